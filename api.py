@@ -1,32 +1,472 @@
 """REST API endpoints for Odoo integration."""
 from __future__ import annotations
 
+import asyncio
+import inspect
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import wraps
-from flask import request, jsonify
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from flask import request, jsonify, Response, stream_with_context
+from fast_answers import FastAnswers
+from frcp_deadlines import RESPONSE_PERIODS, SERVICE_METHODS, DeadlineError, default_calendar, parse_trigger
+from invites import InviteRequestError, campaign_progress, create_campaign
+from jobs import InvalidCallbackURL, JobManager, JobQueueFull
+from long_input import LongInputRunner
 from model_client import ModelClient
-from prompts import build_document_prompt
+from prompt_prefix import Prompt
+from prompts import build_document_messages
+from prompts_full import knowledge_index
+from rate_limit import PRIORITY_BULK
+from resilience import Deadline, DeadlineExceeded, UpstreamUnavailable
+from streaming import STREAM_HEADERS, ndjson_line, sse_event
+from token_budget import PromptTooLarge
+from mail import get_mail_stats
+from users import get_db_stats
+
+
+def _api_key_error():
+    """Return an error response if the request lacks a valid API key."""
+    api_key = request.headers.get('X-API-Key')
+    expected_key = os.environ.get('ODOO_API_KEY')
+    
+    if not expected_key:
+        return jsonify({'error': 'API key authentication not configured'}), 500
+    
+    if not api_key or api_key != expected_key:
+        return jsonify({'error': 'Invalid or missing API key'}), 401
+    
+    return None
 
 
 def require_api_key(f):
-    """Decorator to require API key authentication for API endpoints."""
+    """Decorator to require API key authentication for API endpoints.
+    
+    Works for both regular and `async def` views.
+    """
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_decorated_function(*args, **kwargs):
+            error = _api_key_error()
+            if error:
+                return error
+            return await f(*args, **kwargs)
+        return async_decorated_function
+    
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key')
-        expected_key = os.environ.get('ODOO_API_KEY')
-        
-        if not expected_key:
-            return jsonify({'error': 'API key authentication not configured'}), 500
-        
-        if not api_key or api_key != expected_key:
-            return jsonify({'error': 'Invalid or missing API key'}), 401
-        
+        error = _api_key_error()
+        if error:
+            return error
         return f(*args, **kwargs)
     return decorated_function
 
 
-def register_api_routes(app, model_client: ModelClient):
-    """Register API routes for Odoo integration."""
+class APIRequestError(ValueError):
+    """Raised when an API request body is missing required fields."""
+
+
+# How type errors name each expected JSON type
+_TYPE_NAMES = {str: 'a string', list: 'a list', dict: 'an object'}
+
+
+def _field(data: dict, name: str, default, kind=str):
+    """Return `data[name]` (or `default`), rejecting values of the wrong JSON type."""
+    value = data.get(name, default)
+    if not isinstance(value, kind):
+        raise APIRequestError(f'{name} must be {_TYPE_NAMES[kind]}')
+    return value
+
+
+class PreparedRequest(NamedTuple):
+    """A validated generate request: the prompt plus how to shape the reply."""
+    prompt: Prompt
+    result_field: str
+    echo: dict
+    
+    def success_payload(self, response: str) -> dict:
+        payload = {'success': True, self.result_field: response}
+        payload.update(self.echo)
+        return payload
+
+
+def prepare_generate(data: Optional[dict]) -> PreparedRequest:
+    """Validate a /api/v1/generate body and build its prompt.
+    
+    Request body:
+    {
+        "prompt": "Your question or prompt",
+        "document_type": "General" (optional),
+        "jurisdiction": "Federal" (optional),
+        "context": {} (optional additional context),
+        "use_cache": true (optional; false forces a fresh generation)
+    }
+    """
+    if not isinstance(data, dict) or 'prompt' not in data:
+        raise APIRequestError('Missing required field: prompt')
+    
+    prompt_text = _field(data, 'prompt', '').strip()
+    doc_type = _field(data, 'document_type', 'General')
+    jurisdiction = _field(data, 'jurisdiction', 'Federal')
+    context = _field(data, 'context', {}, dict)
+    
+    if not prompt_text:
+        raise APIRequestError('Prompt cannot be empty')
+    
+    # Add context if provided; it is request-specific, so it goes in the user message
+    user_text = prompt_text
+    if context:
+        user_text += "\n\nAdditional Context:\n"
+        for key, value in context.items():
+            user_text += f"- {key}: {value}\n"
+    
+    # Build the messages: system and template blocks first, user text last
+    messages = build_document_messages(
+        doc_type=doc_type,
+        jurisdiction=jurisdiction,
+        user_text=user_text
+    )
+    
+    return PreparedRequest(messages, 'response', {
+        'prompt': prompt_text,
+        'document_type': doc_type,
+        'jurisdiction': jurisdiction
+    })
+
+
+def prepare_product_description(data: Optional[dict]) -> PreparedRequest:
+    """Validate a /api/v1/generate/product-description body and build its prompt.
+    
+    Request body:
+    {
+        "product_name": "Product name",
+        "category": "Product category" (optional),
+        "features": ["feature1", "feature2"] (optional),
+        "target_audience": "Target audience" (optional)
+    }
+    """
+    if not isinstance(data, dict) or 'product_name' not in data:
+        raise APIRequestError('Missing required field: product_name')
+    
+    product_name = _field(data, 'product_name', '')
+    category = _field(data, 'category', '')
+    features = _field(data, 'features', [], list)
+    target_audience = _field(data, 'target_audience', '')
+    
+    # Build product description prompt
+    prompt = f"Generate a compelling product description for:\n\n"
+    prompt += f"Product Name: {product_name}\n"
+    if category:
+        prompt += f"Category: {category}\n"
+    if features:
+        prompt += f"Key Features:\n"
+        for feature in features:
+            prompt += f"- {feature}\n"
+    if target_audience:
+        prompt += f"Target Audience: {target_audience}\n"
+    
+    prompt += "\nPlease create a professional, engaging product description that highlights the key benefits and features."
+    
+    return PreparedRequest(prompt, 'description', {'product_name': product_name})
+
+
+def prepare_email(data: Optional[dict]) -> PreparedRequest:
+    """Validate a /api/v1/generate/email body and build its prompt.
+    
+    Request body:
+    {
+        "purpose": "Email purpose (e.g., 'customer follow-up', 'sales inquiry')",
+        "recipient_name": "Recipient name" (optional),
+        "context": "Additional context" (optional),
+        "tone": "professional|friendly|formal" (optional)
+    }
+    """
+    if not isinstance(data, dict) or 'purpose' not in data:
+        raise APIRequestError('Missing required field: purpose')
+    
+    purpose = _field(data, 'purpose', '')
+    recipient_name = _field(data, 'recipient_name', '')
+    context = _field(data, 'context', '')
+    tone = _field(data, 'tone', 'professional')
+    
+    # Build email generation prompt
+    prompt = f"Generate a {tone} email for the following purpose:\n\n"
+    prompt += f"Purpose: {purpose}\n"
+    if recipient_name:
+        prompt += f"Recipient: {recipient_name}\n"
+    if context:
+        prompt += f"Context: {context}\n"
+    
+    prompt += "\nPlease create a well-structured email with appropriate greeting, body, and closing."
+    
+    return PreparedRequest(prompt, 'email_content', {'purpose': purpose})
+
+
+def prepare_document(data: Optional[dict]) -> PreparedRequest:
+    """Validate a /api/v1/generate/document body and build its prompt.
+    
+    Request body:
+    {
+        "document_type": "Contract|Agreement|Policy|etc",
+        "jurisdiction": "Federal|State|etc" (optional),
+        "parties": ["Party 1", "Party 2"] (optional),
+        "terms": "Key terms and conditions" (optional),
+        "additional_info": "Any additional information" (optional)
+    }
+    """
+    if not isinstance(data, dict) or 'document_type' not in data:
+        raise APIRequestError('Missing required field: document_type')
+    
+    doc_type = _field(data, 'document_type', '')
+    jurisdiction = _field(data, 'jurisdiction', 'Federal')
+    parties = _field(data, 'parties', [], list)
+    terms = _field(data, 'terms', '')
+    additional_info = _field(data, 'additional_info', '')
+    
+    # Build document generation prompt
+    prompt = f"Generate a {doc_type} document with the following details:\n\n"
+    prompt += f"Jurisdiction: {jurisdiction}\n"
+    if parties:
+        prompt += f"Parties Involved:\n"
+        for i, party in enumerate(parties, 1):
+            prompt += f"{i}. {party}\n"
+    if terms:
+        prompt += f"\nKey Terms:\n{terms}\n"
+    if additional_info:
+        prompt += f"\nAdditional Information:\n{additional_info}\n"
+    
+    prompt += "\nPlease create a professional, legally sound document template."
+    
+    return PreparedRequest(prompt, 'document_content', {'document_type': doc_type})
+
+
+# Request preparer for each generate type, shared by the JSON routes and jobs
+GENERATE_TYPES = {
+    'generate': prepare_generate,
+    'product-description': prepare_product_description,
+    'email': prepare_email,
+    'document': prepare_document,
+}
+
+# URL path, endpoint name and generate type for each JSON generate route
+GENERATE_ROUTES = [
+    ('/api/v1/generate', 'api_generate', 'generate'),
+    ('/api/v1/generate/product-description', 'api_generate_product_description', 'product-description'),
+    ('/api/v1/generate/email', 'api_generate_email', 'email'),
+    ('/api/v1/generate/document', 'api_generate_document', 'document'),
+]
+
+
+# Upper bounds for /api/v1/batch requests
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 1000))
+BATCH_MAX_PARALLELISM = int(os.environ.get('BATCH_MAX_PARALLELISM', 8))
+
+# Upper bound for /api/v1/deadlines requests; these are computed locally, so it can be large
+DEADLINE_BATCH_MAX_ITEMS = int(os.environ.get('DEADLINE_BATCH_MAX_ITEMS', 10000))
+
+
+def _prepare_batch_item(item) -> PreparedRequest:
+    """Validate one /api/v1/batch entry and build its prompt."""
+    if not isinstance(item, dict) or 'type' not in item:
+        raise APIRequestError('Missing required field: type')
+    if not isinstance(item['type'], str):
+        raise APIRequestError('type must be a string')
+    if item['type'] not in GENERATE_TYPES:
+        raise APIRequestError(f"Unknown request type: {item['type']}")
+    if 'request' in item and not isinstance(item['request'], dict):
+        raise APIRequestError('request must be an object')
+    return GENERATE_TYPES[item['type']](item.get('request'))
+
+
+def _iter_batch_results(
+    model_client, items: List, parallelism: int, use_cache: bool, deadline: Optional[Deadline] = None
+) -> Iterator[Tuple[int, dict]]:
+    """Run batch entries concurrently and yield (index, result) as each finishes.
+    
+    Invalid entries fail individually without a model call. A `deadline`
+    bounds the whole batch, so entries still queued when it expires fail
+    fast instead of calling the model.
+    """
+    def run(prepared):
+        response = model_client.generate(
+            prepared.prompt, use_cache=use_cache, deadline=deadline, priority=PRIORITY_BULK
+        )
+        return prepared.success_payload(response)
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(items))))
+    try:
+        futures = {}
+        for index, item in enumerate(items):
+            try:
+                prepared = _prepare_batch_item(item)
+            except APIRequestError as exc:
+                yield index, {'success': False, 'error': str(exc)}
+                continue
+            futures[executor.submit(run, prepared)] = index
+        
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as exc:
+                result = {'success': False, 'error': str(exc)}
+            yield futures[future], result
+    finally:
+        # Stop queued work if the client disconnects mid-stream
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _validate_deadline_item(item) -> Tuple:
+    """Check one /api/v1/deadlines entry and return its (trigger, event, service)."""
+    if not isinstance(item, dict) or 'event' not in item or 'trigger' not in item:
+        raise DeadlineError('Missing required fields: event, trigger')
+    event = item['event']
+    service = item.get('service', 'electronic')
+    if not isinstance(event, str) or not isinstance(service, str) or not isinstance(item['trigger'], str):
+        raise DeadlineError('event, trigger and service must be strings')
+    if event not in RESPONSE_PERIODS:
+        raise DeadlineError(f'Unknown event: {event}')
+    if service not in SERVICE_METHODS:
+        raise DeadlineError(f'Unknown service method: {service}')
+    return parse_trigger(item['trigger']), event, service
+
+
+def _use_cache(data: dict) -> bool:
+    """Return False if the caller asked to bypass the response cache.
+    
+    Either send `"use_cache": false` in the body or a
+    `Cache-Control: no-cache` request header.
+    """
+    if data.get('use_cache') is False:
+        return False
+    return 'no-cache' not in request.headers.get('Cache-Control', '')
+
+
+def _request_deadline() -> Optional[Deadline]:
+    """Return the caller's time budget from the `X-Request-Timeout` header.
+    
+    The value is in seconds; without it the model client's default
+    deadline applies.
+    """
+    value = request.headers.get('X-Request-Timeout')
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise APIRequestError('X-Request-Timeout must be a number of seconds')
+    if seconds <= 0:
+        raise APIRequestError('X-Request-Timeout must be positive')
+    return Deadline(seconds)
+
+
+def _error_response(exc: Exception):
+    """Map a model call failure to a JSON error response.
+    
+    Upstream outages and overload (retries exhausted, circuit open, or no
+    rate-limiter slot in time) are reported as 503 and an exhausted request deadline as 504, so callers can tell them
+    apart from request bugs. A prompt too large for the model's context budget is rejected with 413 before any
+    model call.
+    """
+    if isinstance(exc, PromptTooLarge):
+        status = 413
+    elif isinstance(exc, DeadlineExceeded):
+        status = 504
+    elif isinstance(exc, UpstreamUnavailable):
+        status = 503
+    else:
+        status = 500
+    return jsonify({
+        'success': False,
+        'error': str(exc)
+    }), status
+
+
+def _wants_sse() -> bool:
+    """Return True if the caller asked for SSE rather than NDJSON framing."""
+    if request.args.get('format') == 'sse':
+        return True
+    return request.accept_mimetypes.best == 'text/event-stream'
+
+
+def register_api_routes(
+    app,
+    model_client: ModelClient,
+    async_client=None,
+    job_manager: Optional[JobManager] = None,
+    long_input: Optional[LongInputRunner] = None,
+    fast_answers: Optional[FastAnswers] = None,
+):
+    """Register API routes for Odoo integration.
+    
+    If `async_client` (a `model_client_async.AsyncModelClient`) is given,
+    the JSON generate endpoints are mounted as `async def` views that await
+    it instead of blocking on `model_client`. Flask needs the `async` extra
+    (asgiref) for this. This does not free worker threads: Flask still runs
+    each async view on a WSGI worker thread, even behind an ASGI server, so
+    concurrency is bounded by the server's worker threads. What the async
+    client adds is one shared connection pool and event loop for upstream
+    calls, with the same caching and single-flight coalescing as the sync
+    client.
+    
+    If `job_manager` is given, the /api/v1/jobs endpoints are mounted so
+    long generations can run in the background and be polled.
+    
+    All model calls made here are queued as bulk traffic, behind the
+    interactive /ask page when the rate limiter is saturated.
+    
+    Prompts too long for one call are answered by map-reduce with
+    `long_input` (a `long_input.LongInputRunner`, by default one built
+    from the environment around `model_client`); its chunk calls run on
+    the sync client even when `async_client` is given.
+    
+    If `fast_answers` (the web app's `fast_answers.FastAnswers`) is given,
+    /api/v1/metrics reports how many /ask lookups it answered locally.
+    """
+    if long_input is None:
+        long_input = LongInputRunner.from_env(model_client)
+    
+    def generate_text(prompt, use_cache: bool, deadline: Optional[Deadline] = None) -> str:
+        """Generate a bulk-priority response, by map-reduce if the prompt is too long."""
+        if long_input.needs_long_mode(prompt):
+            return long_input.run(prompt, use_cache=use_cache, deadline=deadline, priority=PRIORITY_BULK)
+        return model_client.generate(prompt, use_cache=use_cache, deadline=deadline, priority=PRIORITY_BULK)
+    
+    def generate_view(prepare):
+        """Build a JSON generate view around a request preparer."""
+        if async_client is not None:
+            async def view():
+                data = request.get_json()
+                try:
+                    prepared = prepare(data)
+                    deadline = _request_deadline()
+                except APIRequestError as exc:
+                    return jsonify({'error': str(exc)}), 400
+                try:
+                    if long_input.needs_long_mode(prepared.prompt):
+                        response = await asyncio.to_thread(generate_text, prepared.prompt, _use_cache(data), deadline)
+                    else:
+                        response = await async_client.generate(
+                            prepared.prompt, use_cache=_use_cache(data), deadline=deadline, priority=PRIORITY_BULK
+                        )
+                    return jsonify(prepared.success_payload(response))
+                except Exception as exc:
+                    return _error_response(exc)
+        else:
+            def view():
+                data = request.get_json()
+                try:
+                    prepared = prepare(data)
+                    deadline = _request_deadline()
+                except APIRequestError as exc:
+                    return jsonify({'error': str(exc)}), 400
+                try:
+                    response = generate_text(prepared.prompt, _use_cache(data), deadline)
+                    return jsonify(prepared.success_payload(response))
+                except Exception as exc:
+                    return _error_response(exc)
+        view.__doc__ = prepare.__doc__
+        return view
     
     @app.route('/api/v1/health', methods=['GET'])
     def api_health():
@@ -37,205 +477,341 @@ def register_api_routes(app, model_client: ModelClient):
             'version': '1.0'
         })
     
-    @app.route('/api/v1/generate', methods=['POST'])
+    @app.route('/api/v1/metrics', methods=['GET'])
     @require_api_key
-    def api_generate():
-        """Generate AI response for a given prompt.
+    def api_metrics():
+        """Runtime statistics for the model client (connection pool, etc.), users database, mail and retrieval."""
+        stats = model_client.get_stats()
+        if async_client is not None:
+            stats['async_client'] = async_client.get_stats()
+        if job_manager is not None:
+            stats['jobs'] = job_manager.get_stats()
+        stats['users_db'] = get_db_stats()
+        stats['mail'] = get_mail_stats()
+        stats['long_input'] = long_input.get_stats()
+        stats['retrieval'] = knowledge_index().get_stats()
+        if fast_answers is not None:
+            stats['fast_path'] = fast_answers.get_stats()
+        return jsonify(stats)
+    
+    for rule, endpoint, generate_type in GENERATE_ROUTES:
+        view = generate_view(GENERATE_TYPES[generate_type])
+        app.add_url_rule(rule, endpoint, require_api_key(view), methods=['POST'])
+    
+    @app.route('/api/v1/generate/stream', methods=['POST'])
+    @require_api_key
+    def api_generate_stream():
+        """Stream an AI response for a given prompt as it is generated.
         
-        Request body:
-        {
-            "prompt": "Your question or prompt",
-            "document_type": "General" (optional),
-            "jurisdiction": "Federal" (optional),
-            "context": {} (optional additional context)
-        }
+        Accepts the same request body as /api/v1/generate. The response is
+        newline-delimited JSON (application/x-ndjson) by default, or
+        server-sent events when requested with `Accept: text/event-stream`
+        or `?format=sse`. Each record is one of:
+        
+            {"type": "chunk", "text": "..."}
+            {"type": "done", "success": true}
+            {"type": "error", "success": false, "error": "..."}
+        
+        Prompts too long for one model call are answered by map-reduce;
+        while the chunks run, records like
+        {"type": "progress", "phase": "map", "done": 3, "total": 12} are sent.
         """
         data = request.get_json()
         
-        if not data or 'prompt' not in data:
-            return jsonify({'error': 'Missing required field: prompt'}), 400
-        
-        prompt_text = data.get('prompt', '').strip()
-        doc_type = data.get('document_type', 'General')
-        jurisdiction = data.get('jurisdiction', 'Federal')
-        context = data.get('context', {})
+        try:
+            full_prompt = prepare_generate(data).prompt
+            deadline = _request_deadline()
+        except APIRequestError as exc:
+            return jsonify({'error': str(exc)}), 400
         
-        if not prompt_text:
-            return jsonify({'error': 'Prompt cannot be empty'}), 400
+        use_cache = _use_cache(data)
+        use_sse = _wants_sse()
         
-        # Build the full prompt
-        full_prompt = build_document_prompt(
-            doc_type=doc_type,
-            jurisdiction=jurisdiction,
-            user_text=prompt_text
-        )
+        def frame(payload):
+            if use_sse:
+                return sse_event(payload, event=payload['type'])
+            return ndjson_line(payload)
         
-        # Add context if provided
-        if context:
-            context_str = "\n\nAdditional Context:\n"
-            for key, value in context.items():
-                context_str += f"- {key}: {value}\n"
-            full_prompt += context_str
+        def records():
+            try:
+                if long_input.needs_long_mode(full_prompt):
+                    for event in long_input.iter_events(
+                        full_prompt, stream=True, use_cache=use_cache, deadline=deadline, priority=PRIORITY_BULK
+                    ):
+                        yield frame(event)
+                else:
+                    for chunk in model_client.generate_stream(
+                        full_prompt, use_cache=use_cache, deadline=deadline, priority=PRIORITY_BULK
+                    ):
+                        yield frame({'type': 'chunk', 'text': chunk})
+            except Exception as exc:
+                yield frame({'type': 'error', 'success': False, 'error': str(exc)})
+                return
+            yield frame({'type': 'done', 'success': True})
         
-        try:
-            response = model_client.generate(full_prompt)
-            return jsonify({
-                'success': True,
-                'response': response,
-                'prompt': prompt_text,
-                'document_type': doc_type,
-                'jurisdiction': jurisdiction
-            })
-        except Exception as exc:
-            return jsonify({
-                'success': False,
-                'error': str(exc)
-            }), 500
+        return Response(
+            stream_with_context(records()),
+            mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+            headers=STREAM_HEADERS
+        )
     
-    @app.route('/api/v1/generate/product-description', methods=['POST'])
+    @app.route('/api/v1/batch', methods=['POST'])
     @require_api_key
-    def api_generate_product_description():
-        """Generate product description.
+    def api_batch():
+        """Run many generate requests concurrently in one call.
         
         Request body:
         {
-            "product_name": "Product name",
-            "category": "Product category" (optional),
-            "features": ["feature1", "feature2"] (optional),
-            "target_audience": "Target audience" (optional)
+            "requests": [
+                {"type": "generate|product-description|email|document",
+                 "request": {...}, "id": "caller reference" (optional)},
+                ...
+            ],
+            "parallelism": 4 (optional, capped by BATCH_MAX_PARALLELISM),
+            "stream": false (optional),
+            "use_cache": true (optional)
         }
+        
+        By default the response lists one result per request, in request
+        order. With "stream": true (or `Accept: application/x-ndjson`) each
+        result is sent as an NDJSON record as soon as it finishes, followed
+        by a {"type": "done", ...} summary. Failures are reported per item.
         """
+        started = time.time()
         data = request.get_json()
         
-        if not data or 'product_name' not in data:
-            return jsonify({'error': 'Missing required field: product_name'}), 400
+        if not data or not isinstance(data.get('requests'), list):
+            return jsonify({'error': 'Missing required field: requests'}), 400
         
-        product_name = data.get('product_name')
-        category = data.get('category', '')
-        features = data.get('features', [])
-        target_audience = data.get('target_audience', '')
+        items = data['requests']
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Too many requests in batch (max {BATCH_MAX_ITEMS})'}), 400
         
-        # Build product description prompt
-        prompt = f"Generate a compelling product description for:\n\n"
-        prompt += f"Product Name: {product_name}\n"
-        if category:
-            prompt += f"Category: {category}\n"
-        if features:
-            prompt += f"Key Features:\n"
-            for feature in features:
-                prompt += f"- {feature}\n"
-        if target_audience:
-            prompt += f"Target Audience: {target_audience}\n"
+        try:
+            parallelism = int(data.get('parallelism', BATCH_MAX_PARALLELISM))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'parallelism must be an integer'}), 400
+        parallelism = max(1, min(parallelism, BATCH_MAX_PARALLELISM))
+        use_cache = _use_cache(data)
+        try:
+            deadline = _request_deadline()
+        except APIRequestError as exc:
+            return jsonify({'error': str(exc)}), 400
         
-        prompt += "\nPlease create a professional, engaging product description that highlights the key benefits and features."
+        def record(index, result):
+            item = items[index]
+            entry = {'index': index}
+            if isinstance(item, dict) and 'id' in item:
+                entry['id'] = item['id']
+            entry.update(result)
+            return entry
         
-        try:
-            response = model_client.generate(prompt)
-            return jsonify({
-                'success': True,
-                'description': response,
-                'product_name': product_name
-            })
-        except Exception as exc:
-            return jsonify({
-                'success': False,
-                'error': str(exc)
-            }), 500
+        results = _iter_batch_results(model_client, items, parallelism, use_cache, deadline)
+        
+        stream = data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson'
+        if stream:
+            def records():
+                succeeded = failed = 0
+                for index, result in results:
+                    if result['success']:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    yield ndjson_line(dict(record(index, result), type='result'))
+                yield ndjson_line({
+                    'type': 'done',
+                    'succeeded': succeeded,
+                    'failed': failed,
+                    'duration_ms': round((time.time() - started) * 1000, 1)
+                })
+            
+            return Response(
+                stream_with_context(records()),
+                mimetype='application/x-ndjson',
+                headers=STREAM_HEADERS
+            )
+        
+        ordered = [None] * len(items)
+        for index, result in results:
+            ordered[index] = record(index, result)
+        return jsonify({
+            'success': True,
+            'results': ordered,
+            'succeeded': sum(1 for r in ordered if r['success']),
+            'failed': sum(1 for r in ordered if not r['success']),
+            'duration_ms': round((time.time() - started) * 1000, 1)
+        })
     
-    @app.route('/api/v1/generate/email', methods=['POST'])
+    @app.route('/api/v1/deadlines', methods=['POST'])
     @require_api_key
-    def api_generate_email():
-        """Generate email content.
+    def api_deadlines():
+        """Compute FRCP 6 due dates for many docket events in one call, without the model.
         
         Request body:
         {
-            "purpose": "Email purpose (e.g., 'customer follow-up', 'sales inquiry')",
-            "recipient_name": "Recipient name" (optional),
-            "context": "Additional context" (optional),
-            "tone": "professional|friendly|formal" (optional)
+            "deadlines": [
+                {"event": "answer|interrogatory_responses|...", "trigger": "YYYY-MM-DD",
+                 "service": "electronic|personal|mail|clerk|other" (optional),
+                 "id": "caller reference" (optional)},
+                ...
+            ],
+            "explain": false (optional: include the rule and computation steps)
         }
+        
+        `event` is a key of `frcp_deadlines.RESPONSE_PERIODS`; `trigger` is
+        the date of the event the period runs from (service, entry of
+        judgment, or the hearing or trial for periods counted backward).
+        Results are listed in request order; invalid entries fail
+        individually.
         """
+        started = time.time()
         data = request.get_json()
         
-        if not data or 'purpose' not in data:
-            return jsonify({'error': 'Missing required field: purpose'}), 400
+        if not data or not isinstance(data.get('deadlines'), list):
+            return jsonify({'error': 'Missing required field: deadlines'}), 400
         
-        purpose = data.get('purpose')
-        recipient_name = data.get('recipient_name', '')
-        context = data.get('context', '')
-        tone = data.get('tone', 'professional')
+        items = data['deadlines']
+        if len(items) > DEADLINE_BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Too many deadlines in batch (max {DEADLINE_BATCH_MAX_ITEMS})'}), 400
         
-        # Build email generation prompt
-        prompt = f"Generate a {tone} email for the following purpose:\n\n"
-        prompt += f"Purpose: {purpose}\n"
-        if recipient_name:
-            prompt += f"Recipient: {recipient_name}\n"
-        if context:
-            prompt += f"Context: {context}\n"
+        calendar = default_calendar()
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            entry = {'index': index}
+            if isinstance(item, dict) and 'id' in item:
+                entry['id'] = item['id']
+            try:
+                valid.append((index, _validate_deadline_item(item)))
+            except DeadlineError as exc:
+                entry.update({'success': False, 'error': str(exc)})
+            results.append(entry)
         
-        prompt += "\nPlease create a well-structured email with appropriate greeting, body, and closing."
-        
-        try:
-            response = model_client.generate(prompt)
-            return jsonify({
+        rows = [row for _, row in valid]
+        due_dates = calendar.compute_batch(
+            [trigger for trigger, _, _ in rows], [event for _, event, _ in rows], [service for _, _, service in rows]
+        )
+        for (index, (trigger, event, service)), due in zip(valid, due_dates):
+            results[index].update({
                 'success': True,
-                'email_content': response,
-                'purpose': purpose
+                'event': event,
+                'trigger': trigger.isoformat(),
+                'service': service,
+                'due': due.isoformat(),
             })
-        except Exception as exc:
-            return jsonify({
-                'success': False,
-                'error': str(exc)
-            }), 500
+            if data.get('explain'):
+                computed = calendar.compute(event, trigger, service)
+                results[index].update({'rule': computed.rule, 'steps': list(computed.steps)})
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'succeeded': len(valid),
+            'failed': len(items) - len(valid),
+            'duration_ms': round((time.time() - started) * 1000, 1)
+        })
     
-    @app.route('/api/v1/generate/document', methods=['POST'])
+    @app.route('/api/v1/invites', methods=['POST'])
     @require_api_key
-    def api_generate_document():
-        """Generate legal or business document.
+    def api_create_invites():
+        """Invite a list of users in one request.
         
         Request body:
         {
-            "document_type": "Contract|Agreement|Policy|etc",
-            "jurisdiction": "Federal|State|etc" (optional),
-            "parties": ["Party 1", "Party 2"] (optional),
-            "terms": "Key terms and conditions" (optional),
-            "additional_info": "Any additional information" (optional)
+            "recipients": [{"username": "jdoe", "email": "jdoe@firm.com"}, ...]
         }
+        
+        Tokens for all valid recipients are created in one transaction and
+        the emails are queued for the background sender. Responds 202 with a
+        result per recipient ("queued", "skipped" or "error"); poll
+        GET /api/v1/invites/<campaign_id> for delivery progress.
+        """
+        data = request.get_json(silent=True) or {}
+        recipients = data.get('recipients')
+        if not isinstance(recipients, list) or not all(isinstance(r, dict) for r in recipients):
+            return jsonify({'success': False, 'error': 'recipients must be a list of objects'}), 400
+        
+        try:
+            campaign = create_campaign(recipients, request.url_root.rstrip('/'))
+        except InviteRequestError as exc:
+            return jsonify({'success': False, 'error': str(exc)}), 400
+        
+        status_url = f"/api/v1/invites/{campaign['campaign_id']}"
+        campaign.update({'success': True, 'status_url': status_url})
+        return jsonify(campaign), 202, {'Location': status_url}
+    
+    @app.route('/api/v1/invites/<campaign_id>', methods=['GET'])
+    @require_api_key
+    def api_get_invites(campaign_id):
+        """Delivery progress of a bulk invite: counts by status and per-recipient state."""
+        progress = campaign_progress(campaign_id)
+        if progress is None:
+            return jsonify({'error': 'Invite campaign not found'}), 404
+        return jsonify(progress)
+    
+    if job_manager is None:
+        return
+    
+    @app.route('/api/v1/jobs', methods=['POST'])
+    @require_api_key
+    def api_create_job():
+        """Queue a generation and return its job id immediately.
+        
+        Request body:
+        {
+            "type": "generate|product-description|email|document",
+            "request": {...} (body accepted by the matching generate endpoint),
+            "callback_url": "https://..." (optional; receives the finished job as JSON)
+        }
+        
+        Responds 202 with the job id; poll GET /api/v1/jobs/<job_id>.
+        Responds 429 when the job queue is full.
         """
         data = request.get_json()
         
-        if not data or 'document_type' not in data:
-            return jsonify({'error': 'Missing required field: document_type'}), 400
-        
-        doc_type = data.get('document_type')
-        jurisdiction = data.get('jurisdiction', 'Federal')
-        parties = data.get('parties', [])
-        terms = data.get('terms', '')
-        additional_info = data.get('additional_info', '')
-        
-        # Build document generation prompt
-        prompt = f"Generate a {doc_type} document with the following details:\n\n"
-        prompt += f"Jurisdiction: {jurisdiction}\n"
-        if parties:
-            prompt += f"Parties Involved:\n"
-            for i, party in enumerate(parties, 1):
-                prompt += f"{i}. {party}\n"
-        if terms:
-            prompt += f"\nKey Terms:\n{terms}\n"
-        if additional_info:
-            prompt += f"\nAdditional Information:\n{additional_info}\n"
-        
-        prompt += "\nPlease create a professional, legally sound document template."
+        if not isinstance(data, dict) or 'type' not in data:
+            return jsonify({'error': 'Missing required field: type'}), 400
+        
+        job_type = data['type']
+        if not isinstance(job_type, str):
+            return jsonify({'error': 'type must be a string'}), 400
+        if job_type not in GENERATE_TYPES:
+            return jsonify({'error': f'Unknown job type: {job_type}'}), 400
         
+        job_request = data.get('request') or {}
+        if not isinstance(job_request, dict):
+            return jsonify({'error': 'request must be an object'}), 400
         try:
-            response = model_client.generate(prompt)
-            return jsonify({
-                'success': True,
-                'document_content': response,
-                'document_type': doc_type
-            })
-        except Exception as exc:
-            return jsonify({
-                'success': False,
-                'error': str(exc)
-            }), 500
+            prepared = GENERATE_TYPES[job_type](job_request)
+        except APIRequestError as exc:
+            return jsonify({'error': str(exc)}), 400
+        
+        use_cache = _use_cache(job_request)
+        
+        def run():
+            response = generate_text(prepared.prompt, use_cache)
+            return prepared.success_payload(response)
+        
+        try:
+            job_id = job_manager.submit(job_type, job_request, run, callback_url=data.get('callback_url'))
+        except InvalidCallbackURL as exc:
+            return jsonify({'error': str(exc)}), 400
+        except JobQueueFull as exc:
+            return jsonify({'error': str(exc)}), 429, {'Retry-After': '5'}
+        
+        status_url = f'/api/v1/jobs/{job_id}'
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    
+    @app.route('/api/v1/jobs/<job_id>', methods=['GET'])
+    @require_api_key
+    def api_get_job(job_id):
+        """Return the status of a job, plus its result or error once finished."""
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found or expired'}), 404
+        return jsonify(job)
@@ -1,18 +1,27 @@
 """Flask web app entrypoint for the Paralegal AI Assistant."""
 from __future__ import annotations
 
+import io
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 
 from model_client import ModelClient
-from prompts import build_document_prompt
+from prompts import build_document_messages
 from auth import login_required, login_user, logout_user, current_user, authenticate, admin_required
-from users import create_user, list_users, delete_user, get_user, generate_token, validate_token, consume_token
+from users import create_user, has_users, list_users_page, import_users, delete_user, get_user, generate_token, validate_token, redeem_token, tokens
+from login_throttle import LoginThrottled
+from password_hashing import HashingBusy
+from user_io import FORMATS, detect_format, export_users, read_users
 from mail import init_mail, send_invite_email, send_password_reset_email
+from invites import InviteRequestError, campaign_progress, create_campaign, parse_recipients
 from flask_wtf import CSRFProtect
 from flask_wtf.csrf import generate_csrf
 from api import register_api_routes
+from fast_answers import FastAnswers
+from jobs import JobManager
+from long_input import LongInputRunner
+from streaming import STREAM_HEADERS, sse_event
 
 load_dotenv()
 
@@ -29,16 +38,62 @@ app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER", "norep
 
 init_mail(app)
 
+# Users shown per page on /admin
+ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", 50))
+
 # Enable CSRF protection for forms
 app.config.setdefault("WTF_CSRF_TIME_LIMIT", None)
 csrf = CSRFProtect(app)
 app.jinja_env.globals["csrf_token"] = generate_csrf
 
 # Initialize model client. It reads API config from environment variables.
-model_client = ModelClient()
+# MODEL_CLIENT=github selects the chat-completions client in model_client_real.
+if os.environ.get("MODEL_CLIENT", "placeholder").lower() == "github":
+    from model_client_real import ModelClient as GitHubModelClient
+    model_client = GitHubModelClient()
+else:
+    model_client = ModelClient()
+
+# Map-reduce over chunks for inputs too long for one model call
+long_input = LongInputRunner.from_env(model_client)
+
+# Template lookups ("checklist for a subpoena") answered without a model call
+fast_answers = FastAnswers.from_env()
+
+# Optionally serve the JSON generate endpoints from the asyncio client
+# (requires the `async` extra: httpx and Flask[async]).
+async_model_client = None
+if os.environ.get("MODEL_ASYNC_API", "false").lower() == "true":
+    from model_client_async import AsyncModelClient
+    async_model_client = AsyncModelClient()
+
+# Background runner for /api/v1/jobs (state kept in jobs.db)
+job_manager = JobManager()
+
+# Delete expired invite/reset tokens in the background
+tokens.start_sweeper()
 
 # Register API routes for Odoo integration
-register_api_routes(app, model_client)
+register_api_routes(
+    app,
+    model_client,
+    async_client=async_model_client,
+    job_manager=job_manager,
+    long_input=long_input,
+    fast_answers=fast_answers,
+)
+
+# The JSON API authenticates with X-API-Key, not the session cookie, so
+# its views are exempt from form CSRF checks.
+for endpoint, view in app.view_functions.items():
+    if endpoint.startswith("api_"):
+        csrf.exempt(view)
+
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(exc):
+    """Password hashing is saturated (login spike or bulk user creation)."""
+    return "The server is busy. Please try again in a moment.", 503, {"Retry-After": "5"}
 
 
 @app.route("/", methods=["GET"])
@@ -54,14 +109,26 @@ def ask():
     query = request.form.get("query", "").strip()
     doc_type = request.form.get("document_type", "General")
     jurisdiction = request.form.get("jurisdiction", "Federal")
+    full_answer = request.form.get("full_answer") == "1"
     if not query:
         flash("Please enter a question or prompt.")
         return redirect(url_for("index"))
 
-    prompt = build_document_prompt(doc_type=doc_type, jurisdiction=jurisdiction, user_text=query)
+    fast = fast_answers.lookup(query, doc_type, jurisdiction, full_answer=full_answer)
+    if fast is not None:
+        return render_template(
+            "index.html", result=fast.text, fast_answer=True, query=query, document_type=doc_type,
+            jurisdiction=jurisdiction, user=current_user(),
+        )
+
+    user_text = fast_answers.facts(query, jurisdiction) + query
+    prompt = build_document_messages(doc_type=doc_type, jurisdiction=jurisdiction, user_text=user_text)
 
     try:
-        resp = model_client.generate(prompt)
+        if long_input.needs_long_mode(prompt):
+            resp = long_input.run(prompt)
+        else:
+            resp = model_client.generate(prompt)
     except Exception as exc:
         flash(f"Model error: {exc}")
         return redirect(url_for("index"))
@@ -69,6 +136,54 @@ def ask():
     return render_template("index.html", result=resp, query=query, user=current_user())
 
 
+@app.route("/ask/stream", methods=["POST"])
+@login_required
+def ask_stream():
+    """Streaming variant of /ask used by the web UI.
+
+    Sends the answer as server-sent events: `chunk` events carrying text,
+    then a final `done` (or `error`) event. Long inputs are answered by
+    map-reduce, reported with `progress` events while the chunks run.
+    Template lookups and deadline questions are answered in one chunk with
+    `"source": "templates"` or `"source": "deadlines"` on the `done` event,
+    unless the form asks for a full answer.
+    """
+    query = request.form.get("query", "").strip()
+    doc_type = request.form.get("document_type", "General")
+    jurisdiction = request.form.get("jurisdiction", "Federal")
+    full_answer = request.form.get("full_answer") == "1"
+    if not query:
+        return jsonify({"error": "Please enter a question or prompt."}), 400
+
+    fast = fast_answers.lookup(query, doc_type, jurisdiction, full_answer=full_answer)
+    if fast is not None:
+        source = "deadlines" if fast.deadline is not None else "templates"
+        events = iter([sse_event({"text": fast.text}, event="chunk"), sse_event({"source": source}, event="done")])
+        return Response(events, mimetype="text/event-stream", headers=STREAM_HEADERS)
+
+    user_text = fast_answers.facts(query, jurisdiction) + query
+    prompt = build_document_messages(doc_type=doc_type, jurisdiction=jurisdiction, user_text=user_text)
+
+    def events():
+        try:
+            if long_input.needs_long_mode(prompt):
+                for event in long_input.iter_events(prompt, stream=True):
+                    if event["type"] == "chunk":
+                        yield sse_event({"text": event["text"]}, event="chunk")
+                    else:
+                        yield sse_event(event, event="progress")
+                yield sse_event({}, event="done")
+                return
+            for chunk in model_client.generate_stream(prompt):
+                yield sse_event({"text": chunk}, event="chunk")
+        except Exception as exc:
+            yield sse_event({"error": f"Model error: {exc}"}, event="error")
+            return
+        yield sse_event({}, event="done")
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=STREAM_HEADERS)
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     """Simple username/password login. Uses `AUTH_USERNAME` and `AUTH_PASSWORD` env vars.
@@ -82,13 +197,19 @@ def login():
     password = request.form.get("password", "")
     next_url = request.form.get("next") or url_for("index")
 
-    if not os.environ.get("AUTH_USERNAME") and not list_users():
+    if not os.environ.get("AUTH_USERNAME") and not has_users():
         # No auth configured and no users in DB: create a dev user and sign in
         login_user(username or "dev")
         flash("Authentication is not configured; signed in as development user.")
         return redirect(next_url)
 
-    if authenticate(username, password):
+    try:
+        authenticated = authenticate(username, password)
+    except LoginThrottled as exc:
+        flash("Too many sign-in attempts. Please wait and try again.")
+        return render_template("login.html"), 429, {"Retry-After": str(int(exc.retry_after) + 1)}
+
+    if authenticated:
         login_user(username)
         flash("Signed in")
         return redirect(next_url)
@@ -108,8 +229,53 @@ def logout():
 @login_required
 @admin_required
 def admin():
-    users_list = list_users()
-    return render_template("admin.html", users=users_list)
+    search = request.args.get("q", "").strip()
+    after = request.args.get("after") or None
+    users_list, next_after = list_users_page(after=after, limit=ADMIN_PAGE_SIZE, search=search or None)
+    return render_template("admin.html", users=users_list, search=search, next_after=next_after, paged=bool(after))
+
+
+@app.route("/admin/import", methods=["POST"])
+@login_required
+@admin_required
+def admin_import():
+    """Create users in bulk from an uploaded CSV or JSONL file."""
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Choose a CSV or JSONL file to import")
+        return redirect(url_for("admin"))
+    fmt = request.form.get("format") or detect_format(upload.filename)
+    overwrite = bool(request.form.get("overwrite"))
+    try:
+        lines = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        summary = import_users(read_users(lines, fmt), overwrite=overwrite)
+    except (ValueError, UnicodeDecodeError) as exc:
+        flash(f"Import stopped: {exc}")
+        return redirect(url_for("admin"))
+    flash(
+        f"Imported {summary['created']} new users, updated {summary['updated']}, "
+        f"skipped {summary['skipped']}, {summary['error_count']} errors"
+    )
+    for item in summary["errors"][:10]:
+        flash(f"Line {item['line']}: {item['error']}")
+    return redirect(url_for("admin"))
+
+
+@app.route("/admin/export", methods=["GET"])
+@login_required
+@admin_required
+def admin_export():
+    """Stream all users as CSV or JSONL (without password hashes)."""
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        flash(f"Unknown export format: {fmt}")
+        return redirect(url_for("admin"))
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        stream_with_context(export_users(fmt)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=users.{fmt}"},
+    )
 
 
 @app.route("/admin/create", methods=["POST"])
@@ -140,6 +306,35 @@ def admin_delete():
     return redirect(url_for("admin"))
 
 
+@app.route("/admin/invites", methods=["POST"])
+@login_required
+@admin_required
+def admin_bulk_invite():
+    """Invite many users at once from "username,email" lines."""
+    recipients = parse_recipients(request.form.get("recipients", ""))
+    try:
+        campaign = create_campaign(recipients, request.url_root.rstrip("/"))
+    except InviteRequestError as exc:
+        flash(str(exc))
+        return redirect(url_for("admin"))
+    flash(f"Queued {campaign['queued']} invites, skipped {campaign['skipped']}, {campaign['errors']} errors")
+    return render_template(
+        "invite_campaign.html", campaign=campaign, progress=campaign_progress(campaign["campaign_id"])
+    )
+
+
+@app.route("/admin/invites/<campaign_id>", methods=["GET"])
+@login_required
+@admin_required
+def admin_invite_campaign(campaign_id):
+    """Delivery progress of a bulk invite."""
+    progress = campaign_progress(campaign_id)
+    if progress is None:
+        flash("Unknown invite campaign")
+        return redirect(url_for("admin"))
+    return render_template("invite_campaign.html", campaign=None, progress=progress)
+
+
 @app.route("/admin/invite", methods=["POST"])
 @login_required
 @admin_required
@@ -204,8 +399,9 @@ def join():
         flash("Password must be at least 8 characters")
         return render_template("join.html", token=token, username=username)
     
-    create_user(username, password, is_admin=False)
-    consume_token(token)
+    if not redeem_token(token, "invite", password, is_admin=False):
+        flash("Invite token expired or invalid")
+        return redirect(url_for("login"))
     flash("Account created successfully! Please sign in.")
     return redirect(url_for("login"))
 
@@ -273,8 +469,9 @@ def reset_password():
         flash("Password must be at least 8 characters")
         return render_template("reset_password.html", token=token, username=username)
     
-    create_user(username, password, is_admin=False)
-    consume_token(token)
+    if not redeem_token(token, "password_reset", password, is_admin=False):
+        flash("Reset token expired or invalid")
+        return redirect(url_for("login"))
     flash("Password reset successfully! Please sign in.")
     return redirect(url_for("login"))
 
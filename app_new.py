@@ -1,15 +1,22 @@
 """Enhanced Flask app with full GitHub Models integration and expanded prompts."""
 from __future__ import annotations
 
+import io
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 
 from .model_client import ModelClient
-from .prompts_full import build_document_prompt, build_case_management_prompt, build_research_prompt
+from .fast_answers import FastAnswers
+from .long_input import LongInputRunner
+from .prompts_full import build_document_messages, build_case_management_messages, build_research_messages
 from .auth import login_required, login_user, logout_user, current_user, authenticate, admin_required
-from .users import create_user, list_users, delete_user, get_user, generate_token, validate_token, consume_token
+from .users import create_user, has_users, list_users_page, import_users, delete_user, get_user, generate_token, validate_token, redeem_token, tokens
+from .login_throttle import LoginThrottled
+from .password_hashing import HashingBusy
+from .user_io import FORMATS, detect_format, export_users, read_users
 from .mail import init_mail, send_invite_email, send_password_reset_email
+from .invites import InviteRequestError, campaign_progress, create_campaign, parse_recipients
 from flask_wtf import CSRFProtect
 from flask_wtf.csrf import generate_csrf
 
@@ -28,6 +35,9 @@ app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER", "norep
 
 init_mail(app)
 
+# Users shown per page on /admin
+ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", 50))
+
 # Enable CSRF protection for forms
 app.config.setdefault("WTF_CSRF_TIME_LIMIT", None)
 csrf = CSRFProtect(app)
@@ -36,6 +46,21 @@ app.jinja_env.globals["csrf_token"] = generate_csrf
 # Initialize model client
 model_client = ModelClient()
 
+# Map-reduce over chunks for inputs too long for one model call
+long_input = LongInputRunner.from_env(model_client)
+
+# Template lookups ("checklist for a subpoena") answered without a model call
+fast_answers = FastAnswers.from_env()
+
+# Delete expired invite/reset tokens in the background
+tokens.start_sweeper()
+
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(exc):
+    """Password hashing is saturated (login spike or bulk user creation)."""
+    return "The server is busy. Please try again in a moment.", 503, {"Retry-After": "5"}
+
 
 @app.route("/", methods=["GET"])
 @login_required
@@ -50,21 +75,35 @@ def ask():
     query = request.form.get("query", "").strip()
     doc_type = request.form.get("document_type", "General Legal Research")
     jurisdiction = request.form.get("jurisdiction", "Federal")
+    full_answer = request.form.get("full_answer") == "1"
     
     if not query:
         flash("Please enter a question or prompt.")
         return redirect(url_for("index"))
 
+    fast = fast_answers.lookup(query, doc_type, jurisdiction, full_answer=full_answer)
+    if fast is not None:
+        return render_template(
+            "index.html", result=fast.text, fast_answer=True, query=query, document_type=doc_type,
+            jurisdiction=jurisdiction, user=current_user(),
+        )
+
+    # Computed deadlines go ahead of the question so the model only explains them
+    user_text = fast_answers.facts(query, jurisdiction) + query
+
     # Build appropriate prompt based on query type
     if "case" in query.lower() and "manage" in query.lower():
-        prompt = build_case_management_prompt(query)
+        prompt = build_case_management_messages(user_text)
     elif "research" in query.lower() or "case law" in query.lower():
-        prompt = build_research_prompt(query)
+        prompt = build_research_messages(user_text)
     else:
-        prompt = build_document_prompt(doc_type=doc_type, jurisdiction=jurisdiction, user_text=query)
+        prompt = build_document_messages(doc_type=doc_type, jurisdiction=jurisdiction, user_text=user_text)
 
     try:
-        resp = model_client.generate(prompt)
+        if long_input.needs_long_mode(prompt):
+            resp = long_input.run(prompt)
+        else:
+            resp = model_client.generate(prompt)
     except Exception as exc:
         flash(f"Model error: {exc}")
         return redirect(url_for("index"))
@@ -82,12 +121,18 @@ def login():
     password = request.form.get("password", "")
     next_url = request.form.get("next") or url_for("index")
 
-    if not os.environ.get("AUTH_USERNAME") and not list_users():
+    if not os.environ.get("AUTH_USERNAME") and not has_users():
         login_user(username or "dev")
         flash("Authentication is not configured; signed in as development user.")
         return redirect(next_url)
 
-    if authenticate(username, password):
+    try:
+        authenticated = authenticate(username, password)
+    except LoginThrottled as exc:
+        flash("Too many sign-in attempts. Please wait and try again.")
+        return render_template("login.html"), 429, {"Retry-After": str(int(exc.retry_after) + 1)}
+
+    if authenticated:
         login_user(username)
         flash("Signed in")
         return redirect(next_url)
@@ -107,8 +152,53 @@ def logout():
 @login_required
 @admin_required
 def admin():
-    users_list = list_users()
-    return render_template("admin.html", users=users_list)
+    search = request.args.get("q", "").strip()
+    after = request.args.get("after") or None
+    users_list, next_after = list_users_page(after=after, limit=ADMIN_PAGE_SIZE, search=search or None)
+    return render_template("admin.html", users=users_list, search=search, next_after=next_after, paged=bool(after))
+
+
+@app.route("/admin/import", methods=["POST"])
+@login_required
+@admin_required
+def admin_import():
+    """Create users in bulk from an uploaded CSV or JSONL file."""
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Choose a CSV or JSONL file to import")
+        return redirect(url_for("admin"))
+    fmt = request.form.get("format") or detect_format(upload.filename)
+    overwrite = bool(request.form.get("overwrite"))
+    try:
+        lines = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        summary = import_users(read_users(lines, fmt), overwrite=overwrite)
+    except (ValueError, UnicodeDecodeError) as exc:
+        flash(f"Import stopped: {exc}")
+        return redirect(url_for("admin"))
+    flash(
+        f"Imported {summary['created']} new users, updated {summary['updated']}, "
+        f"skipped {summary['skipped']}, {summary['error_count']} errors"
+    )
+    for item in summary["errors"][:10]:
+        flash(f"Line {item['line']}: {item['error']}")
+    return redirect(url_for("admin"))
+
+
+@app.route("/admin/export", methods=["GET"])
+@login_required
+@admin_required
+def admin_export():
+    """Stream all users as CSV or JSONL (without password hashes)."""
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        flash(f"Unknown export format: {fmt}")
+        return redirect(url_for("admin"))
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        stream_with_context(export_users(fmt)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=users.{fmt}"},
+    )
 
 
 @app.route("/admin/create", methods=["POST"])
@@ -139,6 +229,35 @@ def admin_delete():
     return redirect(url_for("admin"))
 
 
+@app.route("/admin/invites", methods=["POST"])
+@login_required
+@admin_required
+def admin_bulk_invite():
+    """Invite many users at once from "username,email" lines."""
+    recipients = parse_recipients(request.form.get("recipients", ""))
+    try:
+        campaign = create_campaign(recipients, request.url_root.rstrip("/"))
+    except InviteRequestError as exc:
+        flash(str(exc))
+        return redirect(url_for("admin"))
+    flash(f"Queued {campaign['queued']} invites, skipped {campaign['skipped']}, {campaign['errors']} errors")
+    return render_template(
+        "invite_campaign.html", campaign=campaign, progress=campaign_progress(campaign["campaign_id"])
+    )
+
+
+@app.route("/admin/invites/<campaign_id>", methods=["GET"])
+@login_required
+@admin_required
+def admin_invite_campaign(campaign_id):
+    """Delivery progress of a bulk invite."""
+    progress = campaign_progress(campaign_id)
+    if progress is None:
+        flash("Unknown invite campaign")
+        return redirect(url_for("admin"))
+    return render_template("invite_campaign.html", campaign=None, progress=progress)
+
+
 @app.route("/admin/invite", methods=["POST"])
 @login_required
 @admin_required
@@ -201,8 +320,9 @@ def join():
         flash("Password must be at least 8 characters")
         return render_template("join.html", token=token, username=username)
     
-    create_user(username, password, is_admin=False)
-    consume_token(token)
+    if not redeem_token(token, "invite", password, is_admin=False):
+        flash("Invite token expired or invalid")
+        return redirect(url_for("login"))
     flash("Account created successfully! Please sign in.")
     return redirect(url_for("login"))
 
@@ -267,8 +387,9 @@ def reset_password():
         flash("Password must be at least 8 characters")
         return render_template("reset_password.html", token=token, username=username)
     
-    create_user(username, password, is_admin=False)
-    consume_token(token)
+    if not redeem_token(token, "password_reset", password, is_admin=False):
+        flash("Reset token expired or invalid")
+        return redirect(url_for("login"))
     flash("Password reset successfully! Please sign in.")
     return redirect(url_for("login"))
 
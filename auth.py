@@ -4,6 +4,9 @@ This module provides a minimal `login_required` decorator and helper functions
 that use Flask sessions. Authentication is controlled by two environment
 variables: `AUTH_USERNAME` and `AUTH_PASSWORD`. If `AUTH_USERNAME` is not set,
 authentication is disabled (convenient for local development and tests).
+
+Login attempts are checked against a `login_throttle.LoginThrottle` (per
+username and per client IP) before any password is hashed.
 """
 from __future__ import annotations
 
@@ -13,19 +16,34 @@ from typing import Optional
 from flask import session, redirect, url_for, request, flash
 
 import users
+from login_throttle import LoginThrottle
+
+
+login_throttle = LoginThrottle.from_env()
 
 
 def authenticate(username: str, password: str) -> bool:
     """Authenticate against the users DB if users exist; otherwise fall back
     to environment variables for development convenience.
+
+    Raises LoginThrottled if the username or client IP has failed too many
+    times recently, and password_hashing.HashingBusy if the hash pool is saturated.
     """
+    ip = login_throttle.client_ip(request.remote_addr, request.headers.get("X-Forwarded-For"))
+    login_throttle.check(username, ip)
+    ok = _check_credentials(username, password)
+    login_throttle.record(username, ip, ok)
+    return ok
+
+
+def _check_credentials(username: str, password: str) -> bool:
     # If DB has users, prefer DB authentication
     try:
-        user_list = users.list_users()
+        db_has_users = users.has_users()
     except Exception:
-        user_list = []
+        db_has_users = False
 
-    if user_list:
+    if db_has_users:
         return users.verify_password(username, password)
 
     expected_user = os.environ.get("AUTH_USERNAME")
@@ -74,7 +92,7 @@ def login_required(view_func):
     @wraps(view_func)
     def wrapped(*args, **kwargs):
         # If no auth configured and no users, do not require login
-        if not os.environ.get("AUTH_USERNAME") and not users.list_users():
+        if not os.environ.get("AUTH_USERNAME") and not users.has_users():
             return view_func(*args, **kwargs)
 
         if "user" in session:
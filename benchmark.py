@@ -0,0 +1,380 @@
+"""Load benchmark for the web app and the /api/v1 routes.
+
+Drives /ask, /ask/stream and every /api/v1/* route at a series of
+concurrency levels and reports throughput and p50/p95/p99 latency per
+route and level. Results are written as JSON so runs can be compared.
+
+By default the app is started in-process with `model_client_real` pointed
+at a local `fake_model_server`, so no quota is spent; the fake's latency
+distribution and injected 429/5xx rates are set from the command line.
+Pass --url to benchmark an already running deployment instead.
+
+Usage:
+    python benchmark.py --concurrency 1,8,32 --requests 200 --latency lognormal:-1.5,0.5
+    python benchmark.py --routes ask,generate,batch --error-429 0.05 --output bench.json
+    python benchmark.py --compare bench_results/previous.json
+    python benchmark.py --url http://localhost:8000 --api-key $ODOO_API_KEY --username alice --password ...
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+DEFAULT_API_KEY = "benchmark-api-key"
+CSRF_RE = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+_counter = itertools.count()
+
+
+def _unique(text: str) -> str:
+    # Distinct prompts keep the response cache from hiding upstream load
+    return f"{text} #{next(_counter)}"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of `values` (0 < pct <= 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class BenchmarkSession:
+    """Per-thread HTTP session that knows how to call each benchmarked route."""
+
+    def __init__(self, base_url: str, api_key: str, username: Optional[str] = None, password: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.http = requests.Session()
+        self.http.headers["X-API-Key"] = api_key
+        self.username = username
+        self.password = password
+        self._csrf: Optional[str] = None
+
+    def _url(self, path: str) -> str:
+        return self.base_url + path
+
+    def _form_token(self) -> str:
+        """Log in if needed and return the CSRF token for form posts."""
+        if self._csrf is None:
+            page = self.http.get(self._url("/"), timeout=30)
+            if "/login" in page.url and self.username:
+                token = CSRF_RE.search(page.text).group(1)
+                self.http.post(
+                    self._url("/login"),
+                    data={"username": self.username, "password": self.password, "csrf_token": token},
+                    timeout=30,
+                )
+                page = self.http.get(self._url("/"), timeout=30)
+            match = CSRF_RE.search(page.text)
+            if not match:
+                raise RuntimeError("Could not load the ask form (login required? pass --username/--password)")
+            self._csrf = match.group(1)
+        return self._csrf
+
+    def _post_json(self, path: str, body: Dict, **kwargs) -> requests.Response:
+        return self.http.post(self._url(path), json=body, timeout=120, **kwargs)
+
+    def ask(self) -> requests.Response:
+        return self.http.post(
+            self._url("/ask"),
+            data={"query": _unique("What is the deadline to answer a complaint?"), "csrf_token": self._form_token()},
+            timeout=120,
+            allow_redirects=False,
+        )
+
+    def ask_stream(self) -> requests.Response:
+        response = self.http.post(
+            self._url("/ask/stream"),
+            data={"query": _unique("Draft a demand letter outline"), "csrf_token": self._form_token()},
+            timeout=120,
+            stream=True,
+        )
+        response.content  # read the whole stream
+        return response
+
+    def health(self) -> requests.Response:
+        return self.http.get(self._url("/api/v1/health"), timeout=30)
+
+    def metrics(self) -> requests.Response:
+        return self.http.get(self._url("/api/v1/metrics"), timeout=30)
+
+    def generate(self) -> requests.Response:
+        return self._post_json("/api/v1/generate", {"prompt": _unique("Summarize Rule 12(b)(6)")})
+
+    def product_description(self) -> requests.Response:
+        return self._post_json(
+            "/api/v1/generate/product-description",
+            {"product_name": _unique("Case binder"), "features": ["tabbed", "archival"]},
+        )
+
+    def email(self) -> requests.Response:
+        return self._post_json("/api/v1/generate/email", {"purpose": _unique("client intake follow-up")})
+
+    def document(self) -> requests.Response:
+        return self._post_json("/api/v1/generate/document", {"document_type": "NDA", "terms": _unique("mutual")})
+
+    def generate_stream(self) -> requests.Response:
+        response = self._post_json("/api/v1/generate/stream", {"prompt": _unique("Explain discovery")}, stream=True)
+        response.content
+        return response
+
+    def batch(self, size: int = 5) -> requests.Response:
+        items = [{"type": "generate", "request": {"prompt": _unique("Batch item")}} for _ in range(size)]
+        return self._post_json("/api/v1/batch", {"requests": items})
+
+    def job(self) -> requests.Response:
+        """Submit a job and poll it to completion; latency covers the whole round trip."""
+        response = self._post_json(
+            "/api/v1/jobs", {"type": "generate", "request": {"prompt": _unique("Background research memo")}}
+        )
+        if response.status_code != 202:
+            return response
+        status_url = self._url(response.json()["status_url"])
+        while True:
+            response = self.http.get(status_url, timeout=30)
+            if response.status_code != 200 or response.json().get("status") in ("succeeded", "failed"):
+                return response
+            time.sleep(0.02)
+
+
+# Route name -> BenchmarkSession method
+ROUTES: Dict[str, Callable[[BenchmarkSession], requests.Response]] = {
+    "ask": BenchmarkSession.ask,
+    "ask-stream": BenchmarkSession.ask_stream,
+    "health": BenchmarkSession.health,
+    "metrics": BenchmarkSession.metrics,
+    "generate": BenchmarkSession.generate,
+    "product-description": BenchmarkSession.product_description,
+    "email": BenchmarkSession.email,
+    "document": BenchmarkSession.document,
+    "generate-stream": BenchmarkSession.generate_stream,
+    "batch": BenchmarkSession.batch,
+    "jobs": BenchmarkSession.job,
+}
+
+
+def _succeeded(route: str, response: requests.Response) -> bool:
+    if route == "ask":
+        # The form re-renders with the answer; a redirect means it flashed an error
+        return response.status_code == 200
+    if route == "jobs":
+        return response.status_code == 200 and response.json().get("status") == "succeeded"
+    if route in ("ask-stream", "generate-stream"):
+        return response.status_code == 200 and b'"error"' not in response.content
+    return response.ok
+
+
+def run_level(make_session: Callable[[], BenchmarkSession], route: str, concurrency: int, total: int) -> Dict:
+    """Send `total` requests to `route` from `concurrency` threads and summarize them."""
+    call = ROUTES[route]
+    local = threading.local()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    failures = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failures
+        if not hasattr(local, "session"):
+            local.session = make_session()
+        started = time.perf_counter()
+        try:
+            response = call(local.session)
+            ok = _succeeded(route, response)
+            status = str(response.status_code)
+        except Exception as exc:
+            ok = False
+            status = type(exc).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if ok:
+                latencies.append(elapsed)
+            else:
+                failures += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": total,
+        "succeeded": len(latencies),
+        "failed": failures,
+        "statuses": statuses,
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": ms(max(latencies)) if latencies else None,
+        },
+    }
+
+
+def start_local_app(args) -> str:
+    """Start a fake model endpoint and the app in-process; return the app's base URL."""
+    from fake_model_server import FakeModelServer
+
+    fake = FakeModelServer(
+        latency=args.latency,
+        error_429_rate=args.error_429,
+        error_5xx_rate=args.error_5xx,
+        retry_after=args.retry_after,
+        chunk_delay=args.chunk_delay,
+        seed=args.seed,
+    ).start()
+
+    workdir = tempfile.mkdtemp(prefix="aibot-bench-")
+    os.environ.update({
+        "MODEL_CLIENT": "github",
+        "GITHUB_MODEL_ENDPOINT": fake.url,
+        "GITHUB_MODEL_API_TOKEN": "fake-token",
+        "ODOO_API_KEY": args.api_key,
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+    })
+    if not args.cache:
+        os.environ["MODEL_CACHE_ENABLED"] = "false"
+
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-app", daemon=True).start()
+    args.fake_server = fake
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def print_table(results: List[Dict], previous: Optional[Dict] = None) -> None:
+    baseline = {}
+    if previous:
+        baseline = {(r["route"], r["concurrency"]): r for r in previous.get("results", [])}
+    header = f"{'route':<20} {'conc':>5} {'ok':>6} {'fail':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    if baseline:
+        header += f" {'Δrps':>8} {'Δp95':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        lat = r["latency_ms"]
+        line = (
+            f"{r['route']:<20} {r['concurrency']:>5} {r['succeeded']:>6} {r['failed']:>5} "
+            f"{r['throughput_rps']:>9.1f} {lat['p50'] or 0:>9.1f} {lat['p95'] or 0:>9.1f} {lat['p99'] or 0:>9.1f}"
+        )
+        before = baseline.get((r["route"], r["concurrency"]))
+        if before:
+            d_rps = _pct_change(before["throughput_rps"], r["throughput_rps"])
+            d_p95 = _pct_change(before["latency_ms"]["p95"], lat["p95"])
+            line += f" {d_rps:>8} {d_p95:>8}"
+        print(line)
+
+
+def _pct_change(before, after) -> str:
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.0f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark /ask and the /api/v1 routes")
+    parser.add_argument("--url", help="benchmark a running app instead of starting one in-process")
+    parser.add_argument("--api-key", default=os.environ.get("ODOO_API_KEY", DEFAULT_API_KEY))
+    parser.add_argument("--username", help="login for /ask when the users DB has accounts")
+    parser.add_argument("--password")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated routes to run")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per route and level")
+    parser.add_argument("--output", help="results file (default: bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on (in-process only)")
+    fake = parser.add_argument_group("fake model endpoint (in-process only)")
+    fake.add_argument("--latency", default="lognormal:-2.3,0.5", help="latency spec, see fake_model_server")
+    fake.add_argument("--error-429", type=float, default=0.0)
+    fake.add_argument("--error-5xx", type=float, default=0.0)
+    fake.add_argument("--retry-after", type=float, default=1)
+    fake.add_argument("--chunk-delay", type=float, default=0.0)
+    fake.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)} (choose from {', '.join(ROUTES)})")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    args.fake_server = None
+    base_url = args.url or start_local_app(args)
+
+    def make_session():
+        return BenchmarkSession(base_url, args.api_key, args.username, args.password)
+
+    started_at = datetime.now(timezone.utc)
+    results = []
+    for route in routes:
+        for concurrency in levels:
+            result = run_level(make_session, route, concurrency, args.requests)
+            results.append(result)
+            print(
+                f"{route} @ {concurrency}: {result['throughput_rps']} rps, "
+                f"p95 {result['latency_ms']['p95']} ms, {result['failed']} failed",
+                file=sys.stderr,
+            )
+
+    report = {
+        "started_at": started_at.isoformat(),
+        "target": args.url or "in-process",
+        "config": {
+            "routes": routes,
+            "concurrency": levels,
+            "requests_per_level": args.requests,
+            "latency": None if args.url else args.latency,
+            "error_429": None if args.url else args.error_429,
+            "error_5xx": None if args.url else args.error_5xx,
+            "cache": args.cache,
+        },
+        "results": results,
+    }
+    try:
+        report["server_metrics"] = make_session().metrics().json()
+    except Exception:
+        report["server_metrics"] = None
+    if args.fake_server is not None:
+        report["fake_model_server"] = args.fake_server.get_stats()
+
+    output = args.output or os.path.join("bench_results", started_at.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            previous = json.load(fh)
+    print_table(results, previous)
+    print(f"\nResults written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
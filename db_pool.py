@@ -0,0 +1,184 @@
+"""Pooled SQLite connections shared by the data modules.
+
+Opening a connection and re-running `CREATE TABLE IF NOT EXISTS` on every
+call dominates the cost of small lookups such as `users.get_user`.
+`ConnectionManager` instead:
+  - applies the schema (and any migration callbacks) once per process, on
+    first use;
+  - keeps a pool of open connections that threads check out and return
+    (a connection is only ever used by one thread at a time), so it works
+    with thread-per-request servers as well as fixed worker threads, and
+    discards connections inherited across a fork;
+  - enables WAL journaling so readers do not block the writer, and a busy
+    timeout so concurrent writers wait instead of failing with
+    "database is locked";
+  - sizes sqlite3's per-connection prepared-statement cache, which only
+    pays off because connections now outlive a single call.
+
+`data_version` gives callers a cheap way to notice writes made by any
+connection, in this process or another, so derived values can be cached
+until the database actually changes.
+
+Configuration comes from environment variables:
+  - SQLITE_POOL_SIZE: idle connections kept open per database (default: 8)
+  - SQLITE_BUSY_TIMEOUT_MS: how long a writer waits for a lock (default: 5000)
+  - SQLITE_CACHED_STATEMENTS: prepared statements kept per connection
+    (default: 128)
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+
+class ConnectionManager:
+    """Connection pool and one-time schema setup for one SQLite file."""
+
+    def __init__(
+        self,
+        path: str,
+        schema: Sequence[str] = (),
+        pool_size: Optional[int] = None,
+        busy_timeout_ms: Optional[int] = None,
+        cached_statements: Optional[int] = None,
+        migrations: Sequence[Callable[[sqlite3.Connection], None]] = (),
+    ):
+        self.path = path
+        self.schema = list(schema)
+        self.migrations = list(migrations)
+        self.pool_size = pool_size or int(os.environ.get("SQLITE_POOL_SIZE", 8))
+        self.busy_timeout_ms = busy_timeout_ms or int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+        self.cached_statements = cached_statements or int(os.environ.get("SQLITE_CACHED_STATEMENTS", 128))
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._idle: List[sqlite3.Connection] = []
+        self._pid: Optional[int] = None
+        self._watch_lock = threading.Lock()
+        self._watch_conn: Optional[sqlite3.Connection] = None
+        self._watch_pid: Optional[int] = None
+        self.in_use = 0
+        self.opened = 0
+        self.checkouts = 0
+        self.schema_setups = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            # Pooled connections move between threads, one at a time
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                # New process (or first use): never reuse a connection
+                # inherited from the parent, and set the schema up again.
+                self._idle = []
+                self._pid = os.getpid()
+                self._schema_ready = False
+            self.checkouts += 1
+            self.in_use += 1
+            if self._idle:
+                return self._idle.pop()
+            self.opened += 1
+        try:
+            conn = self._open()
+            if not self._schema_ready:
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        self._setup_schema(conn)
+                        self._schema_ready = True
+        except Exception:
+            with self._lock:
+                self.in_use -= 1
+            raise
+        return conn
+
+    def _setup_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute("PRAGMA journal_mode = WAL")
+        for statement in self.schema:
+            conn.execute(statement)
+        conn.commit()
+        # Migrations run after the schema and must be idempotent
+        for migrate in self.migrations:
+            migrate(conn)
+            conn.commit()
+        self.schema_setups += 1
+
+    def _checkin(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            # Never hand the next caller a half-finished transaction
+            conn.rollback()
+        with self._lock:
+            self.in_use -= 1
+            if self._pid == os.getpid() and len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection and run the block in one transaction.
+
+        Commits on success and rolls back if the block raises.
+        """
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def data_version(self) -> int:
+        """Return a number that changes whenever the database is modified.
+
+        Reads SQLite's `PRAGMA data_version` on a dedicated connection that
+        never writes, so commits from every pooled connection and from other
+        processes are all visible. The pragma reads no table pages, so it
+        costs the same however large the database grows.
+        """
+        with self._watch_lock:
+            if self._watch_conn is None or self._watch_pid != os.getpid():
+                self._watch_conn = self._open()
+                self._watch_pid = os.getpid()
+            return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close_all(self) -> None:
+        """Close idle connections (e.g. at shutdown or between tests)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        with self._watch_lock:
+            if self._watch_conn is not None and self._watch_pid == os.getpid():
+                idle.append(self._watch_conn)
+            self._watch_conn = None
+        for conn in idle:
+            conn.close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "opened": self.opened,
+                "checkouts": self.checkouts,
+                "reuse_rate": (1 - self.opened / self.checkouts) if self.checkouts else 0.0,
+                "schema_setups": self.schema_setups,
+                "pool_size": self.pool_size,
+            }
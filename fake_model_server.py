@@ -0,0 +1,293 @@
+"""Local stand-in for the GitHub Models chat-completions endpoint.
+
+Lets `model_client_real.ModelClient` (and the async client) be load-tested
+without spending quota: point GITHUB_MODEL_ENDPOINT at the server's URL.
+
+The server answers any POST with an OpenAI-style chat completion (or an
+SSE stream when the request sets "stream": true) after a latency drawn
+from a configurable distribution, and can inject 429 and 5xx responses at
+given rates.
+
+Like OpenAI-compatible endpoints with automatic prompt caching, it reports
+`usage.prompt_tokens_details.cached_tokens`: the tokens of the longest run of
+leading messages (short of the final one) seen on an earlier request.
+Streams end with a usage chunk when the request sets
+`stream_options.include_usage`.
+
+Latency specs (seconds):
+  - "fixed:0.2"
+  - "uniform:0.1,0.5"
+  - "normal:0.3,0.05" (mean, stddev; clipped at 0)
+  - "lognormal:-1.5,0.5" (mu, sigma of the underlying normal)
+  - "exp:0.3" (mean)
+
+Usage:
+    python fake_model_server.py --port 8001 --latency lognormal:-1.5,0.5 --error-429 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from rate_limit import estimate_tokens
+
+ERROR_5XX_STATUSES = (500, 502, 503)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Turn a latency spec like "uniform:0.1,0.5" into a sampler."""
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(v) for v in args.split(",") if v.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    samplers = {
+        "fixed": (1, lambda rng, v: v[0]),
+        "uniform": (2, lambda rng, v: rng.uniform(v[0], v[1])),
+        "normal": (2, lambda rng, v: max(0.0, rng.gauss(v[0], v[1]))),
+        "lognormal": (2, lambda rng, v: rng.lognormvariate(v[0], v[1])),
+        "exp": (1, lambda rng, v: rng.expovariate(1.0 / v[0]) if v[0] > 0 else 0.0),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    sample = samplers[kind][1]
+    return lambda rng: sample(rng, values)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        error = fake.roll_error()
+        delay = fake.sample_latency()
+        if error == 429:
+            fake.count("throttled")
+            self._send_json(429, {"error": {"code": "RateLimitReached", "message": "Rate limit exceeded"}},
+                            {"Retry-After": fake.retry_after})
+            return
+        time.sleep(delay)
+        if error is not None:
+            fake.count("server_errors")
+            self._send_json(error, {"error": {"message": "Injected upstream failure"}})
+            return
+
+        messages = request.get("messages") or []
+        prompt = messages[-1].get("content", "") if messages else ""
+        text = fake.reply(prompt)
+        if request.get("stream"):
+            fake.count("streamed")
+            usage = None
+            if (request.get("stream_options") or {}).get("include_usage"):
+                usage = fake.usage(text, messages)
+            self._send_stream(text, request.get("model"), usage)
+        else:
+            fake.count("completed")
+            self._send_json(200, fake.completion(text, messages, request.get("model")))
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, text: str, model: Optional[str], usage: Optional[Dict] = None) -> None:
+        fake = self.server.fake
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            event = {"id": completion_id, "model": model, "choices": [{"index": 0, "delta": delta}]}
+            # Raw UTF-8, as real servers send it, with no charset in the Content-Type
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+            if fake.chunk_delay:
+                time.sleep(fake.chunk_delay)
+        if usage is not None:
+            event = {"id": completion_id, "model": model, "choices": [], "usage": usage}
+            self._write_chunk(f"data: {json.dumps(event)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeModelServer"
+
+
+class FakeModelServer:
+    """Threaded fake chat-completions server with latency and error injection."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "fixed:0.05",
+        error_429_rate: float = 0.0,
+        error_5xx_rate: float = 0.0,
+        retry_after: float = 1,
+        chunk_delay: float = 0.0,
+        response_words: int = 60,
+        seed: Optional[int] = None,
+    ):
+        self.latency_spec = latency
+        self._latency = parse_latency(latency)
+        self.error_429_rate = error_429_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.retry_after = str(retry_after)
+        self.chunk_delay = chunk_delay
+        self.response_words = response_words
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0, "completed": 0, "streamed": 0, "throttled": 0, "server_errors": 0, "prefix_cache_hits": 0
+        }
+        self._prefixes: set = set()
+
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/chat/completions"
+
+    def start(self) -> "FakeModelServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-model-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeModelServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def sample_latency(self) -> float:
+        with self._lock:
+            return self._latency(self._rng)
+
+    def roll_error(self) -> Optional[int]:
+        """Pick an injected error status for this request, or None."""
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._rng.random()
+            if roll < self.error_429_rate:
+                return 429
+            if roll < self.error_429_rate + self.error_5xx_rate:
+                return self._rng.choice(ERROR_5XX_STATUSES)
+        return None
+
+    def reply(self, prompt: str) -> str:
+        words = ["[FAKE MODEL]", "Re:", prompt[:40].replace("\n", " ")]
+        words += ["lorem"] * max(0, self.response_words - len(words))
+        return " ".join(words)
+
+    def usage(self, text: str, messages) -> Dict:
+        prompt_tokens = sum(estimate_tokens(m.get("content")) for m in messages)
+        completion_tokens = estimate_tokens(text)
+        cached = 0
+        # Longest run of leading messages (short of the last) seen on an earlier request
+        prefixes = [json.dumps(messages[:n], sort_keys=True) for n in range(1, len(messages))]
+        with self._lock:
+            for n in range(len(prefixes), 0, -1):
+                if prefixes[n - 1] in self._prefixes:
+                    cached = sum(estimate_tokens(m.get("content")) for m in messages[:n])
+                    self.stats["prefix_cache_hits"] += 1
+                    break
+            self._prefixes.update(prefixes)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    def completion(self, text: str, messages, model: Optional[str]) -> Dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": self.usage(text, messages),
+        }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake chat-completions endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="fixed:0.05", help="latency spec, e.g. lognormal:-1.5,0.5")
+    parser.add_argument("--error-429", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="fraction of requests answered 5xx")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--words", type=int, default=60, help="words per response")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = FakeModelServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        error_429_rate=args.error_429,
+        error_5xx_rate=args.error_5xx,
+        retry_after=args.retry_after,
+        chunk_delay=args.chunk_delay,
+        response_words=args.words,
+        seed=args.seed,
+    )
+    print(f"Fake model endpoint listening on {server.url}")
+    print(f"  export GITHUB_MODEL_ENDPOINT={server.url} GITHUB_MODEL_API_TOKEN=fake")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
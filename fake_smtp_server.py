@@ -0,0 +1,179 @@
+"""Local debugging SMTP server for exercising the mail outbox.
+
+Accepts mail on a local port, keeps every delivered message in memory (and
+optionally prints it), and can be told to fail: reject the next N messages
+with a temporary (4xx) or permanent (5xx) error, or drop the connection
+after a given number of messages. Point MAIL_SERVER/MAIL_PORT at it.
+
+Only the SMTP commands `smtplib` uses for plain delivery are implemented
+(HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT); there is no TLS or AUTH.
+
+Usage:
+    python fake_smtp_server.py --port 8025 --print
+"""
+from __future__ import annotations
+
+import argparse
+import socketserver
+import threading
+from email import message_from_bytes
+from email.message import Message
+from typing import Dict, List, Optional
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        fake = self.server.fake
+        fake.count("connections")
+        self.reply("220 fake-smtp ready")
+        sender, recipients, delivered = None, [], 0
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            verb = line[:4].upper()
+            if verb == "HELO":
+                self.reply("250 fake-smtp")
+            elif verb == "EHLO":
+                self.reply("250-fake-smtp")
+                self.reply("250 8BITMIME")
+            elif verb == "MAIL":
+                sender, recipients = line.partition(":")[2].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(line.partition(":")[2].strip().strip("<>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                error = fake.next_failure()
+                if error:
+                    self.reply(error)
+                else:
+                    fake.deliver(sender, recipients, data)
+                    delivered += 1
+                    self.reply("250 OK queued")
+                    if fake.drop_after and delivered >= fake.drop_after:
+                        return
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def _read_data(self) -> bytes:
+        lines = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw or raw in (b".\r\n", b".\n"):
+                break
+            if raw.startswith(b".."):
+                raw = raw[1:]
+            lines.append(raw)
+        return b"".join(lines)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    fake: "FakeSMTPServer"
+
+
+class FakeSMTPServer:
+    """Threaded SMTP sink with failure injection."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, echo: bool = False):
+        self.echo = echo
+        self.messages: List[Message] = []
+        self.drop_after = 0
+        self._failures: List[str] = []
+        self._lock = threading.Lock()
+        self.stats = {"connections": 0, "delivered": 0, "rejected": 0}
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "FakeSMTPServer":
+        threading.Thread(target=self._server.serve_forever, name="fake-smtp-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSMTPServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def fail_next(self, count: int = 1, permanent: bool = False) -> None:
+        """Reject the next `count` messages with a 451 (or 550) reply."""
+        reply = "550 Mailbox unavailable" if permanent else "451 Try again later"
+        with self._lock:
+            self._failures.extend([reply] * count)
+
+    def next_failure(self) -> Optional[str]:
+        with self._lock:
+            if self._failures:
+                self.stats["rejected"] += 1
+                return self._failures.pop(0)
+        return None
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def deliver(self, sender: Optional[str], recipients: List[str], data: bytes) -> None:
+        message = message_from_bytes(data)
+        with self._lock:
+            self.messages.append(message)
+            self.stats["delivered"] += 1
+        if self.echo:
+            print(f"---- from {sender} to {', '.join(recipients)}")
+            print(data.decode("utf-8", "replace"))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local debugging SMTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--print", dest="echo", action="store_true", help="print each message received")
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(host=args.host, port=args.port, echo=args.echo)
+    print(f"Fake SMTP server listening on {server.host}:{server.port}")
+    print(f"  export MAIL_SERVER={server.host} MAIL_PORT={server.port}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
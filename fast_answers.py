@@ -0,0 +1,254 @@
+"""Deterministic answers for template lookups, without a model call.
+
+Many questions are plain lookups of data that `prompts_full.DOCUMENT_TEMPLATES`
+already holds: "checklist for a subpoena", "formatting for a complaint",
+"federal rules for a motion for summary judgment". `match_lookup`
+recognises them, and `FastAnswers.lookup` renders the answer straight from
+the template in microseconds.
+
+The matcher is deliberately strict. A query matches only if it names one
+document type (in the text or through the form's document type), asks for
+one or more of the checklist, formatting or rules sections, and contains
+nothing else but filler words. "Formatting for a complaint" matches;
+"formatting for a complaint alleging fraud" does not, and goes to the
+model. A lookup of a section the template does not have (e.g. formatting
+for an affidavit) also goes to the model.
+
+Deadline questions that name a standard event and a date ("when is the
+answer due if the complaint was served on March 3, 2025?") are answered
+exactly by the FRCP 6 calculator in `frcp_deadlines`. That only holds in
+federal court: for any other jurisdiction the question goes to the model
+without computed facts, since state periods and counting rules differ.
+
+Users can always ask for a full model answer instead (`full_answer=True`);
+for deadline questions the computed deadline is then put ahead of the
+question (`FastAnswers.facts`) so the model only explains it.
+
+Configuration comes from environment variables:
+  - FAST_PATH_ENABLED: answer template lookups locally (default: true)
+  - FAST_PATH_MAX_WORDS: longest query considered a lookup (default: 16)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from frcp_deadlines import CourtCalendar, DueDate, deadline_facts, default_calendar, parse_deadline_question, render_answer
+from prompts_full import DOCUMENT_TEMPLATES
+
+DISCLAIMER = (
+    "Disclaimer: I am a paralegal AI assistant. This is not legal advice and requires attorney review. "
+    "All legal decisions must be made by your supervising attorney."
+)
+
+# Phrases naming each template, as typed in a question or sent as the form's document type
+TEMPLATE_ALIASES = {
+    "complaint": ("complaint", "civil complaint"),
+    "motion_summary_judgment": ("motion for summary judgment", "summary judgment motion", "summary judgment"),
+    "discovery_request": ("discovery request", "discovery", "interrogatories", "interrogatory",
+                          "requests for production", "request for production", "requests for admission",
+                          "request for admission"),
+    "affidavit": ("affidavit", "declaration under penalty of perjury", "declaration"),
+    "subpoena": ("subpoena duces tecum", "subpoena", "duces tecum"),
+}
+
+# Document type values of the web form that are not template keys; a bare
+# "motion" in a question does not name the summary judgment template
+FORM_DOCUMENT_TYPES = {
+    "motion": "motion_summary_judgment",
+}
+
+SECTION_TITLES = {
+    "checklist": "Preparation Checklist",
+    "formatting": "Formatting Requirements",
+    "federal_rules": "Applicable Rules",
+}
+
+# Phrases asking for each section
+SECTION_ALIASES = {
+    "checklist": ("preparation checklist", "checklist", "check list", "to do list", "todo list", "steps"),
+    "formatting": ("formatting requirements", "format requirements", "formatting", "format", "font", "margins",
+                   "margin", "line spacing", "spacing", "page limits", "page limit"),
+    "federal_rules": ("federal rules", "applicable rules", "governing rules", "rules", "frcp", "statutes"),
+}
+
+# Words a lookup may contain besides a document type and a section
+FILLER_WORDS = frozenset(
+    "a an and any apply applicable are be can civil do document does federal file filing for get give i is "
+    "it list me my need of on our please preparing prepare provide required requirements s see show the "
+    "their there to under what what's whats which with".split()
+)
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _phrase_pattern(phrases) -> "re.Pattern[str]":
+    ordered = sorted(phrases, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(p) for p in ordered) + r")\b")
+
+
+_TEMPLATE_PATTERNS = {key: _phrase_pattern(aliases) for key, aliases in TEMPLATE_ALIASES.items()}
+_SECTION_PATTERNS = {key: _phrase_pattern(aliases) for key, aliases in SECTION_ALIASES.items()}
+
+
+class Lookup(NamedTuple):
+    """A recognised template lookup: which template and which of its sections."""
+    template_key: str
+    sections: List[str]
+
+
+def _normalise(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower().replace("/", " ")))
+
+
+def template_for(doc_type: Optional[str]) -> Optional[str]:
+    """The DOCUMENT_TEMPLATES key a form document type refers to, if any."""
+    text = _normalise(doc_type or "").replace("_", " ")
+    if not text:
+        return None
+    if text.replace(" ", "_") in DOCUMENT_TEMPLATES:
+        return text.replace(" ", "_")
+    if text in FORM_DOCUMENT_TYPES:
+        return FORM_DOCUMENT_TYPES[text]
+    for key, pattern in _TEMPLATE_PATTERNS.items():
+        if pattern.fullmatch(text):
+            return key
+    return None
+
+
+def match_lookup(query: str, doc_type: Optional[str] = None, max_words: int = 16) -> Optional[Lookup]:
+    """Recognise `query` as a pure template lookup, or return None.
+
+    The document type comes from the query if it names exactly one, and
+    from `doc_type` (the form's selection) otherwise.
+    """
+    text = _normalise(query)
+    if not text or len(text.split()) > max_words:
+        return None
+
+    templates = []
+    for key, pattern in _TEMPLATE_PATTERNS.items():
+        text, found = pattern.subn(" ", text)
+        if found:
+            templates.append(key)
+    sections = []
+    for key, pattern in _SECTION_PATTERNS.items():
+        text, found = pattern.subn(" ", text)
+        if found:
+            sections.append(key)
+
+    if not sections or len(templates) > 1 or any(word not in FILLER_WORDS for word in text.split()):
+        return None
+    template_key = templates[0] if templates else template_for(doc_type)
+    if template_key is None or template_key not in DOCUMENT_TEMPLATES:
+        return None
+    return Lookup(template_key, sections)
+
+
+def _is_federal(jurisdiction: Optional[str]) -> bool:
+    return not jurisdiction or jurisdiction.strip().lower() == "federal"
+
+
+def render_lookup(lookup: Lookup, jurisdiction: str = "Federal") -> Optional[str]:
+    """The answer to `lookup` from the template data, or None if the template lacks a requested section."""
+    template = DOCUMENT_TEMPLATES[lookup.template_key]
+    parts = [f"## {template['title']}"]
+    for section in lookup.sections:
+        data = template.get(section)
+        if not data:
+            return None
+        parts.append(f"\n### {SECTION_TITLES[section]}")
+        if isinstance(data, dict):
+            parts.extend(f"- {key.replace('_', ' ').capitalize()}: {value}" for key, value in data.items())
+        else:
+            parts.extend(f"- {item}" for item in data)
+    if not _is_federal(jurisdiction):
+        parts.append(f"\nThese are the federal defaults; verify the {jurisdiction} rules and local court rules.")
+    parts.append("\nFrom the firm's standard templates. Ask for a full answer for guidance specific to your matter.")
+    parts.append(f"\n{DISCLAIMER}")
+    return "\n".join(parts)
+
+
+class FastAnswer(NamedTuple):
+    """A template lookup or deadline question answered locally."""
+    lookup: Optional[Lookup]
+    text: str
+    deadline: Optional[DueDate] = None
+
+
+class FastAnswers:
+    """Answers template lookups and deadline questions locally and counts how much model traffic that saves."""
+
+    def __init__(self, enabled: bool = True, max_words: int = 16, calendar: Optional[CourtCalendar] = None):
+        self.enabled = enabled
+        self.max_words = max_words
+        self.calendar = calendar or CourtCalendar()
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.answered = 0
+        self.full_answer_requested = 0
+        self.answer_seconds = 0.0
+        self.sections: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "FastAnswers":
+        return cls(
+            enabled=os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true",
+            max_words=int(os.environ.get("FAST_PATH_MAX_WORDS", 16)),
+            calendar=default_calendar(),
+        )
+
+    def lookup(
+        self, query: str, doc_type: Optional[str] = None, jurisdiction: str = "Federal", full_answer: bool = False
+    ) -> Optional[FastAnswer]:
+        """Answer `query` from the templates or the deadline calculator, or return None to send it to the model.
+
+        With `full_answer` the model is always used; the query is only
+        counted as an opted-out lookup.
+        """
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        lookup = match_lookup(query, doc_type, self.max_words)
+        question = parse_deadline_question(query) if lookup is None and _is_federal(jurisdiction) else None
+        text = deadline = None
+        if not full_answer:
+            if lookup is not None:
+                text = render_lookup(lookup, jurisdiction)
+            elif question is not None:
+                deadline = self.calendar.compute(question.event, question.trigger, question.service)
+                text = f"{render_answer(deadline, question.service_stated)}\n\n{DISCLAIMER}"
+        elapsed = time.perf_counter() - started
+        sections = lookup.sections if lookup is not None else ["deadline"]
+        with self._lock:
+            self.queries += 1
+            if (lookup is not None or question is not None) and full_answer:
+                self.full_answer_requested += 1
+            if text is not None:
+                self.answered += 1
+                self.answer_seconds += elapsed
+                for section in sections:
+                    self.sections[section] = self.sections.get(section, 0) + 1
+        return FastAnswer(lookup, text, deadline) if text is not None else None
+
+    def facts(self, query: str, jurisdiction: str = "Federal") -> str:
+        """Computed facts to put ahead of `query` when it goes to the model ("" if there are none).
+
+        Deadlines are only computed for federal court.
+        """
+        return deadline_facts(query, self.calendar) if self.enabled and _is_federal(jurisdiction) else ""
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queries": self.queries,
+                "answered": self.answered,
+                "answered_rate": self.answered / self.queries if self.queries else 0.0,
+                "full_answer_requested": self.full_answer_requested,
+                "avg_answer_us": self.answer_seconds / self.answered * 1e6 if self.answered else 0.0,
+                "sections": dict(self.sections),
+            }
@@ -0,0 +1,470 @@
+"""Deadline computation under Federal Rule of Civil Procedure 6, without the model.
+
+`CourtCalendar.compute` applies FRCP 6(a) to a period stated in days:
+  - exclude the day of the triggering event and count every day, including
+    weekends and legal holidays (6(a)(1)(A)-(B));
+  - if the last day is a Saturday, Sunday or legal holiday, the period runs
+    until the next day that is not (6(a)(1)(C)); for periods counted
+    backward from an event, until the previous such day (6(a)(5));
+  - when the period runs from service by mail, by leaving the paper with
+    the clerk or by other consented means, 3 days are added after the
+    period would otherwise expire (6(d)), and the result is rolled forward
+    again if needed.
+
+Legal holidays are the federal holidays of 5 U.S.C. § 6103(a) on the days
+they are observed (a Saturday holiday on the Friday before, a Sunday one on
+the Monday after), plus any extra closures configured for the court, such
+as days declared a holiday by the President (6(a)(6)(B)) or days the
+clerk's office was inaccessible (6(a)(3)).
+
+`RESPONSE_PERIODS` holds the standard periods for common events, keyed by
+event name. `CourtCalendar.compute_batch` computes thousands of due dates
+at once for docketing sync from precomputed next-open-day tables.
+`parse_deadline_question` recognises questions such as "when is the answer
+due if the complaint was served on March 3, 2025?" so they can be answered
+exactly; the model is left to explain the result. Trigger dates must fall in
+`TRIGGER_YEARS`, which keeps every period and holiday lookup inside the
+range `datetime.date` can represent.
+
+Configuration comes from environment variables:
+  - DEADLINE_EXTRA_HOLIDAYS: comma-separated ISO dates on which the court
+    is closed besides weekends and federal holidays (default: unset)
+"""
+from __future__ import annotations
+
+import os
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+DateLike = Union[date, str]
+
+
+class Period(NamedTuple):
+    """A standard response period; negative `days` count backward from the event."""
+    days: int
+    rule: str
+    description: str
+    # Whether the period runs from Rule 5 service, so that Rule 6(d) can add 3 days
+    service_extension: bool
+
+
+RESPONSE_PERIODS: Dict[str, Period] = {
+    "answer": Period(21, "FRCP 12(a)(1)(A)(i)", "Answer, after being served with the summons and complaint", False),
+    "answer_waiver": Period(60, "FRCP 12(a)(1)(A)(ii)", "Answer, after a request for waiver of service was sent", False),
+    "answer_united_states": Period(60, "FRCP 12(a)(2)", "Answer by the United States or its agency or officer, "
+                                   "after service on the United States attorney", False),
+    "answer_after_motion": Period(14, "FRCP 12(a)(4)(A)", "Responsive pleading, after notice that a Rule 12 "
+                                  "motion was denied or postponed", False),
+    "reply_to_counterclaim": Period(21, "FRCP 12(a)(1)(B)", "Answer to a counterclaim or crossclaim, after "
+                                    "being served", True),
+    "amend_as_of_course": Period(21, "FRCP 15(a)(1)(B)", "Amendment as a matter of course, after service of a "
+                                 "responsive pleading or Rule 12(b), (e) or (f) motion", True),
+    "rule_11_safe_harbor": Period(21, "FRCP 11(c)(2)", "Earliest filing of a sanctions motion, after it was "
+                                  "served", True),
+    "interrogatory_responses": Period(30, "FRCP 33(b)(2)", "Answers and objections to interrogatories, after "
+                                      "being served", True),
+    "production_responses": Period(30, "FRCP 34(b)(2)(A)", "Response to requests for production, after being "
+                                   "served", True),
+    "admission_responses": Period(30, "FRCP 36(a)(3)", "Answers or objections to requests for admission, after "
+                                  "being served (otherwise the matters are admitted)", True),
+    "subpoena_objection": Period(14, "FRCP 45(d)(2)(B)", "Written objection to a subpoena to produce, after it "
+                                 "is served (or the time for compliance, if earlier)", False),
+    "magistrate_objection": Period(14, "FRCP 72(b)(2)", "Objections to a magistrate judge's recommended "
+                                   "disposition, after being served with a copy", True),
+    "summary_judgment_motion": Period(30, "FRCP 56(b)", "Last day for a summary judgment motion, after the "
+                                      "close of all discovery (unless a local rule or order says otherwise)", False),
+    "new_trial_motion": Period(28, "FRCP 59(b)", "Motion for a new trial, after entry of judgment "
+                               "(cannot be extended, FRCP 6(b)(2))", False),
+    "alter_amend_judgment": Period(28, "FRCP 59(e)", "Motion to alter or amend a judgment, after entry of "
+                                   "judgment (cannot be extended, FRCP 6(b)(2))", False),
+    "notice_of_appeal": Period(30, "FRAP 4(a)(1)(A)", "Notice of appeal in a civil case, after entry of "
+                               "judgment (60 days if the United States is a party)", False),
+    "motion_notice": Period(-14, "FRCP 6(c)(1)", "Service of a written motion and notice of hearing, before "
+                            "the hearing", False),
+    "opposing_affidavits": Period(-7, "FRCP 6(c)(2)", "Service of opposing affidavits, before the hearing", False),
+    "pretrial_disclosures": Period(-30, "FRCP 26(a)(3)(B)", "Pretrial disclosures, before trial", False),
+    "expert_disclosures": Period(-90, "FRCP 26(a)(2)(D)(i)", "Expert disclosures, before the date set for trial "
+                                 "or for the case to be ready for trial", False),
+}
+
+# Days Rule 6(d) adds, by Rule 5(b)(2) service method
+SERVICE_METHODS = {
+    "personal": 0,      # 5(b)(2)(A)-(B): handing it over or leaving it at the office or home
+    "electronic": 0,    # 5(b)(2)(E): no added days since the 2016 amendment
+    "mail": 3,          # 5(b)(2)(C)
+    "clerk": 3,         # 5(b)(2)(D): leaving it with the court clerk
+    "other": 3,         # 5(b)(2)(F): other means the person consented to in writing
+}
+
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MONTHS = {name: number for number, names in enumerate(
+    [("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",), ("jun", "june"),
+     ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"), ("oct", "october"),
+     ("nov", "november"), ("dec", "december")], start=1) for name in names}
+
+
+# Years a trigger date may fall in
+TRIGGER_YEARS = range(1900, 2200)
+
+
+class DeadlineError(ValueError):
+    """Raised for an unknown event or service method, or an unreadable date."""
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """The `n`th `weekday` (Monday=0) of a month; n=-1 is the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: date) -> date:
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _statutory_holidays(year: int) -> List[Tuple[date, str]]:
+    holidays = [
+        (_observed(date(year, 1, 1)), "New Year's Day"),
+        (_nth_weekday(year, 1, 0, 3), "Birthday of Martin Luther King, Jr."),
+        (_nth_weekday(year, 2, 0, 3), "Washington's Birthday"),
+        (_nth_weekday(year, 5, 0, -1), "Memorial Day"),
+        (_observed(date(year, 7, 4)), "Independence Day"),
+        (_nth_weekday(year, 9, 0, 1), "Labor Day"),
+        (_nth_weekday(year, 10, 0, 2), "Columbus Day"),
+        (_observed(date(year, 11, 11)), "Veterans Day"),
+        (_nth_weekday(year, 11, 3, 4), "Thanksgiving Day"),
+        (_observed(date(year, 12, 25)), "Christmas Day"),
+    ]
+    if year >= 2021:
+        holidays.append((_observed(date(year, 6, 19)), "Juneteenth National Independence Day"))
+    return holidays
+
+
+@lru_cache(maxsize=256)
+def federal_holidays(year: int) -> Dict[date, str]:
+    """Observed federal legal holidays falling in `year` (FRCP 6(a)(6)(A)), by date."""
+    # New Year's Day on a Saturday is observed on December 31 of the year before
+    candidates = _statutory_holidays(year) + _statutory_holidays(year + 1)[:1]
+    return {day: name for day, name in candidates if day.year == year}
+
+
+def parse_date(value: DateLike) -> date:
+    """A `date`, or an ISO "YYYY-MM-DD" string, as a `date`."""
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise DeadlineError(f"Invalid date {value!r}; use YYYY-MM-DD")
+
+
+def parse_trigger(value: DateLike) -> date:
+    """`parse_date` for a trigger date, which must fall in `TRIGGER_YEARS`."""
+    day = parse_date(value)
+    if day.year not in TRIGGER_YEARS:
+        raise DeadlineError(f"Trigger date {day.isoformat()} is outside the supported years "
+                            f"{TRIGGER_YEARS.start}-{TRIGGER_YEARS.stop - 1}")
+    return day
+
+
+def format_date(day: date) -> str:
+    return f"{WEEKDAY_NAMES[day.weekday()]}, {day:%B} {day.day}, {day.year}"
+
+
+def _period(event: str) -> Period:
+    try:
+        return RESPONSE_PERIODS[event]
+    except KeyError:
+        raise DeadlineError(f"Unknown event {event!r}; expected one of {', '.join(sorted(RESPONSE_PERIODS))}")
+
+
+def _service_days(service: str) -> int:
+    try:
+        return SERVICE_METHODS[service]
+    except KeyError:
+        raise DeadlineError(f"Unknown service method {service!r}; expected one of {', '.join(SERVICE_METHODS)}")
+
+
+class DueDate(NamedTuple):
+    """A computed deadline and the steps that produced it."""
+    event: str
+    trigger: date
+    due: date
+    rule: str
+    description: str
+    service: str
+    steps: Tuple[str, ...]
+
+    def render(self) -> str:
+        lines = [
+            f"**Due: {format_date(self.due)}**",
+            f"{self.description} ({self.rule}).",
+            "",
+            "How it was computed:",
+        ]
+        lines.extend(f"{number}. {step}" for number, step in enumerate(self.steps, start=1))
+        return "\n".join(lines)
+
+
+class CourtCalendar:
+    """Days the court is closed, and FRCP 6 deadline arithmetic over them."""
+
+    def __init__(self, extra_holidays: Iterable[DateLike] = ()):
+        self.extra_holidays = frozenset(parse_date(day) for day in extra_holidays)
+
+    @classmethod
+    def from_env(cls) -> "CourtCalendar":
+        extra = os.environ.get("DEADLINE_EXTRA_HOLIDAYS", "")
+        return cls(day for day in extra.split(",") if day.strip())
+
+    def closed_reason(self, day: date) -> Optional[str]:
+        """Why the court is closed on `day` ("Saturday", a holiday name, ...), or None if it is open."""
+        if day.weekday() >= 5:
+            return WEEKDAY_NAMES[day.weekday()]
+        if day in self.extra_holidays:
+            return "a court holiday"
+        holiday = federal_holidays(day.year).get(day)
+        return f"{holiday} (a legal holiday)" if holiday else None
+
+    def is_open(self, day: date) -> bool:
+        return self.closed_reason(day) is None
+
+    def roll_forward(self, day: date) -> date:
+        while not self.is_open(day):
+            day += timedelta(days=1)
+        return day
+
+    def roll_backward(self, day: date) -> date:
+        while not self.is_open(day):
+            day -= timedelta(days=1)
+        return day
+
+    def compute(self, event: str, trigger: DateLike, service: str = "electronic") -> DueDate:
+        """The due date for `event` triggered on `trigger`, with an explanation."""
+        period = _period(event)
+        trigger = parse_trigger(trigger)
+        added = _service_days(service)
+        days = abs(period.days)
+        steps = []
+        if period.days < 0:
+            end = trigger - timedelta(days=days)
+            steps.append(f"Counting {days} days back from {format_date(trigger)}, excluding that day, "
+                         f"lands on {format_date(end)} (FRCP 6(a)(1), 6(a)(5)).")
+            due = self.roll_backward(end)
+            if due != end:
+                steps.append(f"{format_date(end)} is {self.closed_reason(end)}, so the period continues back to "
+                             f"the previous day the court is open (FRCP 6(a)(5)): {format_date(due)}.")
+        else:
+            end = trigger + timedelta(days=days)
+            steps.append(f"Excluding the day of the event ({format_date(trigger)}) and counting every day, "
+                         f"day {days} is {format_date(end)} (FRCP 6(a)(1)(A)-(B)).")
+            due = self.roll_forward(end)
+            if due != end:
+                steps.append(f"{format_date(end)} is {self.closed_reason(end)}, so the period continues to the "
+                             f"next day the court is open (FRCP 6(a)(1)(C)): {format_date(due)}.")
+            if added and period.service_extension:
+                extended = due + timedelta(days=added)
+                steps.append(f"Service by {service} adds {added} days after the period would otherwise expire "
+                             f"(FRCP 6(d)): {format_date(extended)}.")
+                due = self.roll_forward(extended)
+                if due != extended:
+                    steps.append(f"{format_date(extended)} is {self.closed_reason(extended)}, so the deadline "
+                                 f"moves to {format_date(due)} (FRCP 6(a)(1)(C)).")
+            elif added:
+                steps.append("The 3 days FRCP 6(d) adds for service by mail do not apply to this period.")
+        return DueDate(event, trigger, due, period.rule, period.description, service, tuple(steps))
+
+    def compute_batch(
+        self,
+        triggers: Sequence[DateLike],
+        events: Union[str, Sequence[str]],
+        services: Union[str, Sequence[str]] = "electronic",
+    ) -> List[date]:
+        """Due dates for many deadlines at once, in input order.
+
+        `events` and `services` are either one value for every row or one
+        per row. Each row costs a few integer operations and table lookups:
+        the open/closed status of every day in the batch's range is computed
+        once, together with the next and previous open day for each.
+        """
+        count = len(triggers)
+        events = [events] * count if isinstance(events, str) else list(events)
+        services = [services] * count if isinstance(services, str) else list(services)
+        if len(events) != count or len(services) != count:
+            raise DeadlineError("events and services must have one entry per trigger")
+        if not count:
+            return []
+
+        periods = {event: _period(event) for event in set(events)}
+        added = {service: _service_days(service) for service in set(services)}
+        offsets = [periods[event].days for event in events]
+        extensions = [added[service] if periods[event].service_extension else 0
+                      for event, service in zip(events, services)]
+        ends = [parse_trigger(trigger).toordinal() + offset for trigger, offset in zip(triggers, offsets)]
+
+        # Extensions are added after rolling forward, so the table must reach past the latest rolled end
+        last = max(ends)
+        if max(extensions):
+            last = self.roll_forward(date.fromordinal(last)).toordinal() + max(extensions)
+        start, next_open, previous_open = self._open_tables(min(ends), last)
+        due = []
+        for end, offset, extension in zip(ends, offsets, extensions):
+            if offset < 0:
+                day = previous_open[end - start]
+            else:
+                day = next_open[end - start]
+                if extension:
+                    day = next_open[day + extension - start]
+            due.append(day)
+        return [date.fromordinal(day) for day in due]
+
+    def _open_tables(self, first: int, last: int) -> Tuple[int, List[int], List[int]]:
+        """For each day from `first` to `last` (ordinals, widened to open days): the next and previous open day."""
+        while not self.is_open(date.fromordinal(first)):
+            first -= 1
+        while not self.is_open(date.fromordinal(last)):
+            last += 1
+        closed = set()
+        for year in range(date.fromordinal(first).year, date.fromordinal(last).year + 1):
+            closed.update(day.toordinal() for day in federal_holidays(year))
+        closed.update(day.toordinal() for day in self.extra_holidays)
+
+        size = last - first + 1
+        # date.fromordinal(1) is a Monday, so (ordinal - 1) % 7 is the weekday
+        is_open = [(day - 1) % 7 < 5 and day not in closed for day in range(first, last + 1)]
+        next_open = [0] * size
+        upcoming = last
+        for i in range(size - 1, -1, -1):
+            if is_open[i]:
+                upcoming = first + i
+            next_open[i] = upcoming
+        previous_open = [0] * size
+        recent = first
+        for i in range(size):
+            if is_open[i]:
+                recent = first + i
+            previous_open[i] = recent
+        return first, next_open, previous_open
+
+
+@lru_cache(maxsize=None)
+def default_calendar() -> CourtCalendar:
+    """The calendar configured by DEADLINE_EXTRA_HOLIDAYS, built once."""
+    return CourtCalendar.from_env()
+
+
+# Phrases naming each event in a question, most specific first
+EVENT_PHRASES: List[Tuple[str, str]] = [
+    (r"notice of appeal|\bappeal\b", "notice_of_appeal"),
+    (r"new trial", "new_trial_motion"),
+    (r"alter or amend|59\(e\)", "alter_amend_judgment"),
+    (r"interrogator", "interrogatory_responses"),
+    (r"requests? for production|document requests?|\brfps?\b", "production_responses"),
+    (r"requests? for admissions?|\brfas?\b", "admission_responses"),
+    (r"counterclaim|crossclaim|cross-claim", "reply_to_counterclaim"),
+    (r"magistrate|report and recommendation", "magistrate_objection"),
+    (r"subpoena", "subpoena_objection"),
+    (r"safe harbor|sanctions motion", "rule_11_safe_harbor"),
+    (r"expert disclosures?|expert reports?", "expert_disclosures"),
+    (r"pretrial disclosures?", "pretrial_disclosures"),
+    (r"waiver", "answer_waiver"),
+    (r"\bamend", "amend_as_of_course"),
+    (r"\banswer\b|respon\w* to (?:the |a )?complaint|responsive pleading", "answer"),
+]
+
+SERVICE_PHRASES: List[Tuple[str, str]] = [
+    (r"\bby (?:u\.?s\.? |first[- ]class |certified )?mail\b|\bmailed\b", "mail"),
+    (r"with the clerk", "clerk"),
+    (r"electronic|e-?mail|\becf\b|e-?fil", "electronic"),
+    (r"\bby hand\b|hand[- ]deliver|personal(?:ly)? serv|in person", "personal"),
+]
+
+_QUESTION_RE = re.compile(r"\bdue\b|deadline|\bwhen\b|last day|how long|how many days|rule 6|calculat|comput")
+_MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+_DATE_RES = [
+    (re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b"), ("y", "m", "d")),
+    (re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4}|\d{2})\b"), ("m", "d", "y")),
+    (re.compile(rf"\b({_MONTH_NAMES})\.? (\d{{1,2}})(?:st|nd|rd|th)?,? (\d{{4}})\b"), ("mon", "d", "y")),
+    (re.compile(rf"\b(\d{{1,2}}) ({_MONTH_NAMES})\.?,? (\d{{4}})\b"), ("d", "mon", "y")),
+]
+
+
+class DeadlineQuestion(NamedTuple):
+    """A deadline question with everything needed to compute the answer."""
+    event: str
+    trigger: date
+    service: str
+    service_stated: bool
+
+
+def _dates(text: str) -> List[date]:
+    found = []
+    for pattern, fields in _DATE_RES:
+        for match in pattern.finditer(text):
+            parts = dict(zip(fields, match.groups()))
+            month = MONTHS[parts["mon"]] if "mon" in parts else int(parts["m"])
+            year = int(parts["y"]) + (2000 if len(parts["y"]) == 2 else 0)
+            if year not in TRIGGER_YEARS:
+                continue
+            try:
+                found.append(date(year, month, int(parts["d"])))
+            except ValueError:
+                continue
+    return found
+
+
+def parse_deadline_question(text: str) -> Optional[DeadlineQuestion]:
+    """Recognise a question asking when one standard deadline falls, or return None.
+
+    The question must name an event from EVENT_PHRASES and exactly one
+    full date (with the year, in `TRIGGER_YEARS`), and ask for a due date
+    or deadline.
+    """
+    lowered = " ".join(text.lower().split())
+    if not _QUESTION_RE.search(lowered):
+        return None
+    dates = set(_dates(lowered))
+    if len(dates) != 1:
+        return None
+    event = next((name for pattern, name in EVENT_PHRASES if re.search(pattern, lowered)), None)
+    if event is None:
+        return None
+    service = next((name for pattern, name in SERVICE_PHRASES if re.search(pattern, lowered)), None)
+    return DeadlineQuestion(event, dates.pop(), service or "electronic", service is not None)
+
+
+def render_answer(result: DueDate, service_stated: bool = True) -> str:
+    """`result` explained step by step, with the caveats a docketing clerk would add."""
+    text = result.render()
+    if not service_stated and RESPONSE_PERIODS[result.event].service_extension:
+        text += ("\n\nThis assumes personal or electronic service. If the papers were served by mail, left with "
+                 "the clerk, or served by other consented means, FRCP 6(d) adds 3 days.")
+    return text + ("\n\nCheck for court orders, local rules or stipulations that change this period, and for "
+                   "days the clerk's office was inaccessible (FRCP 6(a)(3)).")
+
+
+def answer_deadline_question(question: DeadlineQuestion, calendar: Optional[CourtCalendar] = None) -> str:
+    """The computed deadline for `question`, explained step by step."""
+    calendar = calendar or default_calendar()
+    result = calendar.compute(question.event, question.trigger, question.service)
+    return render_answer(result, question.service_stated)
+
+
+def deadline_facts(text: str, calendar: Optional[CourtCalendar] = None) -> str:
+    """A computed-deadline section to put ahead of a question sent to the model ("" if there is none).
+
+    With the date already computed, the model only has to explain it.
+    """
+    question = parse_deadline_question(text)
+    if question is None:
+        return ""
+    return ("## Computed Deadline (exact, from the FRCP 6 calculator; explain it, do not recalculate)\n"
+            f"{answer_deadline_question(question, calendar)}\n\n")
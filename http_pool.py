@@ -0,0 +1,188 @@
+"""Shared, keep-alive HTTP transport for model API calls.
+
+Every `ModelClient` sends its requests through a `PooledTransport` so that
+TCP/TLS connections to the inference endpoint are reused across Flask worker
+threads instead of being re-established for every generation.
+
+Pool sizing comes from environment variables:
+  - MODEL_HTTP_POOL_CONNECTIONS: number of per-host pools to keep (default: 4)
+  - MODEL_HTTP_POOL_MAXSIZE: max connections kept open per host (default: 32)
+  - MODEL_HTTP_POOL_BLOCK: wait for a free connection instead of opening
+    extra ones when a host's pool is exhausted (default: true)
+  - MODEL_HTTP_KEEPALIVE: enable TCP keep-alive probes on pooled sockets
+    (default: true)
+"""
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class PoolStats:
+    """Thread-safe counters describing how the connection pool is used."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.hits = 0
+        self.new_connections = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_checkout(self, wait_seconds: float, reused: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            if reused:
+                self.hits += 1
+            else:
+                self.new_connections += 1
+            self.wait_time_total += wait_seconds
+            if wait_seconds > self.wait_time_max:
+                self.wait_time_max = wait_seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "hits": self.hits,
+                "new_connections": self.new_connections,
+                "hit_rate": (self.hits / self.checkouts) if self.checkouts else 0.0,
+                "wait_time_total_ms": round(self.wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+            }
+
+
+def _instrumented_pool(base, stats: PoolStats):
+    """Return a subclass of a urllib3 pool class that reports to `stats`."""
+
+    class _InstrumentedPool(base):
+        def _get_conn(self, timeout=None):
+            started = time.perf_counter()
+            conn = super()._get_conn(timeout=timeout)
+            # A pooled connection still holds its socket; a fresh or dropped
+            # one has to connect (and handshake) again.
+            reused = getattr(conn, "sock", None) is not None
+            stats.record_checkout(time.perf_counter() - started, reused)
+            return conn
+
+    _InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return _InstrumentedPool
+
+
+class _PoolAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools record `PoolStats` and enable TCP keep-alive."""
+
+    def __init__(self, stats: PoolStats, keepalive: bool, **kwargs):
+        self._stats = stats
+        self._keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self._keepalive:
+            pool_kwargs.setdefault(
+                "socket_options",
+                HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+            )
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _instrumented_pool(HTTPConnectionPool, self._stats),
+            "https": _instrumented_pool(HTTPSConnectionPool, self._stats),
+        }
+
+
+class PooledTransport:
+    """Thread-safe HTTP transport backed by one shared connection pool.
+
+    `requests.Session` objects are not guaranteed to be thread-safe, so each
+    thread gets its own lightweight session; all of them mount the same
+    adapter and therefore share the same underlying connections.
+    """
+
+    def __init__(
+        self,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        pool_block: Optional[bool] = None,
+        keepalive: Optional[bool] = None,
+    ):
+        self.pool_connections = pool_connections or _env_int("MODEL_HTTP_POOL_CONNECTIONS", 4)
+        self.pool_maxsize = pool_maxsize or _env_int("MODEL_HTTP_POOL_MAXSIZE", 32)
+        self.pool_block = _env_bool("MODEL_HTTP_POOL_BLOCK", True) if pool_block is None else pool_block
+        self.keepalive = _env_bool("MODEL_HTTP_KEEPALIVE", True) if keepalive is None else keepalive
+        self.stats = PoolStats()
+        self._adapter = _PoolAdapter(
+            self.stats,
+            self.keepalive,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            session.headers["Connection"] = "keep-alive"
+            self._local.session = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self._session().request(method, url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def get_stats(self) -> Dict:
+        stats = self.stats.snapshot()
+        stats.update({
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "pool_block": self.pool_block,
+            "keepalive": self.keepalive,
+        })
+        return stats
+
+    def close(self) -> None:
+        self._adapter.close()
+
+
+_shared_transport: Optional[PooledTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport() -> PooledTransport:
+    """Return the process-wide transport, creating it on first use."""
+    global _shared_transport
+    if _shared_transport is None:
+        with _shared_lock:
+            if _shared_transport is None:
+                _shared_transport = PooledTransport()
+    return _shared_transport
@@ -0,0 +1,147 @@
+"""Bulk invite campaigns.
+
+`create_campaign` invites a whole list of recipients in one call:
+  - every recipient is checked up front (missing fields, malformed email,
+    duplicates in the list, existing accounts) with one query for the
+    existing usernames;
+  - the invite tokens for all valid recipients are created in a single
+    transaction;
+  - the emails are queued on the mail outbox in a single transaction,
+    tagged with the campaign id, and delivered by its batched background
+    sender.
+
+The call returns a result per recipient straight away; `campaign_progress`
+then reports delivery progress from the outbox.
+
+Configuration comes from environment variables:
+  - INVITE_MAX_RECIPIENTS: recipients accepted per campaign (default: 1000)
+"""
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import os
+import re
+import uuid
+from typing import Dict, List, Optional
+
+import mail
+import users
+
+logger = logging.getLogger(__name__)
+
+INVITE_EXPIRES_HOURS = 72
+EMAIL_RE = re.compile(r"^[^@\s,;]+@[^@\s,;]+\.[^@\s,;]+$")
+
+
+class InviteRequestError(ValueError):
+    """Raised when a campaign request as a whole is unacceptable."""
+
+
+def max_recipients() -> int:
+    return int(os.environ.get("INVITE_MAX_RECIPIENTS", 1000))
+
+
+def parse_recipients(text: str) -> List[Dict]:
+    """Parse "username,email" lines (an optional header row is skipped)."""
+    recipients = []
+    for row in csv.reader(io.StringIO(text)):
+        fields = [field.strip() for field in row]
+        if not any(fields):
+            continue
+        if [f.lower() for f in fields[:2]] == ["username", "email"]:
+            continue
+        recipients.append({"username": fields[0], "email": fields[1] if len(fields) > 1 else ""})
+    return recipients
+
+
+def create_campaign(recipients: List[Dict], base_url: str) -> Dict:
+    """Create invite tokens and queue invite emails for `recipients`.
+
+    Each recipient is a dict with "username" and "email". Returns the
+    campaign id, counts, and per-recipient results whose status is
+    "queued", "skipped" or "error".
+
+    Raises:
+        InviteRequestError: if the list is empty or too long.
+    """
+    if not recipients:
+        raise InviteRequestError("No recipients given")
+    limit = max_recipients()
+    if len(recipients) > limit:
+        raise InviteRequestError(f"Too many recipients ({len(recipients)}); the limit is {limit}")
+
+    names = [str(r.get("username") or "").strip() for r in recipients]
+    existing = users.existing_usernames(name for name in names if name)
+    results, valid, seen = [], [], set()
+    for recipient, username in zip(recipients, names):
+        email = str(recipient.get("email") or "").strip()
+        result = {"username": username, "email": email}
+        if not username or not email:
+            result.update(status="error", error="username and email are required")
+        elif not EMAIL_RE.match(email):
+            result.update(status="error", error="invalid email address")
+        elif username in seen:
+            result.update(status="skipped", error="duplicate username in this request")
+        elif username in existing:
+            result.update(status="skipped", error="user already exists")
+        else:
+            seen.add(username)
+            valid.append(result)
+        results.append(result)
+
+    campaign_id = uuid.uuid4().hex
+    if valid:
+        tokens = users.generate_tokens([r["username"] for r in valid], "invite", INVITE_EXPIRES_HOURS)
+        invites = [(r["email"], r["username"], f"{base_url}/join?token={token}") for r, token in zip(valid, tokens)]
+        try:
+            message_ids = mail.queue_invite_emails(invites, campaign=campaign_id)
+        except Exception as exc:
+            logger.error(f"Queueing invite campaign {campaign_id} failed: {exc}")
+            # Nobody will receive these links, so they must not stay redeemable
+            users.revoke_tokens(tokens)
+            for result in valid:
+                result.update(status="error", error="invite email could not be queued")
+        else:
+            for result, message_id in zip(valid, message_ids):
+                result.update(status="queued", message_id=message_id)
+
+    counts = {"queued": 0, "skipped": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "campaign_id": campaign_id,
+        "total": len(results),
+        "queued": counts["queued"],
+        "skipped": counts["skipped"],
+        "errors": counts["error"],
+        "results": results,
+    }
+
+
+def campaign_progress(campaign_id: str) -> Optional[Dict]:
+    """Delivery progress of a campaign's emails, or None if it queued nothing."""
+    messages = mail.outbox.campaign_status(campaign_id)
+    if not messages:
+        return None
+    by_status: Dict[str, int] = {}
+    for message in messages:
+        by_status[message["status"]] = by_status.get(message["status"], 0) + 1
+    done = by_status.get("sent", 0) + by_status.get("failed", 0)
+    return {
+        "campaign_id": campaign_id,
+        "total": len(messages),
+        "by_status": by_status,
+        "done": done,
+        "progress": done / len(messages),
+        "recipients": [
+            {
+                "email": ", ".join(message["recipients"]),
+                "status": message["status"],
+                "attempts": message["attempts"],
+                "error": message["error"],
+            }
+            for message in messages
+        ],
+    }
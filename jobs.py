@@ -0,0 +1,305 @@
+"""Asynchronous job runner for long model generations.
+
+Callers submit work and immediately get a job id; a bounded thread pool
+runs the job and the state/result is persisted in a local SQLite store so
+clients can poll it (or receive a webhook callback) without holding an
+HTTP connection open for the whole generation.
+
+Configuration comes from environment variables:
+  - JOBS_DB_PATH: SQLite file for job state (default: jobs.db next to users.db)
+  - JOB_WORKERS: number of worker threads (default: 4)
+  - JOB_MAX_PENDING: max queued + running jobs before submissions are
+    rejected (default: 100)
+  - JOB_RESULT_TTL_SECONDS: how long finished jobs are kept (default: 86400)
+  - JOB_CALLBACK_ALLOWED_HOSTS: comma-separated hosts webhooks may target
+    (default: unset, any http/https host that resolves only to public
+    addresses). Loopback, private, link-local and other non-global
+    addresses are refused unless their host is listed here.
+  - JOB_CALLBACK_SECRET: if set, callbacks carry an HMAC-SHA256 signature
+    in the `X-AIbot-Signature` header
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from http_pool import get_shared_transport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "jobs.db")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """Return True if `owner` names a live process on this host."""
+    host, _, pid = (owner or "").rpartition(":")
+    if host and host != socket.gethostname():
+        # Jobs owned by another host are left for that host to manage
+        return True
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when the job queue is at capacity."""
+
+
+class InvalidCallbackURL(ValueError):
+    """Raised when a webhook URL is not an allowed http(s) target."""
+
+
+class JobStore:
+    """SQLite persistence for job state and results."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("JOBS_DB_PATH", DEFAULT_DB_PATH)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                job_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                callback_url TEXT,
+                owner TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                expires_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at)")
+        self._conn.commit()
+
+    def create(self, job_type: str, request: Dict, callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, job_type, status, request, callback_url, owner, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, QUEUED, json.dumps(request), callback_url, _process_owner(), now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def mark_running(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def finish(self, job_id: str, ttl: float, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, expires_at = ? WHERE id = ?",
+                (
+                    FAILED if error is not None else SUCCEEDED,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    now,
+                    now + ttl,
+                    job_id,
+                ),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (job_id, time.time()),
+            ).fetchone()
+        if not row:
+            return None
+        job = {
+            "job_id": row["id"],
+            "type": row["job_type"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def fail_orphaned(self, reason: str, ttl: float) -> int:
+        """Mark unfinished jobs whose owning process has exited as failed."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            orphaned = [(row["id"],) for row in rows if not _owner_alive(row["owner"])]
+            self._conn.executemany(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, expires_at = ? WHERE id = ?",
+                [(FAILED, reason, now, now + ttl, job_id) for (job_id,) in orphaned],
+            )
+            self._conn.commit()
+        return len(orphaned)
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+        return cur.rowcount
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class JobManager:
+    """Runs submitted jobs on a bounded worker pool and records their outcome."""
+
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        result_ttl: Optional[float] = None,
+    ):
+        self.store = store or JobStore()
+        self.workers = workers or int(os.environ.get("JOB_WORKERS", 4))
+        self.max_pending = max_pending or int(os.environ.get("JOB_MAX_PENDING", 100))
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.environ.get("JOB_RESULT_TTL_SECONDS", 86400))
+        allowed = os.environ.get("JOB_CALLBACK_ALLOWED_HOSTS", "")
+        self.callback_hosts = {h.strip().lower() for h in allowed.split(",") if h.strip()}
+        self.callback_secret = os.environ.get("JOB_CALLBACK_SECRET")
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+
+        orphaned = self.store.fail_orphaned("Interrupted by server restart", self.result_ttl)
+        if orphaned:
+            logger.warning(f"Marked {orphaned} unfinished job(s) from exited workers as failed")
+
+    def validate_callback_url(self, url: str) -> None:
+        """Reject callback URLs that are not http(s), not allow-listed, or resolve to internal addresses."""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise InvalidCallbackURL("callback_url must be an http(s) URL")
+        host = parsed.hostname.lower()
+        if self.callback_hosts:
+            if host not in self.callback_hosts:
+                raise InvalidCallbackURL(f"callback_url host {parsed.hostname} is not allowed")
+            return
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or 80, proto=socket.IPPROTO_TCP)}
+        except (socket.gaierror, UnicodeError, ValueError):
+            raise InvalidCallbackURL(f"callback_url host {parsed.hostname} cannot be resolved")
+        for address in addresses:
+            # Strip any IPv6 zone id ("fe80::1%eth0")
+            if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+                raise InvalidCallbackURL(f"callback_url host {parsed.hostname} resolves to a non-public address")
+
+    def submit(self, job_type: str, request: Dict, fn: Callable[[], Dict], callback_url: Optional[str] = None) -> str:
+        """Queue `fn` for execution and return the new job id.
+
+        Raises:
+            JobQueueFull: if `max_pending` jobs are already queued or running
+            InvalidCallbackURL: if `callback_url` is not an allowed target
+        """
+        if callback_url:
+            self.validate_callback_url(callback_url)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise JobQueueFull(f"Job queue is full ({self.max_pending} pending)")
+
+        self.store.purge_expired()
+        job_id = self.store.create(job_type, request, callback_url)
+        with self._lock:
+            self.pending += 1
+        self._executor.submit(self._run, job_id, fn, callback_url)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable[[], Dict], callback_url: Optional[str]) -> None:
+        try:
+            self.store.mark_running(job_id)
+            try:
+                result = fn()
+            except Exception as exc:
+                logger.error(f"Job {job_id} failed: {exc}")
+                self.store.finish(job_id, self.result_ttl, error=str(exc))
+            else:
+                self.store.finish(job_id, self.result_ttl, result=result)
+            if callback_url:
+                self._send_callback(job_id, callback_url)
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+    def _send_callback(self, job_id: str, url: str) -> None:
+        body = json.dumps(self.store.get(job_id)).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.callback_secret:
+            digest = hmac.new(self.callback_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            headers["X-AIbot-Signature"] = f"sha256={digest}"
+        try:
+            # Checked again at send time: DNS may have changed since submission
+            self.validate_callback_url(url)
+            get_shared_transport().post(url, data=body, headers=headers, timeout=10, allow_redirects=False)
+        except Exception as exc:
+            logger.error(f"Job {job_id} callback to {url} failed: {exc}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "rejected": self.rejected,
+            }
+        stats["by_status"] = self.store.count_by_status()
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,219 @@
+"""Local BM25 retrieval over checklists, templates and firm rule files.
+
+Prompt builders use this to include only the reference material that is
+relevant to a request instead of every checklist. The index is built once
+(at startup) from `Snippet`s: short titled sections of text such as one
+document template's checklist, one part of the filing procedure, or one
+heading of a firm-supplied rule file.
+
+Scoring is Okapi BM25 over lower-cased word tokens with a small stop-word
+list and plural folding, so "deadlines" matches "deadline" and rule
+citations such as "FRCP 56" match on both parts. `select` returns the best
+matches that fit a token budget.
+
+Firm rule files are plain text or Markdown files in a directory (see
+`load_rule_files`); each heading starts a new snippet and long sections are
+split on blank lines.
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from token_budget import count_tokens
+
+RULE_FILE_SUFFIXES = (".md", ".markdown", ".txt")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its me my of on or our should "
+    "so that the their them then there these this to was we what when where which who will with would you "
+    "your".split()
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*\S)\s*$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased search terms of `text`, stop words removed and plurals folded."""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class Snippet(NamedTuple):
+    """A titled piece of reference material."""
+    source: str
+    title: str
+    text: str
+
+    def render(self) -> str:
+        return f"### {self.title}\n{self.text}"
+
+
+class KnowledgeIndex:
+    """In-memory BM25 index over a fixed list of snippets."""
+
+    def __init__(self, snippets: Iterable[Snippet], k1: float = 1.5, b: float = 0.75):
+        self.snippets: List[Snippet] = list(snippets)
+        self.k1 = k1
+        self.b = b
+        self._tokens = [count_tokens(s.render()) for s in self.snippets]
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for doc_id, snippet in enumerate(self.snippets):
+            terms = tokenize(f"{snippet.title}\n{snippet.text}")
+            lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self._postings.setdefault(term, []).append((doc_id, tf))
+        self._lengths = lengths
+        self._avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+        total = len(self.snippets)
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.selected = 0
+        self.selected_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.snippets)
+
+    def search(self, query: str, k: int = 5, boost: Optional[Dict[str, float]] = None) -> List[Tuple[float, Snippet]]:
+        """The `k` best-scoring snippets for `query`, best first (zero scores omitted).
+
+        `boost` multiplies the scores of snippets from the given sources.
+        """
+        return [(score, self.snippets[doc_id]) for doc_id, score in self._rank(query, boost)[:k]]
+
+    def _rank(self, query: str, boost: Optional[Dict[str, float]] = None) -> List[Tuple[int, float]]:
+        started = time.perf_counter()
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for doc_id, tf in postings:
+                norm = 1 - self.b + self.b * self._lengths[doc_id] / self._avg_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        if boost:
+            for doc_id in scores:
+                scores[doc_id] *= boost.get(self.snippets[doc_id].source, 1.0)
+        # Ties keep index order, so results are deterministic
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        with self._lock:
+            self.searches += 1
+            self.search_seconds += time.perf_counter() - started
+        return ranked
+
+    def select(
+        self,
+        query: str,
+        max_tokens: int,
+        k: int = 4,
+        min_relative_score: float = 0.5,
+        boost: Optional[Dict[str, float]] = None,
+    ) -> List[Snippet]:
+        """Best matches for `query`, at most `k` and `max_tokens` tokens of rendered text in total.
+
+        Matches scoring below `min_relative_score` times the best score are
+        left out rather than used to fill the budget.
+        """
+        chosen: List[Snippet] = []
+        used = 0
+        ranked = self._rank(query, boost)
+        cutoff = ranked[0][1] * min_relative_score if ranked else 0.0
+        for doc_id, score in ranked:
+            if score < cutoff:
+                break
+            tokens = self._tokens[doc_id]
+            if used + tokens > max_tokens:
+                continue
+            chosen.append(self.snippets[doc_id])
+            used += tokens
+            if len(chosen) == k:
+                break
+        with self._lock:
+            self.selected += len(chosen)
+            self.selected_tokens += used
+        return chosen
+
+    def render(self, query: str, max_tokens: int, k: int = 4, **options) -> str:
+        """`select` joined into one block of text ("" when nothing matches)."""
+        return "\n\n".join(s.render() for s in self.select(query, max_tokens, k, **options))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "snippets": len(self.snippets),
+                "terms": len(self._postings),
+                "sources": sorted({s.source for s in self.snippets}),
+                "searches": self.searches,
+                "avg_search_ms": self.search_seconds / self.searches * 1000 if self.searches else 0.0,
+                "selected_snippets": self.selected,
+                "selected_tokens": self.selected_tokens,
+            }
+
+
+def split_sections(text: str, source: str, title: str = "", max_tokens: int = 400) -> List[Snippet]:
+    """Cut Markdown-ish `text` into snippets at headings, then at blank lines if still too long.
+
+    Each snippet is titled with `title` and the path of headings above it.
+    """
+    path: List[Tuple[int, str]] = []
+    sections: List[Tuple[str, List[str]]] = [(title, [])]
+    for line in text.splitlines():
+        heading = _HEADING_RE.match(line)
+        if heading:
+            level = len(line) - len(line.lstrip("#"))
+            path = [(lvl, name) for lvl, name in path if lvl < level] + [(level, heading.group(1))]
+            sections.append((": ".join(([title] if title else []) + [name for _, name in path]), []))
+        else:
+            sections[-1][1].append(line)
+
+    snippets = []
+    for section_title, lines in sections:
+        body = "\n".join(lines).strip()
+        if not body:
+            continue
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", body) if p.strip()]
+        current: List[str] = []
+        for paragraph in paragraphs:
+            if current and count_tokens("\n\n".join(current + [paragraph])) > max_tokens:
+                snippets.append(Snippet(source, section_title, "\n\n".join(current)))
+                current = []
+            current.append(paragraph)
+        snippets.append(Snippet(source, section_title, "\n\n".join(current)))
+    return snippets
+
+
+def load_rule_files(directory: Optional[str], max_tokens: int = 400) -> List[Snippet]:
+    """Snippets from every rule file in `directory` (none if it is unset or missing)."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    snippets = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.lower().endswith(RULE_FILE_SUFFIXES) or not os.path.isfile(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        title = os.path.splitext(name)[0].replace("_", " ").replace("-", " ").strip()
+        snippets.extend(split_sections(text, f"rules/{name}", title, max_tokens=max_tokens))
+    return snippets
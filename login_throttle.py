@@ -0,0 +1,212 @@
+"""Per-username and per-IP login throttling.
+
+A brute-force flood would otherwise cost one password hash per guess.
+`LoginThrottle` is consulted before any hashing happens:
+  - per username, failed attempts beyond a small allowance are followed by
+    a delay that doubles with each further failure, up to a cap, instead
+    of a hard lockout, so nobody can lock a known user out for long (a
+    successful login clears the count, and failures older than the
+    window are forgotten);
+  - per client IP, failed attempts are limited within a sliding window,
+    so spraying many usernames from one address is also slowed down.
+    Successful logins do not count, so everyone behind an office NAT can
+    still sign in during the morning rush.
+
+The client IP is the socket peer address. Behind a reverse proxy that is
+the proxy's own address, so set LOGIN_TRUSTED_PROXY_HOPS to the number of
+proxies in front of the app: the address that many entries from the end
+of X-Forwarded-For is used instead. Leave it at 0 when clients connect
+directly, or the header could be forged to dodge the IP limit.
+
+Each key keeps only the timestamps of its last `limit` failures, and at
+most `max_keys` keys are tracked (least recently seen are forgotten), so
+memory stays bounded however many usernames an attacker invents. State is
+per process: with several gunicorn workers the effective limits are
+multiplied by the worker count.
+
+Configuration comes from environment variables:
+  - LOGIN_USER_MAX_FAILURES: failures per username before delays start;
+    0 disables (default: 5)
+  - LOGIN_USER_WINDOW_SECONDS: how long a username's failures are
+    remembered (default: 300)
+  - LOGIN_USER_BASE_DELAY_SECONDS / LOGIN_USER_MAX_DELAY_SECONDS: the first
+    delay and its cap (default: 1 / 60)
+  - LOGIN_IP_MAX_FAILURES: failures per IP per window; 0 disables
+    (default: 30)
+  - LOGIN_IP_WINDOW_SECONDS: per-IP window (default: 60)
+  - LOGIN_TRUSTED_PROXY_HOPS: reverse proxies whose X-Forwarded-For entries
+    are trusted (default: 0)
+  - LOGIN_THROTTLE_MAX_KEYS: usernames/IPs tracked (default: 10000)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+
+class LoginThrottled(Exception):
+    """Too many login attempts; `retry_after` says when to try again."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many login attempts; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class SlidingWindow:
+    """At most `limit` events per key in any `window` seconds."""
+
+    def __init__(self, limit: int, window: float, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._events: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    def retry_after(self, key: str, now: float) -> float:
+        """Seconds until `key` may act again (0 if it may act now)."""
+        events = self._events.get(key)
+        if self.limit <= 0 or events is None or len(events) < self.limit:
+            return 0.0
+        return max(0.0, events[0] + self.window - now)
+
+    def add(self, key: str, now: float) -> None:
+        if self.limit <= 0:
+            return
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque(maxlen=self.limit)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+        else:
+            self._events.move_to_end(key)
+        events.append(now)
+
+    def reset(self, key: str) -> None:
+        self._events.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class FailureBackoff:
+    """Delays that double with each failure per key beyond `allowed` ones."""
+
+    def __init__(self, allowed: int, window: float, base_delay: float, max_delay: float, max_keys: int = 10000):
+        self.allowed = allowed
+        self.window = window
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_keys = max_keys
+        # key -> (failures, time of the last one)
+        self._failures: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+
+    def retry_after(self, key: str, now: float) -> float:
+        """Seconds until `key` may try again (0 if it may try now)."""
+        entry = self._failures.get(key)
+        if self.allowed <= 0 or entry is None:
+            return 0.0
+        count, last = entry
+        if now - last > self.window:
+            del self._failures[key]
+            return 0.0
+        if count < self.allowed:
+            return 0.0
+        delay = min(self.base_delay * 2 ** (count - self.allowed), self.max_delay)
+        return max(0.0, last + delay - now)
+
+    def add(self, key: str, now: float) -> None:
+        if self.allowed <= 0:
+            return
+        entry = self._failures.pop(key, None)
+        count = entry[0] if entry is not None and now - entry[1] <= self.window else 0
+        self._failures[key] = (count + 1, now)
+        while len(self._failures) > self.max_keys:
+            self._failures.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        self._failures.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._failures)
+
+
+class LoginThrottle:
+    """Thread-safe username and IP limits for the login form."""
+
+    def __init__(
+        self,
+        user_max_failures: int = 5,
+        user_window: float = 300,
+        user_base_delay: float = 1,
+        user_max_delay: float = 60,
+        ip_max_failures: int = 30,
+        ip_window: float = 60,
+        trusted_proxy_hops: int = 0,
+        max_keys: int = 10000,
+    ):
+        self._users = FailureBackoff(user_max_failures, user_window, user_base_delay, user_max_delay, max_keys)
+        self._ips = SlidingWindow(ip_max_failures, ip_window, max_keys)
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled_user = 0
+        self.throttled_ip = 0
+
+    @classmethod
+    def from_env(cls) -> "LoginThrottle":
+        return cls(
+            user_max_failures=int(os.environ.get("LOGIN_USER_MAX_FAILURES", 5)),
+            user_window=float(os.environ.get("LOGIN_USER_WINDOW_SECONDS", 300)),
+            user_base_delay=float(os.environ.get("LOGIN_USER_BASE_DELAY_SECONDS", 1)),
+            user_max_delay=float(os.environ.get("LOGIN_USER_MAX_DELAY_SECONDS", 60)),
+            ip_max_failures=int(os.environ.get("LOGIN_IP_MAX_FAILURES", 30)),
+            ip_window=float(os.environ.get("LOGIN_IP_WINDOW_SECONDS", 60)),
+            trusted_proxy_hops=int(os.environ.get("LOGIN_TRUSTED_PROXY_HOPS", 0)),
+            max_keys=int(os.environ.get("LOGIN_THROTTLE_MAX_KEYS", 10000)),
+        )
+
+    def client_ip(self, remote_addr: Optional[str], forwarded_for: Optional[str] = None) -> str:
+        """The address to limit: the peer, or the client as seen by the trusted proxies."""
+        if self.trusted_proxy_hops > 0 and forwarded_for:
+            hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+            if len(hops) >= self.trusted_proxy_hops:
+                return hops[-self.trusted_proxy_hops]
+        return remote_addr or "unknown"
+
+    def check(self, username: str, ip: str) -> None:
+        """Admit one attempt, or raise LoginThrottled."""
+        now = time.monotonic()
+        username = username.lower()
+        with self._lock:
+            wait_ip = self._ips.retry_after(ip, now)
+            if wait_ip:
+                self.throttled_ip += 1
+                raise LoginThrottled(wait_ip)
+            wait_user = self._users.retry_after(username, now)
+            if wait_user:
+                self.throttled_user += 1
+                raise LoginThrottled(wait_user)
+            self.allowed += 1
+
+    def record(self, username: str, ip: str, success: bool) -> None:
+        """Count a failed attempt against the username and IP, or clear the username on success."""
+        now = time.monotonic()
+        username = username.lower()
+        with self._lock:
+            if success:
+                self._users.reset(username)
+            else:
+                self._users.add(username, now)
+                self._ips.add(ip, now)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "allowed": self.allowed,
+                "throttled_user": self.throttled_user,
+                "throttled_ip": self.throttled_ip,
+                "tracked_users": len(self._users),
+                "tracked_ips": len(self._ips),
+            }
@@ -0,0 +1,298 @@
+"""Map-reduce processing for inputs too long to answer in one model call.
+
+A pasted pleading or discovery production can be far larger than the
+model's context window, and even when it fits, a single call's latency
+grows with its length. `LongInputRunner` handles such requests in three
+phases:
+
+  1. map: the user text is split into overlapping token windows
+     (`split_chunks`), and each excerpt is sent with the request's own
+     system and template messages plus a fixed note-taking instruction.
+     The calls run in parallel on a bounded pool, so wall-clock time
+     depends on the number of chunks per worker rather than the length
+     of the input;
+  2. collapse: if the notes together are too big for one call, groups of
+     them are condensed in parallel until they fit;
+  3. reduce: one final call answers the request from the notes, plus the
+     start and end of the original input, where the request itself
+     usually is.
+
+Progress is reported as `{"type": "progress", "phase", "done", "total"}`
+events by `iter_events` (for streaming responses) or through the
+`progress` callback of `run`. All calls go through the model client, so
+caching, retries, rate limiting and token budgets apply to each of them.
+
+Configuration comes from environment variables:
+  - LONG_INPUT_THRESHOLD_TOKENS: user text size at which long-input mode
+    is used even if the prompt would fit (default: 6000)
+  - LONG_INPUT_CHUNK_TOKENS: tokens per excerpt; lowered automatically to
+    fit the model's prompt budget (default: 3000)
+  - LONG_INPUT_OVERLAP_TOKENS: tokens repeated between neighbouring
+    excerpts (default: 200)
+  - LONG_INPUT_PARALLELISM: model calls in flight per request (default: 4)
+  - LONG_INPUT_CONTEXT_TOKENS: tokens from the start and end of the input
+    passed to the reduce call (default: 800)
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional
+
+from prompt_prefix import Message, Prompt, as_messages
+from rate_limit import PRIORITY_INTERACTIVE
+from resilience import Deadline
+from token_budget import PromptTooLarge, TokenBudget, count_messages, count_tokens, token_offsets, truncate_middle
+
+logger = logging.getLogger(__name__)
+
+MAP_INSTRUCTIONS = """## Long Input: Excerpt Notes
+The user's input is too long to read in one pass, so it has been split into overlapping excerpts that are analysed separately and combined afterwards. The user message below is one excerpt.
+
+Write concise notes on this excerpt only. Keep every party, date, deadline, amount, claim, defense, rule or statute cited, procedural event, and any question or instruction addressed to you, quoting exact wording where it matters. Mark text that appears cut off at the start or end of the excerpt. Do not answer the user's request yet and do not add a disclaimer."""
+
+COLLAPSE_INSTRUCTIONS = """## Long Input: Combine Notes
+The user message below holds notes on consecutive excerpts of one long input. Merge them into a single set of notes in the same style: keep every fact, date, deadline, citation and question, drop repetition caused by overlapping excerpts, and keep the original order. Do not answer the user's request yet."""
+
+REDUCE_INSTRUCTIONS = """## Long Input: Final Answer
+The user's input was too long to read in one pass. It was split into overlapping excerpts and each was summarised in notes. The user message below gives the start and end of the original input, which usually contain the actual request, followed by the notes in document order.
+
+Respond to the user's request as if you had read the full input, relying on the notes for its content. Follow all of the instructions above, including the mandatory disclaimer."""
+
+
+def split_chunks(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Split `text` into windows of at most `chunk_tokens` tokens that overlap by `overlap_tokens`.
+
+    Windows end at a line break when there is one in their last fifth, so
+    paragraphs are rarely cut mid-sentence.
+    """
+    if chunk_tokens <= overlap_tokens:
+        raise ValueError("chunk_tokens must be larger than overlap_tokens")
+    offsets = token_offsets(text)
+    if len(offsets) <= chunk_tokens:
+        return [text] if text else []
+    chunks = []
+    start = 0
+    while True:
+        end = start + chunk_tokens
+        if end >= len(offsets):
+            chunks.append(text[offsets[start]:])
+            return chunks
+        end_char = offsets[end]
+        floor_char = offsets[end - chunk_tokens // 5]
+        newline = text.rfind("\n", floor_char, end_char)
+        if newline > floor_char:
+            end_char = newline + 1
+            end = bisect.bisect_left(offsets, end_char)
+        chunks.append(text[offsets[start]:end_char])
+        start = max(end - overlap_tokens, start + 1)
+
+
+class LongInputRunner:
+    """Answer oversized prompts by map-reduce over a model client."""
+
+    def __init__(
+        self,
+        client,
+        threshold_tokens: int = 6000,
+        chunk_tokens: int = 3000,
+        overlap_tokens: int = 200,
+        parallelism: int = 4,
+        context_tokens: int = 800,
+    ):
+        self.client = client
+        self.threshold_tokens = threshold_tokens
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.parallelism = max(1, parallelism)
+        self.context_tokens = context_tokens
+        # Share the client's budget so chunk sizes match what it will accept
+        self.budget = getattr(client, "budget", None) or TokenBudget.from_env(getattr(client, "model_name", None))
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failed = 0
+        self.chunks = 0
+        self.map_calls = 0
+        self.collapse_calls = 0
+        self.last_run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, client) -> "LongInputRunner":
+        return cls(
+            client,
+            threshold_tokens=int(os.environ.get("LONG_INPUT_THRESHOLD_TOKENS", 6000)),
+            chunk_tokens=int(os.environ.get("LONG_INPUT_CHUNK_TOKENS", 3000)),
+            overlap_tokens=int(os.environ.get("LONG_INPUT_OVERLAP_TOKENS", 200)),
+            parallelism=int(os.environ.get("LONG_INPUT_PARALLELISM", 4)),
+            context_tokens=int(os.environ.get("LONG_INPUT_CONTEXT_TOKENS", 800)),
+        )
+
+    def needs_long_mode(self, prompt: Prompt) -> bool:
+        """True if the prompt's user text is over the threshold or the prompt is over budget."""
+        messages = as_messages(prompt)
+        if messages[-1]["role"] != "user":
+            return False
+        return (
+            count_tokens(messages[-1]["content"]) > self.threshold_tokens
+            or count_messages(messages) > self.budget.prompt_limit
+        )
+
+    def run(
+        self,
+        prompt: Prompt,
+        progress: Optional[Callable[[Dict], None]] = None,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """Answer `prompt` by map-reduce and return the final response text."""
+        parts = []
+        for event in self.iter_events(prompt, use_cache=use_cache, deadline=deadline, priority=priority):
+            if event["type"] == "chunk":
+                parts.append(event["text"])
+            elif progress is not None:
+                progress(event)
+        return "".join(parts)
+
+    def iter_events(
+        self,
+        prompt: Prompt,
+        stream: bool = False,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Iterator[Dict]:
+        """Yield progress events while the map phase runs, then the answer as chunk events.
+
+        With `stream=True` the reduce call is streamed; otherwise the answer
+        arrives as one chunk event.
+
+        Raises:
+            token_budget.PromptTooLarge: If even the static part of the prompt does not fit
+        """
+        started = time.perf_counter()
+        messages = as_messages(prompt)
+        prefix, text = messages[:-1], messages[-1]["content"]
+        with self._lock:
+            self.runs += 1
+        try:
+            chunks = split_chunks(text, self._chunk_size(prefix), self.overlap_tokens)
+            with self._lock:
+                self.chunks += len(chunks)
+            logger.info(f"Long input of {count_tokens(text)} tokens split into {len(chunks)} chunks")
+
+            def generate(instructions: str, content: str) -> str:
+                return self.client.generate(
+                    self._messages(prefix, instructions, content),
+                    use_cache=use_cache, deadline=deadline, priority=priority,
+                )
+
+            excerpts = [
+                (MAP_INSTRUCTIONS, f"Excerpt {i} of {len(chunks)}:\n\n{chunk}") for i, chunk in enumerate(chunks, 1)
+            ]
+            notes = yield from self._parallel("map", generate, excerpts)
+            notes = [f"### Notes on excerpt {i} of {len(notes)}\n{note.strip()}" for i, note in enumerate(notes, 1)]
+
+            head_and_tail = truncate_middle(text, self.context_tokens)
+            while True:
+                content = "### Start and end of the input\n" + head_and_tail + "\n\n" + "\n\n".join(notes)
+                reduce_messages = self._messages(prefix, REDUCE_INSTRUCTIONS, content)
+                if count_messages(reduce_messages) <= self.budget.prompt_limit or len(notes) == 1:
+                    break
+                notes = yield from self._collapse(prefix, generate, notes)
+
+            yield {"type": "progress", "phase": "reduce", "done": 0, "total": 1}
+            if stream:
+                for piece in self.client.generate_stream(
+                    reduce_messages, use_cache=use_cache, deadline=deadline, priority=priority
+                ):
+                    yield {"type": "chunk", "text": piece}
+            else:
+                yield {"type": "chunk", "text": self.client.generate(
+                    reduce_messages, use_cache=use_cache, deadline=deadline, priority=priority
+                )}
+            yield {"type": "progress", "phase": "reduce", "done": 1, "total": 1}
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.last_run_seconds = elapsed
+                self.max_run_seconds = max(self.max_run_seconds, elapsed)
+
+    def _chunk_size(self, prefix: List[Message]) -> int:
+        """Excerpt size that fits the prompt budget next to the map instructions."""
+        overhead = count_messages(self._messages(prefix, MAP_INSTRUCTIONS, "Excerpt 999 of 999:\n\n"))
+        room = self.budget.prompt_limit - overhead
+        if room <= self.overlap_tokens * 2:
+            raise PromptTooLarge(overhead + self.overlap_tokens * 2, self.budget.prompt_limit, self.budget.model_name)
+        return min(self.chunk_tokens, room)
+
+    @staticmethod
+    def _messages(prefix: List[Message], instructions: str, content: str) -> List[Message]:
+        # The request's own static prefix comes first so the provider can reuse it
+        return prefix + [{"role": "system", "content": instructions}, {"role": "user", "content": content}]
+
+    def _collapse(self, prefix: List[Message], generate, notes: List[str]):
+        """Condense notes in parallel groups that each fit one call; return the shorter list."""
+        limit = self.budget.prompt_limit - count_messages(self._messages(prefix, COLLAPSE_INSTRUCTIONS, ""))
+        groups: List[List[str]] = [[]]
+        size = 0
+        for note in notes:
+            tokens = count_tokens(note) + 2
+            if groups[-1] and size + tokens > limit:
+                groups.append([])
+                size = 0
+            groups[-1].append(note)
+            size += tokens
+        if len(groups) == len(notes):
+            # Every note fills a call on its own; pair them up so the list still shrinks
+            groups = [notes[i:i + 2] for i in range(0, len(notes), 2)]
+        with self._lock:
+            self.collapse_calls += len(groups)
+        merged = yield from self._parallel(
+            "collapse", generate, [(COLLAPSE_INSTRUCTIONS, "\n\n".join(group)) for group in groups]
+        )
+        return [f"### Combined notes, part {i} of {len(merged)}\n{m.strip()}" for i, m in enumerate(merged, 1)]
+
+    def _parallel(self, phase: str, generate, calls: List) -> Iterator[Dict]:
+        """Run `generate(*call)` for each call on a bounded pool, yielding progress; return results in order."""
+        results: List[Optional[str]] = [None] * len(calls)
+        yield {"type": "progress", "phase": phase, "done": 0, "total": len(calls)}
+        executor = ThreadPoolExecutor(max_workers=min(self.parallelism, len(calls)), thread_name_prefix="long-input")
+        try:
+            pending = {executor.submit(generate, *call): i for i, call in enumerate(calls)}
+            done = 0
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[pending.pop(future)] = future.result()
+                    done += 1
+                if phase == "map":
+                    with self._lock:
+                        self.map_calls += len(finished)
+                yield {"type": "progress", "phase": phase, "done": done, "total": len(calls)}
+        finally:
+            # Stop queued calls if a call failed or the consumer went away
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "failed": self.failed,
+                "chunks": self.chunks,
+                "map_calls": self.map_calls,
+                "collapse_calls": self.collapse_calls,
+                "parallelism": self.parallelism,
+                "last_run_seconds": self.last_run_seconds,
+                "max_run_seconds": self.max_run_seconds,
+            }
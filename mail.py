@@ -1,6 +1,9 @@
 """Email sending helpers for password-reset and invite flows.
 
-This module provides a simple interface to send emails using Flask-Mail.
+Messages are not sent on the request thread: `send_*` helpers put them on
+the persistent `mail_outbox.MailOutbox`, whose background sender delivers
+them over a reused SMTP connection and retries temporary failures.
+
 Email configuration comes from environment variables:
   - MAIL_SERVER: SMTP server (default: localhost)
   - MAIL_PORT: SMTP port (default: 25)
@@ -8,32 +11,46 @@ Email configuration comes from environment variables:
   - MAIL_USERNAME: SMTP username (optional)
   - MAIL_PASSWORD: SMTP password (optional)
   - MAIL_DEFAULT_SENDER: From address (required)
+
+See `mail_outbox` for the queue's own settings.
 """
 from __future__ import annotations
 
 import os
-from typing import Optional
-from flask_mail import Mail, Message
+from typing import Dict, List, Optional, Tuple
+from flask_mail import Mail
+
+from mail_outbox import MailOutbox, SMTPSettings
 
 mail = Mail()
+outbox = MailOutbox.from_env()
 
 
 def init_mail(app):
-    """Initialize Flask-Mail with the app."""
+    """Initialize Flask-Mail with the app and point the outbox at its SMTP settings.
+
+    MAIL_SUPPRESS_SEND (default: the app's TESTING flag) is read each time
+    mail is queued, so setting TESTING after startup still stops delivery.
+    """
     mail.init_app(app)
+    outbox.configure(
+        SMTPSettings.from_config(app.config),
+        suppress_send=lambda: bool(app.config.get("MAIL_SUPPRESS_SEND", app.testing)),
+    )
 
 
-def send_invite_email(to_email: str, username: str, invite_link: str) -> bool:
-    """Send an invite email to a new user.
-    
-    Returns True if successful, False otherwise.
-    """
-    try:
-        subject = "You're invited to Paralegal AI Assistant"
-        body = f"""
+def get_mail_stats() -> Dict:
+    """Outbox queue depth, delivery latency and sender statistics."""
+    return outbox.get_stats()
+
+
+def invite_message(username: str, invite_link: str) -> Tuple[str, str]:
+    """Return the (subject, body) of an invite email."""
+    subject = "You're invited to Paralegal AI Assistant"
+    body = f"""
 Hello {username},
 
-You have been invited to join the Paralegal AI Assistant. 
+You have been invited to join the Paralegal AI Assistant.
 Click the link below to create your account and set your password:
 
 {invite_link}
@@ -45,18 +62,39 @@ If you did not expect this invitation, please ignore this email.
 Best regards,
 Paralegal AI Assistant Team
         """
-        msg = Message(subject=subject, recipients=[to_email], body=body)
-        mail.send(msg)
+    return subject, body
+
+
+def send_invite_email(to_email: str, username: str, invite_link: str) -> bool:
+    """Queue an invite email to a new user.
+
+    Returns True if the message was queued, False otherwise.
+    """
+    try:
+        subject, body = invite_message(username, invite_link)
+        outbox.enqueue([to_email], subject, body)
         return True
     except Exception as e:
-        print(f"Error sending invite email: {e}")
+        print(f"Error queueing invite email: {e}")
         return False
 
 
+def queue_invite_emails(invites: List[Tuple[str, str, str]], campaign: Optional[str] = None) -> List[int]:
+    """Queue invite emails for (email, username, invite_link) tuples in one transaction.
+
+    Returns the outbox message ids, in the same order.
+    """
+    messages = []
+    for to_email, username, invite_link in invites:
+        subject, body = invite_message(username, invite_link)
+        messages.append(([to_email], subject, body))
+    return outbox.enqueue_many(messages, campaign=campaign)
+
+
 def send_password_reset_email(to_email: str, username: str, reset_link: str) -> bool:
-    """Send a password-reset email to a user.
-    
-    Returns True if successful, False otherwise.
+    """Queue a password-reset email to a user.
+
+    Returns True if the message was queued, False otherwise.
     """
     try:
         subject = "Password Reset — Paralegal AI Assistant"
@@ -75,9 +113,8 @@ If you did not request a password reset, please ignore this email.
 Best regards,
 Paralegal AI Assistant Team
         """
-        msg = Message(subject=subject, recipients=[to_email], body=body)
-        mail.send(msg)
+        outbox.enqueue([to_email], subject, body)
         return True
     except Exception as e:
-        print(f"Error sending password-reset email: {e}")
+        print(f"Error queueing password-reset email: {e}")
         return False
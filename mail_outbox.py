@@ -0,0 +1,526 @@
+"""Persistent outbound mail queue with a background SMTP sender.
+
+Web requests only `enqueue` a message (one small SQLite insert) and return;
+a daemon thread delivers queued mail:
+  - messages are claimed in batches inside one BEGIN IMMEDIATE
+    transaction, so several gunicorn workers can run senders against the
+    same outbox without sending anything twice;
+  - one SMTP connection (and TLS session) is reused across a batch and
+    kept open between batches until it has been idle for a while;
+  - temporary failures (4xx replies, dropped connections) are retried with
+    exponential backoff and jitter; permanent (5xx) rejections and
+    messages out of attempts are marked failed;
+  - if the server cannot be reached at all, the pass stops at the first
+    message, the rest of the batch is released, and this sender claims
+    nothing more until that message's backoff has passed, so a down
+    server costs one connection timeout per backoff rather than one per
+    message (which could outlast the claim timeout and get the batch
+    reclaimed and sent twice);
+  - messages left claimed by a process that died are requeued, and sent
+    messages are purged after a retention period.
+
+SMTP settings use the Flask-Mail config keys (MAIL_SERVER, MAIL_PORT,
+MAIL_USE_TLS, MAIL_USE_SSL, MAIL_USERNAME, MAIL_PASSWORD,
+MAIL_DEFAULT_SENDER), taken from the app config by `mail.init_mail`.
+As with Flask-Mail, MAIL_SUPPRESS_SEND (which defaults to the app's
+TESTING flag) stops delivery: queued messages are marked sent without
+connecting to SMTP, and no sender thread is started.
+To try it locally, run `fake_smtp_server.py` and point MAIL_SERVER and
+MAIL_PORT at it.
+
+Outbox behaviour comes from environment variables:
+  - MAIL_OUTBOX_DB_PATH: SQLite file for the queue (default: outbox.db next
+    to users.db)
+  - MAIL_BATCH_SIZE: messages claimed per pass (default: 50)
+  - MAIL_MAX_ATTEMPTS: delivery attempts before a message fails (default: 6)
+  - MAIL_RETRY_BASE_SECONDS / MAIL_RETRY_MAX_SECONDS: backoff bounds
+    (default: 30 / 3600)
+  - MAIL_POLL_SECONDS: how often the sender looks for due retries and mail
+    queued by other processes (default: 5)
+  - MAIL_SMTP_IDLE_SECONDS: close the SMTP connection after this long
+    unused (default: 60)
+  - MAIL_SMTP_TIMEOUT_SECONDS: socket timeout per SMTP operation
+    (default: 10)
+  - MAIL_SENT_TTL_SECONDS: how long sent messages are kept (default: 604800)
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import smtplib
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from typing import Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from db_pool import ConnectionManager
+from resilience import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "outbox.db")
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender TEXT,
+        recipients TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        body TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        created_at REAL NOT NULL,
+        sent_at REAL,
+        last_error TEXT,
+        claimed_by TEXT,
+        claimed_at REAL,
+        campaign TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_outbox_status_due ON outbox (status, next_attempt_at)",
+]
+
+
+def migrate_campaign(conn: sqlite3.Connection) -> None:
+    """Add the `campaign` column (and its index) to outboxes created without it."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+    if "campaign" not in columns:
+        conn.execute("ALTER TABLE outbox ADD COLUMN campaign TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_campaign ON outbox (campaign)")
+
+
+class PermanentMailError(Exception):
+    """The server rejected the message for good (5xx); do not retry."""
+
+
+class SMTPUnavailable(Exception):
+    """No working connection to the server could be made; stop the pass."""
+
+
+class SMTPSettings:
+    """Where and how to connect for delivery."""
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 25,
+        use_tls: bool = False,
+        use_ssl: bool = False,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        default_sender: Optional[str] = None,
+        timeout: float = 10,
+    ):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.default_sender = default_sender
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "SMTPSettings":
+        """Build settings from Flask-Mail style keys (an app config or os.environ)."""
+        def flag(key):
+            value = config.get(key, False)
+            return value.lower() == "true" if isinstance(value, str) else bool(value)
+
+        return cls(
+            host=config.get("MAIL_SERVER") or "localhost",
+            port=int(config.get("MAIL_PORT") or 25),
+            use_tls=flag("MAIL_USE_TLS"),
+            use_ssl=flag("MAIL_USE_SSL"),
+            username=config.get("MAIL_USERNAME"),
+            password=config.get("MAIL_PASSWORD"),
+            default_sender=config.get("MAIL_DEFAULT_SENDER"),
+            timeout=float(os.environ.get("MAIL_SMTP_TIMEOUT_SECONDS", 10)),
+        )
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class MailOutbox:
+    """SQLite-backed mail queue and the thread that drains it."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        settings: Optional[SMTPSettings] = None,
+        batch_size: int = 50,
+        max_attempts: int = 6,
+        retry_base: float = 30,
+        retry_max: float = 3600,
+        poll_interval: float = 5,
+        idle_timeout: float = 60,
+        sent_ttl: float = 7 * 24 * 3600,
+        claim_timeout: float = 600,
+    ):
+        self.db = ConnectionManager(path or DEFAULT_DB_PATH, SCHEMA, migrations=[migrate_campaign])
+        self.settings = settings or SMTPSettings.from_config(os.environ)
+        self.batch_size = batch_size
+        self.retry = RetryPolicy(max_attempts=max_attempts, base_delay=retry_base, max_delay=retry_max)
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.sent_ttl = sent_ttl
+        self.claim_timeout = claim_timeout
+        # Checked whenever mail is queued or delivered; see `configure`
+        self.suppress_send: Callable[[], bool] = lambda: False
+
+        self._lock = threading.Lock()
+        # Held for a whole delivery pass: the SMTP connection is not shareable
+        self._deliver_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._smtp_used_at = 0.0
+        # Set when the server cannot be reached: no claims before this time
+        self._unavailable_until = 0.0
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.deferred = 0
+        self.batches = 0
+        self.connections = 0
+        self.last_error: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "MailOutbox":
+        return cls(
+            path=os.environ.get("MAIL_OUTBOX_DB_PATH"),
+            batch_size=int(os.environ.get("MAIL_BATCH_SIZE", 50)),
+            max_attempts=int(os.environ.get("MAIL_MAX_ATTEMPTS", 6)),
+            retry_base=float(os.environ.get("MAIL_RETRY_BASE_SECONDS", 30)),
+            retry_max=float(os.environ.get("MAIL_RETRY_MAX_SECONDS", 3600)),
+            poll_interval=float(os.environ.get("MAIL_POLL_SECONDS", 5)),
+            idle_timeout=float(os.environ.get("MAIL_SMTP_IDLE_SECONDS", 60)),
+            sent_ttl=float(os.environ.get("MAIL_SENT_TTL_SECONDS", 7 * 24 * 3600)),
+        )
+
+    def configure(self, settings: SMTPSettings, suppress_send: Optional[Callable[[], bool]] = None) -> None:
+        """Switch SMTP settings; the next delivery opens a fresh connection.
+
+        `suppress_send` is called whenever mail is queued or delivered; while
+        it returns True nothing is sent and messages are marked sent.
+        """
+        with self._deliver_lock:
+            self.settings = settings
+            self._unavailable_until = 0.0
+            if suppress_send is not None:
+                self.suppress_send = suppress_send
+            self._close_smtp()
+
+    def enqueue(self, recipients: Union[str, Sequence[str]], subject: str, body: str, sender: Optional[str] = None) -> int:
+        """Queue a plain-text message for background delivery; return its id."""
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        now = time.time()
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO outbox (sender, recipients, subject, body, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sender, json.dumps(list(recipients)), subject, body, QUEUED, now, now),
+            )
+        with self._lock:
+            self.enqueued += 1
+        self._kick()
+        return cur.lastrowid
+
+    def enqueue_many(self, messages: Sequence[Tuple[Sequence[str], str, str]], campaign: Optional[str] = None) -> List[int]:
+        """Queue (recipients, subject, body) messages in one transaction; return their ids.
+
+        `campaign` tags the messages so `campaign_status` can report on them.
+        """
+        now = time.time()
+        ids = []
+        with self.db.transaction() as conn:
+            for recipients, subject, body in messages:
+                cur = conn.execute(
+                    "INSERT INTO outbox (recipients, subject, body, status, next_attempt_at, created_at, campaign) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (json.dumps(list(recipients)), subject, body, QUEUED, now, now, campaign),
+                )
+                ids.append(cur.lastrowid)
+        with self._lock:
+            self.enqueued += len(ids)
+        if ids:
+            self._kick()
+        return ids
+
+    def _kick(self) -> None:
+        """Get newly queued mail delivered: by the sender thread, or at once if sending is suppressed."""
+        if self.suppress_send():
+            while self.deliver_due() >= self.batch_size:
+                pass
+            return
+        self.start()
+        self._wake.set()
+
+    def campaign_status(self, campaign: str) -> List[Dict]:
+        """Delivery status of every message tagged with `campaign`, in queue order."""
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, recipients, status, attempts, last_error, sent_at FROM outbox WHERE campaign = ? ORDER BY id",
+                (campaign,),
+            ).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "recipients": json.loads(row["recipients"]),
+                "status": row["status"],
+                "attempts": row["attempts"],
+                "error": row["last_error"],
+                "sent_at": row["sent_at"],
+            }
+            for row in rows
+        ]
+
+    def _claim(self) -> List:
+        now = time.time()
+        owner = _owner()
+        with self.db.transaction() as conn:
+            # Take the write lock before reading, so no other sender can claim the same rows
+            conn.execute("BEGIN IMMEDIATE")
+            # Requeue work claimed by a sender that never finished it
+            conn.execute(
+                "UPDATE outbox SET status = ?, claimed_by = NULL WHERE status = ? AND claimed_at < ?",
+                (QUEUED, SENDING, now - self.claim_timeout),
+            )
+            rows = conn.execute(
+                "SELECT id, sender, recipients, subject, body, attempts, created_at FROM outbox "
+                "WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (QUEUED, now, self.batch_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = ?, claimed_by = ?, claimed_at = ? WHERE id = ?",
+                [(SENDING, owner, now, row["id"]) for row in rows],
+            )
+        return rows
+
+    def _connect(self) -> smtplib.SMTP:
+        settings = self.settings
+        if settings.use_ssl:
+            smtp = smtplib.SMTP_SSL(settings.host, settings.port, timeout=settings.timeout)
+        else:
+            smtp = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+            if settings.use_tls:
+                smtp.starttls()
+        if settings.username:
+            smtp.login(settings.username, settings.password or "")
+        with self._lock:
+            self.connections += 1
+        return smtp
+
+    def _close_smtp(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                smtp.close()
+
+    def _build(self, row) -> EmailMessage:
+        msg = EmailMessage()
+        msg["Subject"] = row["subject"]
+        msg["From"] = row["sender"] or self.settings.default_sender or "noreply@localhost"
+        msg["To"] = ", ".join(json.loads(row["recipients"]))
+        msg["Date"] = formatdate(localtime=True)
+        msg["Message-ID"] = make_msgid()
+        msg.set_content(row["body"])
+        return msg
+
+    def _send(self, msg: EmailMessage) -> None:
+        """Send on the shared connection, reconnecting once if it went stale.
+
+        Raises PermanentMailError for 5xx rejections and SMTPUnavailable if
+        a fresh connection cannot be opened or fails straight away; anything
+        else raised is a temporary failure of this message.
+        """
+        for attempt in (1, 2):
+            if self._smtp is None:
+                try:
+                    self._smtp = self._connect()
+                except (smtplib.SMTPException, OSError) as exc:
+                    raise SMTPUnavailable(f"{type(exc).__name__}: {exc}") from exc
+            try:
+                self._smtp.send_message(msg)
+                self._smtp_used_at = time.monotonic()
+                return
+            except smtplib.SMTPRecipientsRefused as exc:
+                codes = [code for code, _ in exc.recipients.values()]
+                if codes and min(codes) >= 500:
+                    raise PermanentMailError(f"Recipients refused: {exc.recipients}")
+                raise
+            except smtplib.SMTPResponseException as exc:
+                if exc.smtp_code >= 500:
+                    raise PermanentMailError(f"{exc.smtp_code} {exc.smtp_error!r}")
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError) as exc:
+                # A reused connection may have been closed by the server
+                self._close_smtp()
+                if attempt == 2:
+                    raise SMTPUnavailable(f"{type(exc).__name__}: {exc}") from exc
+
+    def deliver_due(self) -> int:
+        """Send one batch of due messages; return how many were claimed."""
+        with self._deliver_lock:
+            if time.time() < self._unavailable_until and not self.suppress_send():
+                return 0
+            rows = self._claim()
+            if not rows:
+                return 0
+            sent, retry, failed = [], [], []
+            released: List[int] = []
+            suppressed = self.suppress_send()
+            for index, row in enumerate(rows):
+                attempts = row["attempts"] + 1
+                try:
+                    if suppressed:
+                        logger.debug(f"Mail {row['id']} not sent: MAIL_SUPPRESS_SEND is set")
+                    else:
+                        self._send(self._build(row))
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                    logger.warning(f"Mail {row['id']} attempt {attempts} failed: {error}")
+                    # Full jitter, but never sooner than half the base delay
+                    retry_at = time.time() + max(self.retry.base_delay / 2, self.retry.backoff(attempts))
+                    if isinstance(exc, PermanentMailError) or attempts >= self.retry.max_attempts:
+                        failed.append((error, attempts, row["id"]))
+                    else:
+                        retry.append((error, attempts, retry_at, row["id"]))
+                    if isinstance(exc, SMTPUnavailable):
+                        # The rest of the batch waits for the server, without using up an attempt
+                        released = [later["id"] for later in rows[index + 1:]]
+                        self._unavailable_until = retry_at
+                        break
+                else:
+                    now = time.time()
+                    sent.append((now, attempts, row["id"]))
+                    with self._lock:
+                        self._latencies.append(now - row["created_at"])
+        with self.db.transaction() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, attempts = ?, claimed_by = NULL WHERE id = ?", sent
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'queued', last_error = ?, attempts = ?, next_attempt_at = ?, "
+                "claimed_by = NULL WHERE id = ?",
+                retry,
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'failed', last_error = ?, attempts = ?, claimed_by = NULL WHERE id = ?",
+                failed,
+            )
+            if released:
+                conn.execute(
+                    "UPDATE outbox SET status = 'queued', last_error = ?, next_attempt_at = ?, claimed_by = NULL "
+                    f"WHERE id IN ({','.join('?' * len(released))})",
+                    [error, retry_at, *released],
+                )
+        with self._lock:
+            self.batches += 1
+            self.delivered += len(sent)
+            self.retried += len(retry)
+            self.failed += len(failed)
+            self.deferred += len(released)
+            if retry or failed:
+                self.last_error = (retry + failed)[-1][0]
+        return len(rows)
+
+    def purge_sent(self) -> int:
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "DELETE FROM outbox WHERE status = ? AND sent_at < ?", (SENT, time.time() - self.sent_ttl)
+            )
+        return cur.rowcount
+
+    def _run(self) -> None:
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                if self.deliver_due() >= self.batch_size:
+                    continue  # More may be due right away
+                if time.monotonic() - last_purge > 3600:
+                    self.purge_sent()
+                    last_purge = time.monotonic()
+            except Exception as exc:
+                logger.error(f"Mail outbox pass failed: {exc}")
+            with self._deliver_lock:
+                if self._smtp is not None and time.monotonic() - self._smtp_used_at > self.idle_timeout:
+                    self._close_smtp()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        with self._deliver_lock:
+            self._close_smtp()
+
+    def start(self) -> None:
+        """Start this process's sender thread if it is not running (and sending is not suppressed)."""
+        if self.suppress_send():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and self._thread_pid == os.getpid():
+            thread.join(timeout)
+        self._thread = None
+
+    def get_stats(self) -> Dict:
+        with self.db.connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status IN (?, ?)", (QUEUED, SENDING)
+            ).fetchone()[0]
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "enqueued": self.enqueued,
+                "delivered": self.delivered,
+                "retried": self.retried,
+                "failed": self.failed,
+                "deferred": self.deferred,
+                "batches": self.batches,
+                "connections": self.connections,
+                "messages_per_connection": (self.delivered / self.connections) if self.connections else 0.0,
+                "last_error": self.last_error,
+                "sender_running": self._thread is not None and self._thread.is_alive(),
+            }
+        by_status = {row["status"]: row["n"] for row in rows}
+        stats["by_status"] = by_status
+        stats["queue_depth"] = by_status.get(QUEUED, 0) + by_status.get(SENDING, 0)
+        stats["oldest_queued_seconds"] = (time.time() - oldest) if oldest else 0.0
+        if latencies:
+            stats["delivery_latency"] = {
+                "avg": sum(latencies) / len(latencies),
+                "p50": latencies[len(latencies) // 2],
+                "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                "max": latencies[-1],
+            }
+        return stats
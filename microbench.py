@@ -0,0 +1,535 @@
+"""In-process micro-benchmarks for hot helper functions.
+
+Each suite times a handful of small operations and reports operations per
+second, comparing the current implementation against the one it replaced
+where that is useful.
+
+Suites:
+  - users: `users.get_user` and `users.validate_token` on the pooled
+    connection manager vs. the old connect-and-create-tables-per-call path,
+    and the per-request "any users?" check (`has_users` vs. `list_users`)
+  - login: logins/sec with `--threads` concurrent logins, hashing on the
+    request threads vs. on the bounded `password_hashing.HashPool`, plus
+    the latency of a small probe task standing in for a model request
+    while the logins run; and a brute-force flood against one username
+    with and without `login_throttle.LoginThrottle`
+  - long_input: answering a ~100-page document by map-reduce against a
+    stand-in model whose latency grows with prompt size, one chunk at a
+    time vs. `--threads` chunks in parallel
+  - prompts: `prompts_full` prompt builders rendering the static text on
+    every call vs. appending the user text to the cached prefix
+  - fast_path: answering template lookups ("checklist for a subpoena")
+    from `fast_answers` vs. just building the model prompt for them (the
+    model call that the fast path also skips is not included), and the
+    matcher's overhead on questions that still go to the model
+  - deadlines: computing docket deadlines one `CourtCalendar.compute` call
+    at a time vs. `compute_batch` over `--rows` rows (ops are rows), and
+    answering a deadline question locally vs. building its model prompt
+    (as for fast_path, the model call itself is not included)
+  - retrieval: prompt size and request latency on a fixed query set with
+    every checklist in the prompt (PROMPT_CONTEXT=full) vs. only the
+    snippets retrieved from `prompts_full.knowledge_index()`; latency is
+    prompt build time plus a modelled prefill cost per prompt token
+
+Usage:
+    python microbench.py users --seconds 2 --users 1000
+    python microbench.py login --seconds 5 --threads 16
+    python microbench.py prompts --seconds 1
+    python microbench.py long_input --threads 8
+    python microbench.py retrieval
+    python microbench.py fast_path
+    python microbench.py deadlines --rows 10000
+    python microbench.py users --output bench_results/users.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+from werkzeug.security import generate_password_hash
+
+
+def measure(fn: Callable[[int], object], seconds: float) -> Dict:
+    """Call `fn(i)` repeatedly for about `seconds` and return the rate."""
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        for _ in range(100):
+            fn(calls)
+            calls += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+    elapsed = now - started
+    return {"calls": calls, "seconds": round(elapsed, 3), "ops_per_sec": round(calls / elapsed, 1)}
+
+
+def measure_concurrent(fn: Callable[[int], object], threads: int, seconds: float) -> Dict:
+    """Call `fn(i)` from `threads` threads for about `seconds`.
+
+    Alongside, a probe thread times a small pure-Python task every 10ms to
+    show how much the load delays other work in the process.
+    """
+    stop = threading.Event()
+    counts = [0] * threads
+    errors = [0] * threads
+    probes: List[float] = []
+
+    def worker(n):
+        while not stop.is_set():
+            try:
+                fn(counts[n])
+                counts[n] += 1
+            except Exception:
+                errors[n] += 1
+
+    def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            json.dumps({"messages": [{"role": "user", "content": "x" * 200}] * 20})
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)] + [threading.Thread(target=probe)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    probes.sort()
+    calls = sum(counts)
+    return {
+        "calls": calls,
+        "errors": sum(errors),
+        "seconds": round(elapsed, 3),
+        "ops_per_sec": round(calls / elapsed, 1),
+        "probe_p50_ms": round(probes[len(probes) // 2] * 1000, 3) if probes else None,
+        "probe_p99_ms": round(probes[int(len(probes) * 0.99)] * 1000, 3) if probes else None,
+    }
+
+
+def _legacy_conn(path: str, schema: List[str]) -> sqlite3.Connection:
+    """The per-call connection + schema check users.py used to do."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    for statement in schema:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def bench_users(args) -> List[Dict]:
+    import users
+
+    workdir = tempfile.mkdtemp(prefix="aibot-microbench-")
+    users.DB_PATH = os.path.join(workdir, "users.db")
+
+    # Seed directly; hashing thousands of passwords is not what we measure
+    password_hash = generate_password_hash("secret", method="pbkdf2:sha256:1")
+    with users._db().transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, 0)",
+            [(f"user{i}", password_hash) for i in range(args.users)],
+        )
+    tokens = [users.generate_token(f"user{i}", "invite") for i in range(min(args.users, 500))]
+    names = [f"user{i}" for i in range(args.users)]
+
+    def legacy_get_user(i):
+        conn = _legacy_conn(users.DB_PATH, users.SCHEMA)
+        conn.execute(
+            "SELECT id, username, password_hash, is_admin FROM users WHERE username = ?", (names[i % len(names)],)
+        ).fetchone()
+        conn.close()
+
+    def legacy_validate_token(i):
+        conn = _legacy_conn(users.DB_PATH, users.SCHEMA)
+        conn.execute(
+            "SELECT username, expires_at FROM tokens WHERE token = ? AND token_type = ?",
+            (tokens[i % len(tokens)], "invite"),
+        ).fetchone()
+        conn.close()
+
+    cases = [
+        ("get_user", "before", legacy_get_user),
+        ("get_user", "after", lambda i: users.get_user(names[i % len(names)])),
+        ("validate_token", "before", legacy_validate_token),
+        ("validate_token", "after", lambda i: users.validate_token(tokens[i % len(tokens)], "invite")),
+        # What login_required does per request to decide if auth is on
+        ("auth_check", "before", lambda i: bool(users.list_users())),
+        ("auth_check", "after", lambda i: users.has_users()),
+    ]
+    results = []
+    for op, variant, fn in cases:
+        result = {"suite": "users", "op": op, "variant": variant}
+        result.update(measure(fn, args.seconds))
+        results.append(result)
+    return results
+
+
+def bench_login(args) -> List[Dict]:
+    import users
+    from login_throttle import LoginThrottle, LoginThrottled
+    from password_hashing import HashPool
+    from werkzeug.security import check_password_hash
+
+    workdir = tempfile.mkdtemp(prefix="aibot-microbench-")
+    users.DB_PATH = os.path.join(workdir, "users.db")
+    # Real (default-strength) hashes: hashing cost is what this suite measures
+    password_hash = generate_password_hash("secret")
+    with users._db().transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, 0)",
+            [(f"user{i}", password_hash) for i in range(args.threads)],
+        )
+    names = [f"user{i}" for i in range(args.threads)]
+    pool = HashPool.from_env()
+
+    def direct_login(i):
+        user = users.get_user(names[i % len(names)])
+        return check_password_hash(user["password_hash"], "secret")
+
+    def pooled_login(i):
+        user = users.get_user(names[i % len(names)])
+        return pool.check_password(user["password_hash"], "secret")
+
+    throttle = LoginThrottle.from_env()
+
+    def direct_guess(i):
+        return check_password_hash(users.get_user("user0")["password_hash"], f"guess{i}")
+
+    def throttled_guess(i):
+        # Distributed brute force: a different source address per guess
+        ip = f"10.0.{i // 256 % 256}.{i % 256}"
+        try:
+            throttle.check("user0", ip)
+        except LoginThrottled:
+            return False
+        ok = pool.check_password(users.get_user("user0")["password_hash"], f"guess{i}")
+        throttle.record("user0", ip, ok)
+        return ok
+
+    cases = [
+        ("login", "before", direct_login),
+        ("login", "after", pooled_login),
+        # Guesses against one account: every guess hashed vs. throttled
+        ("flood_guess", "before", direct_guess),
+        ("flood_guess", "after", throttled_guess),
+    ]
+    results = []
+    for op, variant, fn in cases:
+        result = {"suite": "login", "op": op, "variant": variant, "threads": args.threads}
+        result.update(measure_concurrent(fn, args.threads, args.seconds))
+        results.append(result)
+    results[-1]["hashes"] = pool.get_stats()["completed"]
+    pool.shutdown()
+    return results
+
+
+def _legacy_document_prompt(doc_type: str, jurisdiction: str, user_text: str) -> str:
+    """prompts_full.build_document_prompt as it was before prefix caching."""
+    from prompts_full import DOCUMENT_TEMPLATES, SYSTEM_PROMPT
+
+    parts = [SYSTEM_PROMPT]
+    doc_key = doc_type.lower()
+    if doc_key in DOCUMENT_TEMPLATES:
+        template = DOCUMENT_TEMPLATES[doc_key]
+        parts.append(f"\n## Document Type: {template['title']}\n")
+        parts.append("### Preparation Checklist:")
+        for item in template["checklist"]:
+            parts.append(f"- {item}")
+        if "formatting" in template:
+            parts.append("\n### Formatting Requirements:")
+            for key, value in template["formatting"].items():
+                parts.append(f"- {key}: {value}")
+        if "federal_rules" in template:
+            parts.append("\n### Applicable Rules:")
+            for rule in template["federal_rules"]:
+                parts.append(f"- {rule}")
+    parts.append(f"\n## Jurisdiction: {jurisdiction}")
+    if jurisdiction.lower() == "federal":
+        parts.append("- Use Federal Rules of Civil Procedure (FRCP)")
+        parts.append("- Consider local court rules for your district")
+        parts.append("- E-filing via CM/ECF (or equivalent)")
+    elif "state" in jurisdiction.lower():
+        parts.append("- Verify state rules of civil procedure")
+        parts.append("- Check local county court rules")
+        parts.append("- Verify e-filing availability by court")
+    parts.append(f"\n## User Request / Question:\n{user_text}")
+    parts.append("\n## Instructions:")
+    parts.append("1. Address the user's specific question or request")
+    parts.append("2. Provide step-by-step guidance where applicable")
+    parts.append("3. Reference applicable rules and procedures")
+    parts.append("4. Include practical tips and common pitfalls to avoid")
+    parts.append("5. Always include the mandatory disclaimer")
+    return "\n".join(parts)
+
+
+def _legacy_case_management_prompt(case_info: str) -> str:
+    """prompts_full.build_case_management_prompt as it was before prefix caching."""
+    from prompts_full import DISCOVERY_CHECKLIST, FILING_PROCEDURE_CHECKLIST, SYSTEM_PROMPT
+
+    parts = [SYSTEM_PROMPT]
+    parts.append("\n## Task: Case Management & Organization")
+    parts.append(FILING_PROCEDURE_CHECKLIST)
+    parts.append(DISCOVERY_CHECKLIST)
+    parts.append(f"\n## Case Information Provided:\n{case_info}")
+    parts.append("\n## Instructions:")
+    parts.append("1. Analyze the case information")
+    parts.append("2. Identify key deadlines based on typical litigation timeline")
+    parts.append("3. Create an organized action plan")
+    parts.append("4. Include discovery, motion practice, and trial preparation phases")
+    parts.append("5. Flag items requiring attorney decision")
+    parts.append("\nReminder: " + SYSTEM_PROMPT.split("Mandatory Disclaimer")[1])
+    return "\n".join(parts)
+
+
+def bench_prompts(args) -> List[Dict]:
+    import prompts_full
+
+    doc_types = list(prompts_full.DOCUMENT_TEMPLATES) + ["letter"]
+    jurisdictions = ["Federal", "State"]
+    user_text = "What do I need to file with the complaint, and when is the answer due? " * 4
+
+    def pick(i):
+        return doc_types[i % len(doc_types)], jurisdictions[i // len(doc_types) % len(jurisdictions)]
+
+    cases = [
+        ("document_prompt", "before", lambda i: _legacy_document_prompt(*pick(i), user_text)),
+        ("document_prompt", "after", lambda i: prompts_full.build_document_prompt(*pick(i), user_text, context="full")),
+        ("case_mgmt_prompt", "before", lambda i: _legacy_case_management_prompt(user_text)),
+        ("case_mgmt_prompt", "after", lambda i: prompts_full.build_case_management_prompt(user_text, context="full")),
+    ]
+    results = []
+    for op, variant, fn in cases:
+        result = {"suite": "prompts", "op": op, "variant": variant}
+        result.update(measure(fn, args.seconds))
+        results.append(result)
+    return results
+
+
+def bench_long_input(args) -> List[Dict]:
+    import prompts_full
+    from long_input import LongInputRunner
+    from token_budget import TokenBudget, count_messages
+
+    class LatencyModel:
+        """Stand-in model: 50 ms per call plus 20 us per prompt token."""
+
+        budget = TokenBudget(model_name="gpt-4o-mini")
+
+        def generate(self, prompt, use_cache=True, deadline=None, priority=0):
+            time.sleep(0.05 + count_messages(prompt) * 20e-6)
+            return "Notes: " + "fact " * 150
+
+    # About 100 pages of deposition transcript (roughly 500 tokens per page)
+    page = "".join(
+        f"Q. Please describe what happened at line {line}.\nA. The shipment was inspected and signed for.\n"
+        for line in range(25)
+    )
+    document = page * 100
+    prompt = prompts_full.build_document_messages("discovery_request", "Federal", document)
+    results = []
+    for variant, parallelism in (("before", 1), ("after", args.threads)):
+        runner = LongInputRunner(LatencyModel(), parallelism=parallelism)
+        started = time.perf_counter()
+        runner.run(prompt)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "suite": "long_input", "op": "100_page_map_reduce", "variant": variant, "threads": parallelism,
+            "chunks": runner.get_stats()["chunks"], "seconds": round(elapsed, 3),
+            "ops_per_sec": round(1 / elapsed, 3),
+        })
+    return results
+
+
+# Fixed query set for the retrieval suite: (builder, document type, request text)
+RETRIEVAL_QUERIES = [
+    ("document", "complaint", "When is the answer due?"),
+    ("document", "complaint", "What goes in the caption and who signs under Rule 11?"),
+    ("document", "motion_summary_judgment", "What are the page limits and font?"),
+    ("document", "discovery_request", "How many interrogatories can we serve and when are responses due?"),
+    ("document", "affidavit", "Does the declaration need a notary?"),
+    ("document", "subpoena", "How do I serve a subpoena duces tecum on a bank?"),
+    ("document", "letter", "How do I e-file the motion on CM/ECF?"),
+    ("document", "letter", "Draft a privilege log for the production"),
+    ("case_mgmt", None, "Breach of contract case; we need to schedule depositions of three witnesses"),
+    ("case_mgmt", None, "Complaint served by mail on March 3; plan the answer and initial disclosures"),
+    ("case_mgmt", None, "Opposing counsel produced 4,000 documents; set up review and a privilege log"),
+    ("case_mgmt", None, "We are filing a motion for summary judgment next month in N.D. Ill."),
+]
+
+# Modelled prefill cost: about 20k prompt tokens per second
+PREFILL_SECONDS_PER_TOKEN = 50e-6
+
+
+def bench_retrieval(args) -> List[Dict]:
+    import prompts_full
+    from token_budget import count_messages
+
+    def build(kind, doc_type, text, context):
+        if kind == "document":
+            return prompts_full.build_document_messages(doc_type, "Federal", text, context=context)
+        return prompts_full.build_case_management_messages(text, context=context)
+
+    results = []
+    for kind in ("document", "case_mgmt"):
+        queries = [q for q in RETRIEVAL_QUERIES if q[0] == kind]
+        for variant, context in (("before", "full"), ("after", "retrieve")):
+            tokens = []
+            build_seconds = 0.0
+            started = time.perf_counter()
+            rounds = 0
+            while True:
+                for _, doc_type, text in queries:
+                    build_started = time.perf_counter()
+                    messages = build(kind, doc_type, text, context)
+                    build_seconds += time.perf_counter() - build_started
+                    tokens.append(count_messages(messages))
+                    time.sleep(tokens[-1] * PREFILL_SECONDS_PER_TOKEN)
+                rounds += 1
+                if time.perf_counter() - started >= args.seconds:
+                    break
+            elapsed = time.perf_counter() - started
+            requests = rounds * len(queries)
+            results.append({
+                "suite": "retrieval", "op": f"{kind}_request", "variant": variant, "calls": requests,
+                "seconds": round(elapsed, 3), "ops_per_sec": round(requests / elapsed, 1),
+                "avg_latency_ms": round(elapsed / requests * 1000, 2),
+                "avg_prompt_tokens": round(sum(tokens) / len(tokens), 1),
+                "avg_build_us": round(build_seconds / requests * 1e6, 1),
+            })
+    return results
+
+
+def bench_fast_path(args) -> List[Dict]:
+    import prompts_full
+    from fast_answers import FastAnswers
+
+    answers = FastAnswers()
+    lookups = ["Checklist for a subpoena", "Formatting for a complaint", "Federal rules for an affidavit",
+               "What are the page limits?"]
+    questions = ["Summarize the deposition of the warehouse manager and list inconsistencies",
+                 "Draft a meet-and-confer letter about the late interrogatory responses"]
+    cases = [
+        ("lookup", "before", lambda i: prompts_full.build_document_messages("motion", "Federal", lookups[i % 4])),
+        ("lookup", "after", lambda i: answers.lookup(lookups[i % 4], "motion")),
+        ("matcher_miss", "after", lambda i: answers.lookup(questions[i % 2], "complaint")),
+    ]
+    results = []
+    for op, variant, fn in cases:
+        result = {"suite": "fast_path", "op": op, "variant": variant}
+        result.update(measure(fn, args.seconds))
+        results.append(result)
+    return results
+
+
+def bench_deadlines(args) -> List[Dict]:
+    import random
+    from datetime import date, timedelta
+
+    import prompts_full
+    from fast_answers import FastAnswers
+    from frcp_deadlines import RESPONSE_PERIODS, SERVICE_METHODS, CourtCalendar
+
+    calendar = CourtCalendar()
+    rng = random.Random(0)
+    events = [rng.choice(list(RESPONSE_PERIODS)) for _ in range(args.rows)]
+    services = [rng.choice(list(SERVICE_METHODS)) for _ in range(args.rows)]
+    triggers = [date(2020, 1, 1) + timedelta(days=rng.randrange(3650)) for _ in range(args.rows)]
+
+    results = []
+    for variant, run in [
+        ("before", lambda: [calendar.compute(e, t, s).due for e, t, s in zip(events, triggers, services)]),
+        ("after", lambda: calendar.compute_batch(triggers, events, services)),
+    ]:
+        # Each run covers every row, so time whole runs instead of `measure`'s batches of 100
+        runs = 0
+        started = time.perf_counter()
+        while True:
+            run()
+            runs += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= args.seconds:
+                break
+        results.append({
+            "suite": "deadlines", "op": f"docket_{args.rows}", "variant": variant,
+            "calls": runs * args.rows, "seconds": round(elapsed, 3), "ops_per_sec": round(runs * args.rows / elapsed, 1),
+        })
+
+    answers = FastAnswers()
+    question = "Interrogatories were served by mail on 10/14/2025. When are responses due?"
+    for variant, fn in [
+        ("before", lambda i: prompts_full.build_document_messages("discovery", "Federal", question)),
+        ("after", lambda i: answers.lookup(question, "discovery")),
+    ]:
+        result = {"suite": "deadlines", "op": "question", "variant": variant}
+        result.update(measure(fn, args.seconds))
+        results.append(result)
+    return results
+
+
+SUITES: Dict[str, Callable] = {
+    "deadlines": bench_deadlines,
+    "login": bench_login,
+    "fast_path": bench_fast_path,
+    "long_input": bench_long_input,
+    "prompts": bench_prompts,
+    "retrieval": bench_retrieval,
+    "users": bench_users,
+}
+
+
+def print_results(results: List[Dict]) -> None:
+    print(
+        f"{'op':<22} {'variant':<10} {'ops/sec':>12} {'speedup':>9} {'probe p50/p99 ms':>18} {'prompt tokens':>14}"
+    )
+    before = {}
+    for r in results:
+        speedup = ""
+        if r["variant"] == "before":
+            before[r["op"]] = r["ops_per_sec"]
+        elif r["op"] in before and before[r["op"]]:
+            speedup = f"{r['ops_per_sec'] / before[r['op']]:.1f}x"
+        probe = f"{r['probe_p50_ms']}/{r['probe_p99_ms']}" if r.get("probe_p50_ms") is not None else ""
+        rate = f"{r['ops_per_sec']:,.0f}" if r["ops_per_sec"] >= 100 else f"{r['ops_per_sec']:.2f}"
+        tokens = f"{r['avg_prompt_tokens']:,.0f}" if "avg_prompt_tokens" in r else ""
+        print(f"{r['op']:<22} {r['variant']:<10} {rate:>12} {speedup:>9} {probe:>18} {tokens:>14}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run in-process micro-benchmarks")
+    parser.add_argument("suite", choices=sorted(SUITES))
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per measured operation")
+    parser.add_argument("--users", type=int, default=1000, help="users to seed (users suite)")
+    parser.add_argument("--rows", type=int, default=10000, help="deadlines per batch (deadlines suite)")
+    parser.add_argument(
+        "--threads", type=int, default=16, help="concurrent logins (login suite) or chunk calls (long_input suite)"
+    )
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = SUITES[args.suite](args)
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump({"suite": args.suite, "results": results}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,16 +11,43 @@ from __future__ import annotations
 
 import os
 import json
-import requests
-from typing import Optional
+from typing import Dict, Iterator, Optional
+
+from http_pool import PooledTransport, get_shared_transport
+from prompt_prefix import Prompt, as_messages, flatten
+from rate_limit import PRIORITY_INTERACTIVE, RateLimiter, get_shared_limiter
+from resilience import Deadline, UpstreamGuard
+from response_cache import ResponseCache, cache_key
+from singleflight import SingleFlight
+from token_budget import TokenBudget
 
 
 class ModelClient:
-    def __init__(self, api_token: Optional[str] = None, model_name: Optional[str] = None):
+    def __init__(
+        self,
+        api_token: Optional[str] = None,
+        model_name: Optional[str] = None,
+        transport: Optional[PooledTransport] = None,
+        cache: Optional[ResponseCache] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
         self.api_token = api_token or os.environ.get("GITHUB_MODEL_API_TOKEN")
         self.model_name = model_name or os.environ.get("GITHUB_MODEL_NAME")
+        self.transport = transport or get_shared_transport()
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        # Concurrent identical prompts share one upstream call
+        self.singleflight = SingleFlight()
+        # Retries with backoff, deadline budgeting and circuit breaking
+        self.guard = UpstreamGuard.from_env()
+        # Request/token quotas and interactive-before-bulk admission
+        self.limiter = limiter or get_shared_limiter()
+        self.guard.on_throttle = self.limiter.pause
+        # Context-window check before dispatch
+        self.budget = TokenBudget.from_env(self.model_name)
 
-    def _call_github_model(self, prompt: str) -> str:
+    def _call_github_model(
+        self, prompt: Prompt, deadline: Optional[Deadline] = None, priority: int = PRIORITY_INTERACTIVE
+    ) -> str:
         """Placeholder for actual GitHub models API call.
 
         NOTE: Implement actual API integration according to GitHub's models
@@ -36,20 +63,40 @@ class ModelClient:
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json",
         }
-        payload = {"input": prompt}
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
+        # Oversized prompts fail (or are trimmed) here, before the network call
+        fit = self.budget.fit(as_messages(prompt))
+        self.budget.record(fit)
+        # The placeholder endpoint takes a single text input
+        payload = {"input": flatten(fit.messages)}
+
+        def attempt(timeout):
+            resp = self.transport.post(url, headers=headers, json=payload, timeout=timeout)
+            resp.raise_for_status()
+            return resp.json()
+
+        with self.limiter.slot(priority, fit.prompt_tokens + fit.max_tokens, deadline):
+            data = self.guard.call(attempt, deadline)
         # This depends on actual API shape
         return data.get("output") or json.dumps(data)
 
-    def generate(self, prompt: str) -> str:
-        """Generate a response for the given prompt.
+    def generate(
+        self,
+        prompt: Prompt,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """Generate a response for the given prompt (a string or chat messages).
 
         If no token is provided, return a deterministic mock response for testing.
+        Real responses are served from the response cache when possible; pass
+        `use_cache=False` to force a fresh call. `deadline` bounds the total
+        time spent on the call, retries included. `priority` orders the call
+        against others waiting on the rate limiter (`rate_limit.PRIORITY_*`).
         """
         if not self.api_token:
             # Mock behavior for local testing
+            prompt = flatten(prompt)
             return (
                 "[MOCK RESPONSE] This is a mocked paralegal assistant response. "
                 "Provide a real GITHUB_MODEL_API_TOKEN and GITHUB_MODEL_NAME to enable live calls.\n\n"
@@ -57,4 +104,39 @@ class ModelClient:
             )
 
         # Real call path
-        return self._call_github_model(prompt)
+        key = cache_key(self.model_name, as_messages(prompt))
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        else:
+            self.cache.record_bypass()
+
+        response = self.singleflight.do(key, lambda: self._call_github_model(prompt, deadline, priority))
+        self.cache.set(key, response)
+        return response
+
+    def generate_stream(
+        self,
+        prompt: Prompt,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Iterator[str]:
+        """Generate a response as a sequence of text chunks.
+
+        The placeholder endpoint has no streaming mode, so the complete
+        response is yielded as a single chunk.
+        """
+        yield self.generate(prompt, use_cache=use_cache, deadline=deadline, priority=priority)
+
+    def get_stats(self) -> Dict:
+        """Return runtime statistics for the client and its transport."""
+        return {
+            "http_pool": self.transport.get_stats(),
+            "response_cache": self.cache.get_stats(),
+            "singleflight": self.singleflight.get_stats(),
+            "resilience": self.guard.get_stats(),
+            "rate_limit": self.limiter.get_stats(),
+            "token_budget": self.budget.get_stats(),
+        }
@@ -0,0 +1,350 @@
+"""Asyncio-native GitHub Models API client.
+
+`AsyncModelClient` has the same `generate` / `generate_stream` contract as
+`model_client_real.ModelClient`, except that both are awaitable and the
+stream is an async iterator. Requests are built, cached, coalesced and
+mocked exactly as in the sync client: concurrent identical `generate`
+calls share one upstream request (`singleflight.AsyncSingleFlight`), and
+the SQLite-backed response cache is read and written in a worker thread
+(`asyncio.to_thread`) so it never blocks an event loop.
+
+All network I/O runs on a private event loop owned by the client, so one
+httpx connection pool is shared no matter which loop or thread the caller
+awaits from (Flask runs each async view on its own short-lived loop).
+This is a client-side change only: the app is still served over WSGI, so
+under Flask every in-flight request occupies a worker thread while it
+awaits and concurrency stays bounded by the server's threads. Only an
+asyncio-native caller (a script, a worker, or an ASGI app) can keep many
+generations in flight without a thread each.
+Retries, deadlines and circuit breaking follow `resilience.UpstreamGuard`,
+and admission goes through the same shared `rate_limit.RateLimiter` as the
+sync client, awaited without blocking the loop.
+
+Pool sizing comes from environment variables:
+  - MODEL_ASYNC_MAX_CONNECTIONS: max concurrent upstream connections
+    (default: 200)
+  - MODEL_HTTP_POOL_MAXSIZE: idle keep-alive connections to retain
+    (default: 32, shared with `http_pool`)
+
+Requires the optional `httpx` dependency: `pip install paralegal-agent[async]`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from typing import AsyncIterator, Dict, Optional
+
+from model_client_real import DEFAULT_ENDPOINT, ChatRequest, ModelClient
+from prompt_prefix import PrefixStats, Prompt
+from rate_limit import PRIORITY_INTERACTIVE, RateLimiter, get_shared_limiter
+from resilience import Deadline, UpstreamGuard
+from response_cache import ResponseCache
+from singleflight import AsyncSingleFlight
+from streaming import iter_completion_deltas, split_for_streaming
+from token_budget import TokenBudget
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class AsyncModelClient:
+    """Awaitable client for GitHub-hosted models via the Azure inference endpoint."""
+
+    # Request construction, cache keys and mock answers are shared with the
+    # sync client so both produce identical payloads and cache entries.
+    _build_request = ModelClient._build_request
+    _cache_key = ModelClient._cache_key
+    _estimate_tokens = ModelClient._estimate_tokens
+    _mock_response = ModelClient._mock_response
+
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        """Initialize with GitHub Models API token and model name.
+
+        Args:
+            cache: Response cache placed in front of `generate`. Defaults to
+                one configured from the MODEL_CACHE_* environment variables.
+            max_connections: Upper bound on concurrent upstream connections.
+            max_keepalive: Idle connections kept open for reuse.
+            limiter: Admission control for upstream calls. Defaults to the
+                process-wide limiter shared with the sync client.
+        """
+        try:
+            import httpx
+        except ImportError as exc:
+            raise ImportError(
+                "AsyncModelClient requires httpx; install with `pip install paralegal-agent[async]`"
+            ) from exc
+        self._httpx = httpx
+
+        self.api_token = os.environ.get("GITHUB_MODEL_API_TOKEN")
+        self.model_name = os.environ.get("GITHUB_MODEL_NAME", "gpt-4o-mini")
+        self.endpoint = os.environ.get("GITHUB_MODEL_ENDPOINT", DEFAULT_ENDPOINT)
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.max_connections = max_connections or int(os.environ.get("MODEL_ASYNC_MAX_CONNECTIONS", 200))
+        self.max_keepalive = max_keepalive or int(os.environ.get("MODEL_HTTP_POOL_MAXSIZE", 32))
+
+        self.guard = UpstreamGuard.from_env()
+        self.limiter = limiter or get_shared_limiter()
+        self.guard.on_throttle = self.limiter.pause
+        self.mock_fallback = os.environ.get("MODEL_MOCK_FALLBACK", "false").lower() == "true"
+        self.stream_usage = os.environ.get("MODEL_STREAM_INCLUDE_USAGE", "true").lower() == "true"
+        self.prefix_stats = PrefixStats.from_env()
+        self.budget = TokenBudget.from_env(self.model_name)
+        # Only used on the client loop
+        self.singleflight = AsyncSingleFlight()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+        if not self.api_token:
+            logger.warning("GITHUB_MODEL_API_TOKEN not set; will use mock responses for testing")
+
+    def _client_loop(self) -> asyncio.AbstractEventLoop:
+        """Return the client's private event loop, starting it on first use."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-model-client", daemon=True).start()
+                limits = self._httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                )
+                self._http = self._httpx.AsyncClient(limits=limits, timeout=30)
+                self._loop = loop
+            return self._loop
+
+    async def _run(self, coro):
+        """Run a coroutine on the client loop and await it from the caller's loop."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._client_loop())
+        return await asyncio.wrap_future(future)
+
+    def _track(self, delta: int) -> None:
+        with self._lock:
+            self.in_flight += delta
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    async def generate(
+        self,
+        prompt: Prompt,
+        system_role: Optional[str] = None,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """
+        Generate a response using the GitHub model.
+
+        Args:
+            prompt: The user prompt/question, or a list of chat messages
+            system_role: Optional system role message
+            use_cache: Set to False to skip the response cache for this call
+            deadline: Overall time budget for the call, including retries
+            priority: Admission priority (`rate_limit.PRIORITY_*`)
+
+        Returns:
+            Model response text
+        """
+        if not self.api_token:
+            return self._mock_response(prompt)
+
+        chat = self._build_request(prompt, system_role)
+        key = self._cache_key(chat)
+        if use_cache:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+        else:
+            self.cache.record_bypass()
+
+        try:
+            response = await self._run(
+                self.singleflight.do(key, lambda: self._call_github_model(chat, deadline, priority))
+            )
+        except Exception as exc:
+            if not self.mock_fallback:
+                logger.error(f"GitHub Models API error: {exc}")
+                raise
+            logger.error(f"GitHub Models API error: {exc}; falling back to mock")
+            return self._mock_response(prompt)
+
+        await asyncio.to_thread(self.cache.set, key, response)
+        return response
+
+    async def generate_stream(
+        self,
+        prompt: Prompt,
+        system_role: Optional[str] = None,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        """
+        Generate a response chunk by chunk as the model produces it.
+
+        Args:
+            prompt: The user prompt/question, or a list of chat messages
+            system_role: Optional system role message
+            use_cache: Set to False to skip the response cache for this call
+            deadline: Time budget for opening the stream, including retries
+            priority: Admission priority (`rate_limit.PRIORITY_*`)
+
+        Yields:
+            Text chunks of the model response, in order
+        """
+        if not self.api_token:
+            for chunk in split_for_streaming(self._mock_response(prompt)):
+                yield chunk
+            return
+
+        chat = self._build_request(prompt, system_role, stream=True)
+        key = self._cache_key(chat)
+        if use_cache:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                for chunk in split_for_streaming(cached):
+                    yield chunk
+                return
+        else:
+            self.cache.record_bypass()
+
+        # Chunks are produced on the client loop and handed to the caller's
+        # loop through a queue.
+        caller_loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for chunk in self._stream_github_model(chat, deadline, priority):
+                    caller_loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            except Exception as exc:
+                caller_loop.call_soon_threadsafe(queue.put_nowait, exc)
+            caller_loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+        producer = asyncio.run_coroutine_threadsafe(produce(), self._client_loop())
+        chunks = []
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    if chunks or not self.mock_fallback:
+                        logger.error(f"GitHub Models API stream failed: {item}")
+                        raise item
+                    logger.error(f"GitHub Models API error: {item}; falling back to mock")
+                    for chunk in split_for_streaming(self._mock_response(prompt)):
+                        yield chunk
+                    return
+                chunks.append(item)
+                yield item
+        finally:
+            # Stops the upstream request if the consumer goes away early
+            producer.cancel()
+
+        await asyncio.to_thread(self.cache.set, key, "".join(chunks))
+
+    async def _call_github_model(
+        self,
+        chat: ChatRequest,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """Make the chat-completions call on the client loop."""
+        headers, payload, fit = chat
+        self.budget.record(fit)
+
+        async def attempt(timeout):
+            self._track(1)
+            try:
+                response = await self._http.post(self.endpoint, headers=headers, json=payload, timeout=timeout)
+            finally:
+                self._track(-1)
+            response.raise_for_status()
+            return response.json()
+
+        self.prefix_stats.record_request(payload["messages"])
+        async with self.limiter.aslot(priority, self._estimate_tokens(fit), deadline):
+            result = await self.guard.acall(attempt, deadline)
+        self.prefix_stats.record_usage(result.get("usage"))
+
+        if "choices" in result and len(result["choices"]) > 0:
+            return result["choices"][0]["message"]["content"]
+
+        raise ValueError(f"Unexpected API response format: {result}")
+
+    async def _stream_github_model(
+        self,
+        chat: ChatRequest,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        """Make a streaming call on the client loop and yield content deltas."""
+        headers, payload, fit = chat
+        self.budget.record(fit)
+
+        async def attempt(timeout):
+            request = self._http.build_request("POST", self.endpoint, headers=headers, json=payload, timeout=timeout)
+            response = await self._http.send(request, stream=True)
+            if response.is_error:
+                await response.aclose()
+                response.raise_for_status()
+            return response
+
+        # The admission slot is held until the stream ends. Retries cover
+        # opening the stream; a stream that breaks midway is not replayed.
+        self.prefix_stats.record_request(payload["messages"])
+        async with self.limiter.aslot(priority, self._estimate_tokens(fit), deadline):
+            self._track(1)
+            try:
+                response = await self.guard.acall(attempt, deadline)
+                try:
+                    async for line in response.aiter_lines():
+                        if line.strip() == "data: [DONE]":
+                            break
+                        for content in iter_completion_deltas([line], on_usage=self.prefix_stats.record_usage):
+                            yield content
+                finally:
+                    await response.aclose()
+            finally:
+                self._track(-1)
+
+    def get_stats(self) -> Dict:
+        """Return runtime statistics for the client and its connection pool."""
+        with self._lock:
+            pool = {
+                "max_connections": self.max_connections,
+                "max_keepalive": self.max_keepalive,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+            }
+        return {
+            "async_http_pool": pool,
+            "response_cache": self.cache.get_stats(),
+            "singleflight": self.singleflight.get_stats(),
+            "resilience": self.guard.get_stats(),
+            "rate_limit": self.limiter.get_stats(),
+            "prompt_prefix": self.prefix_stats.get_stats(),
+            "token_budget": self.budget.get_stats(),
+        }
+
+    def close(self) -> None:
+        """Close the connection pool and stop the client loop."""
+        with self._lock:
+            loop, http = self._loop, self._http
+            self._loop = self._http = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(http.aclose(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
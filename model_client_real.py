@@ -1,99 +1,279 @@
-"""GitHub Models API client for real Azure inference endpoint integration."""
+"""GitHub Models API client for real Azure inference endpoint integration.
+
+Upstream failures are retried and circuit-broken by `resilience.UpstreamGuard`.
+Once retries are exhausted `resilience.RetriesExhausted` is raised to the
+caller (the API reports it as 503); set
+MODEL_MOCK_FALLBACK=true to get the old behaviour of answering with a mock
+response instead.
+
+Calls are admitted through the shared `rate_limit.RateLimiter`, which keeps
+us under the endpoint's request/token quotas and serves interactive callers
+before bulk ones.
+
+Prompts may be plain strings or chat message lists from the prompt
+builders' `build_*_messages`; messages are sent system-first with the user
+text last so the endpoint's prompt cache can reuse the shared prefix.
+`get_stats()["prompt_prefix"]` reports how often that prefix repeats and
+the cached-token counts the endpoint returns (see `prompt_prefix`). Set
+MODEL_STREAM_INCLUDE_USAGE=false for endpoints that reject
+`stream_options`.
+
+Each request is measured locally before dispatch (see `token_budget`):
+`max_tokens` is sized to the room left in the model's context window, and
+a prompt that does not fit raises `token_budget.PromptTooLarge` (or is
+trimmed, with MODEL_PROMPT_OVERFLOW=trim) without a network round-trip.
+"""
 import os
 import json
 import logging
-from typing import Optional
-import requests
+import re
+from datetime import date
+from typing import Dict, Iterator, NamedTuple, Optional
+
+from frcp_deadlines import RESPONSE_PERIODS, CourtCalendar, format_date
+from http_pool import PooledTransport, get_shared_transport
+from prompt_prefix import PrefixStats, Prompt, as_messages, flatten
+from rate_limit import PRIORITY_INTERACTIVE, RateLimiter, get_shared_limiter
+from resilience import Deadline, UpstreamGuard
+from response_cache import ResponseCache, cache_key
+from singleflight import SingleFlight
+from streaming import iter_completion_deltas, split_for_streaming
+from token_budget import Fit, TokenBudget
 
 logger = logging.getLogger(__name__)
 
+# Override with GITHUB_MODEL_ENDPOINT, e.g. to target `fake_model_server`
+DEFAULT_ENDPOINT = "https://models.inference.ai.azure.com/chat/completions"
+
+# Payload fields that only change how the reply is delivered, not what it says
+_DELIVERY_FIELDS = ("model", "messages", "stream", "stream_options")
+
+
+class ChatRequest(NamedTuple):
+    """A chat-completions call ready to send: headers, JSON payload and token budget fit."""
+    headers: Dict
+    payload: Dict
+    fit: Fit
+
 
 class ModelClient:
     """Client for calling GitHub-hosted models via Azure inference endpoint."""
 
-    def __init__(self):
-        """Initialize with GitHub Models API token and model name."""
+    def __init__(
+        self,
+        transport: Optional[PooledTransport] = None,
+        cache: Optional[ResponseCache] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        """Initialize with GitHub Models API token and model name.
+
+        Args:
+            transport: HTTP transport to use. Defaults to the process-wide
+                pooled transport so connections are reused across threads.
+            cache: Response cache placed in front of `generate`. Defaults to
+                one configured from the MODEL_CACHE_* environment variables.
+            limiter: Admission control for upstream calls. Defaults to the
+                process-wide limiter configured from the environment.
+        """
         self.api_token = os.environ.get("GITHUB_MODEL_API_TOKEN")
         self.model_name = os.environ.get("GITHUB_MODEL_NAME", "gpt-4o-mini")
-        self.endpoint = "https://models.inference.ai.azure.com/chat/completions"
+        self.endpoint = os.environ.get("GITHUB_MODEL_ENDPOINT", DEFAULT_ENDPOINT)
+        self.transport = transport or get_shared_transport()
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        # Concurrent identical prompts share one upstream call
+        self.singleflight = SingleFlight()
+        self.guard = UpstreamGuard.from_env()
+        self.limiter = limiter or get_shared_limiter()
+        self.guard.on_throttle = self.limiter.pause
+        self.mock_fallback = os.environ.get("MODEL_MOCK_FALLBACK", "false").lower() == "true"
+        self.stream_usage = os.environ.get("MODEL_STREAM_INCLUDE_USAGE", "true").lower() == "true"
+        # Prefix reuse and provider-side cached tokens
+        self.prefix_stats = PrefixStats.from_env()
+        # Context-window check and max_tokens sizing, before dispatch
+        self.budget = TokenBudget.from_env(self.model_name)
         
         if not self.api_token:
             logger.warning("GITHUB_MODEL_API_TOKEN not set; will use mock responses for testing")
 
-    def generate(self, prompt: str, system_role: Optional[str] = None) -> str:
+    def generate(
+        self,
+        prompt: Prompt,
+        system_role: Optional[str] = None,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
         """
         Generate a response using the GitHub model.
         
         Args:
-            prompt: The user prompt/question
+            prompt: The user prompt/question, or a list of chat messages
             system_role: Optional system role message. If not included in prompt, used here.
+            use_cache: Set to False to skip the response cache for this call
+            deadline: Overall time budget for the call, including retries
+            priority: Admission priority (`rate_limit.PRIORITY_*`)
             
         Returns:
             Model response text
+            
+        Raises:
+            resilience.UpstreamUnavailable: If the circuit is open, the deadline runs out
+                or the call cannot be admitted under the rate limits in time
+            token_budget.PromptTooLarge: If the prompt does not fit the model's context budget
+            Exception: If the API call fails after retries (unless MODEL_MOCK_FALLBACK is set)
         """
         if not self.api_token:
             return self._mock_response(prompt)
 
+        chat = self._build_request(prompt, system_role)
+        key = self._cache_key(chat)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        else:
+            self.cache.record_bypass()
+
         try:
-            return self._call_github_model(prompt, system_role)
+            response = self.singleflight.do(key, lambda: self._call_github_model(chat, deadline, priority))
         except Exception as exc:
+            if not self.mock_fallback:
+                logger.error(f"GitHub Models API error: {exc}")
+                raise
             logger.error(f"GitHub Models API error: {exc}; falling back to mock")
             return self._mock_response(prompt)
 
-    def _call_github_model(self, prompt: str, system_role: Optional[str] = None) -> str:
+        self.cache.set(key, response)
+        return response
+
+    def generate_stream(
+        self,
+        prompt: Prompt,
+        system_role: Optional[str] = None,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Iterator[str]:
         """
-        Make actual HTTP call to GitHub Models API endpoint.
+        Generate a response chunk by chunk as the model produces it.
         
         Args:
-            prompt: User message/prompt
-            system_role: System message (paralegal role, context, etc.)
-            
-        Returns:
-            Response text from model
+            prompt: The user prompt/question, or a list of chat messages
+            system_role: Optional system role message
+            use_cache: Set to False to skip the response cache for this call
+            deadline: Time budget for opening the stream, including retries
+            priority: Admission priority (`rate_limit.PRIORITY_*`)
             
+        Yields:
+            Text chunks of the model response, in order
+        """
+        if not self.api_token:
+            yield from split_for_streaming(self._mock_response(prompt))
+            return
+
+        chat = self._build_request(prompt, system_role, stream=True)
+        key = self._cache_key(chat)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield from split_for_streaming(cached)
+                return
+        else:
+            self.cache.record_bypass()
+
+        chunks = []
+        try:
+            for chunk in self._stream_github_model(chat, deadline, priority):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as exc:
+            if chunks or not self.mock_fallback:
+                # Never splice mock text onto a partly delivered answer
+                logger.error(f"GitHub Models API stream failed: {exc}")
+                raise
+            logger.error(f"GitHub Models API error: {exc}; falling back to mock")
+            yield from split_for_streaming(self._mock_response(prompt))
+            return
+
+        self.cache.set(key, "".join(chunks))
+
+    def _build_request(self, prompt: Prompt, system_role: Optional[str] = None, stream: bool = False) -> ChatRequest:
+        """Build the headers, JSON payload and token budget fit for a chat-completions call.
+
         Raises:
-            Exception: If API call fails
+            token_budget.PromptTooLarge: If the prompt does not fit the model's context budget
         """
         headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json",
         }
 
-        messages = []
-        
-        # If system_role is provided separately, add it as a system message
-        if system_role:
-            messages.append({
-                "role": "system",
-                "content": system_role
-            })
-        
-        # Add user prompt
-        messages.append({
-            "role": "user",
-            "content": prompt
-        })
-
+        # System messages first, user text last: a stable, cacheable prefix
+        fit = self.budget.fit(as_messages(prompt, system_role))
         payload = {
             "model": self.model_name,
-            "messages": messages,
+            "messages": fit.messages,
             "temperature": 0.7,
-            "max_tokens": 2048,
+            "max_tokens": fit.max_tokens,
             "top_p": 1.0
         }
+        if stream:
+            headers["Accept"] = "text/event-stream"
+            payload["stream"] = True
+            if self.stream_usage:
+                payload["stream_options"] = {"include_usage": True}
+
+        return ChatRequest(headers, payload, fit)
+
+    def _estimate_tokens(self, fit: Fit) -> int:
+        """Estimate the quota a request uses: prompt tokens plus the completion budget."""
+        return fit.prompt_tokens + fit.max_tokens
+
+    def _cache_key(self, chat: ChatRequest) -> str:
+        """Return the response-cache key for a built request (streamed or not)."""
+        params = {k: v for k, v in chat.payload.items() if k not in _DELIVERY_FIELDS}
+        return cache_key(self.model_name, chat.payload["messages"], params)
+
+    def _call_github_model(
+        self,
+        chat: ChatRequest,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """
+        Make actual HTTP call to GitHub Models API endpoint.
+        
+        Args:
+            chat: The request built by `_build_request`
+            deadline: Overall time budget, shared by all retry attempts
+            priority: Admission priority while waiting on the rate limiter
+            
+        Returns:
+            Response text from model
+            
+        Raises:
+            Exception: If API call fails
+        """
+        headers, payload, fit = chat
+        self.budget.record(fit)
 
         logger.info(f"Calling GitHub Models API endpoint: {self.endpoint}")
         logger.info(f"Using model: {self.model_name}")
 
-        response = requests.post(
-            self.endpoint,
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        result = response.json()
+        def attempt(timeout):
+            response = self.transport.post(
+                self.endpoint,
+                headers=headers,
+                json=payload,
+                timeout=timeout
+            )
+            response.raise_for_status()
+            return response.json()
+
+        self.prefix_stats.record_request(payload["messages"])
+        with self.limiter.slot(priority, self._estimate_tokens(fit), deadline):
+            result = self.guard.call(attempt, deadline)
+        self.prefix_stats.record_usage(result.get("usage"))
         
         # Extract message content from response
         if "choices" in result and len(result["choices"]) > 0:
@@ -101,16 +281,73 @@ class ModelClient:
         
         raise ValueError(f"Unexpected API response format: {result}")
 
-    def _mock_response(self, prompt: str) -> str:
+    def _stream_github_model(
+        self,
+        chat: ChatRequest,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Iterator[str]:
+        """
+        Make a streaming HTTP call and yield content deltas from the SSE body.
+        
+        Raises:
+            Exception: If API call fails
+        """
+        headers, payload, fit = chat
+        self.budget.record(fit)
+
+        logger.info(f"Streaming from GitHub Models API endpoint: {self.endpoint}")
+
+        def attempt(timeout):
+            response = self.transport.post(
+                self.endpoint,
+                headers=headers,
+                json=payload,
+                timeout=timeout,
+                stream=True
+            )
+            try:
+                response.raise_for_status()
+            except Exception:
+                response.close()
+                raise
+            return response
+
+        # The admission slot is held until the stream ends. Retries cover
+        # opening the stream; a stream that breaks midway is not replayed.
+        self.prefix_stats.record_request(payload["messages"])
+        with self.limiter.slot(priority, self._estimate_tokens(fit), deadline):
+            response = self.guard.call(attempt, deadline)
+            try:
+                # Raw byte lines: without a charset, requests would decode
+                # text/event-stream as ISO-8859-1; iter_sse_data decodes UTF-8
+                yield from iter_completion_deltas(response.iter_lines(), on_usage=self.prefix_stats.record_usage)
+            finally:
+                response.close()
+
+    def get_stats(self) -> Dict:
+        """Return runtime statistics for the client and its transport."""
+        return {
+            "http_pool": self.transport.get_stats(),
+            "response_cache": self.cache.get_stats(),
+            "singleflight": self.singleflight.get_stats(),
+            "resilience": self.guard.get_stats(),
+            "rate_limit": self.limiter.get_stats(),
+            "prompt_prefix": self.prefix_stats.get_stats(),
+            "token_budget": self.budget.get_stats(),
+        }
+
+    def _mock_response(self, prompt: Prompt) -> str:
         """
         Return a mock response for testing without API token.
         
         Args:
-            prompt: User prompt
+            prompt: User prompt or chat messages
             
         Returns:
             Simulated paralegal response
         """
+        prompt = flatten(prompt)
         if "complaint" in prompt.lower():
             return """[MOCK RESPONSE - DEVELOP ONLY]
 
@@ -162,25 +399,7 @@ Pursuant to Fed. R. Civ. P. 34, Plaintiff requests production of:
 """
         
         elif "deadline" in prompt.lower() or "rule 6" in prompt.lower():
-            return """[MOCK RESPONSE - DEVELOP ONLY]
-
-FEDERAL RULE OF CIVIL PROCEDURE 6 - TIMING DEADLINES
-
-1. CALCULATING TIME:
-   - Exclude the day the event happens
-   - Include the last day if it's a weekday
-   - If deadline falls on weekend/holiday, next business day counts as the deadline
-
-2. COMMON DEADLINES:
-   - Response to pleading: 21 days
-   - Motion response: 14 days
-   - Discovery response: 30 days (interrogatories, requests for production)
-   - Deposition notice: 14 days (except expert witnesses: 21 days)
-
-EXAMPLE: If Complaint served Monday, Jan 8, Response due by 5 PM Friday, Jan 29.
-
-⚠️ DISCLAIMER: Verify applicable local rules and any court orders modifying these deadlines.
-"""
+            return _mock_deadline_response(prompt)
         
         else:
             return f"""[MOCK RESPONSE - DEVELOP ONLY]
@@ -204,3 +423,36 @@ All responses require attorney review before use.
 
 ⚠️ DISCLAIMER: This is a template only. All work requires attorney supervision and review.
 """
+
+
+def _mock_deadline_response(prompt: str) -> str:
+    """Mock Rule 6 explanation; dates come from `frcp_deadlines`, never from the mock."""
+    computed = re.search(r"^\*\*Due: (.+)\*\*$", prompt, re.MULTILINE)
+    periods = "\n".join(
+        f"   - {RESPONSE_PERIODS[event].description}: {RESPONSE_PERIODS[event].days} days ({RESPONSE_PERIODS[event].rule})"
+        for event in ("answer", "interrogatory_responses", "production_responses", "admission_responses")
+    )
+    served = date(2024, 1, 8)
+    example = CourtCalendar().compute("answer", served)
+    lines = [
+        "[MOCK RESPONSE - DEVELOP ONLY]",
+        "",
+        "FEDERAL RULE OF CIVIL PROCEDURE 6 - TIMING DEADLINES",
+        "",
+    ]
+    if computed:
+        lines += [f"COMPUTED DEADLINE: {computed.group(1)}", ""]
+    lines += [
+        "1. CALCULATING TIME:",
+        "   - Exclude the day the event happens and count every day, including weekends and holidays",
+        "   - If the last day is a Saturday, Sunday or legal holiday, the period runs to the next day that is not",
+        "   - Service by mail adds 3 days after the period would otherwise expire (Rule 6(d))",
+        "",
+        "2. COMMON DEADLINES:",
+        periods,
+        "",
+        f"EXAMPLE: If the complaint is served {format_date(served)}, the answer is due {format_date(example.due)}.",
+        "",
+        "⚠️ DISCLAIMER: Verify applicable local rules and any court orders modifying these deadlines.",
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,209 @@
+"""Bounded worker pool for password hashing.
+
+Werkzeug's scrypt/pbkdf2 hashes take tens of milliseconds of CPU each. Run
+on the request thread, a login spike or a bulk user creation ties up every
+core and starves the threads serving model requests. `HashPool` runs the
+hashes on a small, fixed set of workers instead:
+  - at most `workers` hashes run at once, however many requests arrive;
+  - at most `max_pending` hashes may be running or queued; beyond that a
+    call fails at once with `HashingBusy`;
+  - a hash that has waited in the queue longer than `max_queue_seconds` is
+    dropped without being computed and also raises `HashingBusy`, so a
+    backlog cannot turn into minutes of stale work.
+
+hashlib releases the GIL while hashing, so the default thread workers run
+in parallel; process workers are available for deployments that want the
+hashing isolated from the web process entirely.
+
+Configuration comes from environment variables:
+  - PASSWORD_HASH_WORKERS: concurrent hashes; 0 hashes on the calling
+    thread (default: 2)
+  - PASSWORD_HASH_MAX_PENDING: hashes running or queued before new ones
+    are rejected (default: 64)
+  - PASSWORD_HASH_MAX_QUEUE_SECONDS: longest a hash may wait for a worker
+    (default: 5)
+  - PASSWORD_HASH_EXECUTOR: "thread" or "process" (default: thread)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(RuntimeError):
+    """The hashing pool is saturated; the caller should retry later."""
+
+
+_HEX_RE = re.compile(r"[0-9a-f]+")
+
+
+def is_password_hash(value: str) -> bool:
+    """Whether `value` is a hash werkzeug's `check_password_hash` can read.
+
+    Checks the "method$salt$hash" format and the method's parameters
+    without hashing anything, so it is cheap enough for bulk imports.
+    """
+    parts = value.split("$", 2)
+    if len(parts) != 3 or not parts[1] or not _HEX_RE.fullmatch(parts[2]):
+        return False
+    method, *args = parts[0].split(":")
+    if method == "scrypt":
+        if not args:
+            return True
+        if len(args) != 3 or not all(arg.isdigit() for arg in args):
+            return False
+        n, r, p = map(int, args)
+        return n > 1 and n & (n - 1) == 0 and r > 0 and p > 0
+    if method == "pbkdf2":
+        if len(args) > 2 or (args and args[0] not in hashlib.algorithms_available):
+            return False
+        return len(args) < 2 or (args[1].isdigit() and int(args[1]) > 0)
+    return False
+
+
+def _run_if_fresh(fn: Callable, enqueued_at: float, max_queue_seconds: float, *args):
+    """Worker-side wrapper: skip work that waited too long for a worker.
+
+    Returns (queue_wait, hash_seconds, result). Uses wall-clock time so it
+    is comparable across processes.
+    """
+    started = time.time()
+    waited = started - enqueued_at
+    if max_queue_seconds and waited > max_queue_seconds:
+        raise HashingBusy(f"Password hash waited {waited:.1f}s for a worker")
+    result = fn(*args)
+    return waited, time.time() - started, result
+
+
+class HashPool:
+    """Runs password hashes on a bounded executor with admission control."""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_pending: int = 64,
+        max_queue_seconds: float = 5,
+        executor: str = "thread",
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown hash executor: {executor}")
+        self.workers = workers
+        self.max_pending = max(max_pending, workers)
+        self.max_queue_seconds = max_queue_seconds
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._hash_total = 0.0
+
+    @classmethod
+    def from_env(cls) -> "HashPool":
+        return cls(
+            workers=int(os.environ.get("PASSWORD_HASH_WORKERS", 2)),
+            max_pending=int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64)),
+            max_queue_seconds=float(os.environ.get("PASSWORD_HASH_MAX_QUEUE_SECONDS", 5)),
+            executor=os.environ.get("PASSWORD_HASH_EXECUTOR", "thread"),
+        )
+
+    def _get_executor(self) -> Executor:
+        """Executor for this process. Lock held."""
+        if self._executor is None or self._pid != os.getpid():
+            # Worker threads/processes do not survive a fork; start fresh
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            self._pid = os.getpid()
+        return self._executor
+
+    def run(self, fn: Callable, *args):
+        """Run `fn(*args)` on a worker and return its result.
+
+        Raises:
+            HashingBusy: if too many hashes are pending or this one waited
+                longer than `max_queue_seconds` for a worker.
+        """
+        if self.workers <= 0:
+            return fn(*args)
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusy(f"{self.pending} password hashes already pending")
+            self.pending += 1
+            self.submitted += 1
+            try:
+                future = self._get_executor().submit(_run_if_fresh, fn, time.time(), self.max_queue_seconds, *args)
+            except Exception:
+                self.pending -= 1
+                raise
+        try:
+            waited, hash_seconds, result = future.result()
+        except HashingBusy:
+            with self._lock:
+                self.expired += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+        with self._lock:
+            self.completed += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._hash_total += hash_seconds
+        return result
+
+    def hash_password(self, password: str) -> str:
+        return self.run(generate_password_hash, password)
+
+    def check_password(self, password_hash: str, password: str) -> bool:
+        return self.run(check_password_hash, password_hash, password)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "executor": self.executor_kind,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "queue_wait_avg": (self._wait_total / self.completed) if self.completed else 0.0,
+                "queue_wait_max": self._wait_max,
+                "hash_seconds_avg": (self._hash_total / self.completed) if self.completed else 0.0,
+            }
+
+
+_shared_pool: Optional[HashPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_hash_pool() -> HashPool:
+    """Process-wide pool shared by every caller that hashes passwords."""
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_lock:
+            if _shared_pool is None:
+                _shared_pool = HashPool.from_env()
+    return _shared_pool
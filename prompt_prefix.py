@@ -0,0 +1,155 @@
+"""Cache-friendly chat message layout and prefix-reuse accounting.
+
+Providers with automatic prompt caching (OpenAI-compatible endpoints such as
+GitHub Models) reuse work for the longest request prefix they have seen
+recently, byte for byte. The prompt builders therefore return structured
+messages laid out from most to least stable:
+
+  1. the system message (the persona, identical for every request);
+  2. the static template block (headings and instructions for one document
+     type and jurisdiction, or the full checklists with PROMPT_CONTEXT=full);
+  3. the variable user content, last: reference material retrieved for the
+     request (see `knowledge_index`), then the user's text.
+
+The system messages are the static prefix. `as_messages` normalises a
+prompt (plain string or message list) into that order for the clients, and
+`PrefixStats` records how often the static prefix of a request repeats one
+sent recently, together with the cached-token counts the endpoint reports
+in `usage`.
+
+Configuration comes from environment variables:
+  - PROMPT_PREFIX_WINDOW_SECONDS: how recently a prefix must have been sent
+    to count as reused; roughly the provider's cache lifetime (default: 600)
+  - PROMPT_PREFIX_MAX_TRACKED: distinct prefixes remembered (default: 1024)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+Message = Dict[str, str]
+Prompt = Union[str, List[Message]]
+
+
+def as_messages(prompt: Prompt, system_role: Optional[str] = None) -> List[Message]:
+    """Return `prompt` as a chat message list with system messages first.
+
+    A plain string becomes a single user message. `system_role` is prepended
+    unless the messages already carry a system message. The sort is stable,
+    so the builders' own order within each role is kept.
+    """
+    if isinstance(prompt, str):
+        messages = [{"role": "user", "content": prompt}]
+    else:
+        messages = [dict(m) for m in prompt]
+    if system_role and not any(m["role"] == "system" for m in messages):
+        messages.insert(0, {"role": "system", "content": system_role})
+    return sorted(messages, key=lambda m: m["role"] != "system")
+
+
+def flatten(prompt: Prompt) -> str:
+    """Join a message list back into one text (for mock answers and logs)."""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n\n".join(m["content"] for m in prompt)
+
+
+def prefix_key(messages: List[Message]) -> Optional[str]:
+    """Hash of the leading system messages, or None if the request has none.
+
+    Only the system messages are static; everything from the first user
+    message on (retrieved references, the user's text) varies per request.
+    """
+    count = 0
+    while count < len(messages) - 1 and messages[count]["role"] == "system":
+        count += 1
+    if not count:
+        return None
+    canonical = json.dumps(messages[:count], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cached_tokens(usage: Optional[Dict]) -> Optional[int]:
+    """Cached prompt tokens reported in a `usage` block, if the endpoint reports them."""
+    if not usage:
+        return None
+    details = usage.get("prompt_tokens_details") or {}
+    if details.get("cached_tokens") is not None:
+        return int(details["cached_tokens"])
+    if usage.get("cache_read_input_tokens") is not None:
+        return int(usage["cache_read_input_tokens"])
+    return None
+
+
+class PrefixStats:
+    """Thread-safe counters for prefix reuse and provider-side cache hits."""
+
+    def __init__(self, window: float = 600, max_tracked: int = 1024):
+        self.window = window
+        self.max_tracked = max_tracked
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.with_prefix = 0
+        self.prefix_reused = 0
+        self.usage_reports = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+
+    @classmethod
+    def from_env(cls) -> "PrefixStats":
+        return cls(
+            window=float(os.environ.get("PROMPT_PREFIX_WINDOW_SECONDS", 600)),
+            max_tracked=int(os.environ.get("PROMPT_PREFIX_MAX_TRACKED", 1024)),
+        )
+
+    def record_request(self, messages: List[Message]) -> bool:
+        """Note an upstream request; return True if its prefix was sent within the window."""
+        key = prefix_key(messages)
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            if key is None:
+                return False
+            self.with_prefix += 1
+            last_sent = self._seen.pop(key, None)
+            reused = last_sent is not None and now - last_sent <= self.window
+            if reused:
+                self.prefix_reused += 1
+            self._seen[key] = now
+            while len(self._seen) > self.max_tracked:
+                self._seen.popitem(last=False)
+        return reused
+
+    def record_usage(self, usage: Optional[Dict]) -> None:
+        """Add the token counts of one response's `usage` block."""
+        if not usage:
+            return
+        cached = cached_tokens(usage) or 0
+        with self._lock:
+            self.usage_reports += 1
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.cached_tokens += cached
+            if cached:
+                self.cache_hits += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "with_prefix": self.with_prefix,
+                "prefix_reused": self.prefix_reused,
+                "prefix_reuse_rate": self.prefix_reused / self.with_prefix if self.with_prefix else 0.0,
+                "distinct_prefixes": len(self._seen),
+                "usage_reports": self.usage_reports,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_token_rate": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "provider_cache_hits": self.cache_hits,
+            }
@@ -1,4 +1,12 @@
-"""Prompt templates and helpers for the Paralegal Assistant persona."""
+"""Prompt templates and helpers for the Paralegal Assistant persona.
+
+The static part of a prompt (everything before the user text) is rendered
+once per (doc_type, jurisdiction) pair and cached. `build_document_messages`
+returns the same content as chat messages with the user text last, so the
+provider can cache the shared prefix (see `prompt_prefix`).
+"""
+from functools import lru_cache
+from typing import Dict, List
 
 SYSTEM_PROMPT = (
     "You are a Paralegal AI Assistant working under attorney supervision. "
@@ -8,12 +16,39 @@ SYSTEM_PROMPT = (
 )
 
 
-def build_document_prompt(doc_type: str, jurisdiction: str, user_text: str) -> str:
-    """Build a combined prompt given document type, jurisdiction, and user text."""
+INSTRUCTIONS = (
+    "Instructions: Follow the paralegal assistant guidelines. "
+    "Provide checklists, formatting requirements, and items for attorney review."
+)
+
+
+@lru_cache(maxsize=512)
+def _document_block(doc_type: str, jurisdiction: str) -> str:
+    """The static template message of a structured document prompt."""
+    return "\n\n".join([f"Document Type: {doc_type}", f"Jurisdiction: {jurisdiction}", INSTRUCTIONS])
+
+
+@lru_cache(maxsize=512)
+def _document_prefix(doc_type: str, jurisdiction: str) -> str:
+    """Everything in a document prompt before the user text."""
     parts = [SYSTEM_PROMPT]
     parts.append(f"Document Type: {doc_type}")
     parts.append(f"Jurisdiction: {jurisdiction}")
-    parts.append("Instructions: Follow the paralegal assistant guidelines. Provide checklists, formatting requirements, and items for attorney review.")
+    parts.append(INSTRUCTIONS)
     parts.append("User Input:")
-    parts.append(user_text)
+    parts.append("")
     return "\n\n".join(parts)
+
+
+def build_document_prompt(doc_type: str, jurisdiction: str, user_text: str) -> str:
+    """Build a combined prompt given document type, jurisdiction, and user text."""
+    return _document_prefix(doc_type, jurisdiction) + user_text
+
+
+def build_document_messages(doc_type: str, jurisdiction: str, user_text: str) -> List[Dict[str, str]]:
+    """Build system, static template and user messages for a chat endpoint."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": _document_block(doc_type, jurisdiction)},
+        {"role": "user", "content": user_text},
+    ]
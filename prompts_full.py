@@ -2,7 +2,39 @@
 
 This module provides system prompts, document-specific templates, checklists,
 and procedures aligned with federal and state civil litigation.
+
+Everything in a prompt except the caller's text is static, so the builders
+render that text once and cache it: the document prefix per
+(template, jurisdiction) pair, and the fixed prefix and suffix of the case
+management and research prompts. Each call then only concatenates the
+cached pieces around the user text. If DOCUMENT_TEMPLATES or the prompt
+constants are modified at runtime, call `clear_prompt_cache()`.
+
+The `build_*_messages` variants return the same content as chat messages
+(system prompt, static template block, user text) so that the provider's
+prompt cache can reuse the shared prefix; see `prompt_prefix`.
+
+Document and case management prompts do not paste every checklist.
+Instead, `knowledge_index()` is a BM25 index over the template
+checklists, formatting requirements and rules, the filing, deadline and
+discovery checklists, and any firm rule files, built at import. Each
+prompt includes only the snippets that best match the request, within a
+token budget, ahead of the user text (a separate user message in the
+structured form, so the static prefix is unchanged).
+
+Configuration comes from environment variables:
+  - PROMPT_CONTEXT: "retrieve" or "full" (every checklist, as before)
+    (default: retrieve)
+  - PROMPT_CONTEXT_TOKENS: token budget for retrieved snippets (default: 300)
+  - PROMPT_CONTEXT_SNIPPETS: most snippets per prompt (default: 3)
+  - FIRM_RULES_DIR: directory of firm rule files (.md, .txt) to index as
+    well (default: unset)
 """
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from knowledge_index import KnowledgeIndex, Snippet, load_rule_files, split_sections
 
 SYSTEM_PROMPT = """You are an expert Paralegal AI Assistant with comprehensive knowledge of paralegal duties, legal procedures, document preparation, case management, and client support. You function as a highly skilled paralegal professional supporting attorneys and legal teams with practical, hands-on legal work.
 
@@ -242,26 +274,74 @@ DISCOVERY_CHECKLIST = """
 - [ ] Review for attorney-client privilege, work product doctrine
 """
 
-def build_document_prompt(doc_type: str, jurisdiction: str, user_text: str) -> str:
-    """Build a combined prompt for document preparation or procedural guidance."""
-    parts = [SYSTEM_PROMPT]
-    
+DOCUMENT_INSTRUCTIONS = [
+    "1. Address the user's specific question or request",
+    "2. Provide step-by-step guidance where applicable",
+    "3. Reference applicable rules and procedures",
+    "4. Include practical tips and common pitfalls to avoid",
+    "5. Always include the mandatory disclaimer",
+]
+
+CASE_MANAGEMENT_INSTRUCTIONS = [
+    "1. Analyze the case information",
+    "2. Identify key deadlines based on typical litigation timeline",
+    "3. Create an organized action plan",
+    "4. Include discovery, motion practice, and trial preparation phases",
+    "5. Flag items requiring attorney decision",
+]
+
+RESEARCH_INSTRUCTIONS = [
+    "1. Provide relevant case law citations",
+    "2. Summarize key holdings and reasoning",
+    "3. Identify procedural rules and statutes",
+    "4. Suggest related research areas",
+    "5. Recommend primary sources for further research",
+]
+
+
+CONTEXT_MODES = ("retrieve", "full")
+
+# Longest query text handed to the index; longer inputs are searched by their start and end
+MAX_QUERY_CHARS = 4000
+
+# Score multiplier for snippets from the requested document type's own template
+TEMPLATE_BOOST = 2.0
+
+
+@lru_cache(maxsize=None)
+def _template_section(template_key: str) -> str:
+    """Render one DOCUMENT_TEMPLATES entry as prompt text."""
+    template = DOCUMENT_TEMPLATES[template_key]
+    parts = [f"\n## Document Type: {template['title']}\n"]
+    parts.append("### Preparation Checklist:")
+    for item in template["checklist"]:
+        parts.append(f"- {item}")
+    if "formatting" in template:
+        parts.append("\n### Formatting Requirements:")
+        for key, value in template["formatting"].items():
+            parts.append(f"- {key}: {value}")
+    if "federal_rules" in template:
+        parts.append("\n### Applicable Rules:")
+        for rule in template["federal_rules"]:
+            parts.append(f"- {rule}")
+    return "\n".join(parts)
+
+
+@lru_cache(maxsize=512)
+def _document_context(template_key: Optional[str], jurisdiction: str, full: bool = True) -> str:
+    """The template and jurisdiction sections of a document prompt.
+
+    Without `full`, the template is reduced to its title; the relevant parts
+    of it are retrieved per request instead.
+    """
+    parts = []
+
     # Add document-specific template if available
-    if doc_type.lower() in DOCUMENT_TEMPLATES:
-        template = DOCUMENT_TEMPLATES[doc_type.lower()]
-        parts.append(f"\n## Document Type: {template['title']}\n")
-        parts.append("### Preparation Checklist:")
-        for item in template["checklist"]:
-            parts.append(f"- {item}")
-        if "formatting" in template:
-            parts.append("\n### Formatting Requirements:")
-            for key, value in template["formatting"].items():
-                parts.append(f"- {key}: {value}")
-        if "federal_rules" in template:
-            parts.append("\n### Applicable Rules:")
-            for rule in template["federal_rules"]:
-                parts.append(f"- {rule}")
-    
+    if template_key is not None and full:
+        parts.append(_template_section(template_key))
+    elif template_key is not None:
+        parts.append(f"\n## Document Type: {DOCUMENT_TEMPLATES[template_key]['title']}")
+
     # Add jurisdiction-specific info
     parts.append(f"\n## Jurisdiction: {jurisdiction}")
     if jurisdiction.lower() == "federal":
@@ -272,48 +352,224 @@ def build_document_prompt(doc_type: str, jurisdiction: str, user_text: str) -> s
         parts.append("- Verify state rules of civil procedure")
         parts.append("- Check local county court rules")
         parts.append("- Verify e-filing availability by court")
-    
-    # Add user input/question
-    parts.append(f"\n## User Request / Question:\n{user_text}")
-    
-    # Add closing instructions
-    parts.append("\n## Instructions:")
-    parts.append("1. Address the user's specific question or request")
-    parts.append("2. Provide step-by-step guidance where applicable")
-    parts.append("3. Reference applicable rules and procedures")
-    parts.append("4. Include practical tips and common pitfalls to avoid")
-    parts.append("5. Always include the mandatory disclaimer")
-    
     return "\n".join(parts)
 
 
-def build_case_management_prompt(case_info: str) -> str:
-    """Build a prompt for case management and organization tasks."""
-    parts = [SYSTEM_PROMPT]
-    parts.append("\n## Task: Case Management & Organization")
-    parts.append(FILING_PROCEDURE_CHECKLIST)
-    parts.append(DISCOVERY_CHECKLIST)
-    parts.append(f"\n## Case Information Provided:\n{case_info}")
-    parts.append("\n## Instructions:")
-    parts.append("1. Analyze the case information")
-    parts.append("2. Identify key deadlines based on typical litigation timeline")
-    parts.append("3. Create an organized action plan")
-    parts.append("4. Include discovery, motion practice, and trial preparation phases")
-    parts.append("5. Flag items requiring attorney decision")
-    parts.append("\nReminder: " + SYSTEM_PROMPT.split("Mandatory Disclaimer")[1])
+@lru_cache(maxsize=512)
+def _document_prefix(template_key: Optional[str], jurisdiction: str, full: bool = True) -> str:
+    """Everything in a document prompt before the reference material and user text."""
+    return "\n".join([SYSTEM_PROMPT, _document_context(template_key, jurisdiction, full)])
+
+
+@lru_cache(maxsize=512)
+def _document_block(template_key: Optional[str], jurisdiction: str, full: bool = True) -> str:
+    """The static template message of a structured document prompt."""
+    return "\n".join(
+        [_document_context(template_key, jurisdiction, full).strip("\n"), "\n## Instructions:"]
+        + DOCUMENT_INSTRUCTIONS
+    )
+
+
+@lru_cache(maxsize=None)
+def _document_suffix() -> str:
+    return "\n".join(["", "\n## Instructions:"] + DOCUMENT_INSTRUCTIONS)
+
+
+@lru_cache(maxsize=None)
+def _system_reminder() -> str:
+    """The mandatory-disclaimer section of SYSTEM_PROMPT, split out once."""
+    return SYSTEM_PROMPT.split("Mandatory Disclaimer")[1]
+
+
+@lru_cache(maxsize=None)
+def _case_management_parts(full: bool = True) -> "tuple[str, str]":
+    checklists = [FILING_PROCEDURE_CHECKLIST, DISCOVERY_CHECKLIST] if full else []
+    prefix = "\n".join([SYSTEM_PROMPT, "\n## Task: Case Management & Organization"] + checklists)
+    suffix = "\n".join(
+        ["", "\n## Instructions:"] + CASE_MANAGEMENT_INSTRUCTIONS + ["\nReminder: " + _system_reminder()]
+    )
+    return prefix, suffix
+
+
+@lru_cache(maxsize=None)
+def _case_management_block(full: bool = True) -> str:
+    checklists = [FILING_PROCEDURE_CHECKLIST, DISCOVERY_CHECKLIST] if full else []
+    return "\n".join(
+        ["## Task: Case Management & Organization"]
+        + checklists
+        + ["\n## Instructions:"]
+        + CASE_MANAGEMENT_INSTRUCTIONS
+        + ["\nReminder: " + _system_reminder()]
+    )
+
+
+@lru_cache(maxsize=None)
+def _research_parts() -> "tuple[str, str]":
+    prefix = SYSTEM_PROMPT + "\n\n## Legal Research Question:\n"
+    suffix = "\n".join(["", _research_block()])
+    return prefix, suffix
+
+
+@lru_cache(maxsize=None)
+def _research_block() -> str:
+    return "\n".join(
+        ["\n## Research Instructions:"]
+        + RESEARCH_INSTRUCTIONS
+        + [
+            "\nNote: This research requires attorney interpretation and verification.",
+            "Always verify citations in primary sources before use.",
+        ]
+    )
+
+
+def knowledge_snippets() -> List[Snippet]:
+    """The built-in reference material, cut into retrievable snippets."""
+    snippets = []
+    for key, template in DOCUMENT_TEMPLATES.items():
+        source = f"templates/{key}"
+        title = template["title"]
+        snippets.append(Snippet(source, f"{title}: Preparation Checklist",
+                                "\n".join(f"- {item}" for item in template["checklist"])))
+        if "formatting" in template:
+            snippets.append(Snippet(source, f"{title}: Formatting Requirements",
+                                    "\n".join(f"- {k}: {v}" for k, v in template["formatting"].items())))
+        if "federal_rules" in template:
+            snippets.append(Snippet(source, f"{title}: Applicable Rules",
+                                    "\n".join(f"- {rule}" for rule in template["federal_rules"])))
+    snippets.extend(split_sections(FILING_PROCEDURE_CHECKLIST, "checklists/filing_procedure"))
+    snippets.extend(split_sections(DEADLINE_CALCULATION, "checklists/deadline_calculation"))
+    snippets.extend(split_sections(DISCOVERY_CHECKLIST, "checklists/discovery"))
+    return snippets
+
+
+@lru_cache(maxsize=None)
+def knowledge_index() -> KnowledgeIndex:
+    """The retrieval index over `knowledge_snippets()` and FIRM_RULES_DIR, built once."""
+    return KnowledgeIndex(knowledge_snippets() + load_rule_files(os.environ.get("FIRM_RULES_DIR")))
+
+
+def clear_prompt_cache() -> None:
+    """Forget rendered prompt pieces and the index (after changing templates or rule files at runtime)."""
+    for cached in (_template_section, _document_context, _document_prefix, _document_block, _document_suffix,
+                   _system_reminder, _case_management_parts, _case_management_block, _research_parts,
+                   _research_block, knowledge_index):
+        cached.cache_clear()
+
+
+def precompile_prompts(jurisdictions=("Federal", "State")) -> None:
+    """Render the document prefixes for every template and build the index ahead of the first request."""
+    for template_key in list(DOCUMENT_TEMPLATES) + [None]:
+        for jurisdiction in jurisdictions:
+            for full in (True, False):
+                _document_prefix(template_key, jurisdiction, full)
+                _document_block(template_key, jurisdiction, full)
+    _document_suffix()
+    for full in (True, False):
+        _case_management_parts(full)
+        _case_management_block(full)
+    _research_parts()
+    knowledge_index()
+
+
+def _template_key(doc_type: str) -> Optional[str]:
+    template_key = doc_type.lower()
+    return template_key if template_key in DOCUMENT_TEMPLATES else None
+
+
+def _full_context(context: Optional[str]) -> bool:
+    """Whether a builder includes every checklist ("full") or retrieves snippets ("retrieve")."""
+    mode = (context or os.environ.get("PROMPT_CONTEXT", "retrieve")).lower()
+    if mode not in CONTEXT_MODES:
+        raise ValueError(f"context must be one of {CONTEXT_MODES}, not {mode!r}")
+    return mode == "full"
+
+
+def retrieve_reference(query: str, template_key: Optional[str] = None) -> str:
+    """The reference-material section for `query` ("" when nothing relevant is indexed).
+
+    Snippets from `template_key`'s own template rank above equally good
+    matches from other document types.
+    """
+    if len(query) > MAX_QUERY_CHARS:
+        # The start and end of very long inputs (e.g. a pasted transcript) say what is being asked
+        query = query[: MAX_QUERY_CHARS // 2] + "\n" + query[-MAX_QUERY_CHARS // 2:]
+    snippets = knowledge_index().render(
+        query,
+        max_tokens=int(os.environ.get("PROMPT_CONTEXT_TOKENS", 300)),
+        k=int(os.environ.get("PROMPT_CONTEXT_SNIPPETS", 3)),
+        boost={f"templates/{template_key}": TEMPLATE_BOOST} if template_key else None,
+    )
+    return f"## Reference Material:\n\n{snippets}" if snippets else ""
+
+
+def _messages(static_block: str, user_text: str, reference: str = "") -> List[Dict[str, str]]:
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": static_block},
+    ]
+    if reference:
+        messages.append({"role": "user", "content": reference})
+    messages.append({"role": "user", "content": user_text})
+    return messages
+
+
+def build_document_prompt(doc_type: str, jurisdiction: str, user_text: str, context: Optional[str] = None) -> str:
+    """Build a combined prompt for document preparation or procedural guidance.
+
+    `context` overrides PROMPT_CONTEXT ("retrieve" or "full").
+    """
+    template_key = _template_key(doc_type)
+    full = _full_context(context)
+    reference = "" if full else retrieve_reference(user_text, template_key)
+    parts = [_document_prefix(template_key, jurisdiction, full)]
+    if reference:
+        parts.append("\n" + reference)
+    parts.append("\n## User Request / Question:\n" + user_text + _document_suffix())
     return "\n".join(parts)
 
 
+def build_document_messages(
+    doc_type: str, jurisdiction: str, user_text: str, context: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Structured form of `build_document_prompt` for chat endpoints.
+
+    Returns the system prompt, the static template block for this
+    (doc_type, jurisdiction) pair, the retrieved reference material (if
+    any) and the user text as separate messages, in that order, so requests
+    for the same pair share a byte-identical prefix the provider can cache.
+    """
+    template_key = _template_key(doc_type)
+    full = _full_context(context)
+    reference = "" if full else retrieve_reference(user_text, template_key)
+    return _messages(_document_block(template_key, jurisdiction, full), user_text, reference)
+
+
+def build_case_management_prompt(case_info: str, context: Optional[str] = None) -> str:
+    """Build a prompt for case management and organization tasks (see `build_document_prompt`)."""
+    full = _full_context(context)
+    prefix, suffix = _case_management_parts(full)
+    reference = "" if full else retrieve_reference(case_info)
+    if reference:
+        prefix += "\n\n" + reference
+    return prefix + "\n\n## Case Information Provided:\n" + case_info + suffix
+
+
+def build_case_management_messages(case_info: str, context: Optional[str] = None) -> List[Dict[str, str]]:
+    """Structured form of `build_case_management_prompt` (see `build_document_messages`)."""
+    full = _full_context(context)
+    reference = "" if full else retrieve_reference(case_info)
+    return _messages(_case_management_block(full), case_info, reference)
+
+
 def build_research_prompt(research_question: str) -> str:
     """Build a prompt for legal research assistance."""
-    parts = [SYSTEM_PROMPT]
-    parts.append(f"\n## Legal Research Question:\n{research_question}")
-    parts.append("\n## Research Instructions:")
-    parts.append("1. Provide relevant case law citations")
-    parts.append("2. Summarize key holdings and reasoning")
-    parts.append("3. Identify procedural rules and statutes")
-    parts.append("4. Suggest related research areas")
-    parts.append("5. Recommend primary sources for further research")
-    parts.append("\nNote: This research requires attorney interpretation and verification.")
-    parts.append("Always verify citations in primary sources before use.")
-    return "\n".join(parts)
+    prefix, suffix = _research_parts()
+    return prefix + research_question + suffix
+
+
+def build_research_messages(research_question: str) -> List[Dict[str, str]]:
+    """Structured form of `build_research_prompt` (see `build_document_messages`)."""
+    return _messages(_research_block(), research_question)
+
+
+precompile_prompts()
@@ -0,0 +1,327 @@
+"""Client-side admission control for model calls.
+
+The GitHub Models endpoint enforces per-token quotas on requests and tokens
+per minute; going over them produces bursts of 429 responses that each cost
+a round-trip. `RateLimiter` keeps us under the quota before we call:
+  - two token buckets, one for requests per minute and one for estimated
+    tokens per minute;
+  - a concurrency cap on calls in flight;
+  - a priority queue, so interactive traffic (the /ask page) is admitted
+    ahead of bulk traffic (/api/v1, batches, jobs) when both are waiting.
+
+A 429 with `Retry-After` pauses admission for everyone via `pause`, so one
+throttled call holds back the queue instead of each caller discovering the
+limit on its own.
+
+Configuration comes from environment variables (0 disables a limit):
+  - MODEL_RATE_LIMIT_RPM: requests per minute (default: 0)
+  - MODEL_RATE_LIMIT_TPM: estimated tokens per minute (default: 0)
+  - MODEL_MAX_CONCURRENCY: model calls in flight at once (default: 0)
+  - MODEL_QUEUE_MAX_WAIT_SECONDS: longest a call may wait for admission
+    (default: 30)
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, List, Optional
+
+from resilience import Deadline, DeadlineExceeded, UpstreamUnavailable
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough token count for quota accounting (about four characters per token)."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+class RateLimitTimeout(UpstreamUnavailable):
+    """Raised when a call waits longer than allowed for admission."""
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute of quota."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)."""
+        self._refill(now)
+        # A single call larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        self.level = min(self.level, 0.0)
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "tokens", "enqueued_at", "wake")
+
+    def __init__(self, priority: int, seq: int, tokens: int, wake: Optional[Callable[[], None]] = None):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.wake = wake
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RateLimiter:
+    """Priority-ordered admission against RPM/TPM buckets and a concurrency cap."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 0,
+        max_wait: float = 30.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self.in_flight = 0
+        self.peak_queue_depth = 0
+        self.timeouts = 0
+        self.pauses = 0
+        self._admitted: Dict[int, int] = {}
+        self._wait_total: Dict[int, float] = {}
+        self._wait_max: Dict[int, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            requests_per_minute=float(os.environ.get("MODEL_RATE_LIMIT_RPM", 0)),
+            tokens_per_minute=float(os.environ.get("MODEL_RATE_LIMIT_TPM", 0)),
+            max_concurrency=int(os.environ.get("MODEL_MAX_CONCURRENCY", 0)),
+            max_wait=float(os.environ.get("MODEL_QUEUE_MAX_WAIT_SECONDS", 30)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None or self.max_concurrency > 0
+
+    def _try_admit(self, ticket: _Ticket) -> Optional[float]:
+        """Admit `ticket` if it is next in line and capacity allows.
+
+        Called with the lock held. Returns 0 when admitted, a delay in
+        seconds when only the buckets are short, or None to wait for a
+        wake-up (another ticket is ahead or the concurrency cap is hit).
+        """
+        if self._queue[0] is not ticket:
+            return None
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return None
+        now = time.monotonic()
+        delay = max(0.0, self._paused_until - now)
+        if self.requests is not None:
+            delay = max(delay, self.requests.delay_for(1, now))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.delay_for(ticket.tokens, now))
+        if delay > 0:
+            return delay
+
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(ticket.tokens)
+        heapq.heappop(self._queue)
+        self.in_flight += 1
+        waited = now - ticket.enqueued_at
+        self._admitted[ticket.priority] = self._admitted.get(ticket.priority, 0) + 1
+        self._wait_total[ticket.priority] = self._wait_total.get(ticket.priority, 0.0) + waited
+        self._wait_max[ticket.priority] = max(self._wait_max.get(ticket.priority, 0.0), waited)
+        self._wake_head()
+        return 0.0
+
+    def _wake_head(self) -> None:
+        """Let the ticket now at the front of the queue re-check. Lock held."""
+        if not self._queue:
+            return
+        head = self._queue[0]
+        if head.wake is not None:
+            head.wake()
+        else:
+            self._cond.notify_all()
+
+    def _enqueue(self, priority: int, tokens: int, wake=None) -> _Ticket:
+        ticket = _Ticket(priority, next(self._seq), tokens, wake)
+        heapq.heappush(self._queue, ticket)
+        self.peak_queue_depth = max(self.peak_queue_depth, len(self._queue))
+        return ticket
+
+    def _abandon(self, ticket: _Ticket, deadline: Optional[Deadline]) -> Exception:
+        """Drop a ticket that ran out of time and return the error to raise. Lock held."""
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self.timeouts += 1
+        self._wake_head()
+        if deadline is not None and deadline.expired():
+            return DeadlineExceeded("Request deadline exceeded while queued for the model")
+        return RateLimitTimeout(f"Waited more than {self.max_wait}s for a model call slot")
+
+    def _wait_budget(self, deadline: Optional[Deadline]) -> float:
+        budget = self.max_wait
+        if deadline is not None:
+            budget = min(budget, deadline.remaining())
+        return time.monotonic() + budget
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0, deadline: Optional[Deadline] = None) -> None:
+        """Block until a call may go upstream; pair with `release`.
+
+        Raises:
+            RateLimitTimeout: if admission takes longer than `max_wait`
+            DeadlineExceeded: if `deadline` runs out first
+        """
+        if not self.enabled:
+            return
+        give_up_at = self._wait_budget(deadline)
+        with self._cond:
+            ticket = self._enqueue(priority, tokens)
+            while True:
+                delay = self._try_admit(ticket)
+                if delay == 0:
+                    return
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    raise self._abandon(ticket, deadline)
+                self._cond.wait(remaining if delay is None else min(delay, remaining))
+
+    async def aacquire(
+        self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0, deadline: Optional[Deadline] = None
+    ) -> None:
+        """Async variant of `acquire`; waits without blocking the event loop."""
+        if not self.enabled:
+            return
+        give_up_at = self._wait_budget(deadline)
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        with self._lock:
+            ticket = self._enqueue(priority, tokens, wake=lambda: loop.call_soon_threadsafe(woken.set))
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_admit(ticket)
+                    if delay == 0:
+                        return
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        raise self._abandon(ticket, deadline)
+                try:
+                    await asyncio.wait_for(woken.wait(), remaining if delay is None else min(delay, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                woken.clear()
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._wake_head()
+            raise
+
+    def release(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_head()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0, deadline: Optional[Deadline] = None):
+        """Hold an admission slot for the duration of a `with` block."""
+        self.acquire(priority, tokens, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0, deadline: Optional[Deadline] = None):
+        """Async variant of `slot`."""
+        await self.aacquire(priority, tokens, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all admissions for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.pauses += 1
+            if self.requests is not None:
+                self.requests.drain()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for ticket in self._queue:
+                name = PRIORITY_NAMES.get(ticket.priority, str(ticket.priority))
+                depth[name] = depth.get(name, 0) + 1
+            waits = {}
+            for priority, admitted in self._admitted.items():
+                waits[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    "admitted": admitted,
+                    "avg_wait_ms": round(self._wait_total[priority] / admitted * 1000, 2),
+                    "max_wait_ms": round(self._wait_max[priority] * 1000, 2),
+                }
+            return {
+                "enabled": self.enabled,
+                "requests_per_minute": self.requests.per_minute if self.requests else None,
+                "tokens_per_minute": self.tokens.per_minute if self.tokens else None,
+                "max_concurrency": self.max_concurrency or None,
+                "in_flight": self.in_flight,
+                "queue_depth": depth,
+                "peak_queue_depth": self.peak_queue_depth,
+                "timeouts": self.timeouts,
+                "pauses": self.pauses,
+                "wait": waits,
+            }
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_limiter() -> RateLimiter:
+    """Return the process-wide limiter (quotas are per API token, not per client)."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter.from_env()
+        return _shared_limiter
@@ -0,0 +1,301 @@
+"""Retries, deadlines and circuit breaking for upstream model calls.
+
+`UpstreamGuard.call` wraps a single HTTP attempt and adds:
+  - retries with exponential backoff and full jitter on 429/5xx responses
+    and connection errors, honouring `Retry-After`;
+  - an overall `Deadline` shared by all attempts, so a caller's request
+    budget bounds the total time spent (each attempt's timeout is the
+    smaller of the per-attempt timeout and the time remaining);
+  - a circuit breaker that fails fast while the upstream keeps failing and
+    lets a single trial call through after a cool-down.
+
+Configuration comes from environment variables:
+  - MODEL_RETRY_MAX_ATTEMPTS: attempts per call, including the first (default: 3)
+  - MODEL_RETRY_BASE_DELAY: first backoff step in seconds (default: 0.5)
+  - MODEL_RETRY_MAX_DELAY: backoff cap in seconds (default: 8)
+  - MODEL_ATTEMPT_TIMEOUT: per-attempt HTTP timeout in seconds (default: 30)
+  - MODEL_DEADLINE_SECONDS: overall budget when the caller sets none (default: 60)
+  - MODEL_BREAKER_FAILURE_THRESHOLD: consecutive failures that open the
+    circuit (default: 5)
+  - MODEL_BREAKER_RESET_SECONDS: how long the circuit stays open (default: 30)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised when the model endpoint cannot be reached in time."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class RetriesExhausted(UpstreamUnavailable):
+    """Raised when every attempt failed with a retryable error; the last one is the `__cause__`."""
+
+
+class DeadlineExceeded(UpstreamUnavailable, TimeoutError):
+    """Raised when the caller's deadline leaves no time for another attempt."""
+
+
+class Deadline:
+    """A point in time by which a request must be finished."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a `Retry-After` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, Optional[float]]:
+    """Return (retryable, retry_after_seconds) for an exception from one attempt.
+
+    Understands `requests` and `httpx` exceptions without importing either.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        return status in RETRYABLE_STATUSES, retry_after
+    # Connection resets, DNS failures and timeouts are worth another try
+    name = type(exc).__name__
+    retryable = isinstance(exc, (ConnectionError, TimeoutError)) or any(
+        marker in name for marker in ("Connect", "Timeout", "RemoteProtocol", "ReadError")
+    )
+    return retryable, None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0, attempt_timeout: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (1-based)."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            # The server knows best; never retry sooner than it asked
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker counting consecutive upstream failures."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opens = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def before_call(self) -> None:
+        """Raise `CircuitOpenError` unless a call may go upstream now."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.short_circuited += 1
+        raise CircuitOpenError("Model endpoint circuit is open; failing fast")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opens += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_neutral(self) -> None:
+        """Release a half-open trial that ended in a non-health error (e.g. 400)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "opens": self.opens,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class UpstreamGuard:
+    """Applies a `RetryPolicy`, `CircuitBreaker` and `Deadline` to upstream calls."""
+
+    def __init__(
+        self,
+        policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        default_deadline: float = 60.0,
+    ):
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.default_deadline = default_deadline
+        # Called with the Retry-After delay when upstream throttles us
+        self.on_throttle: Optional[Callable[[float], None]] = None
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.retries = 0
+        self.giveups = 0
+        self.deadline_exceeded = 0
+
+    @classmethod
+    def from_env(cls) -> "UpstreamGuard":
+        policy = RetryPolicy(
+            max_attempts=int(os.environ.get("MODEL_RETRY_MAX_ATTEMPTS", 3)),
+            base_delay=float(os.environ.get("MODEL_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.environ.get("MODEL_RETRY_MAX_DELAY", 8)),
+            attempt_timeout=float(os.environ.get("MODEL_ATTEMPT_TIMEOUT", 30)),
+        )
+        breaker = CircuitBreaker(
+            failure_threshold=int(os.environ.get("MODEL_BREAKER_FAILURE_THRESHOLD", 5)),
+            reset_timeout=float(os.environ.get("MODEL_BREAKER_RESET_SECONDS", 30)),
+        )
+        return cls(policy, breaker, default_deadline=float(os.environ.get("MODEL_DEADLINE_SECONDS", 60)))
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _start_attempt(self, deadline: Deadline) -> float:
+        """Check breaker and deadline; return the timeout for the next attempt."""
+        timeout = min(self.policy.attempt_timeout, deadline.remaining())
+        if timeout <= 0:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded("Request deadline exceeded before calling the model")
+        self.breaker.before_call()
+        self._count("attempts")
+        return timeout
+
+    def _after_failure(self, exc: Exception, attempt: int, deadline: Deadline) -> float:
+        """Record a failed attempt; return the backoff delay, or raise if there is no retry left.
+
+        Non-retryable errors are re-raised as they are; running out of
+        attempts raises `RetriesExhausted`.
+        """
+        retryable, retry_after = classify_error(exc)
+        if retry_after is not None and self.on_throttle is not None:
+            self.on_throttle(retry_after)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_neutral()
+        if not retryable:
+            raise exc
+        if attempt >= self.policy.max_attempts:
+            self._count("giveups")
+            raise RetriesExhausted(f"Model endpoint still failing after {attempt} attempts: {exc}") from exc
+        delay = self.policy.backoff(attempt, retry_after)
+        if delay >= deadline.remaining():
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"No time left in request deadline to retry after: {exc}") from exc
+        self._count("retries")
+        return delay
+
+    def call(self, fn: Callable[[float], T], deadline: Optional[Deadline] = None) -> T:
+        """Call `fn(timeout)` with retries until it succeeds or the budget runs out."""
+        deadline = deadline or Deadline(self.default_deadline)
+        attempt = 0
+        while True:
+            timeout = self._start_attempt(deadline)
+            attempt += 1
+            try:
+                result = fn(timeout)
+            except Exception as exc:
+                time.sleep(self._after_failure(exc, attempt, deadline))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[[float], Awaitable[T]], deadline: Optional[Deadline] = None) -> T:
+        """Async variant of `call` for coroutine-based transports."""
+        deadline = deadline or Deadline(self.default_deadline)
+        attempt = 0
+        while True:
+            timeout = self._start_attempt(deadline)
+            attempt += 1
+            try:
+                result = await fn(timeout)
+            except Exception as exc:
+                await asyncio.sleep(self._after_failure(exc, attempt, deadline))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "giveups": self.giveups,
+                "deadline_exceeded": self.deadline_exceeded,
+                "max_attempts": self.policy.max_attempts,
+            }
+        stats["breaker"] = self.breaker.get_stats()
+        return stats
@@ -0,0 +1,253 @@
+"""Content-addressed cache for model generations.
+
+Responses are keyed on a SHA-256 of the model name, the chat messages and
+the sampling parameters, so identical prompts (retries, re-submitted Odoo
+payloads, deterministic templates) are answered without a model call.
+
+Two tiers are available:
+  - `MemoryCache`: in-process LRU with TTL and a byte-size budget.
+  - `SQLiteCache`: optional on-disk tier that survives restarts.
+
+Configuration comes from environment variables:
+  - MODEL_CACHE_ENABLED: set to "false" to disable caching (default: true)
+  - MODEL_CACHE_TTL_SECONDS: entry lifetime (default: 3600)
+  - MODEL_CACHE_MAX_ENTRIES: in-memory entry limit (default: 1024)
+  - MODEL_CACHE_MAX_BYTES: in-memory size limit (default: 64 MiB)
+  - MODEL_CACHE_DB_PATH: SQLite file for the on-disk tier (default: unset,
+    memory only)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def cache_key(model_name: Optional[str], messages: List[Dict], params: Optional[Dict] = None) -> str:
+    """Return a stable hash for a generation request."""
+    canonical = json.dumps(
+        {"model": model_name, "messages": messages, "params": params or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """Thread-safe LRU cache with per-entry TTL and a total byte budget."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.time() + self.ttl)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteCache:
+    """On-disk cache tier stored in a single SQLite file.
+
+    Expired and excess entries are pruned every `prune_every` writes rather
+    than on each one, so the table may briefly hold up to `prune_every`
+    entries over `max_entries`.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, max_entries: int = 100_000, prune_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = max(1, prune_every)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache (expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache (created_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM response_cache WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(now)
+            self._conn.commit()
+
+    def _prune(self, now: float) -> None:
+        """Drop expired entries, then the oldest ones beyond `max_entries` (both index scans)."""
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+        (entries,) = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()
+        if entries > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache ORDER BY created_at LIMIT ?)",
+                (entries - self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()
+        return {"entries": entries, "path": self.path}
+
+
+class ResponseCache:
+    """Two-tier response cache with hit/miss accounting.
+
+    Lookups check the memory tier first, then the disk tier; disk hits are
+    promoted into memory.
+    """
+
+    def __init__(self, memory: Optional[MemoryCache] = None, disk: Optional[SQLiteCache] = None, enabled: bool = True):
+        self.memory = memory or MemoryCache()
+        self.disk = disk
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        ttl = float(os.environ.get("MODEL_CACHE_TTL_SECONDS", 3600))
+        memory = MemoryCache(
+            max_entries=int(os.environ.get("MODEL_CACHE_MAX_ENTRIES", 1024)),
+            max_bytes=int(os.environ.get("MODEL_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            ttl=ttl,
+        )
+        db_path = os.environ.get("MODEL_CACHE_DB_PATH")
+        disk = SQLiteCache(db_path, ttl=ttl) if db_path else None
+        enabled = os.environ.get("MODEL_CACHE_ENABLED", "true").lower() != "false"
+        return cls(memory=memory, disk=disk, enabled=enabled)
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def record_bypass(self) -> None:
+        self._count("bypasses")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            stats = {
+                "enabled": self.enabled,
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_rate": (hits / lookups) if lookups else 0.0,
+            }
+        stats["memory"] = self.memory.get_stats()
+        if self.disk is not None:
+            stats["disk"] = self.disk.get_stats()
+        return stats
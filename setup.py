@@ -8,11 +8,33 @@ setup(
         'app',
         'app_new',
         'auth',
+        'db_pool',
+        'fast_answers',
+        'frcp_deadlines',
+        'http_pool',
+        'invites',
+        'jobs',
+        'knowledge_index',
+        'login_throttle',
+        'long_input',
         'mail',
+        'mail_outbox',
         'model_client',
+        'model_client_async',
         'model_client_real',
+        'password_hashing',
+        'prompt_prefix',
         'prompts',
         'prompts_full',
+        'rate_limit',
+        'resilience',
+        'response_cache',
+        'singleflight',
+        'streaming',
+        'token_budget',
+        'token_store',
+        'user_cache',
+        'user_io',
         'users'
     ],
     install_requires=[
@@ -23,6 +45,13 @@ setup(
         "Flask-Mail>=0.9",
     ],
     extras_require={
+        'async': [
+            'httpx>=0.24',
+            'Flask[async]>=2.0',
+        ],
+        'tokens': [
+            'tiktoken>=0.7',
+        ],
         'dev': [
             'pytest>=7.0',
             'pytest-cov',
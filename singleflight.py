@@ -0,0 +1,116 @@
+"""Coalesce concurrent identical model calls into one upstream request.
+
+When several threads ask for the same prompt key at once, the first one
+(the leader) makes the call and every other thread (a waiter) blocks until
+the leader finishes, then receives the same result or exception.
+
+`AsyncSingleFlight` does the same for coroutines awaited on one event
+loop: the leader's call runs as a task that every waiter awaits, shielded
+so a waiter that gives up does not cancel it for the others.
+
+Waiting is bounded by MODEL_SINGLEFLIGHT_WAIT_SECONDS (default: 120); a
+waiter that runs out of time raises `SingleFlightTimeout`.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised when a waiter gives up on an in-flight call."""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Thread-safe registry of in-flight calls keyed by prompt hash."""
+
+    def __init__(self, wait_timeout: Optional[float] = None):
+        if wait_timeout is None:
+            wait_timeout = float(os.environ.get("MODEL_SINGLEFLIGHT_WAIT_SECONDS", 120))
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run `fn` once for all concurrent callers sharing `key`."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as exc:
+                call.error = exc
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        elif not call.done.wait(self.wait_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise SingleFlightTimeout(f"Timed out after {self.wait_timeout}s waiting for in-flight call")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "wait_timeout_seconds": self.wait_timeout,
+            }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """`SingleFlight` for coroutines; use it from a single event loop."""
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `fn()` once for all concurrent callers sharing `key`."""
+        with self._lock:
+            task = self._calls.get(key)
+            leader = task is None
+            if leader:
+                task = self._calls[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self._forget(key, task))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), None if leader else self.wait_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise SingleFlightTimeout(f"Timed out after {self.wait_timeout}s waiting for in-flight call")
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is task:
+                del self._calls[key]
@@ -0,0 +1,63 @@
+"""Helpers for streaming model output.
+
+Covers both directions: parsing the server-sent-events stream returned by the
+chat-completions endpoint, and framing chunks for our own streaming
+responses (SSE for the web UI, NDJSON or SSE for the API).
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+# Headers that keep proxies (nginx, gunicorn) from buffering a streamed body
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def iter_sse_data(lines: Iterable) -> Iterator[str]:
+    """Yield the `data:` payloads of an SSE stream until `[DONE]`."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        yield data
+
+
+def iter_completion_deltas(lines: Iterable, on_usage: Optional[Callable[[Dict], None]] = None) -> Iterator[str]:
+    """Yield content deltas from a streamed chat-completions response.
+
+    If the stream carries a `usage` block (requested with
+    `stream_options.include_usage`), it is passed to `on_usage`.
+    """
+    for data in iter_sse_data(lines):
+        chunk = json.loads(data)
+        if on_usage is not None and chunk.get("usage"):
+            on_usage(chunk["usage"])
+        for choice in chunk.get("choices") or []:
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+def split_for_streaming(text: str) -> Iterator[str]:
+    """Split a complete text into word-sized chunks (used by mock streams)."""
+    for match in re.finditer(r"\S+\s*|\s+", text):
+        yield match.group(0)
+
+
+def sse_event(payload: Dict, event: Optional[str] = None) -> str:
+    """Frame a JSON payload as a server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+
+def ndjson_line(payload: Dict) -> str:
+    """Frame a JSON payload as one newline-delimited JSON record."""
+    return json.dumps(payload) + "\n"
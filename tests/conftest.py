@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import users
+
+
+@pytest.fixture(autouse=True)
+def users_db(tmp_path, monkeypatch):
+    """Give every test its own users database instead of the repo-root users.db."""
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    yield
+    users._db().close_all()
@@ -117,3 +117,22 @@ def test_password_reset_flow(client):
     )
     assert rv.status_code == 200
     assert b"successfully" in rv.data or b"login" in rv.data
+
+
+def test_api_routes_skip_form_csrf(monkeypatch):
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = True
+    try:
+        with app.test_client() as client:
+            rv = client.post(
+                "/api/v1/generate",
+                json={"prompt": "What is Rule 6?"},
+                headers={"X-API-Key": "test-api-key"},
+            )
+            assert rv.status_code == 200
+            assert rv.get_json()["success"] is True
+            # Form routes are still protected
+            assert client.post("/ask", data={"query": "hi"}).status_code == 400
+    finally:
+        app.config["WTF_CSRF_ENABLED"] = False
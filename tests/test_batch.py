@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from api import register_api_routes
+
+
+class _SlowClient:
+    """Stand-in model client that records peak concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, use_cache=True, deadline=None, priority=0):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if "FAIL" in prompt:
+            raise RuntimeError("upstream failure")
+        return "generated: " + prompt.splitlines()[2]
+
+    def get_stats(self):
+        return {}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    app = Flask(__name__)
+    model = _SlowClient()
+    register_api_routes(app, model)
+    return app.test_client(), model
+
+
+def _products(n):
+    return [
+        {"type": "product-description", "id": f"sku-{i}", "request": {"product_name": f"Product {i}"}}
+        for i in range(n)
+    ]
+
+
+def test_batch_returns_results_in_order_with_parallel_fan_out(api):
+    client, model = api
+    items = _products(8) + [{"type": "email", "request": {}}, {"type": "bogus"}]
+    rv = client.post("/api/v1/batch", json={"requests": items, "parallelism": 4},
+                     headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 200
+    data = rv.get_json()
+    assert [r["index"] for r in data["results"]] == list(range(10))
+    assert data["results"][3]["id"] == "sku-3"
+    assert data["results"][3]["description"] == "generated: Product Name: Product 3"
+    assert data["results"][8] == {"index": 8, "success": False, "error": "Missing required field: purpose"}
+    assert data["results"][9]["success"] is False
+    assert data["succeeded"] == 8 and data["failed"] == 2
+    assert 1 < model.peak <= 4
+
+
+def test_batch_streams_results_as_they_finish(api):
+    client, _ = api
+    items = _products(3) + [{"type": "product-description", "request": {"product_name": "FAIL"}}]
+    rv = client.post("/api/v1/batch", json={"requests": items, "stream": True},
+                     headers={"X-API-Key": "test-api-key"})
+    assert rv.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in rv.data.decode().splitlines()]
+    assert sorted(r["index"] for r in records[:-1]) == [0, 1, 2, 3]
+    assert records[-1]["type"] == "done"
+    assert records[-1]["succeeded"] == 3 and records[-1]["failed"] == 1
+
+
+def test_batch_rejects_malformed_body(api):
+    client, _ = api
+    rv = client.post("/api/v1/batch", json={"requests": "nope"}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 400
+
+
+def test_batch_fails_items_with_non_string_type(api):
+    client, _ = api
+    items = [{"type": ["x"]}, {"type": "product-description", "request": {"product_name": "Lamp"}}]
+    rv = client.post("/api/v1/batch", json={"requests": items}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 200
+    first, second = json.loads(rv.data)["results"]
+    assert first == {"index": 0, "success": False, "error": "type must be a string"}
+    assert second["success"]
+
+
+def test_batch_fails_items_with_malformed_requests(api):
+    client, _ = api
+    items = [
+        {"type": "generate", "request": "summarize this"},
+        {"type": "generate", "request": {"prompt": 42}},
+        {"type": "product-description", "request": {"product_name": "Lamp", "features": "bright"}},
+        {"type": "product-description", "request": {"product_name": "Lamp"}},
+    ]
+    rv = client.post("/api/v1/batch", json={"requests": items}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 200
+    results = json.loads(rv.data)["results"]
+    assert [r.get("error") for r in results] == [
+        "request must be an object", "prompt must be a string", "features must be a list", None,
+    ]
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import sys
+import threading
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+import users
+from db_pool import ConnectionManager
+
+SCHEMA = ["CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, name TEXT)"]
+
+
+def test_schema_is_set_up_once_and_connections_are_reused(tmp_path):
+    db = ConnectionManager(str(tmp_path / "test.db"), SCHEMA, pool_size=2)
+    for i in range(20):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO items (name) VALUES (?)", (f"item{i}",))
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 20
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    stats = db.get_stats()
+    assert stats["schema_setups"] == 1
+    assert stats["opened"] == 1
+    assert stats["checkouts"] == 21
+    assert stats["in_use"] == 0
+
+
+def test_failed_transaction_rolls_back(tmp_path):
+    db = ConnectionManager(str(tmp_path / "test.db"), SCHEMA)
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('lost')")
+            raise RuntimeError("boom")
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+
+def test_pool_is_bounded_under_concurrency(tmp_path):
+    db = ConnectionManager(str(tmp_path / "test.db"), SCHEMA, pool_size=3)
+    barrier = threading.Barrier(8)
+
+    def worker():
+        with db.connection() as conn:
+            barrier.wait()
+            conn.execute("SELECT COUNT(*) FROM items").fetchone()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = db.get_stats()
+    assert stats["opened"] == 8
+    assert stats["idle"] == 3
+    assert stats["schema_setups"] == 1
+
+
+def test_users_use_the_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    users.create_user("alice", "pw", is_admin=True)
+    assert users.get_user("alice")["is_admin"] is True
+    token = users.generate_token("alice", "invite")
+    assert users.validate_token(token, "invite") == "alice"
+    users.consume_token(token)
+    assert users.validate_token(token, "invite") is None
+    users.delete_user("alice")
+    assert users.get_user("alice") is None
+    stats = users.get_db_stats()
+    assert stats["path"] == str(tmp_path / "users.db")
+    assert stats["opened"] == 1
+    assert stats["schema_setups"] == 1
+
+
+def test_has_users_is_cached_until_the_database_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    assert users.has_users() is False
+    users.create_user("bob", "pw")
+    assert users.has_users() is True
+    before = users.get_db_stats()["has_users_cache"]
+    for _ in range(50):
+        assert users.has_users() is True
+    after = users.get_db_stats()["has_users_cache"]
+    assert after["hits"] - before["hits"] == 50
+    assert after["refreshes"] == before["refreshes"]
+
+    # A write from another connection (standing in for another worker
+    # process) is noticed through PRAGMA data_version
+    other = sqlite3.connect(users.DB_PATH)
+    other.execute("DELETE FROM users")
+    other.commit()
+    other.close()
+    assert users.has_users() is False
@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+import threading
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+import benchmark
+from api import register_api_routes
+from fake_model_server import FakeModelServer, parse_latency
+from model_client_real import ModelClient
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def real_client(monkeypatch):
+    def make(fake):
+        monkeypatch.setenv("GITHUB_MODEL_API_TOKEN", "fake-token")
+        monkeypatch.setenv("GITHUB_MODEL_ENDPOINT", fake.url)
+        monkeypatch.setenv("MODEL_RETRY_BASE_DELAY", "0.01")
+        monkeypatch.setenv("MODEL_BREAKER_FAILURE_THRESHOLD", "100")
+        return ModelClient(cache=ResponseCache(enabled=False), limiter=RateLimiter())
+    return make
+
+
+def test_parse_latency():
+    rng = random.Random(0)
+    assert parse_latency("fixed:0.2")(rng) == 0.2
+    assert 0.1 <= parse_latency("uniform:0.1,0.3")(rng) <= 0.3
+    assert parse_latency("normal:0,0.001")(rng) >= 0
+    assert parse_latency("lognormal:-2,0.5")(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency("uniform:1")
+    with pytest.raises(ValueError):
+        parse_latency("bogus:1")
+
+
+def test_model_client_against_fake(real_client):
+    with FakeModelServer(latency="fixed:0") as fake:
+        client = real_client(fake)
+        answer = client.generate("What is Rule 12?")
+        assert answer.startswith("[FAKE MODEL] Re: What is Rule 12?")
+        chunks = list(client.generate_stream("Stream this"))
+        assert len(chunks) > 1
+        assert "".join(chunks).startswith("[FAKE MODEL] Re: Stream this")
+        assert fake.get_stats()["completed"] == 1
+        assert fake.get_stats()["streamed"] == 1
+        # Non-ASCII text streamed without a charset arrives intact
+        assert "".join(client.generate_stream("Rule 6 § “days”")).startswith("[FAKE MODEL] Re: Rule 6 § “days”")
+
+
+def test_injected_errors_are_retried(real_client):
+    with FakeModelServer(latency="fixed:0", error_429_rate=0.3, error_5xx_rate=0.2, retry_after=0, seed=7) as fake:
+        client = real_client(fake)
+        client.guard.policy.max_attempts = 10
+        for i in range(10):
+            assert "[FAKE MODEL]" in client.generate(f"prompt {i}")
+        stats = fake.get_stats()
+        assert stats["throttled"] + stats["server_errors"] > 0
+        assert client.get_stats()["resilience"]["retries"] == stats["throttled"] + stats["server_errors"]
+
+
+def test_benchmark_run_level_reports_percentiles(real_client, monkeypatch):
+    monkeypatch.setenv("ODOO_API_KEY", "bench-key")
+    with FakeModelServer(latency="uniform:0.01,0.03") as fake:
+        app = Flask(__name__)
+        register_api_routes(app, real_client(fake))
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            def session():
+                return benchmark.BenchmarkSession(f"http://127.0.0.1:{server.server_port}", "bench-key")
+
+            result = benchmark.run_level(session, "generate", concurrency=4, total=12)
+        finally:
+            server.shutdown()
+
+    assert result["succeeded"] == 12
+    assert result["statuses"] == {"200": 12}
+    latency = result["latency_ms"]
+    assert 10 <= latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    assert result["throughput_rps"] > 0
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([], 50) is None
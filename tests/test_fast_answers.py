@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import prompts_full
+from fast_answers import DISCLAIMER, FastAnswers, Lookup, match_lookup, render_lookup, template_for
+
+
+@pytest.mark.parametrize("query, doc_type, expected", [
+    ("checklist for a subpoena", None, Lookup("subpoena", ["checklist"])),
+    ("Formatting for a complaint?", None, Lookup("complaint", ["formatting"])),
+    ("Federal rules for a complaint", None, Lookup("complaint", ["federal_rules"])),
+    ("What rules apply to interrogatories?", None, Lookup("discovery_request", ["federal_rules"])),
+    ("Checklist and formatting for a motion for summary judgment", None,
+     Lookup("motion_summary_judgment", ["checklist", "formatting"])),
+    # The form's document type stands in when the question names none
+    ("What's the checklist?", "subpoena", Lookup("subpoena", ["checklist"])),
+    ("What are the page limits?", "motion", Lookup("motion_summary_judgment", ["formatting"])),
+])
+def test_lookups_are_recognised(query, doc_type, expected):
+    assert match_lookup(query, doc_type) == expected
+
+
+@pytest.mark.parametrize("query, doc_type", [
+    ("Draft a basic complaint checklist", "Complaint"),
+    ("Formatting for a complaint alleging fraud", None),
+    ("Checklist for a subpoena and an affidavit", None),
+    ("Rule 11 for a complaint", None),
+    ("What font should I use?", "General Legal Research"),
+    # Only the form's selection maps "motion" to the summary judgment template
+    ("Rules for a motion", None),
+    ("Checklist for my motion", "complaint"),
+    ("MSJ checklist", None),
+    ("Summarize the deposition", "subpoena"),
+    ("checklist for a subpoena " + "please " * 20, None),
+])
+def test_other_questions_go_to_the_model(query, doc_type):
+    assert match_lookup(query, doc_type) is None
+
+
+def test_answer_is_rendered_from_template_data():
+    assert template_for("Discovery") == "discovery_request" and template_for("General Legal Research") is None
+    text = render_lookup(Lookup("subpoena", ["checklist", "federal_rules"]), "Texas")
+    template = prompts_full.DOCUMENT_TEMPLATES["subpoena"]
+    assert text.startswith(f"## {template['title']}\n\n### Preparation Checklist\n")
+    assert all(f"- {item}" in text for item in template["checklist"] + template["federal_rules"])
+    assert "verify the Texas rules" in text
+    assert text.endswith(DISCLAIMER) and DISCLAIMER in prompts_full.SYSTEM_PROMPT
+    # No formatting data for affidavits: the model answers that
+    assert render_lookup(Lookup("affidavit", ["formatting"])) is None
+
+
+def test_stats_and_full_answer_opt_in():
+    answers = FastAnswers()
+    assert answers.lookup("checklist for a subpoena").lookup == Lookup("subpoena", ["checklist"])
+    assert answers.lookup("checklist for a subpoena", full_answer=True) is None
+    assert answers.lookup("formatting for an affidavit") is None
+    assert answers.lookup("Summarize the deposition") is None
+    stats = answers.get_stats()
+    assert (stats["queries"], stats["answered"], stats["full_answer_requested"]) == (4, 1, 1)
+    assert stats["sections"] == {"checklist": 1} and stats["avg_answer_us"] > 0
+    assert FastAnswers(enabled=False).lookup("checklist for a subpoena") is None
+
+
+@pytest.fixture
+def web(monkeypatch):
+    monkeypatch.delenv("GITHUB_MODEL_API_TOKEN", raising=False)
+    monkeypatch.delenv("AUTH_USERNAME", raising=False)
+    import app as web_app
+    web_app.app.config["TESTING"] = True
+    web_app.app.config["WTF_CSRF_ENABLED"] = False
+    calls = []
+    original = web_app.model_client.generate
+    monkeypatch.setattr(web_app.model_client, "generate", lambda prompt, **kw: calls.append(prompt) or original(prompt))
+    with web_app.app.test_client() as client:
+        with client.session_transaction() as session:
+            session["user"] = "testuser"
+        yield client, calls
+
+
+def test_ask_answers_lookups_without_the_model(web):
+    client, calls = web
+    form = {"query": "Checklist for a subpoena", "document_type": "", "jurisdiction": "Federal"}
+    rv = client.post("/ask", data=form)
+    assert b"Subpoena / Subpoena Duces Tecum" in rv.data and b"Get a full answer from the model" in rv.data
+    assert calls == []
+
+    client.post("/ask", data=dict(form, full_answer="1"))
+    assert len(calls) == 1
+
+    rv = client.post("/ask/stream", data=form)
+    events = [block for block in rv.data.decode().split("\n\n") if block]
+    assert events[0].startswith("event: chunk") and "Preparation Checklist" in events[0]
+    assert json.loads(events[-1].split("data: ", 1)[1]) == {"source": "templates"}
+    assert len(calls) == 1
+
+    rv = client.post("/ask/stream", data=dict(form, query="When is the answer due if served on March 3, 2025?"))
+    events = [block for block in rv.data.decode().split("\n\n") if block]
+    assert "Monday, March 24, 2025" in events[0]
+    assert json.loads(events[-1].split("data: ", 1)[1]) == {"source": "deadlines"}
+    assert len(calls) == 1
@@ -0,0 +1,180 @@
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from api import register_api_routes
+from fast_answers import FastAnswers
+from frcp_deadlines import (
+    RESPONSE_PERIODS,
+    SERVICE_METHODS,
+    CourtCalendar,
+    DeadlineError,
+    DeadlineQuestion,
+    deadline_facts,
+    federal_holidays,
+    parse_deadline_question,
+)
+from model_client_real import _mock_deadline_response
+
+
+def test_federal_holidays_use_observed_dates():
+    assert sorted(federal_holidays(2025)) == [
+        date(2025, 1, 1), date(2025, 1, 20), date(2025, 2, 17), date(2025, 5, 26), date(2025, 6, 19),
+        date(2025, 7, 4), date(2025, 9, 1), date(2025, 10, 13), date(2025, 11, 11), date(2025, 11, 27),
+        date(2025, 12, 25),
+    ]
+    # July 4 on a Sunday, and New Year's Day 2022 (a Saturday) observed in 2021
+    assert federal_holidays(2021)[date(2021, 7, 5)] == "Independence Day"
+    assert federal_holidays(2021)[date(2021, 12, 31)] == "New Year's Day"
+    assert date(2022, 1, 1) not in federal_holidays(2022)
+    assert date(2020, 6, 19) not in federal_holidays(2020)
+
+
+@pytest.mark.parametrize("event, trigger, service, due", [
+    # Day 21 is a Monday: no rollover
+    ("answer", "2024-01-08", "electronic", date(2024, 1, 29)),
+    # Day 21 is Memorial Day
+    ("answer", "2025-05-05", "electronic", date(2025, 5, 27)),
+    # Day 21 is a Saturday; 6(d) does not apply to service of the summons
+    ("answer", "2025-03-01", "mail", date(2025, 3, 24)),
+    # 6(d) adds 3 days to Nov 13 and the result (a Sunday) rolls forward
+    ("interrogatory_responses", "2025-10-14", "mail", date(2025, 11, 17)),
+    ("interrogatory_responses", "2025-10-14", "electronic", date(2025, 11, 13)),
+    # The 3 days are added after the period rolls past the weekend and Memorial Day
+    ("interrogatory_responses", "2025-04-25", "mail", date(2025, 5, 30)),
+    # Backward periods roll to the previous open day
+    ("pretrial_disclosures", "2025-12-01", "electronic", date(2025, 10, 31)),
+    ("motion_notice", "2025-07-18", "electronic", date(2025, 7, 3)),
+])
+def test_compute_applies_rule_6(event, trigger, service, due):
+    result = CourtCalendar().compute(event, trigger, service)
+    assert result.due == due
+    assert result.rule == RESPONSE_PERIODS[event].rule
+
+
+def test_explanation_and_extra_holidays():
+    result = CourtCalendar().compute("answer", "2025-05-05")
+    assert result.render().startswith("**Due: Tuesday, May 27, 2025**")
+    assert "Memorial Day (a legal holiday)" in result.steps[1]
+
+    closed = CourtCalendar(["2024-01-29"])
+    assert closed.compute("answer", "2024-01-08").due == date(2024, 1, 30)
+    with pytest.raises(DeadlineError):
+        closed.compute("reply_brief", "2024-01-08")
+    with pytest.raises(DeadlineError):
+        closed.compute("answer", "2024-01-08", service="pigeon")
+    with pytest.raises(DeadlineError):
+        closed.compute("answer", "January 8")
+    # Periods from triggers near the end of the calendar would overflow datetime.date
+    with pytest.raises(DeadlineError, match="supported years"):
+        closed.compute("answer", "9999-12-30")
+    with pytest.raises(DeadlineError, match="supported years"):
+        closed.compute_batch(["2025-10-14", "9999-12-30"], "answer")
+
+
+def test_batch_matches_single_computations():
+    calendar = CourtCalendar(["2023-01-09"])
+    rng = random.Random(7)
+    rows = [
+        (date(2019, 12, 1) + timedelta(days=rng.randrange(2500)), rng.choice(list(RESPONSE_PERIODS)),
+         rng.choice(list(SERVICE_METHODS)))
+        for _ in range(3000)
+    ]
+    due = calendar.compute_batch([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+    assert due == [calendar.compute(event, trigger, service).due for trigger, event, service in rows]
+    assert calendar.compute_batch(["2025-10-14"], "interrogatory_responses", "mail") == [date(2025, 11, 17)]
+    # The extension is added after rolling forward, so it can reach past the last unrolled end date
+    assert calendar.compute_batch(["2024-01-01"], "magistrate_objection", "mail") == [date(2024, 1, 19)]
+    assert calendar.compute_batch([], "answer") == []
+    with pytest.raises(DeadlineError):
+        calendar.compute_batch(["2025-10-14"], ["answer", "answer"])
+
+
+def test_one_row_batches_match_single_computations():
+    calendar = CourtCalendar()
+    day = date(2024, 1, 1)
+    while day < date(2027, 1, 1):
+        for event, period in RESPONSE_PERIODS.items():
+            for service in ("electronic", "mail") if period.service_extension else ("electronic",):
+                assert calendar.compute_batch([day], [event], [service]) == [calendar.compute(event, day, service).due]
+        day += timedelta(days=1)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("When is the answer due if the complaint was served on March 3, 2025?",
+     DeadlineQuestion("answer", date(2025, 3, 3), "electronic", False)),
+    ("Interrogatories were served by mail on 10/14/2025. When are responses due?",
+     DeadlineQuestion("interrogatory_responses", date(2025, 10, 14), "mail", True)),
+    ("Deadline for a notice of appeal, judgment entered 2025-06-20",
+     DeadlineQuestion("notice_of_appeal", date(2025, 6, 20), "electronic", False)),
+    ("What is Rule 6?", None),
+    ("When is the answer due?", None),
+    ("Was the answer served on 3/3/2025 or 3/4/2025 due yet?", None),
+    ("Summarize the deposition taken on March 3, 2025", None),
+    ("When is the answer due if the complaint was served on December 20, 9999?", None),
+])
+def test_deadline_questions_are_parsed(text, expected):
+    assert parse_deadline_question(text) == expected
+
+
+def test_deadline_questions_are_answered_locally():
+    answers = FastAnswers()
+    question = "Interrogatories were served by mail on 10/14/2025. When are responses due?"
+    fast = answers.lookup(question)
+    assert fast.lookup is None and fast.deadline.due == date(2025, 11, 17)
+    assert fast.text.startswith("**Due: Monday, November 17, 2025**")
+    assert answers.lookup(question, full_answer=True) is None
+    stats = answers.get_stats()
+    assert (stats["answered"], stats["full_answer_requested"], stats["sections"]) == (1, 1, {"deadline": 1})
+
+    # On the model path the computed date goes ahead of the question, and the mock only repeats it
+    facts = answers.facts(question)
+    assert facts.startswith("## Computed Deadline") and facts == deadline_facts(question)
+    assert "COMPUTED DEADLINE: Monday, November 17, 2025" in _mock_deadline_response(facts + question)
+    assert answers.facts("What is Rule 6?") == ""
+
+    # FRCP periods do not apply in state court: the model answers, without computed facts
+    question = "When is the answer due if the complaint was served on March 3, 2025?"
+    assert answers.lookup(question, jurisdiction="Federal").deadline.due == date(2025, 3, 24)
+    assert answers.lookup(question, jurisdiction="California") is None
+    assert answers.facts(question, "California") == ""
+    assert "answer is due Monday, January 29, 2024" in _mock_deadline_response("What is Rule 6?")
+
+
+def test_deadlines_endpoint(monkeypatch):
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    app = Flask(__name__)
+    register_api_routes(app, model_client=None)
+    client = app.test_client()
+    items = [
+        {"id": "case-1", "event": "interrogatory_responses", "trigger": "2025-10-14", "service": "mail"},
+        {"event": "answer", "trigger": "2025-05-05"},
+        {"id": "case-3", "event": "answer", "trigger": "05/05/2025"},
+        {"event": "bogus", "trigger": "2025-05-05"},
+        {"event": ["answer"], "trigger": "2025-05-05"},
+        {"event": "answer", "trigger": "2025-05-05", "service": {"mail": True}},
+        {"event": "answer", "trigger": "9999-12-30"},
+    ]
+    rv = client.post("/api/v1/deadlines", json={"deadlines": items, "explain": True},
+                     headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 200
+    data = json.loads(rv.data)
+    assert (data["succeeded"], data["failed"]) == (2, 5)
+    first, second, third, fourth, fifth, sixth, seventh = data["results"]
+    assert (first["id"], first["due"], first["rule"]) == ("case-1", "2025-11-17", "FRCP 33(b)(2)")
+    assert second["due"] == "2025-05-27" and "Memorial Day" in second["steps"][1]
+    assert third["id"] == "case-3" and not third["success"] and "YYYY-MM-DD" in third["error"]
+    assert fourth == {"index": 3, "success": False, "error": "Unknown event: bogus"}
+    assert not fifth["success"] and not sixth["success"] and "must be strings" in sixth["error"]
+    assert not seventh["success"] and "supported years" in seventh["error"]
+
+    rv = client.post("/api/v1/deadlines", json={"items": []}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 400
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from http_pool import PooledTransport
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(server_url):
+    transport = PooledTransport(pool_maxsize=2)
+    for _ in range(3):
+        resp = transport.post(server_url, json={"x": 1}, timeout=5)
+        assert resp.json() == {"ok": True}
+
+    stats = transport.get_stats()
+    assert stats["checkouts"] == 3
+    assert stats["new_connections"] == 1
+    assert stats["hits"] == 2
+    transport.close()
+
+
+def test_pool_is_shared_across_threads(server_url):
+    transport = PooledTransport(pool_maxsize=2)
+
+    def worker():
+        for _ in range(5):
+            transport.post(server_url, json={}, timeout=5).json()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = transport.get_stats()
+    assert stats["checkouts"] == 20
+    # Blocking pool never opens more than pool_maxsize sockets per host
+    assert stats["new_connections"] <= 2
+    transport.close()
@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import invites
+import mail
+import users
+from fake_smtp_server import FakeSMTPServer
+from mail_outbox import MailOutbox, SMTPSettings
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    # Importing the app configures `mail.outbox`; do that before it is replaced below
+    import app  # noqa: F401
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    with FakeSMTPServer() as smtp:
+        outbox = MailOutbox(
+            path=str(tmp_path / "outbox.db"),
+            settings=SMTPSettings(host=smtp.host, port=smtp.port),
+            poll_interval=0.05,
+        )
+        monkeypatch.setattr(mail, "outbox", outbox)
+        yield smtp
+        outbox.stop(timeout=5)
+        outbox.db.close_all()
+    users._db().close_all()
+
+
+def _wait_done(campaign_id):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        progress = invites.campaign_progress(campaign_id)
+        if progress["done"] == progress["total"]:
+            return progress
+        time.sleep(0.02)
+    raise AssertionError("campaign did not finish")
+
+
+def test_parse_recipients():
+    text = "username,email\njdoe, jdoe@firm.com\n\nasmith,asmith@firm.com\nlonely\n"
+    assert invites.parse_recipients(text) == [
+        {"username": "jdoe", "email": "jdoe@firm.com"},
+        {"username": "asmith", "email": "asmith@firm.com"},
+        {"username": "lonely", "email": ""},
+    ]
+
+
+def test_campaign_results_tokens_and_delivery(env):
+    users.create_user("taken", "pw")
+    campaign = invites.create_campaign(
+        [
+            {"username": "jdoe", "email": "jdoe@firm.com"},
+            {"username": "asmith", "email": "asmith@firm.com"},
+            {"username": "jdoe", "email": "other@firm.com"},
+            {"username": "taken", "email": "taken@firm.com"},
+            {"username": "bad", "email": "not-an-email"},
+            {"username": "", "email": "nobody@firm.com"},
+        ],
+        "http://app.test",
+    )
+    assert (campaign["total"], campaign["queued"], campaign["skipped"], campaign["errors"]) == (6, 2, 2, 2)
+    assert [r["status"] for r in campaign["results"]] == ["queued", "queued", "skipped", "skipped", "error", "error"]
+
+    progress = _wait_done(campaign["campaign_id"])
+    assert progress["by_status"] == {"sent": 2} and progress["progress"] == 1.0
+    assert sorted(m["To"] for m in env.messages) == ["asmith@firm.com", "jdoe@firm.com"]
+
+    body = next(m for m in env.messages if m["To"] == "jdoe@firm.com").get_payload()
+    token = re.search(r"/join\?token=(\S+)", body).group(1)
+    assert users.validate_token(token, "invite") == "jdoe"
+
+
+def test_failed_queueing_revokes_tokens(env, monkeypatch):
+    generated = []
+    original = users.generate_tokens
+
+    def recording_generate_tokens(*args, **kwargs):
+        tokens = original(*args, **kwargs)
+        generated.extend(tokens)
+        return tokens
+
+    def failing_queue_invite_emails(*args, **kwargs):
+        raise RuntimeError("outbox unavailable")
+
+    monkeypatch.setattr(users, "generate_tokens", recording_generate_tokens)
+    monkeypatch.setattr(mail, "queue_invite_emails", failing_queue_invite_emails)
+    campaign = invites.create_campaign([{"username": "newbie", "email": "newbie@firm.com"}], "http://app")
+    assert campaign["errors"] == 1 and len(generated) == 1
+    assert users.validate_token(generated[0], "invite") is None
+
+
+def test_campaign_limits(env, monkeypatch):
+    with pytest.raises(invites.InviteRequestError):
+        invites.create_campaign([], "http://app.test")
+    monkeypatch.setenv("INVITE_MAX_RECIPIENTS", "2")
+    with pytest.raises(invites.InviteRequestError, match="limit is 2"):
+        invites.create_campaign([{"username": f"u{i}", "email": f"u{i}@x.com"} for i in range(3)], "http://app.test")
+    assert invites.campaign_progress("missing") is None
+
+
+def test_admin_form_and_api(env, monkeypatch):
+    from app import app
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    users.create_user("admin", "AdminPass123", is_admin=True)
+    with client.session_transaction() as sess:
+        sess["user"] = "admin"
+
+    rv = client.post("/admin/invites", data={"recipients": "jdoe,jdoe@firm.com\nadmin,admin@firm.com\n"})
+    assert rv.status_code == 200
+    assert b"1 queued, 1 skipped" in rv.data
+
+    rv = client.post(
+        "/api/v1/invites",
+        json={"recipients": [{"username": "asmith", "email": "asmith@firm.com"}]},
+        headers={"X-API-Key": "test-api-key"},
+    )
+    assert rv.status_code == 202
+    data = rv.get_json()
+    assert data["success"] and data["results"][0]["status"] == "queued"
+
+    _wait_done(data["campaign_id"])
+    rv = client.get(data["status_url"], headers={"X-API-Key": "test-api-key"})
+    assert rv.get_json()["recipients"][0] == {
+        "email": "asmith@firm.com", "status": "sent", "attempts": 1, "error": None
+    }
+    rv = client.get(f"/admin/invites/{data['campaign_id']}")
+    assert b"1 of 1 finished" in rv.data
+
+    rv = client.post("/api/v1/invites", json={"recipients": "nope"}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 400
@@ -0,0 +1,144 @@
+import os
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from api import register_api_routes
+from jobs import InvalidCallbackURL, JobManager, JobQueueFull, JobStore
+from model_client import ModelClient
+
+
+class _FakeClient(ModelClient):
+    def __init__(self):
+        super().__init__(api_token="test-token")
+        self.release = threading.Event()
+        self.release.set()
+
+    def _call_github_model(self, prompt, deadline=None, priority=0):
+        self.release.wait(5)
+        return "generated document"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(store=JobStore(str(tmp_path / "jobs.db")), workers=1, max_pending=2, result_ttl=60)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def api(manager, monkeypatch):
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    app = Flask(__name__)
+    fake = _FakeClient()
+    register_api_routes(app, fake, job_manager=manager)
+    return app.test_client(), fake
+
+
+def _wait_for(client, url, status):
+    for _ in range(100):
+        job = client.get(url, headers={"X-API-Key": "test-api-key"}).get_json()
+        if job["status"] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job never reached {status}: {job}")
+
+
+def test_job_runs_in_background_and_can_be_polled(api):
+    client, _ = api
+    rv = client.post(
+        "/api/v1/jobs",
+        json={"type": "document", "request": {"document_type": "Contract"}},
+        headers={"X-API-Key": "test-api-key"},
+    )
+    assert rv.status_code == 202
+    url = rv.get_json()["status_url"]
+    assert rv.headers["Location"] == url
+
+    job = _wait_for(client, url, "succeeded")
+    assert job["result"] == {
+        "success": True,
+        "document_content": "generated document",
+        "document_type": "Contract",
+    }
+
+
+def test_job_validation_errors_are_immediate(api):
+    client, _ = api
+    headers = {"X-API-Key": "test-api-key"}
+    assert client.post("/api/v1/jobs", json={"type": "nope"}, headers=headers).status_code == 400
+    assert client.post("/api/v1/jobs", json={"type": "document", "request": {}}, headers=headers).status_code == 400
+    assert client.post("/api/v1/jobs", json={"type": ["generate"]}, headers=headers).status_code == 400
+    rv = client.post("/api/v1/jobs", json={"type": "generate", "request": ["x"]}, headers=headers)
+    assert (rv.status_code, rv.get_json()) == (400, {"error": "request must be an object"})
+    assert client.post("/api/v1/jobs", json=["generate"], headers=headers).status_code == 400
+    rv = client.post(
+        "/api/v1/jobs",
+        json={"type": "generate", "request": {"prompt": "x"}, "callback_url": "file:///etc/passwd"},
+        headers=headers,
+    )
+    assert rv.status_code == 400
+    assert client.get("/api/v1/jobs/missing", headers=headers).status_code == 404
+
+
+@pytest.mark.parametrize("url", [
+    "http://localhost:8080/hook",
+    "http://127.0.0.1/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_callbacks_to_internal_addresses_are_refused(url, monkeypatch, tmp_path):
+    monkeypatch.delenv("JOB_CALLBACK_ALLOWED_HOSTS", raising=False)
+    manager = JobManager(JobStore(str(tmp_path / "jobs.db")), workers=1)
+    with pytest.raises(InvalidCallbackURL):
+        manager.validate_callback_url(url)
+    # An explicit allow-list entry is trusted as configured
+    monkeypatch.setenv("JOB_CALLBACK_ALLOWED_HOSTS", urlparse(url).hostname)
+    JobManager(JobStore(str(tmp_path / "jobs.db")), workers=1).validate_callback_url(url)
+    manager.validate_callback_url("http://93.184.216.34/hook")
+
+
+def test_full_queue_applies_backpressure(api, manager):
+    client, fake = api
+    fake.release.clear()
+    headers = {"X-API-Key": "test-api-key"}
+    body = {"type": "generate", "request": {"prompt": "x", "use_cache": False}}
+    assert client.post("/api/v1/jobs", json=body, headers=headers).status_code == 202
+    assert client.post("/api/v1/jobs", json=body, headers=headers).status_code == 202
+    rv = client.post("/api/v1/jobs", json=body, headers=headers)
+    assert rv.status_code == 429
+    assert rv.headers["Retry-After"]
+    with pytest.raises(JobQueueFull):
+        manager.submit("generate", {}, lambda: {"ok": True})
+    fake.release.set()
+
+
+def test_finished_jobs_are_purged_after_ttl(tmp_path):
+    manager = JobManager(store=JobStore(str(tmp_path / "jobs.db")), workers=1, result_ttl=0)
+    job_id = manager.submit("generate", {}, lambda: {"ok": True})
+    manager.shutdown()
+    time.sleep(0.01)
+    assert manager.get(job_id) is None
+    assert manager.store.purge_expired() == 1
+
+
+def test_orphaned_jobs_are_failed_on_startup(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = store.create("generate", {})
+    dead_owner = f"{socket.gethostname()}:999999999"
+    store._conn.execute("UPDATE jobs SET owner = ? WHERE id = ?", (dead_owner, job_id))
+    store._conn.commit()
+    manager = JobManager(store=store, workers=1)
+    assert manager.get(job_id)["status"] == "failed"
+    manager.shutdown()
@@ -0,0 +1,88 @@
+import os
+import sys
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import prompts_full
+from knowledge_index import KnowledgeIndex, Snippet, load_rule_files, split_sections, tokenize
+from prompt_prefix import prefix_key
+from token_budget import count_tokens
+
+
+def test_tokenize_folds_plurals_and_drops_stop_words():
+    assert tokenize("What are the Deadlines for Interrogatories?") == ["deadline", "interrogatory"]
+    assert tokenize("FRCP 56(c)(4) process") == ["frcp", "56", "c", "4", "process"]
+
+
+def test_bm25_ranks_specific_matches_first():
+    index = prompts_full.knowledge_index()
+    titles = [snippet.title for _, snippet in index.search("How do I e-file on CM/ECF?", k=2)]
+    assert titles[0] == "Court Filing Procedure (Federal / E-Filing): E-Filing (CM/ECF or similar)"
+    top = index.search("privilege log for the production", k=1)[0][1]
+    assert top.source == "checklists/discovery" and "Privilege Management" in top.title
+    assert index.search("zzzz qqqq") == []
+
+    # The requested document type's own template wins among equally good matches
+    query = "What are the page limits and font?"
+    boosted = index.search(query, k=1, boost={"templates/complaint": 2.0})[0][1]
+    assert boosted.title == "Civil Complaint (Federal): Formatting Requirements"
+
+
+def test_select_respects_token_budget_and_count():
+    index = KnowledgeIndex([
+        Snippet("a", "Deadlines", "deadline " * 50),
+        Snippet("b", "More deadlines", "deadline response " * 10),
+        Snippet("c", "Deadline rules", "deadline rule"),
+        Snippet("d", "Fees", "filing fee"),
+    ])
+    chosen = index.select("deadline", max_tokens=80, k=2, min_relative_score=0)
+    assert len(chosen) == 2 and all(s.source != "d" for s in chosen)
+    assert sum(count_tokens(s.render()) for s in chosen) <= 80
+    assert index.select("deadline", max_tokens=5) == []
+    assert index.get_stats()["searches"] == 2
+
+
+def test_rule_files_are_split_at_headings(tmp_path):
+    (tmp_path / "local_rules.md").write_text(
+        "# N.D. Ill. Local Rules\n\n## LR 5.2 Form of documents\nBriefs are limited to 15 pages.\n\n"
+        "## LR 7.1 Briefs\nNo brief over fifteen pages without leave of court.\n"
+    )
+    (tmp_path / "notes.bin").write_text("ignored")
+    snippets = load_rule_files(str(tmp_path))
+    assert [s.title for s in snippets] == [
+        "local rules: N.D. Ill. Local Rules: LR 5.2 Form of documents",
+        "local rules: N.D. Ill. Local Rules: LR 7.1 Briefs",
+    ]
+    assert all(s.source == "rules/local_rules.md" for s in snippets)
+    assert load_rule_files(None) == [] and load_rule_files(str(tmp_path / "missing")) == []
+    long_section = split_sections("## Notes\n" + "\n\n".join(["word " * 100] * 5), "x", max_tokens=250)
+    assert len(long_section) > 1 and all(count_tokens(s.text) <= 250 for s in long_section)
+
+
+def test_prompts_include_only_retrieved_snippets(monkeypatch, tmp_path):
+    full = prompts_full.build_case_management_prompt("Schedule depositions of three witnesses", context="full")
+    retrieved = prompts_full.build_case_management_prompt("Schedule depositions of three witnesses")
+    assert "### Discovery Management Checklist: Deposition Coordination" in retrieved
+    assert "### E-Filing (CM/ECF or similar)" in full and "E-Filing (CM/ECF" not in retrieved
+    assert count_tokens(retrieved) < count_tokens(full)
+
+    messages = prompts_full.build_document_messages("subpoena", "Federal", "Mileage fee for a witness?")
+    assert [m["role"] for m in messages] == ["system", "system", "user", "user"]
+    assert "### Preparation Checklist" not in messages[1]["content"]
+    assert "### Subpoena / Subpoena Duces Tecum: Preparation Checklist" in messages[2]["content"]
+    # The reference varies per request but the cacheable prefix does not
+    other = prompts_full.build_document_messages("subpoena", "Federal", "Which rules apply?")
+    assert prefix_key(messages) == prefix_key(other)
+
+    (tmp_path / "firm.md").write_text("## Conflict checks\nRun a conflict check before any engagement letter.\n")
+    monkeypatch.setenv("FIRM_RULES_DIR", str(tmp_path))
+    monkeypatch.setenv("PROMPT_CONTEXT_TOKENS", "100")
+    prompts_full.clear_prompt_cache()
+    try:
+        prompt = prompts_full.build_document_prompt("letter", "Federal", "Do we need a conflict check?")
+        assert "## Reference Material:\n\n### firm: Conflict checks\n" in prompt
+        assert prompt.index("## Reference Material:") < prompt.index("## User Request / Question:")
+    finally:
+        monkeypatch.undo()
+        prompts_full.clear_prompt_cache()
@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import auth
+import login_throttle
+import users
+from login_throttle import LoginThrottle, LoginThrottled
+from password_hashing import HashingBusy, HashPool
+
+
+def test_hash_pool_round_trip():
+    pool = HashPool(workers=2)
+    password_hash = pool.hash_password("s3cret")
+    assert pool.check_password(password_hash, "s3cret")
+    assert not pool.check_password(password_hash, "wrong")
+    stats = pool.get_stats()
+    assert stats["completed"] == 3 and stats["pending"] == 0
+    pool.shutdown()
+
+
+def test_hash_pool_rejects_when_full():
+    pool = HashPool(workers=1, max_pending=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    thread = threading.Thread(target=pool.run, args=(slow,))
+    thread.start()
+    assert started.wait(5)
+    with pytest.raises(HashingBusy):
+        pool.run(lambda: "never")
+    release.set()
+    thread.join()
+    assert pool.get_stats()["rejected"] == 1
+    pool.shutdown()
+
+
+def test_hash_pool_drops_work_that_queued_too_long():
+    pool = HashPool(workers=1, max_pending=4, max_queue_seconds=0.05)
+    ran = []
+    errors = []
+
+    def run(fn):
+        try:
+            pool.run(fn)
+        except HashingBusy as exc:
+            errors.append(exc)
+
+    blocker = threading.Thread(target=run, args=(lambda: time.sleep(0.2),))
+    blocker.start()
+    time.sleep(0.02)
+    run(lambda: ran.append(1))
+    blocker.join()
+    assert ran == [] and len(errors) == 1
+    assert pool.get_stats()["expired"] == 1
+    pool.shutdown()
+
+
+def test_throttle_delays_failures_per_username():
+    throttle = LoginThrottle(user_max_failures=3, user_window=60, user_base_delay=10, user_max_delay=25,
+                             ip_max_failures=0)
+    for i in range(3):
+        throttle.check("Alice", f"10.0.0.{i}")
+        throttle.record("Alice", f"10.0.0.{i}", False)
+    with pytest.raises(LoginThrottled) as excinfo:
+        throttle.check("alice", "10.0.0.99")
+    assert 0 < excinfo.value.retry_after <= 10
+    # Other accounts are unaffected
+    throttle.check("bob", "10.0.0.99")
+    assert throttle.get_stats()["throttled_user"] == 1
+
+
+def test_username_delays_double_up_to_a_cap(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(login_throttle.time, "monotonic", lambda: now[0])
+    throttle = LoginThrottle(user_max_failures=2, user_window=300, user_base_delay=1, user_max_delay=4,
+                             ip_max_failures=0)
+    delays = []
+    for _ in range(6):
+        while True:
+            try:
+                throttle.check("alice", "ip")
+                break
+            except LoginThrottled as exc:
+                delays.append(exc.retry_after)
+                now[0] += exc.retry_after
+        throttle.record("alice", "ip", False)
+    # No delay for the first two failures, then 1, 2, 4 and 4 seconds: never a hard lockout
+    assert delays == [1, 2, 4, 4]
+    # Failures older than the window are forgotten
+    now[0] += 301
+    throttle.check("alice", "ip")
+
+
+def test_throttle_success_clears_username_failures():
+    throttle = LoginThrottle(user_max_failures=2, user_base_delay=60, ip_max_failures=0)
+    throttle.check("alice", "ip")
+    throttle.record("alice", "ip", False)
+    throttle.check("alice", "ip")
+    throttle.record("alice", "ip", True)
+    throttle.check("alice", "ip")
+    throttle.record("alice", "ip", False)
+    throttle.check("alice", "ip")
+
+
+def test_throttle_limits_failures_per_ip_within_window():
+    throttle = LoginThrottle(user_max_failures=0, ip_max_failures=2, ip_window=0.05)
+    # Successful logins from a shared address are never limited
+    for i in range(10):
+        throttle.check(f"user{i}", "1.2.3.4")
+        throttle.record(f"user{i}", "1.2.3.4", True)
+    throttle.record("a", "1.2.3.4", False)
+    throttle.record("b", "1.2.3.4", False)
+    with pytest.raises(LoginThrottled):
+        throttle.check("c", "1.2.3.4")
+    throttle.check("c", "5.6.7.8")
+    time.sleep(0.06)
+    throttle.check("c", "1.2.3.4")
+
+
+def test_client_ip_trusts_only_the_configured_proxy_hops():
+    forwarded = "6.6.6.6, 203.0.113.7, 10.0.0.2"
+    assert LoginThrottle().client_ip("10.0.0.1", forwarded) == "10.0.0.1"
+    assert LoginThrottle(trusted_proxy_hops=1).client_ip("10.0.0.1", forwarded) == "10.0.0.2"
+    assert LoginThrottle(trusted_proxy_hops=2).client_ip("10.0.0.1", forwarded) == "203.0.113.7"
+    assert LoginThrottle(trusted_proxy_hops=4).client_ip("10.0.0.1", forwarded) == "10.0.0.1"
+    assert LoginThrottle(trusted_proxy_hops=1).client_ip(None, None) == "unknown"
+
+
+def test_throttle_bounds_tracked_keys():
+    throttle = LoginThrottle(max_keys=10)
+    for i in range(100):
+        throttle.check(f"user{i}", f"ip{i}")
+        throttle.record(f"user{i}", f"ip{i}", False)
+    stats = throttle.get_stats()
+    assert stats["tracked_users"] == 10 and stats["tracked_ips"] == 10
+
+
+def test_login_view_throttles_repeated_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    monkeypatch.setattr(auth, "login_throttle", LoginThrottle(user_max_failures=2, user_base_delay=60, ip_max_failures=0))
+    users.create_user("alice", "correct-horse")
+
+    from app import app
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+
+    for _ in range(2):
+        resp = client.post("/login", data={"username": "alice", "password": "nope"})
+        assert resp.status_code == 302
+    resp = client.post("/login", data={"username": "alice", "password": "correct-horse"})
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) > 0
+    users._db().close_all()
@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+
+import prompts_full
+from api import register_api_routes
+from long_input import COLLAPSE_INSTRUCTIONS, MAP_INSTRUCTIONS, REDUCE_INSTRUCTIONS, LongInputRunner, split_chunks
+from token_budget import TokenBudget, count_messages, count_tokens
+
+DOCUMENT = "".join(
+    f"{i}. The deponent testified that the shipment left the warehouse on May {i % 28 + 1}, 2021.\n"
+    for i in range(1, 1501)
+)
+
+
+class _RecordingClient:
+    """Stand-in model client that answers instantly and records every call."""
+
+    def __init__(self, budget, delay=0.0, note_words=20):
+        self.budget = budget
+        self.delay = delay
+        self.note_words = note_words
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, use_cache=True, deadline=None, priority=0):
+        # Everything the budget-aware client would reject must not get here
+        self.budget.fit(prompt)
+        with self._lock:
+            self.calls.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        instructions = prompt[-2]["content"]
+        if instructions == REDUCE_INSTRUCTIONS:
+            return "final answer"
+        return " ".join(["note"] * self.note_words)
+
+    def generate_stream(self, prompt, use_cache=True, deadline=None, priority=0):
+        text = self.generate(prompt)
+        yield text[:5]
+        yield text[5:]
+
+    def get_stats(self):
+        return {}
+
+
+def _phase(call):
+    return {MAP_INSTRUCTIONS: "map", COLLAPSE_INSTRUCTIONS: "collapse", REDUCE_INSTRUCTIONS: "reduce"}[call[-2]["content"]]
+
+
+def test_split_chunks_overlap_and_coverage():
+    chunks = split_chunks(DOCUMENT, 2000, 100)
+    assert len(chunks) > 5
+    assert all(count_tokens(c) <= 2000 for c in chunks)
+    # Windows end on line breaks and the next one repeats the end of the previous
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.endswith("\n")
+        assert previous[-200:].splitlines()[-1] in chunk[:2000]
+    assert chunks[0].startswith("1. ") and chunks[-1].endswith("May 17, 2021.\n")
+    assert split_chunks("short text", 2000, 100) == ["short text"]
+    with pytest.raises(ValueError):
+        split_chunks(DOCUMENT, 100, 100)
+
+
+def test_map_reduce_runs_chunks_in_parallel_and_reports_progress():
+    client = _RecordingClient(TokenBudget(context_window=8000), delay=0.02)
+    runner = LongInputRunner(client, chunk_tokens=2000, overlap_tokens=100, parallelism=3)
+    prompt = prompts_full.build_document_messages("complaint", "Federal", DOCUMENT)
+    assert runner.needs_long_mode(prompt)
+    assert not runner.needs_long_mode(prompts_full.build_document_messages("complaint", "Federal", "Short"))
+
+    events = []
+    assert runner.run(prompt, progress=events.append) == "final answer"
+
+    phases = [_phase(call) for call in client.calls]
+    maps = phases.count("map")
+    assert phases[-1] == "reduce" and phases.count("reduce") == 1 and maps > 5
+    assert client.peak == 3
+    # Every call keeps the request's system and template messages as its prefix
+    assert all(call[:2] == prompt[:2] for call in client.calls)
+    assert events[0] == {"type": "progress", "phase": "map", "done": 0, "total": maps}
+    assert {"type": "progress", "phase": "map", "done": maps, "total": maps} in events
+    assert events[-1] == {"type": "progress", "phase": "reduce", "done": 1, "total": 1}
+    reduce_input = client.calls[-1][-1]["content"]
+    assert reduce_input.startswith("### Start and end of the input\n1. The deponent")
+    assert f"### Notes on excerpt {maps} of {maps}" in reduce_input
+    assert runner.get_stats()["map_calls"] == maps
+
+
+def test_notes_too_big_for_one_call_are_collapsed():
+    budget = TokenBudget(context_window=4000, min_output=256)
+    client = _RecordingClient(budget, note_words=600)
+    runner = LongInputRunner(client, chunk_tokens=1500, overlap_tokens=50, parallelism=4, context_tokens=200)
+    prompt = prompts_full.build_document_messages("complaint", "Federal", DOCUMENT)
+    events = list(runner.iter_events(prompt, stream=True))
+    assert "".join(e["text"] for e in events if e["type"] == "chunk") == "final answer"
+    phases = [_phase(call) for call in client.calls]
+    assert "collapse" in phases and phases[-1] == "reduce"
+    assert count_messages(client.calls[-1]) <= budget.prompt_limit
+    assert any(e["phase"] == "collapse" for e in events if e["type"] == "progress")
+    assert runner.get_stats()["collapse_calls"] == phases.count("collapse")
+
+
+def test_api_stream_reports_progress(monkeypatch):
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    client = _RecordingClient(TokenBudget(context_window=8000))
+    app = Flask(__name__)
+    register_api_routes(app, client, long_input=LongInputRunner(client, chunk_tokens=2000, overlap_tokens=100))
+    api = app.test_client()
+    rv = api.post("/api/v1/generate/stream", json={"prompt": DOCUMENT}, headers={"X-API-Key": "test-api-key"})
+    records = [json.loads(line) for line in rv.data.decode().splitlines()]
+    assert records[0]["type"] == "progress" and records[0]["phase"] == "map"
+    assert "".join(r["text"] for r in records if r["type"] == "chunk") == "final answer"
+    assert records[-1] == {"type": "done", "success": True}
+
+    rv = api.post("/api/v1/generate", json={"prompt": DOCUMENT}, headers={"X-API-Key": "test-api-key"})
+    assert rv.get_json()["response"] == "final answer"
+    metrics = api.get("/api/v1/metrics", headers={"X-API-Key": "test-api-key"}).get_json()
+    assert metrics["long_input"]["runs"] == 2
@@ -0,0 +1,196 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mail
+from fake_smtp_server import FakeSMTPServer
+from mail_outbox import MailOutbox, SMTPSettings
+
+
+@pytest.fixture
+def smtp():
+    with FakeSMTPServer() as server:
+        yield server
+
+
+@pytest.fixture
+def make_outbox(tmp_path, smtp):
+    created = []
+
+    def make(**kwargs):
+        kwargs.setdefault("retry_base", 0)
+        outbox = MailOutbox(
+            path=str(tmp_path / "outbox.db"),
+            settings=SMTPSettings(host=smtp.host, port=smtp.port, default_sender="noreply@test.local"),
+            **kwargs,
+        )
+        created.append(outbox)
+        return outbox
+
+    yield make
+    for outbox in created:
+        outbox.stop(timeout=5)
+        outbox.db.close_all()
+
+
+def _enqueue_quietly(outbox, count):
+    # Insert without waking a sender thread, so tests drive delivery themselves
+    outbox.start = lambda: None
+    return [outbox.enqueue(f"user{i}@example.com", f"Subject {i}", f"Body {i}") for i in range(count)]
+
+
+def test_batch_reuses_one_connection(make_outbox, smtp):
+    outbox = make_outbox(batch_size=10)
+    _enqueue_quietly(outbox, 5)
+    assert outbox.deliver_due() == 5
+    _enqueue_quietly(outbox, 2)
+    assert outbox.deliver_due() == 2
+    assert smtp.get_stats() == {"connections": 1, "delivered": 7, "rejected": 0}
+    assert smtp.messages[0]["To"] == "user0@example.com"
+    assert smtp.messages[0]["From"] == "noreply@test.local"
+    stats = outbox.get_stats()
+    assert stats["delivered"] == 7 and stats["queue_depth"] == 0
+    assert stats["by_status"] == {"sent": 7}
+    assert stats["delivery_latency"]["max"] >= 0
+
+
+def test_temporary_failure_is_retried(make_outbox, smtp):
+    outbox = make_outbox()
+    _enqueue_quietly(outbox, 1)
+    smtp.fail_next(1)
+    outbox.deliver_due()
+    stats = outbox.get_stats()
+    assert stats["retried"] == 1 and stats["queue_depth"] == 1
+    assert "451" in stats["last_error"]
+    time.sleep(0.01)
+    outbox.deliver_due()
+    assert outbox.get_stats()["by_status"] == {"sent": 1}
+    assert len(smtp.messages) == 1
+
+
+def test_permanent_failure_and_attempt_limit(make_outbox, smtp):
+    outbox = make_outbox(max_attempts=2)
+    _enqueue_quietly(outbox, 2)
+    smtp.fail_next(1, permanent=True)
+    smtp.fail_next(2)
+    outbox.deliver_due()  # 1st: 550, 2nd: 451
+    outbox.deliver_due()  # 2nd: 451 again, out of attempts
+    assert outbox.get_stats()["by_status"] == {"failed": 2}
+    assert outbox.deliver_due() == 0
+
+
+def test_reconnects_when_server_drops_connection(make_outbox, smtp):
+    smtp.drop_after = 1
+    outbox = make_outbox()
+    _enqueue_quietly(outbox, 3)
+    outbox.deliver_due()
+    assert len(smtp.messages) == 3
+    assert outbox.get_stats()["connections"] == 3
+
+
+def test_server_down_is_retried_later(tmp_path):
+    outbox = MailOutbox(path=str(tmp_path / "outbox.db"), settings=SMTPSettings(host="127.0.0.1", port=1), retry_base=60)
+    _enqueue_quietly(outbox, 1)
+    outbox.deliver_due()
+    stats = outbox.get_stats()
+    assert stats["retried"] == 1 and stats["by_status"] == {"queued": 1}
+    # Not due again until the backoff has passed
+    assert outbox.deliver_due() == 0
+    outbox.db.close_all()
+
+
+def test_server_down_stops_the_batch_after_one_connection_attempt(tmp_path, monkeypatch):
+    outbox = MailOutbox(path=str(tmp_path / "outbox.db"), settings=SMTPSettings(host="127.0.0.1", port=1), retry_base=60)
+    _enqueue_quietly(outbox, 5)
+    attempts = []
+    connect = outbox._connect
+    monkeypatch.setattr(outbox, "_connect", lambda: attempts.append(1) or connect())
+    assert outbox.deliver_due() == 5
+    stats = outbox.get_stats()
+    assert len(attempts) == 1
+    assert (stats["retried"], stats["deferred"], stats["by_status"]) == (1, 4, {"queued": 5})
+    with outbox.db.connection() as conn:
+        rows = conn.execute("SELECT attempts, next_attempt_at, claimed_by FROM outbox ORDER BY id").fetchall()
+    assert [row["attempts"] for row in rows] == [1, 0, 0, 0, 0]
+    assert all(row["next_attempt_at"] > time.time() + 20 and row["claimed_by"] is None for row in rows)
+    # Nothing more is claimed, even newly queued mail, until the backoff has passed
+    _enqueue_quietly(outbox, 1)
+    assert outbox.deliver_due() == 0 and len(attempts) == 1
+    outbox.db.close_all()
+
+
+def test_two_senders_never_double_send(make_outbox, smtp):
+    first, second = make_outbox(batch_size=5), make_outbox(batch_size=5)
+    _enqueue_quietly(first, 40)
+    barrier = threading.Barrier(2)
+
+    def drain(outbox):
+        barrier.wait()
+        while outbox.deliver_due():
+            pass
+
+    threads = [threading.Thread(target=drain, args=(o,)) for o in (first, second)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(smtp.messages) == 40
+    assert sorted(m["Subject"] for m in smtp.messages) == sorted(f"Subject {i}" for i in range(40))
+
+
+def test_send_helpers_only_enqueue(make_outbox, smtp, monkeypatch):
+    outbox = make_outbox(poll_interval=0.05)
+    monkeypatch.setattr(mail, "outbox", outbox)
+    assert mail.send_invite_email("new@example.com", "newbie", "http://x/join?token=abc")
+    deadline = time.time() + 5
+    while not smtp.messages and time.time() < deadline:
+        time.sleep(0.01)
+    assert "http://x/join?token=abc" in smtp.messages[0].get_payload()
+    assert mail.get_mail_stats()["sender_running"]
+
+
+def test_suppressed_sending_marks_mail_sent_without_connecting(make_outbox, smtp, monkeypatch):
+    from flask import Flask
+
+    outbox = make_outbox()
+    monkeypatch.setattr(mail, "outbox", outbox)
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER=smtp.host, MAIL_PORT=smtp.port)
+    mail.init_mail(app)
+    app.config["TESTING"] = True
+    assert mail.send_invite_email("new@example.com", "newbie", "http://x/join?token=abc")
+    stats = mail.get_mail_stats()
+    assert stats["by_status"] == {"sent": 1} and not stats["sender_running"]
+    assert smtp.messages == []
+
+    app.config["MAIL_SUPPRESS_SEND"] = False
+    assert mail.send_invite_email("other@example.com", "other", "http://x/join?token=def")
+    deadline = time.time() + 5
+    while not smtp.messages and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(smtp.messages) == 1
+
+
+def test_outbox_without_campaign_column_is_migrated(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "outbox.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT, recipients TEXT NOT NULL, "
+        "subject TEXT NOT NULL, body TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+        "next_attempt_at REAL NOT NULL, created_at REAL NOT NULL, sent_at REAL, last_error TEXT, "
+        "claimed_by TEXT, claimed_at REAL)"
+    )
+    conn.commit()
+    conn.close()
+    outbox = MailOutbox(path=path, settings=SMTPSettings(host="127.0.0.1", port=1))
+    outbox.start = lambda: None
+    ids = outbox.enqueue_many([(["a@example.com"], "Hi", "Body")], campaign="c1")
+    assert [m["id"] for m in outbox.campaign_status("c1")] == ids
+    outbox.db.close_all()
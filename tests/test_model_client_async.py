@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("httpx")
+
+from flask import Flask
+from api import register_api_routes
+from model_client import ModelClient
+from model_client_async import AsyncModelClient
+from response_cache import ResponseCache
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if "slow" in body["messages"][-1]["content"]:
+            time.sleep(0.3)
+        text = "echo: " + body["messages"][-1]["content"][:20]
+        if body.get("stream"):
+            events = "".join(
+                "data: " + json.dumps({"choices": [{"delta": {"content": word}}]}) + "\n\n"
+                for word in text.split(" ")
+            ) + "data: [DONE]\n\n"
+            payload = events.encode()
+            content_type = "text/event-stream"
+        else:
+            payload = json.dumps({"choices": [{"message": {"content": text}}]}).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def async_client(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GITHUB_MODEL_API_TOKEN", "test-token")
+    client = AsyncModelClient(cache=ResponseCache())
+    client.endpoint = f"http://127.0.0.1:{server.server_address[1]}/chat/completions"
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_generations_share_one_client(async_client):
+    async def run():
+        prompts = [f"prompt {i}" for i in range(20)]
+        return await asyncio.gather(*(async_client.generate(p) for p in prompts))
+
+    results = asyncio.run(run())
+    assert results[3] == "echo: prompt 3"
+    assert async_client.get_stats()["async_http_pool"]["in_flight"] == 0
+
+
+def test_generate_stream_yields_chunks_and_fills_cache(async_client):
+    async def run():
+        return [chunk async for chunk in async_client.generate_stream("stream me")]
+
+    chunks = asyncio.run(run())
+    assert "".join(chunks) == "echo:streamme"
+    # Second call is served from the cache
+    assert asyncio.run(run()) != []
+    assert async_client.get_stats()["response_cache"]["hits"] == 1
+
+
+def test_async_routes_are_mounted(async_client, monkeypatch):
+    pytest.importorskip("asgiref")
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    app = Flask(__name__)
+    register_api_routes(app, ModelClient(), async_client=async_client)
+    client = app.test_client()
+
+    rv = client.post("/api/v1/generate/email", json={"purpose": "Follow-up"}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 200
+    assert rv.get_json()["email_content"].startswith("echo: Generate a")
+
+    rv = client.post("/api/v1/generate/email", json={}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 400
+    rv = client.post("/api/v1/generate/email", json={"purpose": "x"})
+    assert rv.status_code == 401
+
+
+
+def test_concurrent_identical_generations_share_one_upstream_call(async_client):
+    async def run():
+        return await asyncio.gather(*(async_client.generate("slow prompt") for _ in range(10)))
+
+    assert asyncio.run(run()) == ["echo: slow prompt"] * 10
+    stats = async_client.get_stats()["singleflight"]
+    assert (stats["leaders"], stats["coalesced"], stats["in_flight"]) == (1, 9, 0)
@@ -0,0 +1,85 @@
+import os
+import sys
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import prompts
+import prompts_full
+from fake_model_server import FakeModelServer
+from model_client_real import ModelClient
+from prompt_prefix import PrefixStats, as_messages, cached_tokens, flatten
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+
+
+def test_as_messages_orders_system_first():
+    assert as_messages("hi") == [{"role": "user", "content": "hi"}]
+    assert as_messages("hi", system_role="sys") == [
+        {"role": "system", "content": "sys"},
+        {"role": "user", "content": "hi"},
+    ]
+    mixed = [
+        {"role": "system", "content": "a"},
+        {"role": "user", "content": "q"},
+        {"role": "system", "content": "b"},
+    ]
+    assert [m["content"] for m in as_messages(mixed, system_role="ignored")] == ["a", "b", "q"]
+    assert flatten(mixed) == "a\n\nq\n\nb"
+
+
+def test_message_builders_share_a_byte_stable_prefix():
+    first = prompts_full.build_document_messages("Complaint", "Federal", "Who do I serve?")
+    second = prompts_full.build_document_messages("complaint", "Federal", "What is the page limit?")
+    assert [m["role"] for m in first] == ["system", "system", "user", "user"]
+    assert first[:2] == second[:2]
+    assert first[0]["content"] is prompts_full.SYSTEM_PROMPT
+    assert "## Document Type: Civil Complaint" in first[1]["content"]
+    # Retrieved reference material goes after the static prefix, ahead of the user text
+    assert first[2]["content"].startswith("## Reference Material:")
+    assert first[3]["content"] == "Who do I serve?"
+    assert prompts_full.build_research_messages("x")[:2] == prompts_full.build_research_messages("y")[:2]
+    assert prompts_full.build_case_management_messages("x")[-1] == {"role": "user", "content": "x"}
+    assert prompts.build_document_messages("Motion", "Federal", "a")[:2] == prompts.build_document_messages(
+        "Motion", "Federal", "b"
+    )[:2]
+
+
+def test_prefix_stats_reuse_window_and_usage():
+    stats = PrefixStats(window=60)
+    messages = prompts.build_document_messages("Motion", "Federal", "a")
+    assert stats.record_request(messages) is False
+    assert stats.record_request(prompts.build_document_messages("Motion", "Federal", "b")) is True
+    assert stats.record_request([{"role": "user", "content": "bare"}]) is False
+    stats.record_usage({"prompt_tokens": 100, "prompt_tokens_details": {"cached_tokens": 80}})
+    stats.record_usage({"prompt_tokens": 100})
+    stats.record_usage(None)
+    result = stats.get_stats()
+    assert (result["requests"], result["with_prefix"], result["prefix_reused"]) == (3, 2, 1)
+    assert result["prefix_reuse_rate"] == 0.5
+    assert (result["usage_reports"], result["cached_tokens"], result["provider_cache_hits"]) == (2, 80, 1)
+    assert result["cached_token_rate"] == 0.4
+    assert cached_tokens({"cache_read_input_tokens": 7}) == 7
+
+    expired = PrefixStats(window=0)
+    expired.record_request(messages)
+    expired._seen[next(iter(expired._seen))] -= 1
+    assert expired.record_request(messages) is False
+
+
+def test_client_records_cached_tokens_from_endpoint(monkeypatch):
+    with FakeModelServer(latency="fixed:0") as fake:
+        monkeypatch.setenv("GITHUB_MODEL_API_TOKEN", "fake-token")
+        monkeypatch.setenv("GITHUB_MODEL_ENDPOINT", fake.url)
+        client = ModelClient(cache=ResponseCache(enabled=False), limiter=RateLimiter())
+        for question in ("Who must be served?", "What is the deadline?"):
+            answer = client.generate(prompts_full.build_document_messages("complaint", "Federal", question))
+            assert answer.startswith(f"[FAKE MODEL] Re: {question}")
+        chunks = list(client.generate_stream(prompts_full.build_document_messages("complaint", "Federal", "Stream")))
+        assert "".join(chunks).startswith("[FAKE MODEL] Re: Stream")
+
+        stats = client.get_stats()["prompt_prefix"]
+        assert stats["requests"] == 3 and stats["prefix_reused"] == 2
+        assert stats["usage_reports"] == 3 and stats["provider_cache_hits"] == 2
+        assert 0 < stats["cached_tokens"] < stats["prompt_tokens"]
+        assert fake.get_stats()["prefix_cache_hits"] == 2
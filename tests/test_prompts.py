@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import prompts
+import prompts_full
+from microbench import _legacy_case_management_prompt, _legacy_document_prompt
+
+
+@pytest.mark.parametrize("doc_type", list(prompts_full.DOCUMENT_TEMPLATES) + ["Complaint", "letter"])
+@pytest.mark.parametrize("jurisdiction", ["Federal", "State of Ohio", "N.D. Cal."])
+def test_document_prompt_matches_uncached_rendering(doc_type, jurisdiction):
+    user_text = "When is the answer due?\nPlease list the steps."
+    assert prompts_full.build_document_prompt(doc_type, jurisdiction, user_text, context="full") == _legacy_document_prompt(
+        doc_type, jurisdiction, user_text
+    )
+
+
+def test_case_management_and_research_prompts():
+    assert prompts_full.build_case_management_prompt("Case 1:24-cv-1", context="full") == _legacy_case_management_prompt(
+        "Case 1:24-cv-1"
+    )
+    prompt = prompts_full.build_research_prompt("Rule 12(b)(6) standard")
+    assert prompt.startswith(prompts_full.SYSTEM_PROMPT + "\n\n## Legal Research Question:\nRule 12(b)(6) standard\n")
+    assert prompt.endswith("Always verify citations in primary sources before use.")
+
+
+def test_prefix_is_cached_and_clearable(monkeypatch):
+    prompts_full.build_document_prompt("complaint", "Federal", "a")
+    hits = prompts_full._document_prefix.cache_info().hits
+    prompts_full.build_document_prompt("COMPLAINT", "Federal", "b")
+    assert prompts_full._document_prefix.cache_info().hits == hits + 1
+
+    monkeypatch.setitem(prompts_full.DOCUMENT_TEMPLATES, "complaint", dict(
+        prompts_full.DOCUMENT_TEMPLATES["complaint"], title="Amended Complaint"
+    ))
+    prompts_full.clear_prompt_cache()
+    assert "## Document Type: Amended Complaint" in prompts_full.build_document_prompt(
+        "complaint", "Federal", "c", context="full"
+    )
+    monkeypatch.undo()
+    prompts_full.clear_prompt_cache()
+
+
+def test_simple_prompt():
+    assert prompts.build_document_prompt("Motion", "Federal", "Draft it") == "\n\n".join([
+        prompts.SYSTEM_PROMPT,
+        "Document Type: Motion",
+        "Jurisdiction: Federal",
+        "Instructions: Follow the paralegal assistant guidelines. Provide checklists, "
+        "formatting requirements, and items for attorney review.",
+        "User Input:",
+        "Draft it",
+    ])
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rate_limit import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    RateLimiter,
+    RateLimitTimeout,
+    TokenBucket,
+    estimate_tokens,
+)
+from resilience import Deadline, DeadlineExceeded
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(per_minute=60)
+    now = time.monotonic()
+    assert bucket.delay_for(60, now) == 0
+    bucket.take(60)
+    assert bucket.delay_for(1, now) == pytest.approx(1.0, abs=0.05)
+    assert bucket.delay_for(1, now + 1.0) == 0
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter()
+    assert not limiter.enabled
+    with limiter.slot():
+        pass
+    assert limiter.get_stats()["in_flight"] == 0
+
+
+def test_requests_per_minute_bucket_delays_calls():
+    limiter = RateLimiter(requests_per_minute=600)  # one every 0.1s once the burst is spent
+    limiter.requests.take(600)
+    started = time.monotonic()
+    for _ in range(3):
+        with limiter.slot():
+            pass
+    assert time.monotonic() - started >= 0.25
+
+
+def test_interactive_calls_jump_ahead_of_bulk():
+    limiter = RateLimiter(max_concurrency=1)
+    order = []
+    limiter.acquire()  # occupy the only slot
+
+    def worker(name, priority):
+        with limiter.slot(priority):
+            order.append(name)
+
+    threads = []
+    for name, priority in [("bulk-1", PRIORITY_BULK), ("bulk-2", PRIORITY_BULK), ("ask", PRIORITY_INTERACTIVE)]:
+        thread = threading.Thread(target=worker, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+
+    assert limiter.get_stats()["queue_depth"] == {"interactive": 1, "bulk": 2}
+    limiter.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ["ask", "bulk-1", "bulk-2"]
+    stats = limiter.get_stats()
+    assert stats["wait"]["bulk"]["admitted"] == 2
+    assert stats["wait"]["interactive"]["max_wait_ms"] > 0
+    assert stats["peak_queue_depth"] == 3
+
+
+def test_queue_wait_is_bounded():
+    limiter = RateLimiter(max_concurrency=1, max_wait=0.1)
+    limiter.acquire()
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(PRIORITY_BULK)
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(deadline=Deadline(0.05))
+    stats = limiter.get_stats()
+    assert stats["timeouts"] == 2
+    assert stats["queue_depth"] == {"interactive": 0, "bulk": 0}
+
+
+def test_pause_holds_back_admissions():
+    limiter = RateLimiter(requests_per_minute=6000)
+    limiter.pause(0.2)
+    started = time.monotonic()
+    with limiter.slot():
+        pass
+    assert time.monotonic() - started >= 0.15
+    assert limiter.get_stats()["pauses"] == 1
+
+
+def test_async_acquire_waits_without_blocking_loop():
+    limiter = RateLimiter(max_concurrency=1)
+    limiter.acquire()
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        threading.Timer(0.1, limiter.release).start()
+        async with limiter.aslot(PRIORITY_BULK):
+            pass
+        tick_task.cancel()
+        return ticks
+
+    assert asyncio.run(main()) >= 5
+    assert limiter.get_stats()["in_flight"] == 0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd" * 10) == 10
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Deadline,
+    DeadlineExceeded,
+    RetriesExhausted,
+    RetryPolicy,
+    UpstreamGuard,
+    classify_error,
+    parse_retry_after,
+)
+
+
+def _http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def _guard(max_attempts=3, failure_threshold=5, reset_timeout=30.0):
+    return UpstreamGuard(
+        RetryPolicy(max_attempts=max_attempts, base_delay=0.01, max_delay=0.02, attempt_timeout=5),
+        CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout),
+    )
+
+
+def test_classify_error():
+    assert classify_error(_http_error(503)) == (True, None)
+    assert classify_error(_http_error(429, {"Retry-After": "2"})) == (True, 2.0)
+    assert classify_error(_http_error(400)) == (False, None)
+    assert classify_error(requests.ConnectionError("reset"))[0] is True
+    assert classify_error(ValueError("bad json"))[0] is False
+    assert parse_retry_after("garbage") is None
+
+
+def test_retries_transient_errors_then_succeeds():
+    guard = _guard()
+    failures = [_http_error(503), _http_error(429, {"Retry-After": "0.05"})]
+    timeouts = []
+
+    def attempt(timeout):
+        timeouts.append(timeout)
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    started = time.monotonic()
+    assert guard.call(attempt) == "ok"
+    assert time.monotonic() - started >= 0.05
+    assert len(timeouts) == 3
+    assert all(0 < t <= 5 for t in timeouts)
+    stats = guard.get_stats()
+    assert stats["attempts"] == 3
+    assert stats["retries"] == 2
+    assert stats["breaker"]["state"] == "closed"
+
+
+def test_non_retryable_error_is_raised_immediately():
+    guard = _guard()
+    calls = []
+
+    def attempt(timeout):
+        calls.append(1)
+        raise _http_error(400)
+
+    with pytest.raises(requests.HTTPError):
+        guard.call(attempt)
+    assert len(calls) == 1
+
+
+def test_deadline_stops_retries():
+    guard = _guard(max_attempts=10)
+
+    def attempt(timeout):
+        raise _http_error(503, {"Retry-After": "5"})
+
+    with pytest.raises(DeadlineExceeded):
+        guard.call(attempt, Deadline(0.5))
+    assert guard.get_stats()["deadline_exceeded"] == 1
+
+
+def test_breaker_opens_and_recovers_after_cool_down():
+    guard = _guard(max_attempts=1, failure_threshold=2, reset_timeout=0.1)
+
+    def failing(timeout):
+        raise _http_error(502)
+
+    for _ in range(2):
+        with pytest.raises(RetriesExhausted) as info:
+            guard.call(failing)
+        assert isinstance(info.value.__cause__, requests.HTTPError)
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda timeout: calls.append(1))
+    assert calls == []
+
+    time.sleep(0.15)
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+    assert guard.call(lambda timeout: "recovered") == "recovered"
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.get_stats()["breaker"]["short_circuited"] == 1
+
+
+def test_acall_retries():
+    import asyncio
+
+    guard = _guard()
+    failures = [requests.ConnectionError("reset")]
+
+    async def attempt(timeout):
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    assert asyncio.run(guard.acall(attempt)) == "ok"
+    assert guard.get_stats()["retries"] == 1
+
+
+class _FailingTransport:
+    """Stand-in HTTP transport whose every response is a 503."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 503
+        response.url = url
+        return response
+
+    def get_stats(self):
+        return {}
+
+
+def test_api_reports_exhausted_retries_as_503(monkeypatch):
+    from flask import Flask
+
+    from api import register_api_routes
+    from model_client import ModelClient
+    from response_cache import ResponseCache
+
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    monkeypatch.setenv("MODEL_RETRY_BASE_DELAY", "0.01")
+    monkeypatch.setenv("MODEL_RETRY_MAX_DELAY", "0.02")
+    transport = _FailingTransport()
+    client = ModelClient(api_token="token", model_name="model", transport=transport, cache=ResponseCache(enabled=False))
+    app = Flask(__name__)
+    register_api_routes(app, client)
+    rv = app.test_client().post("/api/v1/generate", json={"prompt": "Hello"}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 503
+    assert transport.calls == 3
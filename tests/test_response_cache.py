@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from response_cache import MemoryCache, ResponseCache, SQLiteCache, cache_key
+import model_client_real
+
+
+def test_cache_key_is_stable_and_sensitive():
+    messages = [{"role": "user", "content": "hello"}]
+    assert cache_key("m", messages, {"temperature": 0.7}) == cache_key("m", list(messages), {"temperature": 0.7})
+    assert cache_key("m", messages, {"temperature": 0.7}) != cache_key("m", messages, {"temperature": 0.2})
+    assert cache_key("m", messages) != cache_key("other", messages)
+
+
+def test_memory_cache_lru_and_byte_eviction():
+    cache = MemoryCache(max_entries=2, max_bytes=10, ttl=60)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")
+    cache.set("c", "cccc")  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    cache.set("d", "dddddddd")  # 12 bytes total > 10, evicts until it fits
+    assert cache.get_stats()["bytes"] <= 10
+
+
+def test_memory_cache_ttl():
+    cache = MemoryCache(ttl=0.01)
+    cache.set("a", "value")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(disk=SQLiteCache(path)).set("k", "stored")
+
+    fresh = ResponseCache(disk=SQLiteCache(path))
+    assert fresh.get("k") == "stored"
+    assert fresh.get("k") == "stored"
+    stats = fresh.get_stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_disk_tier_prunes_oldest_entries_periodically(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=5, prune_every=4)
+    for i in range(7):
+        cache.set(f"k{i}", "v")
+    # Not pruned yet: the fourth write found only 4 entries
+    assert cache.get_stats()["entries"] == 7
+    cache.set("k7", "v")
+    assert cache.get_stats()["entries"] == 5
+    assert cache.get("k0") is None and cache.get("k2") is None and cache.get("k3") == "v"
+    plan = " ".join(row[-1] for row in cache._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT key FROM response_cache ORDER BY created_at LIMIT 1"
+    ))
+    assert "idx_response_cache_created" in plan
+
+
+def test_model_client_serves_repeat_prompts_from_cache(monkeypatch):
+    monkeypatch.setenv("GITHUB_MODEL_API_TOKEN", "test-token")
+    client = model_client_real.ModelClient(cache=ResponseCache())
+    calls = []
+    fits = []
+
+    def fake_call(chat, deadline=None, priority=0):
+        calls.append(chat)
+        return f"answer {len(calls)}"
+
+    fit = client.budget.fit
+    monkeypatch.setattr(client, "_call_github_model", fake_call)
+    monkeypatch.setattr(client.budget, "fit", lambda messages: fits.append(messages) or fit(messages))
+
+    assert client.generate("same prompt") == "answer 1"
+    assert client.generate("same prompt") == "answer 1"
+    assert client.generate("same prompt", use_cache=False) == "answer 2"
+    assert len(calls) == 2
+    # The request is built (and measured) once per call, for both the cache key and the upstream call
+    assert len(fits) == 3
+    # Streamed and non-streamed calls share cache entries (the bypassing call refreshed this one)
+    assert "".join(client.generate_stream("same prompt")) == "answer 2"
+    stats = client.get_stats()["response_cache"]
+    assert stats["hits"] == 2
+    assert stats["bypasses"] == 1
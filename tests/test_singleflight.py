@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from singleflight import AsyncSingleFlight, SingleFlight, SingleFlightTimeout
+
+
+def _run_concurrently(n, target):
+    results = [None] * n
+    started = threading.Barrier(n)
+
+    def worker(i):
+        started.wait()
+        try:
+            results[i] = target()
+        except Exception as exc:
+            results[i] = exc
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight(wait_timeout=5)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    results = _run_concurrently(5, lambda: flight.do("key", slow))
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    stats = flight.get_stats()
+    assert stats["leaders"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_error_is_delivered_to_every_waiter():
+    flight = SingleFlight(wait_timeout=5)
+
+    def failing():
+        time.sleep(0.2)
+        raise ConnectionError("upstream down")
+
+    results = _run_concurrently(3, lambda: flight.do("key", failing))
+    assert all(isinstance(r, ConnectionError) for r in results)
+
+
+def test_waiter_gives_up_after_timeout():
+    flight = SingleFlight(wait_timeout=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do("key", release.wait))
+    leader.start()
+    time.sleep(0.02)
+    with pytest.raises(SingleFlightTimeout):
+        flight.do("key", lambda: "never")
+    release.set()
+    leader.join()
+    assert flight.get_stats()["timeouts"] == 1
+
+
+def test_async_waiters_share_the_leaders_call_and_error():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        sf = AsyncSingleFlight(wait_timeout=5)
+        results = await asyncio.gather(*(sf.do("k", fetch) for _ in range(5)))
+        errors = await asyncio.gather(*(sf.do("e", fail) for _ in range(3)), return_exceptions=True)
+        return sf, results, errors
+
+    sf, results, errors = asyncio.run(run())
+    assert results == ["answer"] * 5 and len(calls) == 1
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    stats = sf.get_stats()
+    assert (stats["leaders"], stats["coalesced"], stats["in_flight"]) == (2, 6, 0)
+
+
+def test_async_waiter_times_out_without_cancelling_the_leader():
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "late"
+
+    async def run():
+        sf = AsyncSingleFlight(wait_timeout=0.01)
+        leader = asyncio.ensure_future(sf.do("k", slow))
+        await asyncio.sleep(0)
+        with pytest.raises(SingleFlightTimeout):
+            await sf.do("k", slow)
+        return sf, await leader
+
+    sf, result = asyncio.run(run())
+    assert result == "late" and sf.get_stats()["timeouts"] == 1
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, model_client
+from streaming import iter_completion_deltas, sse_event
+import model_client_real
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    monkeypatch.delenv("AUTH_USERNAME", raising=False)
+    monkeypatch.setattr(model_client, "api_token", None)
+    with app.test_client() as client:
+        yield client
+
+
+def test_iter_completion_deltas_parses_sse():
+    lines = [
+        'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+        "",
+        'data: {"choices": [{"delta": {"content": "Hello"}}]}',
+        ": keep-alive comment",
+        'data: {"choices": [{"delta": {"content": " world"}}]}',
+        "data: [DONE]",
+        'data: {"choices": [{"delta": {"content": "ignored"}}]}',
+    ]
+    assert list(iter_completion_deltas(lines)) == ["Hello", " world"]
+
+
+def test_real_client_mock_stream_matches_generate(monkeypatch):
+    monkeypatch.delenv("GITHUB_MODEL_API_TOKEN", raising=False)
+    client = model_client_real.ModelClient()
+    prompt = "Draft a complaint"
+    chunks = list(client.generate_stream(prompt))
+    assert len(chunks) > 1
+    assert "".join(chunks) == client.generate(prompt)
+
+
+def test_api_generate_stream_ndjson(client):
+    rv = client.post(
+        "/api/v1/generate/stream",
+        json={"prompt": "Test question"},
+        headers={"X-API-Key": "test-api-key"},
+    )
+    assert rv.status_code == 200
+    assert rv.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in rv.data.decode().splitlines()]
+    assert records[-1] == {"type": "done", "success": True}
+    text = "".join(r["text"] for r in records if r["type"] == "chunk")
+    assert "MOCK RESPONSE" in text
+
+
+def test_api_generate_stream_sse(client):
+    rv = client.post(
+        "/api/v1/generate/stream?format=sse",
+        json={"prompt": "Test question"},
+        headers={"X-API-Key": "test-api-key"},
+    )
+    assert rv.status_code == 200
+    assert rv.mimetype == "text/event-stream"
+    assert rv.data.decode().endswith(sse_event({"type": "done", "success": True}, event="done"))
+
+
+def test_api_generate_stream_requires_prompt(client):
+    rv = client.post("/api/v1/generate/stream", json={}, headers={"X-API-Key": "test-api-key"})
+    assert rv.status_code == 400
+
+
+def test_ask_stream(client):
+    with client.session_transaction() as sess:
+        sess["user"] = "testuser"
+    rv = client.post("/ask/stream", data={"query": "Draft a complaint", "document_type": "complaint"})
+    assert rv.status_code == 200
+    body = rv.data.decode()
+    assert "event: chunk" in body
+    assert body.endswith("event: done\ndata: {}\n\n")
@@ -0,0 +1,109 @@
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+
+import prompts_full
+from api import register_api_routes
+from fake_model_server import FakeModelServer
+from model_client_real import ModelClient
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+from token_budget import PromptTooLarge, TokenBudget, count_messages, count_tokens, truncate_middle
+
+DEPOSITION = "Q. Where were you on the night of March 3rd, 2023?\nA. At the warehouse on 12th Street.\n" * 2000
+
+
+def test_count_tokens_is_conservative():
+    assert count_tokens("") == 0
+    assert count_tokens("Hello, world") >= 3
+    # Never wildly below the usual four-characters-per-token rule of thumb
+    assert count_tokens(DEPOSITION) >= len(DEPOSITION) // 5
+    assert count_messages([{"role": "user", "content": "Hello"}]) == count_tokens("Hello") + 6
+
+
+def test_truncate_middle_keeps_head_and_tail():
+    trimmed = truncate_middle(DEPOSITION, 500)
+    assert count_tokens(trimmed) <= 500
+    assert trimmed.startswith("Q. Where were you")
+    assert trimmed.rstrip().endswith("12th Street.")
+    assert "tokens omitted" in trimmed
+    assert truncate_middle("short", 500) == "short"
+
+
+def test_fit_sizes_max_tokens_to_remaining_room():
+    budget = TokenBudget(context_window=4000, max_output=2048, min_output=256)
+    small = budget.fit([{"role": "user", "content": "What is Rule 12?"}])
+    assert small.max_tokens == 2048 and small.trimmed_tokens == 0
+
+    messages = [{"role": "user", "content": "word " * 3000}]
+    large = budget.fit(messages)
+    assert large.max_tokens == 4000 - large.prompt_tokens
+    assert 256 <= large.max_tokens < 2048
+    assert large.messages is messages
+
+    with pytest.raises(PromptTooLarge) as excinfo:
+        budget.fit([{"role": "user", "content": DEPOSITION}])
+    assert excinfo.value.limit == 4000 - 256
+    assert budget.get_stats()["rejected"] == 1
+
+
+def test_trim_mode_only_cuts_the_user_message():
+    budget = TokenBudget(context_window=8000, prompt_budget=3000, overflow="trim")
+    messages = prompts_full.build_document_messages("complaint", "Federal", DEPOSITION, context="full")
+    fit = budget.fit(messages)
+    assert fit.messages[:2] == messages[:2]
+    assert fit.prompt_tokens <= 3000 and fit.trimmed_tokens > 0
+    assert fit.prompt_tokens == count_messages(fit.messages)
+    budget.record(fit)
+    stats = budget.get_stats()
+    assert stats["trimmed"] == 1 and stats["max_prompt_tokens"] == fit.prompt_tokens
+
+    # Nothing to trim when the static prefix alone is over budget
+    tiny = TokenBudget(context_window=800, min_output=100, overflow="trim")
+    with pytest.raises(PromptTooLarge):
+        tiny.fit(messages)
+
+
+@pytest.fixture
+def budget_client(monkeypatch):
+    fake = FakeModelServer(latency="fixed:0").start()
+    monkeypatch.setenv("GITHUB_MODEL_API_TOKEN", "fake-token")
+    monkeypatch.setenv("GITHUB_MODEL_ENDPOINT", fake.url)
+    monkeypatch.setenv("MODEL_CONTEXT_TOKENS", "12000")
+    yield ModelClient(cache=ResponseCache(enabled=False), limiter=RateLimiter()), fake
+    fake.stop()
+
+
+def test_oversized_prompt_fails_before_dispatch(budget_client):
+    client, fake = budget_client
+    with pytest.raises(PromptTooLarge):
+        client.generate(prompts_full.build_document_messages("complaint", "Federal", DEPOSITION))
+    with pytest.raises(PromptTooLarge):
+        list(client.generate_stream(DEPOSITION))
+    assert fake.get_stats()["requests"] == 0
+
+    client.generate(prompts_full.build_document_messages("complaint", "Federal", "Who do I serve?"))
+    stats = client.get_stats()["token_budget"]
+    assert stats["requests"] == 1 and stats["rejected"] == 2
+    assert stats["context_window"] == 12000 and stats["avg_max_tokens"] == 2048
+
+
+def test_api_reports_oversized_prompt_as_413(budget_client, monkeypatch):
+    client, fake = budget_client
+    # Too small even for the map-reduce fallback to fit an excerpt
+    client.budget.context_window = 600
+    monkeypatch.setenv("ODOO_API_KEY", "test-api-key")
+    app = Flask(__name__)
+    register_api_routes(app, client)
+    rv = app.test_client().post(
+        "/api/v1/generate", json={"prompt": DEPOSITION}, headers={"X-API-Key": "test-api-key"}
+    )
+    assert rv.status_code == 413
+    assert "tokens" in rv.get_json()["error"]
+    assert fake.get_stats()["requests"] == 0
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import token_store
+import users
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    yield users
+    users._db().close_all()
+
+
+def test_validate_and_expiry(db):
+    token = db.generate_token("alice", "invite", expires_in_hours=1)
+    assert db.validate_token(token, "invite") == "alice"
+    assert db.validate_token(token, "password_reset") is None
+    expired = db.generate_token("alice", "invite", expires_in_hours=-1)
+    assert db.validate_token(expired, "invite") is None
+    with db._db().connection() as conn:
+        value = conn.execute("SELECT expires_at FROM tokens WHERE token = ?", (token,)).fetchone()[0]
+    assert isinstance(value, int) and abs(value - (time.time() + 3600)) < 5
+
+
+def test_consume_valid_is_single_use_under_concurrency(db):
+    token = db.generate_token("alice", "invite")
+    winners = []
+    barrier = threading.Barrier(8)
+
+    def redeem():
+        barrier.wait()
+        winners.append(db.tokens.consume_valid(token, "invite"))
+
+    threads = [threading.Thread(target=redeem) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert winners.count("alice") == 1 and winners.count(None) == 7
+    assert db.validate_token(token, "invite") is None
+
+
+def test_redeem_token_sets_password_once(db):
+    token = db.generate_token("newbie", "invite")
+    assert db.redeem_token(token, "invite", "first-password") == "newbie"
+    assert db.verify_password("newbie", "first-password")
+    assert db.redeem_token(token, "invite", "second-password") is None
+    assert db.verify_password("newbie", "first-password")
+
+
+def test_sweep_deletes_expired_in_batches(db):
+    with db._db().transaction() as conn:
+        conn.executemany(
+            "INSERT INTO tokens (token, username, token_type, expires_at, created_at) VALUES (?, ?, ?, ?, '')",
+            [(f"old{i}", "u", "invite" if i % 2 else "password_reset", 1000) for i in range(25)],
+        )
+    live = db.generate_token("u", "invite")
+    db.tokens.batch_size = 4
+    assert db.tokens.sweep_expired() == 25
+    assert db.validate_token(live, "invite") == "u"
+    stats = db.get_db_stats()["tokens"]
+    assert stats["swept"] == 25 and stats["sweeps"] == 1
+    assert stats["by_type"] == {"invite": {"live": 1, "expired": 0}}
+
+
+def test_background_sweeper(db):
+    db.generate_token("u", "invite", expires_in_hours=-1)
+    store = db.token_store.TokenStore(db._db, sweep_interval=0.01)
+    assert store.start_sweeper()
+    try:
+        deadline = time.time() + 5
+        while store.get_stats()["swept"] < 1 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        store.stop_sweeper()
+    assert store.get_stats()["swept"] == 1
+
+
+def test_lookups_use_indexes(db):
+    with db._db().connection() as conn:
+        sweep_plan = " ".join(
+            row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM tokens WHERE token_type = ? AND expires_at <= ?", ("invite", 0)
+            )
+        )
+        user_plan = " ".join(
+            row[3] for row in conn.execute("EXPLAIN QUERY PLAN SELECT id FROM tokens WHERE username = ?", ("u",))
+        )
+    assert "idx_tokens_type_expires" in sweep_plan
+    assert "idx_tokens_username" in user_plan
+
+
+def test_legacy_text_expiry_is_migrated(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE tokens (id INTEGER PRIMARY KEY AUTOINCREMENT, token TEXT UNIQUE NOT NULL, "
+        "username TEXT NOT NULL, token_type TEXT NOT NULL, expires_at TEXT NOT NULL, created_at TEXT NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO tokens (token, username, token_type, expires_at, created_at) VALUES "
+        "('keep', 'alice', 'invite', '2999-01-01T00:00:00.123456', '2024-01-01T00:00:00'), "
+        "('gone', 'bob', 'invite', '2000-01-01T00:00:00', '2000-01-01T00:00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(users, "DB_PATH", path)
+    try:
+        assert users.validate_token("keep", "invite") == "alice"
+        assert users.validate_token("gone", "invite") is None
+        with users._db().connection() as conn:
+            types = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(tokens)")}
+            indexes = {row[1] for row in conn.execute("PRAGMA index_list(tokens)")}
+        assert types["expires_at"] == "INTEGER"
+        assert {"idx_tokens_type_expires", "idx_tokens_username"} <= indexes
+    finally:
+        users._db().close_all()
+
+
+def test_migration_rechecks_the_column_under_the_write_lock(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE tokens (id INTEGER PRIMARY KEY AUTOINCREMENT, token TEXT UNIQUE NOT NULL, "
+        "username TEXT NOT NULL, token_type TEXT NOT NULL, expires_at TEXT NOT NULL, created_at TEXT NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO tokens (token, username, token_type, expires_at, created_at) "
+        "VALUES ('keep', 'alice', 'invite', '2999-01-01T00:00:00', '2024-01-01T00:00:00')"
+    )
+    conn.commit()
+    other = sqlite3.connect(path)
+    token_store.migrate_expires_at(conn)
+
+    # A second worker that saw the legacy column before the first one migrated it
+    checks = iter([True])
+    real_check = token_store._expires_at_is_text
+    monkeypatch.setattr(token_store, "_expires_at_is_text", lambda c: next(checks, None) or real_check(c))
+    token_store.migrate_expires_at(other)
+    assert other.execute("SELECT token, expires_at FROM tokens").fetchall() == [("keep", 32472144000)]
+    conn.close()
+    other.close()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import auth
+import users
+from user_cache import UserCache
+
+
+def test_lru_eviction_and_ttl():
+    cache = UserCache(max_entries=2, ttl=0.05)
+    cache.get("a", 1)
+    cache.put("a", {"username": "a"}, 1)
+    cache.put("b", {"username": "b"}, 1)
+    assert cache.get("a", 1) == (True, {"username": "a"})
+    cache.put("c", {"username": "c"}, 1)  # evicts b, the least recently used
+    assert cache.get("b", 1) == (False, None)
+    time.sleep(0.06)
+    assert cache.get("a", 1) == (False, None)
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_version_change_drops_everything():
+    cache = UserCache()
+    cache.get("a", 1)
+    cache.put("a", {"username": "a"}, 1)
+    cache.put("ghost", None, 1)
+    assert cache.get("ghost", 1) == (True, None)
+    assert cache.get("a", 2) == (False, None)
+    # A read made at the old version is not cached after the change
+    cache.put("a", {"username": "stale"}, 1)
+    assert cache.get("a", 2) == (False, None)
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_get_user_is_cached_and_sees_other_workers_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    users.create_user("admin", "pw", is_admin=True)
+    # Write-through: visible immediately
+    assert users.get_user("admin")["is_admin"] is True
+
+    stats_before = users.get_db_stats()["user_cache"]
+    for _ in range(20):
+        assert users.get_user("admin")["is_admin"] is True
+        assert users.verify_password("admin", "pw")
+    stats = users.get_db_stats()["user_cache"]
+    assert stats["hits"] - stats_before["hits"] >= 39
+    assert stats["hit_rate"] > 0.5
+
+    # Another worker demotes the admin directly in SQLite
+    other = sqlite3.connect(users.DB_PATH)
+    other.execute("UPDATE users SET is_admin = 0 WHERE username = 'admin'")
+    other.commit()
+    other.close()
+    assert users.get_user("admin")["is_admin"] is False
+
+    users.delete_user("admin")
+    assert users.get_user("admin") is None
+
+
+def test_is_current_user_admin_uses_cache(tmp_path, monkeypatch):
+    from flask import Flask
+
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    users.create_user("boss", "pw", is_admin=True)
+    app = Flask(__name__)
+    app.secret_key = "test"
+    with app.test_request_context():
+        auth.login_user("boss")
+        assert auth.is_current_user_admin() is True
+        users.create_user("boss", "pw", is_admin=False)
+        assert auth.is_current_user_admin() is False
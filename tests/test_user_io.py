@@ -0,0 +1,148 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import users
+import user_io
+from password_hashing import HashPool
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "users.db"))
+    yield users
+    users._db().close_all()
+
+
+def test_import_csv_in_batches(db):
+    db.create_user("existing", "old-password")
+    data = (
+        "username,password,is_admin\n"
+        "alice,pw-alice,true\n"
+        "bob,pw-bob,\n"
+        "existing,new-password,0\n"
+        ",orphan,0\n"
+        "carol,,0\n"
+        "alice,again,0\n"
+        "dave,pw-dave,no\n"
+    )
+    batches = []
+    summary = db.import_users(
+        user_io.read_users(io.StringIO(data), "csv"), batch_size=2, pool=HashPool(workers=2),
+        progress=lambda s: batches.append(s["processed"]),
+    )
+    assert summary["created"] == 3
+    assert summary["skipped"] == 2  # existing user, duplicate alice
+    assert [e["line"] for e in summary["errors"]] == [4, 5]
+    assert len(batches) == 3
+    assert db.verify_password("alice", "pw-alice") and db.get_user("alice")["is_admin"]
+    assert not db.get_user("dave")["is_admin"]
+    assert db.verify_password("existing", "old-password")
+
+
+def test_import_overwrite_updates_existing(db):
+    db.create_user("existing", "old-password")
+    rows = [{"username": "existing", "password": "new-password", "is_admin": True}]
+    summary = db.import_users(rows, overwrite=True)
+    assert summary["updated"] == 1 and summary["created"] == 0
+    assert db.verify_password("existing", "new-password")
+    assert db.get_user("existing")["is_admin"]
+
+
+def test_import_reports_bad_password_values(db):
+    good_hash = db.get_hash_pool().hash_password("pw")
+    rows = [
+        {"username": "a", "password": 1234},
+        {"username": "b", "password_hash": "plaintext"},
+        {"username": "c", "password_hash": "md5$salt$abc"},
+        {"username": "d", "password_hash": ["x"]},
+        {"username": "e", "password_hash": good_hash},
+        {"username": "f", "password": "pw-f"},
+    ]
+    summary = db.import_users(rows)
+    assert [e["line"] for e in summary["errors"]] == [1, 2, 3, 4]
+    assert summary["created"] == 2
+    assert db.verify_password("e", "pw") and db.verify_password("f", "pw-f")
+
+
+def test_jsonl_rejects_bad_lines():
+    rows = user_io.read_users(io.StringIO('{"username": "a", "password": "x"}\n\nnot json\n'), "jsonl")
+    assert next(rows)["username"] == "a"
+    with pytest.raises(ValueError, match="Line 3"):
+        next(rows)
+
+
+def test_export_round_trip_with_hashes(db, tmp_path, monkeypatch):
+    for i in range(5):
+        db.import_users([{"username": f"user{i}", "password": f"pw{i}", "is_admin": i == 0}])
+    chunks = list(user_io.export_users("jsonl", include_hashes=True, batch_size=2))
+    assert len(chunks) == 3
+    exported = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [u["username"] for u in exported] == [f"user{i}" for i in range(5)]
+
+    monkeypatch.setattr(users, "DB_PATH", str(tmp_path / "restored.db"))
+    summary = users.import_users(exported)
+    assert summary["created"] == 5
+    assert users.verify_password("user3", "pw3") and users.get_user("user0")["is_admin"]
+
+    csv_text = "".join(user_io.export_users("csv"))
+    assert csv_text.splitlines()[0] == "username,is_admin"
+    assert "password" not in csv_text
+
+
+def test_keyset_pages_and_search(db):
+    db.import_users(
+        [{"username": name, "password_hash": "scrypt:32768:8:1$salt$00"}
+         for name in ["amy", "ann", "bob", "b_x", "bax", "cat", "dan"]]
+    )
+    seen, after = [], None
+    while True:
+        page, after = db.list_users_page(after=after, limit=3)
+        seen += [u["username"] for u in page]
+        if after is None:
+            break
+    assert seen == ["amy", "ann", "b_x", "bax", "bob", "cat", "dan"]
+    page, after = db.list_users_page(search="A")
+    assert [u["username"] for u in page] == ["amy", "ann", "bax", "cat", "dan"] and after is None
+    # LIKE wildcards in the search are literal
+    assert [u["username"] for u in db.list_users_page(search="_")[0]] == ["b_x"]
+
+
+def test_admin_import_export_and_paging(db, monkeypatch):
+    from app import app
+    monkeypatch.setattr("app.ADMIN_PAGE_SIZE", 2)
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    db.create_user("admin", "AdminPass123", is_admin=True)
+    with client.session_transaction() as sess:
+        sess["user"] = "admin"
+
+    upload = io.BytesIO(b'{"username": "zed", "password": "pw"}\n{"username": "yan", "password": "pw"}\n')
+    rv = client.post("/admin/import", data={"file": (upload, "staff.jsonl")}, content_type="multipart/form-data")
+    assert rv.status_code == 302
+    assert db.get_user("zed") and db.get_user("yan")
+
+    rv = client.get("/admin")
+    assert b"admin" in rv.data and b"after=yan" in rv.data and b"zed" not in rv.data
+    rv = client.get("/admin?after=yan")
+    assert b"zed" in rv.data
+
+    rv = client.get("/admin/export?format=csv")
+    assert rv.mimetype == "text/csv"
+    assert rv.get_data(as_text=True).splitlines() == ["username,is_admin", "admin,True", "yan,False", "zed,False"]
+
+
+def test_cli_import_and_export(db, tmp_path):
+    src = tmp_path / "staff.csv"
+    src.write_text("username,password\nuser1,pw1\nuser2,pw2\n", encoding="utf-8")
+    assert user_io.main(["import", str(src), "--workers", "2"]) == 0
+    out = tmp_path / "out.jsonl"
+    assert user_io.main(["export", str(out)]) == 0
+    assert [json.loads(line)["username"] for line in out.read_text().splitlines()] == ["user1", "user2"]
@@ -0,0 +1,260 @@
+"""Local token counting and per-model context budgets.
+
+Every chat request is measured before it leaves the process:
+  - `count_tokens` uses tiktoken when it is installed
+    (`pip install paralegal-agent[tokens]`) and otherwise a fast regex
+    estimate that errs on the high side (letter runs of up to six
+    characters, groups of up to three digits and each punctuation mark
+    count as one token);
+  - `TokenBudget.fit` checks the messages against the model's context
+    window and sizes `max_tokens` to the room that is left, capped at the
+    configured output limit;
+  - a prompt that leaves less than the minimum output room is rejected with
+    `PromptTooLarge`, or, with MODEL_PROMPT_OVERFLOW=trim, has the middle
+    of its last user message cut out (the system and template messages,
+    which form the cacheable prefix, are never trimmed).
+
+Counts are memoised per string, so the static system and template blocks
+are only measured once.
+
+Configuration comes from environment variables:
+  - MODEL_CONTEXT_TOKENS: context window; overrides the built-in table of
+    known models (default: from the table, 8192 for unknown models)
+  - MODEL_PROMPT_BUDGET_TOKENS: cap on prompt tokens below the window, e.g.
+    for cost control (default: unset)
+  - MODEL_MAX_OUTPUT_TOKENS: upper bound for `max_tokens` (default: 2048)
+  - MODEL_MIN_OUTPUT_TOKENS: smallest answer room a request may be left
+    with (default: 256)
+  - MODEL_PROMPT_OVERFLOW: "error" or "trim" (default: error)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+
+# Context windows of models served by GitHub Models, in tokens
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4.1-mini": 1_047_576,
+    "gpt-4.1-nano": 1_047_576,
+    "o1": 200_000,
+    "o1-mini": 128_000,
+    "o3-mini": 200_000,
+    "o4-mini": 200_000,
+    "meta-llama-3.1-8b-instruct": 128_000,
+    "meta-llama-3.1-70b-instruct": 128_000,
+    "llama-3.3-70b-instruct": 128_000,
+    "mistral-large-2411": 128_000,
+    "mistral-small-2503": 128_000,
+    "phi-4": 16_384,
+    "phi-3.5-mini-instruct": 128_000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Chat formatting overhead: per message, and for priming the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+OVERFLOW_MODES = ("error", "trim")
+TRIM_MARKER = "\n\n[... {omitted} tokens omitted to fit the model's context window ...]\n\n"
+
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]")
+
+
+class PromptTooLarge(ValueError):
+    """Raised before dispatch when a prompt does not fit the model's context budget."""
+
+    def __init__(self, prompt_tokens: int, limit: int, model: Optional[str] = None):
+        self.prompt_tokens = prompt_tokens
+        self.limit = limit
+        self.model = model
+        super().__init__(
+            f"Prompt is about {prompt_tokens} tokens; {model or 'the model'} accepts at most {limit} "
+            "prompt tokens for this request"
+        )
+
+
+def _load_encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Encodings are downloaded on first use; offline hosts fall back to the estimate
+        return None
+
+
+_encoding = _load_encoding()
+
+
+@lru_cache(maxsize=128)
+def count_tokens(text: str) -> int:
+    """Count (or conservatively estimate) the tokens in `text`."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return sum(1 for _ in _TOKEN_RE.finditer(text))
+
+
+def token_offsets(text: str) -> List[int]:
+    """Character offset at which each token of `text` starts."""
+    if not text:
+        return []
+    if _encoding is not None:
+        _, offsets = _encoding.decode_with_offsets(_encoding.encode(text, disallowed_special=()))
+        return offsets
+    return [m.start() for m in _TOKEN_RE.finditer(text)]
+
+
+def count_messages(messages: List[Dict[str, str]]) -> int:
+    """Tokens a chat request's messages take up, formatting overhead included."""
+    return sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in messages) + TOKENS_PER_REPLY
+
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    """Cut the middle out of `text` so it is at most `max_tokens` tokens, marker included."""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    starts = token_offsets(text)
+
+    def cut(head_tokens: int, tail_tokens: int) -> "tuple[str, str]":
+        tail = text[starts[len(starts) - tail_tokens]:] if tail_tokens else ""
+        return text[: starts[head_tokens]], tail
+
+    keep = max(0, max_tokens - count_tokens(TRIM_MARKER.format(omitted=total)))
+    while True:
+        head, tail = cut(keep // 2, keep - keep // 2)
+        result = head + TRIM_MARKER.format(omitted=total - keep) + tail
+        # Re-tokenising across the seams can shift the count by a token or two
+        over = count_tokens(result) - max_tokens
+        if over <= 0 or keep == 0:
+            return result
+        keep = max(0, keep - over)
+
+
+class Fit(NamedTuple):
+    """A request that fits its budget: the messages to send and their token counts."""
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    max_tokens: int
+    trimmed_tokens: int
+
+
+class TokenBudget:
+    """Per-model prompt budget with output sizing and request statistics."""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        context_window: Optional[int] = None,
+        prompt_budget: Optional[int] = None,
+        max_output: int = 2048,
+        min_output: int = 256,
+        overflow: str = "error",
+    ):
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_MODES}, not {overflow!r}")
+        self.model_name = model_name
+        if context_window is None:
+            context_window = MODEL_CONTEXT_WINDOWS.get((model_name or "").lower(), DEFAULT_CONTEXT_WINDOW)
+        self.context_window = context_window
+        self.prompt_budget = prompt_budget
+        self.max_output = max_output
+        self.min_output = min_output
+        self.overflow = overflow
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.output_tokens_reserved = 0
+        self.rejected = 0
+        self.trimmed = 0
+        self.trimmed_tokens = 0
+
+    @classmethod
+    def from_env(cls, model_name: Optional[str] = None) -> "TokenBudget":
+        context = os.environ.get("MODEL_CONTEXT_TOKENS")
+        budget = os.environ.get("MODEL_PROMPT_BUDGET_TOKENS")
+        return cls(
+            model_name=model_name,
+            context_window=int(context) if context else None,
+            prompt_budget=int(budget) if budget else None,
+            max_output=int(os.environ.get("MODEL_MAX_OUTPUT_TOKENS", 2048)),
+            min_output=int(os.environ.get("MODEL_MIN_OUTPUT_TOKENS", 256)),
+            overflow=os.environ.get("MODEL_PROMPT_OVERFLOW", "error").lower(),
+        )
+
+    @property
+    def prompt_limit(self) -> int:
+        """Most prompt tokens a request may use and still leave `min_output` room."""
+        limit = self.context_window - self.min_output
+        if self.prompt_budget is not None:
+            limit = min(limit, self.prompt_budget)
+        return max(0, limit)
+
+    def fit(self, messages: List[Dict[str, str]]) -> Fit:
+        """Check `messages` against the budget; trim or raise `PromptTooLarge` if they do not fit.
+
+        Does not record anything; call `record` when the request is sent.
+        """
+        prompt_tokens = count_messages(messages)
+        trimmed_tokens = 0
+        limit = self.prompt_limit
+        if prompt_tokens > limit:
+            if self.overflow != "trim" or not messages or messages[-1]["role"] != "user":
+                self._count_rejected()
+                raise PromptTooLarge(prompt_tokens, limit, self.model_name)
+            last = messages[-1]
+            room = count_tokens(last["content"]) - (prompt_tokens - limit)
+            if room <= 0:
+                # Even an empty user message would not fit next to the static prefix
+                self._count_rejected()
+                raise PromptTooLarge(prompt_tokens, limit, self.model_name)
+            messages = messages[:-1] + [dict(last, content=truncate_middle(last["content"], room))]
+            trimmed_tokens = prompt_tokens - count_messages(messages)
+            prompt_tokens -= trimmed_tokens
+        max_tokens = min(self.max_output, self.context_window - prompt_tokens)
+        return Fit(messages, prompt_tokens, max_tokens, trimmed_tokens)
+
+    def record(self, fit: Fit) -> None:
+        """Record the token counts of a request that is being sent."""
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += fit.prompt_tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, fit.prompt_tokens)
+            self.output_tokens_reserved += fit.max_tokens
+            if fit.trimmed_tokens:
+                self.trimmed += 1
+                self.trimmed_tokens += fit.trimmed_tokens
+
+    def _count_rejected(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "tokenizer": "tiktoken" if _encoding is not None else "estimate",
+                "context_window": self.context_window,
+                "prompt_limit": self.prompt_limit,
+                "max_output": self.max_output,
+                "overflow": self.overflow,
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "avg_prompt_tokens": self.prompt_tokens / self.requests if self.requests else 0.0,
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "avg_max_tokens": self.output_tokens_reserved / self.requests if self.requests else 0.0,
+                "rejected": self.rejected,
+                "trimmed": self.trimmed,
+                "trimmed_tokens": self.trimmed_tokens,
+            }
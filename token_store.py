@@ -0,0 +1,266 @@
+"""Invite and password-reset tokens, stored in the users database.
+
+`TokenStore` keeps the `tokens` table bounded and its lookups cheap:
+  - `expires_at` is an integer Unix epoch, so expiry checks are plain
+    integer comparisons (older databases with ISO-8601 text are migrated
+    on first use by `migrate_expires_at`);
+  - `(token_type, expires_at)` and `username` are indexed, so counting,
+    sweeping and per-user lookups do not scan the table;
+  - `consume_valid` looks a token up and deletes it in one
+    `BEGIN IMMEDIATE` transaction, so a token can be redeemed only once
+    even by concurrent requests;
+  - a background sweeper deletes expired rows in small batches, each its
+    own short transaction, so writers are never blocked for long.
+
+Configuration comes from environment variables:
+  - TOKEN_SWEEP_INTERVAL_SECONDS: time between sweeps; 0 disables the
+    background sweeper (default: 600)
+  - TOKEN_SWEEP_BATCH_SIZE: rows deleted per transaction (default: 500)
+"""
+from __future__ import annotations
+
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from db_pool import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token TEXT UNIQUE NOT NULL,
+        username TEXT NOT NULL,
+        token_type TEXT NOT NULL,
+        expires_at INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (username) REFERENCES users (username)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_tokens_type_expires ON tokens (token_type, expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_tokens_username ON tokens (username)",
+]
+
+
+def _expires_at_is_text(conn: sqlite3.Connection) -> bool:
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(tokens)")}
+    return columns.get("expires_at", "").upper() == "TEXT"
+
+
+def migrate_expires_at(conn: sqlite3.Connection) -> None:
+    """Rebuild a `tokens` table whose `expires_at` is ISO-8601 text."""
+    if not _expires_at_is_text(conn):
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have migrated the table while we waited for the lock
+        if not _expires_at_is_text(conn):
+            conn.rollback()
+            return
+        conn.execute("ALTER TABLE tokens RENAME TO tokens_legacy")
+        conn.execute(SCHEMA[0])
+        conn.execute(
+            "INSERT INTO tokens (id, token, username, token_type, expires_at, created_at) "
+            "SELECT id, token, username, token_type, CAST(strftime('%s', expires_at) AS INTEGER), created_at "
+            "FROM tokens_legacy"
+        )
+        conn.execute("DROP TABLE tokens_legacy")
+        # The indexes went with the legacy table
+        for statement in SCHEMA[1:]:
+            conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("Migrated tokens.expires_at to integer epoch seconds")
+
+
+class TokenStore:
+    """Create, validate and redeem tokens; sweep out expired ones."""
+
+    def __init__(
+        self,
+        db: Callable[[], ConnectionManager],
+        sweep_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self._db = db
+        if sweep_interval is None:
+            sweep_interval = float(os.environ.get("TOKEN_SWEEP_INTERVAL_SECONDS", 600))
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size or int(os.environ.get("TOKEN_SWEEP_BATCH_SIZE", 500))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self.created = 0
+        self.consumed = 0
+        self.sweeps = 0
+        self.swept = 0
+        self.last_sweep_seconds = 0.0
+        self.max_sweep_seconds = 0.0
+        self.last_sweep_at: Optional[float] = None
+
+    def create(self, username: str, token_type: str, expires_in_hours: float = 24) -> str:
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        with self._db().transaction() as conn:
+            conn.execute(
+                "INSERT INTO tokens (token, username, token_type, expires_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (token, username, token_type, int(now + expires_in_hours * 3600), datetime.utcfromtimestamp(now).isoformat()),
+            )
+        with self._lock:
+            self.created += 1
+        return token
+
+    def create_many(self, usernames: Sequence[str], token_type: str, expires_in_hours: float = 24) -> List[str]:
+        """Create one token per username in a single transaction; return them in order."""
+        now = time.time()
+        expires_at = int(now + expires_in_hours * 3600)
+        created_at = datetime.utcfromtimestamp(now).isoformat()
+        tokens = [secrets.token_urlsafe(32) for _ in usernames]
+        with self._db().transaction() as conn:
+            conn.executemany(
+                "INSERT INTO tokens (token, username, token_type, expires_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(token, username, token_type, expires_at, created_at) for token, username in zip(tokens, usernames)],
+            )
+        with self._lock:
+            self.created += len(tokens)
+        return tokens
+
+    def validate(self, token: str, token_type: str) -> Optional[str]:
+        """Return the token's username if it exists, has this type and has not expired."""
+        with self._db().connection() as conn:
+            row = conn.execute(
+                "SELECT username FROM tokens WHERE token = ? AND token_type = ? AND expires_at > ?",
+                (token, token_type, int(time.time())),
+            ).fetchone()
+        return row["username"] if row else None
+
+    def consume(self, token: str) -> None:
+        with self._db().transaction() as conn:
+            conn.execute("DELETE FROM tokens WHERE token = ?", (token,))
+
+    def revoke_many(self, tokens: Sequence[str]) -> None:
+        """Delete the given tokens in one transaction (unknown tokens are ignored)."""
+        with self._db().transaction() as conn:
+            for start in range(0, len(tokens), 500):
+                chunk = list(tokens[start:start + 500])
+                conn.execute(f"DELETE FROM tokens WHERE token IN ({','.join('?' * len(chunk))})", chunk)
+
+    def consume_valid(self, token: str, token_type: str, conn: Optional[sqlite3.Connection] = None) -> Optional[str]:
+        """Validate and delete a token in one transaction; return its username.
+
+        Pass `conn` to take part in a caller's transaction (so the token is
+        only spent if the rest of the transaction commits).
+        """
+        if conn is None:
+            with self._db().transaction() as own:
+                return self.consume_valid(token, token_type, own)
+        if not conn.in_transaction:
+            # Take the write lock before reading, so no other connection can
+            # spend the token between the lookup and the delete
+            conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT username FROM tokens WHERE token = ? AND token_type = ? AND expires_at > ?",
+            (token, token_type, int(time.time())),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM tokens WHERE token = ?", (token,))
+        with self._lock:
+            self.consumed += 1
+        return row["username"]
+
+    def sweep_expired(self, now: Optional[float] = None) -> int:
+        """Delete expired tokens in batches; return how many were removed."""
+        cutoff = int(time.time() if now is None else now)
+        started = time.perf_counter()
+        removed = 0
+        manager = self._db()
+        with manager.connection() as conn:
+            token_types = [row[0] for row in conn.execute("SELECT DISTINCT token_type FROM tokens")]
+        for token_type in token_types:
+            while True:
+                # One short transaction per batch, walking the (token_type, expires_at) index
+                with manager.transaction() as conn:
+                    cur = conn.execute(
+                        "DELETE FROM tokens WHERE id IN ("
+                        "SELECT id FROM tokens WHERE token_type = ? AND expires_at <= ? LIMIT ?)",
+                        (token_type, cutoff, self.batch_size),
+                    )
+                removed += cur.rowcount
+                if cur.rowcount < self.batch_size:
+                    break
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.sweeps += 1
+            self.swept += removed
+            self.last_sweep_seconds = elapsed
+            self.max_sweep_seconds = max(self.max_sweep_seconds, elapsed)
+            self.last_sweep_at = time.time()
+        return removed
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                removed = self.sweep_expired()
+                if removed:
+                    logger.info(f"Swept {removed} expired tokens")
+            except Exception as exc:
+                logger.error(f"Token sweep failed: {exc}")
+
+    def start_sweeper(self) -> bool:
+        """Start the background sweeper for this process (idempotent)."""
+        if self.sweep_interval <= 0:
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return True
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sweep_loop, name="token-sweeper", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+        return True
+
+    def stop_sweeper(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and self._thread_pid == os.getpid():
+            thread.join()
+        self._thread = None
+
+    def count_by_type(self) -> Dict[str, Dict[str, int]]:
+        """Live and expired token counts per type (served from the index)."""
+        with self._db().connection() as conn:
+            rows = conn.execute(
+                "SELECT token_type, COUNT(*) AS total, SUM(expires_at <= ?) AS expired FROM tokens GROUP BY token_type",
+                (int(time.time()),),
+            ).fetchall()
+        return {
+            row["token_type"]: {"live": row["total"] - row["expired"], "expired": row["expired"]}
+            for row in rows
+        }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "created": self.created,
+                "consumed": self.consumed,
+                "sweeps": self.sweeps,
+                "swept": self.swept,
+                "last_sweep_seconds": self.last_sweep_seconds,
+                "max_sweep_seconds": self.max_sweep_seconds,
+                "last_sweep_at": self.last_sweep_at,
+                "sweeper_running": self._thread is not None and self._thread.is_alive(),
+            }
+        stats["by_type"] = self.count_by_type()
+        return stats
@@ -0,0 +1,110 @@
+"""In-process cache of user records in front of `users.get_user`.
+
+`auth.is_current_user_admin` and `users.verify_password` look a user up on
+every admin page and login. `UserCache` keeps recent records (including
+the admin flag and password hash, and "no such user" answers) in a bounded
+LRU with a per-entry TTL.
+
+Correctness across gunicorn workers comes from SQLite's
+`PRAGMA data_version`: every lookup passes the current version, and when it
+differs from the one the cache was filled at (some connection, in any
+process, committed a write), the whole cache is dropped. Writes made by
+this process are also applied write-through by `users.create_user` and
+`users.delete_user`, so they are visible at once; their commit still
+moves the version, so the next lookup re-reads from the database once.
+The TTL only bounds how long an idle entry lives.
+
+Configuration comes from environment variables:
+  - USER_CACHE_ENABLED: set to "false" to disable the cache (default: true)
+  - USER_CACHE_MAX_ENTRIES: records kept (default: 1024)
+  - USER_CACHE_TTL_SECONDS: entry lifetime (default: 300)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class UserCache:
+    """Thread-safe LRU/TTL cache of user dicts keyed by username."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[Optional[Dict], float]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "UserCache":
+        return cls(
+            max_entries=int(os.environ.get("USER_CACHE_MAX_ENTRIES", 1024)),
+            ttl=float(os.environ.get("USER_CACHE_TTL_SECONDS", 300)),
+            enabled=os.environ.get("USER_CACHE_ENABLED", "true").lower() != "false",
+        )
+
+    def _sync(self, version: int) -> None:
+        """Drop everything if the database changed since the cache was filled. Lock held."""
+        if version != self._version:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._version = version
+
+    def get(self, username: str, version: int) -> Tuple[bool, Optional[Dict]]:
+        """Return (hit, user). A hit with user None means "no such user"."""
+        if not self.enabled:
+            return False, None
+        with self._lock:
+            self._sync(version)
+            entry = self._entries.get(username)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            user = entry[0]
+        return True, dict(user) if user is not None else None
+
+    def put(self, username: str, user: Optional[Dict], version: Optional[int] = None) -> None:
+        """Store a record read at `version`, or write through a local change if None."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if version is not None and version != self._version:
+                # Read before a newer commit was seen; don't cache stale data
+                return
+            self._entries[username] = (dict(user) if user is not None else None, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,137 @@
+"""CSV and JSONL bulk import/export of user accounts.
+
+Import rows carry `username`, `password` (or an existing `password_hash`,
+e.g. from an export with hashes) and an optional `is_admin` flag. CSV files
+need a header row; JSONL files hold one JSON object per line. Rows are fed
+lazily to `users.import_users`, which hashes in parallel and commits in
+batches, so a file of any size is never held in memory.
+
+Exports are produced as an iterator of text chunks (one per batch of
+users), suitable for a streamed HTTP response or writing to a file.
+
+Usage:
+    python user_io.py import staff.csv --workers 8
+    python user_io.py import staff.jsonl --overwrite
+    python user_io.py export users.csv
+    python user_io.py export backup.jsonl --include-hashes
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from typing import Dict, Iterable, Iterator, Optional
+
+import users
+
+FORMATS = ("csv", "jsonl")
+CSV_FIELDS = ["username", "is_admin"]
+
+
+def detect_format(filename: Optional[str], default: str = "csv") -> str:
+    """Pick "csv" or "jsonl" from a file name's extension."""
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if ext in ("jsonl", "ndjson", "json"):
+        return "jsonl"
+    if ext == "csv":
+        return "csv"
+    return default
+
+
+def read_users(lines: Iterable[str], fmt: str) -> Iterator[Dict]:
+    """Parse import rows lazily from an iterable of text lines.
+
+    Raises:
+        ValueError: on an unknown format or a line that is not a JSON object.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(lines)
+    elif fmt == "jsonl":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number}: invalid JSON")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {number}: expected a JSON object")
+            yield row
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def export_users(fmt: str, include_hashes: bool = False, batch_size: int = 500) -> Iterator[str]:
+    """Yield the users table as CSV or JSONL text, one chunk per batch."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    fields = CSV_FIELDS + (["password_hash"] if include_hashes else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+    if fmt == "csv":
+        writer.writeheader()
+    for count, user in enumerate(users.iter_users(batch_size, include_hashes), 1):
+        if fmt == "csv":
+            writer.writerow(user)
+        else:
+            buffer.write(json.dumps({k: user[k] for k in fields}) + "\n")
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import or export user accounts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="create users from a CSV or JSONL file")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    imp.add_argument("--overwrite", action="store_true", help="update existing users instead of skipping them")
+    imp.add_argument("--batch-size", type=int, default=500)
+    imp.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="parallel password hashes")
+    exp = sub.add_parser("export", help="write all users to a CSV or JSONL file ('-' for stdout)")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    exp.add_argument("--include-hashes", action="store_true", help="include password hashes (for migration)")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    if args.command == "export":
+        out = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+        try:
+            for chunk in export_users(fmt, include_hashes=args.include_hashes):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return 0
+
+    # Offline import: use every core rather than the web process's small pool
+    from password_hashing import HashPool
+    pool = HashPool(workers=args.workers, max_pending=args.workers * 2, max_queue_seconds=0)
+
+    def report(summary):
+        print(f"processed {summary['processed']}: created {summary['created']}, "
+              f"updated {summary['updated']}, skipped {summary['skipped']}, errors {summary['error_count']}",
+              file=sys.stderr)
+
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as fh:
+            summary = users.import_users(
+                read_users(fh, fmt), batch_size=args.batch_size, overwrite=args.overwrite, pool=pool, progress=report
+            )
+    finally:
+        pool.shutdown()
+    for item in summary["errors"]:
+        print(f"line {item['line']}: {item['error']}", file=sys.stderr)
+    return 1 if summary["error_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
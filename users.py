@@ -1,105 +1,364 @@
 """Simple SQLite-backed user management for the scaffold.
 
-Provides create_user, get_user, list_users, and delete_user. Passwords are
-stored as salted hashes using Werkzeug's `generate_password_hash`.
+Provides create_user, get_user, list_users, has_users and delete_user, plus
+keyset-paginated listing (list_users_page), streaming iteration (iter_users)
+and batched bulk import (import_users). Passwords are
+stored as salted hashes using Werkzeug's `generate_password_hash`, computed on
+the bounded `password_hashing.HashPool` rather than the request thread.
+
+Connections come from a `db_pool.ConnectionManager`, so the schema is set
+up once per process and connections (with their prepared statements) are
+reused across calls. `get_user` is served from a `user_cache.UserCache`
+that is dropped whenever any process writes to the database. Invite and
+password-reset tokens live in the same database, managed by
+`token_store.TokenStore`.
+
+Configuration comes from environment variables:
+  - USERS_DB_PATH: SQLite file for users and tokens (default: users.db in
+    the package directory)
 """
 from __future__ import annotations
 
 import os
 import sqlite3
-import secrets
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict
-from werkzeug.security import generate_password_hash, check_password_hash
-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "users.db")
+import token_store
+from db_pool import ConnectionManager
+from password_hashing import HashingBusy, HashPool, get_hash_pool, is_password_hash
+from user_cache import UserCache
 
 
-def _get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+DB_PATH = os.environ.get("USERS_DB_PATH") or os.path.join(os.path.dirname(__file__), "users.db")
 
 
-def _ensure_table():
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            is_admin INTEGER NOT NULL DEFAULT 0
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS tokens (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            token TEXT UNIQUE NOT NULL,
-            username TEXT NOT NULL,
-            token_type TEXT NOT NULL,
-            expires_at TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (username) REFERENCES users (username)
-        )
-        """
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        is_admin INTEGER NOT NULL DEFAULT 0
     )
-    conn.commit()
-    conn.close()
+    """,
+] + token_store.SCHEMA
+
+_manager: Optional[ConnectionManager] = None
+_manager_lock = threading.Lock()
+_user_cache = UserCache.from_env()
+
+
+def _db() -> ConnectionManager:
+    """Return the connection manager for DB_PATH, creating it on first use."""
+    global _manager
+    manager = _manager
+    if manager is None or manager.path != DB_PATH:
+        with _manager_lock:
+            if _manager is None or _manager.path != DB_PATH:
+                _manager = ConnectionManager(DB_PATH, SCHEMA, migrations=[token_store.migrate_expires_at])
+                _user_cache.clear()
+            manager = _manager
+    return manager
+
+
+tokens = token_store.TokenStore(_db)
+
+
+class _HasUsersCache:
+    """Whether any account exists, re-checked only when the database changes.
+
+    `login_required` asks on every protected request. The answer is kept
+    alongside the `PRAGMA data_version` it was read at; while the version is
+    unchanged (no commit from any process) it is served from memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value: Optional[bool] = None
+        self._version: Optional[int] = None
+        self._path: Optional[str] = None
+        self.hits = 0
+        self.refreshes = 0
+
+    def get(self, manager: ConnectionManager) -> bool:
+        version = manager.data_version()
+        with self._lock:
+            if self._value is not None and self._version == version and self._path == manager.path:
+                self.hits += 1
+                return self._value
+        with manager.connection() as conn:
+            value = conn.execute("SELECT EXISTS (SELECT 1 FROM users)").fetchone()[0] == 1
+        with self._lock:
+            self._value, self._version, self._path = value, version, manager.path
+            self.refreshes += 1
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "refreshes": self.refreshes}
+
+
+_has_users = _HasUsersCache()
+
+
+def get_db_stats() -> Dict:
+    """Connection pool and cache statistics for the users database."""
+    stats = _db().get_stats()
+    stats["has_users_cache"] = _has_users.get_stats()
+    stats["user_cache"] = _user_cache.get_stats()
+    stats["password_hashing"] = get_hash_pool().get_stats()
+    stats["tokens"] = tokens.get_stats()
+    return stats
+
+
+def has_users() -> bool:
+    """Return True if at least one user account exists.
+
+    Cheap enough to call on every request: an existence query, cached until
+    any process writes to the database.
+    """
+    return _has_users.get(_db())
 
 
 def create_user(username: str, password: str, is_admin: bool = False) -> None:
-    _ensure_table()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
+    """Create or replace a user. Raises password_hashing.HashingBusy if the hash pool is saturated."""
+    password_hash = get_hash_pool().hash_password(password)
+    with _db().transaction() as conn:
+        user_id = _store_user(conn, username, password_hash, is_admin)
+    _user_stored(user_id, username, password_hash, is_admin)
+
+
+def _store_user(conn: sqlite3.Connection, username: str, password_hash: str, is_admin: bool) -> int:
+    cur = conn.execute(
         "INSERT OR REPLACE INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)",
-        (username, generate_password_hash(password), 1 if is_admin else 0),
+        (username, password_hash, 1 if is_admin else 0),
+    )
+    return cur.lastrowid
+
+
+def _user_stored(user_id: int, username: str, password_hash: str, is_admin: bool) -> None:
+    """Update the in-process caches after a committed user write."""
+    _has_users.invalidate()
+    _user_cache.put(
+        username,
+        {"id": user_id, "username": username, "password_hash": password_hash, "is_admin": bool(is_admin)},
     )
-    conn.commit()
-    conn.close()
 
 
 def get_user(username: str) -> Optional[Dict]:
-    _ensure_table()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, username, password_hash, is_admin FROM users WHERE username = ?", (username,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return None
-    return {"id": row["id"], "username": row["username"], "password_hash": row["password_hash"], "is_admin": bool(row["is_admin"]) }
+    manager = _db()
+    version = manager.data_version() if _user_cache.enabled else 0
+    hit, user = _user_cache.get(username, version)
+    if hit:
+        return user
+    with manager.connection() as conn:
+        row = conn.execute(
+            "SELECT id, username, password_hash, is_admin FROM users WHERE username = ?", (username,)
+        ).fetchone()
+    user = None
+    if row:
+        user = {"id": row["id"], "username": row["username"], "password_hash": row["password_hash"], "is_admin": bool(row["is_admin"]) }
+    _user_cache.put(username, user, version)
+    return user
 
 
 def list_users() -> List[Dict]:
-    _ensure_table()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, username, is_admin FROM users ORDER BY username")
-    rows = cur.fetchall()
-    conn.close()
+    with _db().connection() as conn:
+        rows = conn.execute("SELECT id, username, is_admin FROM users ORDER BY username").fetchall()
     return [{"id": r["id"], "username": r["username"], "is_admin": bool(r["is_admin"])} for r in rows]
 
 
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def list_users_page(
+    after: Optional[str] = None, limit: int = 50, search: Optional[str] = None
+) -> Tuple[List[Dict], Optional[str]]:
+    """Return one page of users ordered by username, and the cursor for the next.
+
+    Keyset pagination: a page starts just after the last username of the
+    previous one (`after`) and walks the username index from there, so
+    every page costs the same however deep into the table it is. `search`
+    keeps usernames containing it (case-insensitive). The returned cursor
+    is None on the last page.
+    """
+    clauses, params = [], []
+    if after:
+        clauses.append("username > ?")
+        params.append(after)
+    if search:
+        clauses.append("username LIKE ? ESCAPE '\\'")
+        params.append(f"%{_escape_like(search)}%")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with _db().connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, username, is_admin FROM users {where} ORDER BY username LIMIT ?", params + [limit + 1]
+        ).fetchall()
+    page = [{"id": r["id"], "username": r["username"], "is_admin": bool(r["is_admin"])} for r in rows[:limit]]
+    next_after = page[-1]["username"] if len(rows) > limit else None
+    return page, next_after
+
+
+def iter_users(batch_size: int = 500, include_hashes: bool = False) -> Iterator[Dict]:
+    """Yield every user in username order, reading `batch_size` rows at a time.
+
+    Each batch is its own short read, so a slow consumer (e.g. a streamed
+    HTTP export) never holds a connection or a read snapshot open.
+    """
+    columns = "id, username, is_admin" + (", password_hash" if include_hashes else "")
+    after = ""
+    while True:
+        with _db().connection() as conn:
+            rows = conn.execute(
+                f"SELECT {columns} FROM users WHERE username > ? ORDER BY username LIMIT ?", (after, batch_size)
+            ).fetchall()
+        for r in rows:
+            user = {"id": r["id"], "username": r["username"], "is_admin": bool(r["is_admin"])}
+            if include_hashes:
+                user["password_hash"] = r["password_hash"]
+            yield user
+        if len(rows) < batch_size:
+            return
+        after = rows[-1]["username"]
+
+
+MAX_IMPORT_ERRORS = 100
+
+
+def _parse_flag(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "on")
+    return bool(value)
+
+
+def import_users(
+    rows: Iterable[Dict],
+    batch_size: int = 500,
+    overwrite: bool = False,
+    pool: Optional[HashPool] = None,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """Create users in bulk from dicts with username, password (or password_hash) and is_admin.
+
+    Rows are processed `batch_size` at a time: usernames that already exist
+    are skipped (or updated when `overwrite` is set) before any hashing,
+    the remaining passwords are hashed in parallel on `pool` (by default
+    the shared pool, using at most its worker count so logins still get
+    through), and the batch is written in one transaction. Invalid rows
+    (including non-string passwords and `password_hash` values werkzeug
+    cannot read) and rows whose hash could not be scheduled are reported in "errors"
+    and skipped, so re-running the same file with `overwrite` off picks
+    up only what is missing.
+
+    Returns counts of processed, created, updated and skipped rows and up
+    to MAX_IMPORT_ERRORS errors; `progress` is called with that summary
+    after every batch.
+    """
+    pool = pool or get_hash_pool()
+    summary: Dict = {"processed": 0, "created": 0, "updated": 0, "skipped": 0, "error_count": 0, "errors": []}
+
+    def error(line: int, message: str) -> None:
+        summary["error_count"] += 1
+        if len(summary["errors"]) < MAX_IMPORT_ERRORS:
+            summary["errors"].append({"line": line, "error": message})
+
+    def hash_one(password: str) -> Optional[str]:
+        try:
+            return pool.hash_password(password)
+        except HashingBusy:
+            return None
+
+    def flush(batch: List[Tuple[int, str, Optional[str], Optional[str], bool]]) -> None:
+        names = [item[1] for item in batch]
+        with _db().connection() as conn:
+            existing = {
+                r[0] for r in conn.execute(
+                    f"SELECT username FROM users WHERE username IN ({','.join('?' * len(names))})", names
+                )
+            }
+        pending, seen = [], set()
+        for line, username, password, password_hash, is_admin in batch:
+            if username in seen or (username in existing and not overwrite):
+                summary["skipped"] += 1
+                continue
+            seen.add(username)
+            pending.append((line, username, password, password_hash, is_admin))
+
+        to_hash = [item[2] for item in pending if item[3] is None]
+        hashed = iter(list(hashers.map(hash_one, to_hash)))
+        records = []
+        for line, username, password, password_hash, is_admin in pending:
+            if password_hash is None:
+                password_hash = next(hashed)
+                if password_hash is None:
+                    error(line, "password hashing is busy; retry the import")
+                    continue
+            records.append((username, password_hash, 1 if is_admin else 0))
+
+        conflict = (
+            "DO UPDATE SET password_hash = excluded.password_hash, is_admin = excluded.is_admin"
+            if overwrite else "DO NOTHING"
+        )
+        with _db().transaction() as conn:
+            conn.executemany(
+                f"INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?) ON CONFLICT (username) {conflict}",
+                records,
+            )
+        for username, _, _ in records:
+            summary["updated" if username in existing else "created"] += 1
+        if records:
+            _has_users.invalidate()
+        if progress:
+            progress(summary)
+
+    batch: List[Tuple[int, str, Optional[str], Optional[str], bool]] = []
+    with ThreadPoolExecutor(max_workers=max(1, pool.workers), thread_name_prefix="user-import") as hashers:
+        for line, row in enumerate(rows, 1):
+            summary["processed"] += 1
+            username = str(row.get("username") or "").strip()
+            password = row.get("password") or None
+            password_hash = row.get("password_hash") or None
+            if not username:
+                error(line, "missing username")
+                continue
+            if not password and not password_hash:
+                error(line, f"missing password for {username}")
+                continue
+            if password is not None and not isinstance(password, str):
+                error(line, f"password for {username} must be a string")
+                continue
+            if password_hash is not None and not (isinstance(password_hash, str) and is_password_hash(password_hash)):
+                error(line, f"password_hash for {username} is not a werkzeug password hash")
+                continue
+            batch.append((line, username, password, password_hash, _parse_flag(row.get("is_admin"))))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    return summary
+
+
 def delete_user(username: str) -> None:
-    _ensure_table()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM users WHERE username = ?", (username,))
-    conn.commit()
-    conn.close()
+    with _db().transaction() as conn:
+        conn.execute("DELETE FROM users WHERE username = ?", (username,))
+    _has_users.invalidate()
+    _user_cache.put(username, None)
 
 
 def verify_password(username: str, password: str) -> bool:
+    """Check a password. Raises password_hashing.HashingBusy if the hash pool is saturated."""
     user = get_user(username)
     if not user:
         return False
-    return check_password_hash(user["password_hash"], password)
+    return get_hash_pool().check_password(user["password_hash"], password)
 
 
 def generate_token(username: str, token_type: str, expires_in_hours: int = 24) -> str:
@@ -108,21 +367,7 @@ def generate_token(username: str, token_type: str, expires_in_hours: int = 24) -
     token_type: 'password_reset' or 'invite'
     Returns: the token string
     """
-    _ensure_table()
-    token = secrets.token_urlsafe(32)
-    now = datetime.utcnow()
-    expires_at = (now + timedelta(hours=expires_in_hours)).isoformat()
-    created_at = now.isoformat()
-    
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO tokens (token, username, token_type, expires_at, created_at) VALUES (?, ?, ?, ?, ?)",
-        (token, username, token_type, expires_at, created_at),
-    )
-    conn.commit()
-    conn.close()
-    return token
+    return tokens.create(username, token_type, expires_in_hours)
 
 
 def validate_token(token: str, token_type: str) -> Optional[str]:
@@ -130,31 +375,52 @@ def validate_token(token: str, token_type: str) -> Optional[str]:
     
     Returns None if token is invalid, expired, or of wrong type.
     """
-    _ensure_table()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT username, expires_at FROM tokens WHERE token = ? AND token_type = ?",
-        (token, token_type),
-    )
-    row = cur.fetchone()
-    conn.close()
-    
-    if not row:
-        return None
-    
-    expires_at = datetime.fromisoformat(row["expires_at"])
-    if datetime.utcnow() > expires_at:
-        return None
-    
-    return row["username"]
+    return tokens.validate(token, token_type)
+
+
+def generate_tokens(usernames: List[str], token_type: str, expires_in_hours: int = 24) -> List[str]:
+    """Generate one token per username, all committed in one transaction."""
+    return tokens.create_many(usernames, token_type, expires_in_hours)
+
+
+def revoke_tokens(token_list: List[str]) -> None:
+    """Delete tokens that were generated but never handed out."""
+    tokens.revoke_many(token_list)
+
+
+def existing_usernames(usernames: Iterable[str]) -> set:
+    """Return which of `usernames` already have accounts."""
+    names = list(dict.fromkeys(usernames))
+    found = set()
+    with _db().connection() as conn:
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            found.update(
+                r[0] for r in conn.execute(
+                    f"SELECT username FROM users WHERE username IN ({','.join('?' * len(chunk))})", chunk
+                )
+            )
+    return found
 
 
 def consume_token(token: str) -> None:
     """Delete a token after it has been used."""
-    _ensure_table()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM tokens WHERE token = ?", (token,))
-    conn.commit()
-    conn.close()
+    tokens.consume(token)
+
+
+def redeem_token(token: str, token_type: str, password: str, is_admin: bool = False) -> Optional[str]:
+    """Spend an invite or reset token and set the user's password.
+
+    The password is hashed first (so a saturated hash pool leaves the token
+    intact); then the token is validated and deleted, and the user written,
+    in one transaction. Returns the username, or None if the token was
+    invalid, expired or already used.
+    """
+    password_hash = get_hash_pool().hash_password(password)
+    with _db().transaction() as conn:
+        username = tokens.consume_valid(token, token_type, conn)
+        if username is None:
+            return None
+        user_id = _store_user(conn, username, password_hash, is_admin)
+    _user_stored(user_id, username, password_hash, is_admin)
+    return username